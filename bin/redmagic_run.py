@@ -15,8 +15,10 @@ if __name__ == '__main__':
     parser.add_argument('-C', '--clobber', action='store_true', default=False, help='Clobber existing run')
     parser.add_argument('-n', '--nrandoms', action='store', type=int, required=False,
                         help='Number of randoms to make')
+    parser.add_argument('-N', '--nproc', action='store', type=int, required=False,
+                        help='Number of processes for the selection')
 
     args = parser.parse_args()
 
     run_redmagic = redmapper.redmagic.RunRedmagicTask(args.configfile)
-    run_redmagic.run(clobber=args.clobber, n_randoms=args.nrandoms)
+    run_redmagic.run(clobber=args.clobber, n_randoms=args.nrandoms, nproc=args.nproc)
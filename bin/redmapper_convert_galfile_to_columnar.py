@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+from __future__ import division, absolute_import, print_function
+
+import os
+import sys
+import argparse
+import redmapper
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a pixelated redmapper galaxy table to a columnar galaxy store')
+
+    parser.add_argument('-g', '--galfile', action='store', type=str, required=True,
+                        help='Input galaxy master table file')
+    parser.add_argument('-o', '--outbase', action='store', type=str, required=True,
+                        help='Output filename base (including path)')
+    parser.add_argument('-z', '--zredfile', action='store', type=str, required=False,
+                        help='Input zred master table file to store with the galaxies')
+    parser.add_argument('-C', '--clobber', action='store_true',
+                        help='Clobber output table?')
+
+    args = parser.parse_args()
+
+    filename = redmapper.galaxy.convert_galfile_to_columnar(args.galfile, args.outbase,
+                                                            zredfile=args.zredfile,
+                                                            clobber=args.clobber)
+    print('Wrote columnar galaxy store table %s' % (filename))
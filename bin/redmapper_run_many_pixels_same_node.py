@@ -2,6 +2,7 @@
 
 import os
 import sys
+import time
 import subprocess
 import multiprocessing
 import argparse
@@ -10,11 +11,38 @@ parser = argparse.ArgumentParser(description='Run multiple redmapper pixels on t
 
 parser.add_argument('-c', '--command', action='store', type=str, required=True, help='Command to run')
 parser.add_argument('-P', '--pixels', action='store', type=str, required=True, help='Comma-separated list of pixels')
+parser.add_argument('-N', '--nproc', action='store', type=int, required=False, default=None,
+                    help='Number of processes (default is one per pixel)')
+parser.add_argument('-C', '--configfile', action='store', type=str, required=False, default=None,
+                    help='Configuration file, to run the most expensive pixels first')
+parser.add_argument('-n', '--nside', action='store', type=int, required=False, default=None,
+                    help='Healpix nside for the pixels (required with --configfile)')
+parser.add_argument('-r', '--runtimefile', action='store', type=str, required=False, default=None,
+                    help='File to record runtimes to refine the cost model')
 
 args = parser.parse_args()
 
 pixels = args.pixels.split(',')
 
+nproc = args.nproc if args.nproc is not None else len(pixels)
+
+cost_model = None
+if args.configfile is not None:
+    import numpy as np
+    import redmapper
+
+    if args.nside is None:
+        raise RuntimeError("Must set --nside with --configfile")
+
+    config = redmapper.Configuration(args.configfile)
+    runtimefile = args.runtimefile if args.runtimefile is not None else config.calib_run_runtimefile
+
+    cost_model = redmapper.PixelCostModel(config.galfile, args.nside,
+                                          border=config.border,
+                                          seedfile=config.seedfile,
+                                          runtimefile=runtimefile)
+    pixels = [str(p) for p in cost_model.order(np.array([int(p) for p in pixels]))]
+
 class RunCommand(object):
     def __init__(self, command):
         self.command = command
@@ -22,18 +50,17 @@ class RunCommand(object):
     def __call__(self, pixel):
         full_command = self.command + ' -p ' + pixel
         print(full_command)
+        starttime = time.time()
         subprocess.call(full_command, shell=True)
+        return (pixel, time.time() - starttime)
 
 runCommand = RunCommand(args.command)
 
-pool = multiprocessing.Pool(processes=len(pixels))
-results = []
-
-for pixel in pixels:
-    results.append(pool.apply_async(runCommand, (pixel, )))
-
+# Each process takes the next pixel (most expensive first) when it is free
+pool = multiprocessing.Pool(processes=nproc)
+results = list(pool.imap_unordered(runCommand, pixels, chunksize=1))
 pool.close()
 pool.join()
 
-for res in results:
-    res.get()
+if cost_model is not None:
+    cost_model.record([int(x[0]) for x in results], [x[1] for x in results])
@@ -16,9 +16,9 @@ from .configuration import Configuration
 from .runcat import RunCatalog
 from .run_zscan import RunZScan
 from .solver_nfw import Solver
-from .catalog import DataObject, Entry, Catalog
+from .catalog import DataObject, Entry, Catalog, CatalogBuilder
 from .redsequence import RedSequenceColorPar
-from .chisq_dist import compute_chisq
+from .chisq_dist import compute_chisq, compute_chisq_grouped
 from .background import Background, ZredBackground, BackgroundGenerator, ZredBackgroundGenerator
 from .cluster import Cluster, ClusterCatalog
 from .galaxy import Galaxy, GalaxyCatalog, GalaxyCatalogMaker
@@ -36,6 +36,7 @@ from .color_background import ColorBackground, ColorBackgroundGenerator
 from .fitters import MedZFitter, RedSequenceFitter, RedSequenceOffDiagonalFitter, CorrectionFitter, EcgmmFitter, ErrorBinFitter
 from .zred_runner import ZredRunCatalog, ZredRunPixels
 from .redmapper_run import RedmapperRun
+from .pixel_scheduler import PixelCostModel
 from .depth_fitting import DepthLim, applyErrorModel
 from .plotting import SpecPlot, NzPlot, NLambdaPlot, PositionPlot
 from .volumelimit import VolumeLimitMask, VolumeLimitMaskFixed
@@ -10,6 +10,8 @@ import time
 import copy
 import os
 import esutil
+import threading
+import collections
 
 import multiprocessing
 
@@ -28,6 +30,85 @@ from .utilities import _pickle_method
 
 copyreg.pickle(types.MethodType, _pickle_method)
 
+class SigmaGLookup(object):
+    """
+    Lookup table of Sigma_g(chisq, refmag) at a single redshift bin.
+
+    The table is stored flattened and contiguous, with a final entry of
+    infinity which is used for out-of-range galaxies.
+    """
+
+    def __init__(self, sigma_g, chisqbins, chisqbinsize, refmagbins, refmagbinsize):
+        """
+        Instantiate a SigmaGLookup
+
+        Parameters
+        ----------
+        sigma_g: `np.array`
+           Float array of Sigma_g [nrefmagbins, nchisqbins]
+        chisqbins: `np.array`
+           Float array of chisq bins
+        chisqbinsize: `float`
+           Chisq bin size
+        refmagbins: `np.array`
+           Float array of refmag bins
+        refmagbinsize: `float`
+           Refmag bin size
+        """
+        self.chisqbins = chisqbins
+        self.refmagbins = refmagbins
+
+        self._chisqmin = chisqbins[0]
+        self._chisqmax = chisqbins[-1] + chisqbinsize
+        self._refmagmin = refmagbins[0]
+        self._refmagmax = refmagbins[-1] + refmagbinsize
+
+        self._stride = chisqbins.size
+        self._badindex = sigma_g.size
+
+        self._table = np.append(sigma_g.ravel(), np.inf)
+
+        # Table with zeros replaced by infinity
+        self._table_no0 = self._table.copy()
+        self._table_no0[self._table_no0 == 0.0] = np.inf
+
+    def lookup(self, chisq, refmag, allow0=False):
+        """
+        Look up Sigma_g(chisq, refmag).
+
+        Parameters
+        ----------
+        chisq: `np.array`
+           chi-squared values of galaxies
+        refmag: `np.array`
+           reference magnitudes of galaxies
+        allow0: `bool`, optional
+           Flag to allow Sigma_g(x) to be zero.  Otherwise will set to infinity
+           where there is no data.  Default is False.
+
+        Returns
+        -------
+        sigma_g: `np.array`
+           Sigma_g(x) for input values
+        """
+        chisqindex = np.searchsorted(self.chisqbins, chisq) - 1
+        # A chisq on the first bin edge wraps to the last bin, as with
+        # indexing the full table.
+        chisqindex[chisqindex < 0] = self._stride - 1
+
+        index = (np.searchsorted(self.refmagbins, refmag) - 1) * self._stride + chisqindex
+
+        index[(chisq < self._chisqmin) |
+              (chisq > self._chisqmax) |
+              (refmag <= self._refmagmin) |
+              (refmag > self._refmagmax)] = self._badindex
+
+        if allow0:
+            return self._table[index]
+        else:
+            return self._table_no0[index]
+
+
 class Background(object):
     """
     Galaxy background class.
@@ -127,6 +208,54 @@ class Background(object):
         self.sigma_lng = sigma_lng_new
         self.n = n_new
 
+        self._lookup_cache = collections.OrderedDict()
+        self._lookup_lock = threading.Lock()
+
+    # Number of redshift bins of lookup tables to keep
+    lookup_cache_size = 32
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lookup_cache']
+        del state['_lookup_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lookup_cache = collections.OrderedDict()
+        self._lookup_lock = threading.Lock()
+
+    def get_lookup(self, zindex):
+        """
+        Get the Sigma_g(chisq, refmag) lookup table for a redshift bin.
+
+        The tables are cached for the most recently used redshift bins.
+        This is thread-safe.
+
+        Parameters
+        ----------
+        zindex: `int`
+           Redshift bin index
+
+        Returns
+        -------
+        lookup: `redmapper.background.SigmaGLookup`
+           Lookup table
+        """
+        with self._lookup_lock:
+            lookup = self._lookup_cache.get(zindex)
+            if lookup is not None:
+                self._lookup_cache.move_to_end(zindex)
+                return lookup
+
+            lookup = SigmaGLookup(self.sigma_g[:, :, zindex], self.chisqbins, self.chisqbinsize,
+                                  self.refmagbins, self.refmagbinsize)
+            self._lookup_cache[zindex] = lookup
+            if len(self._lookup_cache) > self.lookup_cache_size:
+                self._lookup_cache.popitem(last=False)
+
+            return lookup
+
     def sigma_g_lookup(self, z, chisq, refmag, allow0=False):
         """
         Look up the Sigma_g(z, chisq, refmag) background quantity for matched filter
@@ -149,11 +278,22 @@ class Background(object):
            Sigma_g(x) for input values
         """
         zmin = self.zbins[0]
-        chisqindex = np.searchsorted(self.chisqbins, chisq) - 1
-        refmagindex = np.searchsorted(self.refmagbins, refmag) - 1
+
+        if np.ndim(z) == 0:
+            # A single redshift uses the cached lookup table
+            # (computing the index with python scalars is much faster)
+            ind = min(max(round((float(z) - zmin)/(self.zbins[1] - zmin)), 0), self.zbins.size - 1)
+            return self.get_lookup(ind).lookup(chisq, refmag, allow0=allow0)
+
         # Look into changing to searchsorted
         ind = np.clip(np.round((z-zmin)/(self.zbins[1]-zmin)),0, self.zbins.size-1).astype(np.int32)
 
+        if ind.size > 0 and np.all(ind == ind.flat[0]):
+            return self.get_lookup(int(ind.flat[0])).lookup(chisq, refmag, allow0=allow0)
+
+        chisqindex = np.searchsorted(self.chisqbins, chisq) - 1
+        refmagindex = np.searchsorted(self.refmagbins, refmag) - 1
+
         badchisq, = np.where((chisq < self.chisqbins[0]) |
                              (chisq > (self.chisqbins[-1] + self.chisqbinsize)))
         badrefmag, = np.where((refmag <= self.refmagbins[0]) |
@@ -231,6 +371,10 @@ class ZredBackground(object):
         self.refmagrange = obkg.refmagrange
         self.sigma_g = sigma_g_new
 
+        # Flattened table for lookups, with a final entry of infinity for
+        # out-of-range galaxies
+        self._sigma_g_flat = np.append(self.sigma_g.ravel(), np.inf)
+
     def sigma_g_lookup(self, zred, refmag):
         """
         Look up the Sigma_g(zred, refmag) background quantity for centering calculations
@@ -251,19 +395,10 @@ class ZredBackground(object):
         zredindex = np.searchsorted(self.zredbins, zred) - 1
         refmagindex = np.searchsorted(self.refmagbins, refmag) - 1
 
-        badzred, = np.where((zredindex < 0) |
-                            (zredindex >= self.zredbins.size))
-        zredindex[badzred] = 0
-        badrefmag, = np.where((refmagindex < 0) |
-                              (refmagindex >= self.refmagbins.size))
-        refmagindex[badrefmag] = 0
-
-        lookup_vals = self.sigma_g[refmagindex, zredindex]
-
-        lookup_vals[badzred] = np.inf
-        lookup_vals[badrefmag] = np.inf
+        index = refmagindex * self.zredbins.size + zredindex
+        index[(zredindex < 0) | (refmagindex < 0)] = self.sigma_g.size
 
-        return lookup_vals
+        return self._sigma_g_flat[index]
 
 class BackgroundGenerator(object):
     """
@@ -290,7 +425,9 @@ class BackgroundGenerator(object):
         """
         Generate the galaxy background using multiprocessing.  The number of
         cores used is specified in self.config.calib_nproc, and the output
-        filename is specified in self.config.bkgfile.
+        filename is specified in self.config.bkgfile.  The work is split by
+        redshift bin, or by galaxy pixel if self.config.bkg_pixel_partition
+        is set.
 
         Parameters
         ----------
@@ -342,39 +479,10 @@ class BackgroundGenerator(object):
             self.areas = np.zeros(self.refmagbins.size) + self.config.area
 
 
-        # Split into bins for parallel running
-        logrange = np.log(np.array([self.config.zrange[0] - 0.001,
-                                    self.config.zrange[1] + 0.001]))
-        logbinsize = (logrange[1] - logrange[0]) / self.config.calib_nproc
-        zedges = (np.exp(logrange[0]) + np.exp(logrange[1])) - np.exp(logrange[0] + np.arange(self.config.calib_nproc + 1) * logbinsize)
-
-        worker_list = []
-        for i in range(self.config.calib_nproc):
-            ubins, = np.where((self.zbins < zedges[i]) & (self.zbins > zedges[i + 1]))
-            gd, = np.where(ubins < self.zbins.size)
-
-            # If we have more processes than bins, some of these will be empty
-            # and this prevents us from adding them to the list
-            if gd.size == 0:
-                continue
-
-            ubins = ubins[gd]
-
-            zbinmark = np.zeros(self.zbins.size, dtype=bool)
-            zbinmark[ubins] = True
-
-            worker_list.append(zbinmark)
-
-        mp_ctx = multiprocessing.get_context("fork")
-        pool = mp_ctx.Pool(processes=self.config.calib_nproc)
-        retvals = pool.map(self._worker, worker_list, chunksize=1)
-        pool.close()
-        pool.join()
-
-        # And store the results
-        for zbinmark, sigma_g_sub, sigma_lng_sub in retvals:
-            sigma_g[:, :, zbinmark] = sigma_g_sub
-            sigma_lng[:, :, zbinmark] = sigma_lng_sub
+        if self.config.bkg_pixel_partition:
+            sigma_g[:, :, :], sigma_lng[:, :, :] = self._run_pixel_partition()
+        else:
+            self._run_redshift_partition(sigma_g, sigma_lng)
 
         # And save them
         dtype = [('zbins', 'f4', self.zbins.size),
@@ -417,6 +525,243 @@ class BackgroundGenerator(object):
         chisq_bkg.to_fits_file(self.config.bkgfile, extname='CHISQBKG', clobber=clobber)
 
 
+    def _run_redshift_partition(self, sigma_g, sigma_lng):
+        """
+        Compute the background with the redshift bins split between processes.
+
+        Parameters
+        ----------
+        sigma_g: `np.array`
+           Sigma_g(x) array to fill
+        sigma_lng: `np.array`
+           Sigma_lng(x) (log binning) array to fill
+        """
+        # Split into bins for parallel running
+        logrange = np.log(np.array([self.config.zrange[0] - 0.001,
+                                    self.config.zrange[1] + 0.001]))
+        logbinsize = (logrange[1] - logrange[0]) / self.config.calib_nproc
+        zedges = (np.exp(logrange[0]) + np.exp(logrange[1])) - np.exp(logrange[0] + np.arange(self.config.calib_nproc + 1) * logbinsize)
+
+        worker_list = []
+        for i in range(self.config.calib_nproc):
+            ubins, = np.where((self.zbins < zedges[i]) & (self.zbins > zedges[i + 1]))
+            gd, = np.where(ubins < self.zbins.size)
+
+            # If we have more processes than bins, some of these will be empty
+            # and this prevents us from adding them to the list
+            if gd.size == 0:
+                continue
+
+            ubins = ubins[gd]
+
+            zbinmark = np.zeros(self.zbins.size, dtype=bool)
+            zbinmark[ubins] = True
+
+            worker_list.append(zbinmark)
+
+        mp_ctx = multiprocessing.get_context("fork")
+        pool = mp_ctx.Pool(processes=self.config.calib_nproc)
+        retvals = pool.map(self._worker, worker_list, chunksize=1)
+        pool.close()
+        pool.join()
+
+        # And store the results
+        for zbinmark, sigma_g_sub, sigma_lng_sub in retvals:
+            sigma_g[:, :, zbinmark] = sigma_g_sub
+            sigma_lng[:, :, zbinmark] = sigma_lng_sub
+
+    def _run_pixel_partition(self):
+        """
+        Compute the background with the galaxies split between processes.
+
+        Each process reads its share of the galaxies once, computes chisq at
+        all the redshift bins, and returns partial histograms which are
+        summed here.
+
+        Returns
+        -------
+        sigma_g: `np.array`
+           Sigma_g(x)
+        sigma_lng: `np.array`
+           Sigma_lng(x) (log binning)
+        """
+        worker_list = _partition_galaxy_reads(self.config, 4*self.config.calib_nproc, self.natatime)
+
+        counts_g = np.zeros((self.nrefmagbins, self.nchisqbins, self.nzbins))
+        counts_lng = np.zeros((self.nrefmagbins, self.nlnchisqbins, self.nzbins))
+
+        mp_ctx = multiprocessing.get_context("fork")
+        pool = mp_ctx.Pool(processes=self.config.calib_nproc)
+        for counts_g_sub, counts_lng_sub in pool.imap_unordered(self._pixel_worker, worker_list, chunksize=1):
+            counts_g += counts_g_sub
+            counts_lng += counts_lng_sub
+        pool.close()
+        pool.join()
+
+        return self._normalize_counts(counts_g, counts_lng)
+
+    def _get_zlimmag(self, zredstr, zbins_use):
+        """
+        Get the limiting magnitude for computing chisq at each redshift bin.
+
+        Parameters
+        ----------
+        zredstr: `redmapper.RedSequenceColorPar`
+           Red sequence parameters
+        zbins_use: `np.array`
+           Float array of redshift bins
+
+        Returns
+        -------
+        zlimmag: `np.array`
+           Float array of limiting magnitudes (at refmag bin edges)
+        """
+        if (self.deepmode):
+            zlimmag = np.atleast_1d(zredstr.mstar(zbins_use + self.config.bkg_zbinsize) - 2.5 * np.log10(0.01))
+        else:
+            zlimmag = np.atleast_1d(zredstr.mstar(zbins_use + self.config.bkg_zbinsize) - 2.5 * np.log10(0.1))
+
+        bad, = np.where(zlimmag >= self.config.limmag_catalog)
+        zlimmag[bad] = self.config.limmag_catalog - 0.01
+        zlimmagpos = np.clip(((zlimmag - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])).astype(np.int32), 0, self.nrefmagbins - 1)
+
+        return self.refmagbins[zlimmagpos] + self.config.bkg_refmagbinsize
+
+    def _histogram_chisqs(self, chisqs, refmags):
+        """
+        Compute the (un-normalized) cloud-in-cell histograms of chisq and
+        ln(chisq) vs refmag for each redshift bin.
+
+        Parameters
+        ----------
+        chisqs: `np.array`
+           Float array of chisq values [ngal, nz]
+        refmags: `np.array`
+           Float array of reference magnitudes [ngal]
+
+        Returns
+        -------
+        counts_g: `np.array`
+           Float array of counts [nrefmagbins, nchisqbins, nz]
+        counts_lng: `np.array`
+           Float array of counts [nrefmagbins, nlnchisqbins, nz]
+        """
+        nz = chisqs.shape[1]
+
+        counts_g = np.zeros((self.nrefmagbins, self.nchisqbins, nz))
+        counts_lng = np.zeros((self.nrefmagbins, self.nlnchisqbins, nz))
+
+        for i in range(nz):
+            use, = np.where((chisqs[:, i] >= self.chisqrange[0]) &
+                            (chisqs[:, i] < self.chisqrange[1]) &
+                            (refmags >= self.refmagrange[0]) &
+                            (refmags < self.refmagrange[1]))
+            chisqpos = (chisqs[use, i] - self.chisqrange[0]) * self.nchisqbins / (self.chisqrange[1] - self.chisqrange[0])
+            refmagpos = (refmags[use] - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])
+
+            value = np.ones(use.size)
+
+            counts_g[:, :, i] = cic(value, chisqpos, self.nchisqbins, refmagpos, self.nrefmagbins, isolated=True)
+
+            lnchisqs = np.log(chisqs[:, i])
+
+            use, = np.where((lnchisqs >= self.lnchisqrange[0]) &
+                            (lnchisqs < self.lnchisqrange[1]) &
+                            (refmags >= self.refmagrange[0]) &
+                            (refmags < self.refmagrange[1]))
+            lnchisqpos = (lnchisqs[use] - self.lnchisqrange[0]) * self.nlnchisqbins / (self.lnchisqrange[1] - self.lnchisqrange[0])
+            refmagpos = (refmags[use] - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])
+
+            value = np.ones(use.size)
+
+            counts_lng[:, :, i] = cic(value, lnchisqpos, self.nlnchisqbins, refmagpos, self.nrefmagbins, isolated=True)
+
+        return counts_g, counts_lng
+
+    def _normalize_counts(self, counts_g, counts_lng):
+        """
+        Normalize the histograms by area and bin size.
+
+        Parameters
+        ----------
+        counts_g: `np.array`
+           Float array of counts [nrefmagbins, nchisqbins, nz]
+        counts_lng: `np.array`
+           Float array of counts [nrefmagbins, nlnchisqbins, nz]
+
+        Returns
+        -------
+        sigma_g: `np.array`
+           Sigma_g(x) [nrefmagbins, nchisqbins, nz]
+        sigma_lng: `np.array`
+           Sigma_lng(x) (log binning) [nrefmagbins, nlnchisqbins, nz]
+        """
+        binsizes = self.config.bkg_refmagbinsize  * self.config.bkg_chisqbinsize
+        lnbinsizes = self.config.bkg_refmagbinsize * self.lnchisqbinsize
+
+        sigma_g = counts_g / (self.areas * binsizes)[:, np.newaxis, np.newaxis]
+        sigma_lng = counts_lng / (self.areas * lnbinsizes)[:, np.newaxis, np.newaxis]
+
+        return sigma_g, sigma_lng
+
+    def _pixel_worker(self, reads):
+        """
+        Internal worker method for multiprocessing, computing the background
+        histograms for a subset of the galaxies at all redshift bins.
+
+        Parameters
+        ----------
+        reads: `list`
+           List of galaxy reads (see _partition_galaxy_reads())
+
+        Returns
+        -------
+        retvals: `tuple`
+           counts_g: `np.array`
+              Un-normalized sigma_g(x) histogram
+           counts_lng: `np.array`
+              Un-normalized sigma_lng(x) (log binning) histogram
+        """
+        starttime = time.time()
+
+        zrange_use = np.array([self.zbins[0], self.zbins[-1] + self.config.bkg_zbinsize])
+        zredstr = RedSequenceColorPar(self.config.parfile, zrange=zrange_use, cachedir=self.config.redsequence_cachedir)
+
+        zlimmag = self._get_zlimmag(zredstr, self.zbins)
+
+        counts_g = np.zeros((self.nrefmagbins, self.nchisqbins, self.nzbins))
+        counts_lng = np.zeros((self.nrefmagbins, self.nlnchisqbins, self.nzbins))
+
+        ngal = 0
+        for read in reads:
+            gals = _read_galaxies(self.config, read)
+            if gals.size == 0:
+                continue
+
+            # default values are all guaranteed to be out of range
+            chisqs = np.zeros((gals.size, self.zbins.size), dtype=np.float32) + np.exp(np.max(self.lnchisqbins)) + 100.0
+
+            # Compute chisq for the galaxies in range at any redshift bin, at
+            # all the redshift bins in grouped blocks (of about natatime pairs)
+            inrange = ((gals.refmag[:, np.newaxis] > self.refmagrange[0]) &
+                       (gals.refmag[:, np.newaxis] < zlimmag[np.newaxis, :]))
+            galind, = np.where(inrange.any(axis=1))
+            nblock = max(self.natatime // self.zbins.size, 1)
+            for lo in range(0, galind.size, nblock):
+                ind = galind[lo: lo + nblock]
+                chisqs_block = zredstr.calculate_chisq_grouped(gals[ind], self.zbins, dtype='f4')
+                chisqs[ind, :] = np.where(inrange[ind, :], chisqs_block, chisqs[ind, :])
+
+            counts_g_sub, counts_lng_sub = self._histogram_chisqs(chisqs, gals.refmag.astype(np.float32))
+            counts_g += counts_g_sub
+            counts_lng += counts_lng_sub
+
+            ngal += gals.size
+
+        self.config.logger.info("Finished %d galaxies in %.1f seconds" % (ngal, time.time() - starttime))
+
+        return (counts_g, counts_lng)
+
     def _worker(self, zbinmark):
         """
         Internal worker method for multiprocessing.
@@ -443,7 +788,7 @@ class BackgroundGenerator(object):
         zrange_use = np.array([zbins_use[0], zbins_use[-1] + self.config.bkg_zbinsize])
 
         # We need to load in the red sequence structure -- just in the specific redshift range
-        zredstr = RedSequenceColorPar(self.config.parfile, zrange=zrange_use)
+        zredstr = RedSequenceColorPar(self.config.parfile, zrange=zrange_use, cachedir=self.config.redsequence_cachedir)
 
         zredstrbinsize = zredstr.z[1] - zredstr.z[0]
         zpos = np.searchsorted(zredstr.z, zbins_use)
@@ -477,15 +822,7 @@ class BackgroundGenerator(object):
         chisqs = np.zeros((ngal, zbins_use.size), dtype=np.float32) + np.exp(np.max(self.lnchisqbins)) + 100.0
         refmags = np.zeros(ngal, dtype=np.float32)
 
-        if (self.deepmode):
-            zlimmag = np.atleast_1d(zredstr.mstar(zbins_use + self.config.bkg_zbinsize) - 2.5 * np.log10(0.01))
-        else:
-            zlimmag = np.atleast_1d(zredstr.mstar(zbins_use + self.config.bkg_zbinsize) - 2.5 * np.log10(0.1))
-
-        bad, = np.where(zlimmag >= self.config.limmag_catalog)
-        zlimmag[bad] = self.config.limmag_catalog - 0.01
-        zlimmagpos = np.clip(((zlimmag - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])).astype(np.int32), 0, self.nrefmagbins - 1)
-        zlimmag = self.refmagbins[zlimmagpos] + self.config.bkg_refmagbinsize
+        zlimmag = self._get_zlimmag(zredstr, zbins_use)
 
         zbinmid = np.median(np.arange(zredstr.z.size - 1))
 
@@ -527,41 +864,7 @@ class BackgroundGenerator(object):
                     # Compute chisq at the redshift zbin
                     chisqs[inds[use], i] = zredstr.calculate_chisq(gals[use], zbin)
 
-        binsizes = self.config.bkg_refmagbinsize  * self.config.bkg_chisqbinsize
-        lnbinsizes = self.config.bkg_refmagbinsize * self.lnchisqbinsize
-
-        sigma_g_sub = np.zeros((self.nrefmagbins, self.nchisqbins, zbins_use.size))
-        sigma_lng_sub = np.zeros((self.nrefmagbins, self.nlnchisqbins, zbins_use.size))
-
-        for i, zbin in enumerate(zbins_use):
-            use, = np.where((chisqs[:, i] >= self.chisqrange[0]) &
-                            (chisqs[:, i] < self.chisqrange[1]) &
-                            (refmags >= self.refmagrange[0]) &
-                            (refmags < self.refmagrange[1]))
-            chisqpos = (chisqs[use, i] - self.chisqrange[0]) * self.nchisqbins / (self.chisqrange[1] - self.chisqrange[0])
-            refmagpos = (refmags[use] - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])
-
-            value = np.ones(use.size)
-
-            field = cic(value, chisqpos, self.nchisqbins, refmagpos, self.nrefmagbins, isolated=True)
-            for j in range(self.nchisqbins):
-                sigma_g_sub[:, j, i] = field[:, j] / (self.areas * binsizes)
-
-            lnchisqs = np.log(chisqs[:, i])
-
-            use, = np.where((lnchisqs >= self.lnchisqrange[0]) &
-                            (lnchisqs < self.lnchisqrange[1]) &
-                            (refmags >= self.refmagrange[0]) &
-                            (refmags < self.refmagrange[1]))
-            lnchisqpos = (lnchisqs[use] - self.lnchisqrange[0]) * self.nlnchisqbins / (self.lnchisqrange[1] - self.lnchisqrange[0])
-            refmagpos = (refmags[use] - self.refmagrange[0]) * self.nrefmagbins / (self.refmagrange[1] - self.refmagrange[0])
-
-            value = np.ones(use.size)
-
-            field2 = cic(value, lnchisqpos, self.nlnchisqbins, refmagpos, self.nrefmagbins, isolated=True)
-
-            for j in range(self.nlnchisqbins):
-                sigma_lng_sub[:, j, i] = field2[:, j] / (self.areas * lnbinsizes)
+        sigma_g_sub, sigma_lng_sub = self._normalize_counts(*self._histogram_chisqs(chisqs, refmags))
 
         self.config.logger.info("Finished %.2f < z < %.2f in %.1f seconds" % (zbins_use[0], zbins_use[-1],
                                                                               time.time() - starttime))
@@ -585,12 +888,15 @@ class ZredBackgroundGenerator(object):
         config: `redmapper.Configuration`
            Redmapper configuration object
         """
-        self.config = config
+        # We need to delete "cosmo" from the config for pickling/multiprocessing
+        self.config = config.copy()
+        self.config.cosmo = None
 
     def run(self, clobber=False, natatime=100000):
         """
         Generate the zred galaxy background.  The output filename is specified
-        in self.config.bkgfile.
+        in self.config.bkgfile.  If self.config.bkg_pixel_partition is set,
+        the galaxies are split between self.config.calib_nproc processes.
 
         Parameters
         ----------
@@ -611,7 +917,7 @@ class ZredBackgroundGenerator(object):
                         return
 
         # Read in zred parameters
-        zredstr = RedSequenceColorPar(self.config.parfile, fine=True, zrange=self.config.zrange)
+        zredstr = RedSequenceColorPar(self.config.parfile, fine=True, zrange=self.config.zrange, cachedir=self.config.redsequence_cachedir)
 
         # Set ranges
         refmagrange = np.array([12.0, self.config.limmag_catalog])
@@ -637,72 +943,86 @@ class ZredBackgroundGenerator(object):
         if not self.config.galfile_pixelized:
             raise ValueError("Only pixelized galfiles are supported at this moment.")
 
-        master = Entry.from_fits_file(self.config.galfile)
+        starttime = time.time()
+
+        if self.config.bkg_pixel_partition:
+            worker_list = [(reads, zredrange, nzredbins, refmagrange, nrefmagbins, maxchisq)
+                           for reads in _partition_galaxy_reads(self.config, 4*self.config.calib_nproc, natatime)]
 
-        if len(self.config.d.hpix) > 0:
-            # We need to take a sub-region
-            theta, phi = hpg.pixel_to_angle(master.nside, master.hpix, lonlat=False, nest=False)
-            ipring_big = hpg.angle_to_pixel(self.config.d.nside, theta, phi, lonlat=False, nest=False)
+            field = np.zeros((nrefmagbins, nzredbins))
 
-            _, subreg_indices = esutil.numpy_util.match(self.config.d.hpix, ipring_big)
-            subreg_indices = np.unique(subreg_indices)
+            mp_ctx = multiprocessing.get_context("fork")
+            pool = mp_ctx.Pool(processes=self.config.calib_nproc)
+            for field_sub in pool.imap_unordered(self._worker, worker_list, chunksize=1):
+                field += field_sub
+            pool.close()
+            pool.join()
         else:
-            subreg_indices = np.arange(master.hpix.size)
+            master = Entry.from_fits_file(self.config.galfile)
 
-        ngal = np.sum(master.ngals[subreg_indices])
-        npix = subreg_indices.size
+            if len(self.config.d.hpix) > 0:
+                # We need to take a sub-region
+                theta, phi = hpg.pixel_to_angle(master.nside, master.hpix, lonlat=False, nest=False)
+                ipring_big = hpg.angle_to_pixel(self.config.d.nside, theta, phi, lonlat=False, nest=False)
 
-        starttime = time.time()
+                _, subreg_indices = esutil.numpy_util.match(self.config.d.hpix, ipring_big)
+                subreg_indices = np.unique(subreg_indices)
+            else:
+                subreg_indices = np.arange(master.hpix.size)
 
-        nmag = self.config.nmag
-        ncol = nmag - 1
+            ngal = np.sum(master.ngals[subreg_indices])
+            npix = subreg_indices.size
 
-        zreds = np.zeros(ngal, dtype=np.float32) - 1.0
-        refmags = np.zeros(ngal, dtype=np.float32)
+            nmag = self.config.nmag
+            ncol = nmag - 1
 
-        zbinmid = np.median(np.arange(zredstr.z.size, dtype=np.int32))
+            zreds = np.zeros(ngal, dtype=np.float32) - 1.0
+            refmags = np.zeros(ngal, dtype=np.float32)
 
-        # Loop
-        ctr = 0
-        p = 0
-        while ((ctr < ngal) and (p < npix)):
-            if master.ngals[subreg_indices[p]] == 0:
-                p += 1
-                continue
+            zbinmid = np.median(np.arange(zredstr.z.size, dtype=np.int32))
 
-            gals = GalaxyCatalog.from_galfile(self.config.galfile, nside=master.nside,
-                                              hpix=master.hpix[subreg_indices[p]],
-                                              border=0.0,
-                                              zredfile=self.config.zredfile)
+            # Loop
+            ctr = 0
+            p = 0
+            while ((ctr < ngal) and (p < npix)):
+                if master.ngals[subreg_indices[p]] == 0:
+                    p += 1
+                    continue
 
-            use, = np.where(gals.chisq < maxchisq)
+                gals = GalaxyCatalog.from_galfile(self.config.galfile, nside=master.nside,
+                                                  hpix=master.hpix[subreg_indices[p]],
+                                                  border=0.0,
+                                                  zredfile=self.config.zredfile)
 
-            if use.size > 0:
-                lo = ctr
-                hi = ctr + use.size
+                use, = np.where(gals.chisq < maxchisq)
 
-                inds = np.arange(lo, hi, dtype=np.int64)
+                if use.size > 0:
+                    lo = ctr
+                    hi = ctr + use.size
 
-                refmags[inds] = gals.refmag[use]
-                zreds[inds] = gals.zred[use]
+                    inds = np.arange(lo, hi, dtype=np.int64)
 
-            ctr += master.ngals[subreg_indices[p]]
-            p += 1
+                    refmags[inds] = gals.refmag[use]
+                    zreds[inds] = gals.zred[use]
 
-        # Compute cic
-        sigma_g = np.zeros((nrefmagbins, nzredbins))
+                ctr += master.ngals[subreg_indices[p]]
+                p += 1
 
-        binsizes = self.config.bkg_refmagbinsize * self.config.bkg_zredbinsize
+            # Compute cic
 
-        use, = np.where((zreds >= zredrange[0]) & (zreds < zredrange[1]) &
-                        (refmags > refmagrange[0]) & (refmags < refmagrange[1]))
+            use, = np.where((zreds >= zredrange[0]) & (zreds < zredrange[1]) &
+                            (refmags > refmagrange[0]) & (refmags < refmagrange[1]))
 
-        zredpos = (zreds[use] - zredrange[0]) * nzredbins / (zredrange[1] - zredrange[0])
-        refmagpos = (refmags[use] - refmagrange[0]) * nrefmagbins / (refmagrange[1] - refmagrange[0])
+            zredpos = (zreds[use] - zredrange[0]) * nzredbins / (zredrange[1] - zredrange[0])
+            refmagpos = (refmags[use] - refmagrange[0]) * nrefmagbins / (refmagrange[1] - refmagrange[0])
 
-        value = np.ones(use.size)
+            value = np.ones(use.size)
+
+            field = cic(value, zredpos, nzredbins, refmagpos, nrefmagbins, isolated=True)
 
-        field = cic(value, zredpos, nzredbins, refmagpos, nrefmagbins, isolated=True)
+        sigma_g = np.zeros((nrefmagbins, nzredbins))
+
+        binsizes = self.config.bkg_refmagbinsize * self.config.bkg_zredbinsize
 
         sigma_g[:, :] = field
 
@@ -738,3 +1058,137 @@ class ZredBackgroundGenerator(object):
 
         zred_bkg.to_fits_file(self.config.bkgfile, extname='ZREDBKG', clobber=clobber)
 
+    def _worker(self, args):
+        """
+        Internal worker method for multiprocessing, computing the zred
+        background histogram for a subset of the galaxies.
+
+        Parameters
+        ----------
+        args: `tuple`
+           reads: `list`
+              List of galaxy reads (see _partition_galaxy_reads())
+           zredrange: `np.array`
+              Range of zred bins
+           nzredbins: `int`
+              Number of zred bins
+           refmagrange: `np.array`
+              Range of refmag bins
+           nrefmagbins: `int`
+              Number of refmag bins
+           maxchisq: `float`
+              Maximum chisq of galaxies to use
+
+        Returns
+        -------
+        field: `np.array`
+           Un-normalized histogram [nrefmagbins, nzredbins]
+        """
+        reads, zredrange, nzredbins, refmagrange, nrefmagbins, maxchisq = args
+
+        zreds = []
+        refmags = []
+        for read in reads:
+            gals = _read_galaxies(self.config, read, zredfile=self.config.zredfile)
+
+            use, = np.where(gals.chisq < maxchisq)
+
+            zreds.append(gals.zred[use].astype(np.float32))
+            refmags.append(gals.refmag[use].astype(np.float32))
+
+        zreds = np.concatenate(zreds)
+        refmags = np.concatenate(refmags)
+
+        use, = np.where((zreds >= zredrange[0]) & (zreds < zredrange[1]) &
+                        (refmags > refmagrange[0]) & (refmags < refmagrange[1]))
+
+        zredpos = (zreds[use] - zredrange[0]) * nzredbins / (zredrange[1] - zredrange[0])
+        refmagpos = (refmags[use] - refmagrange[0]) * nrefmagbins / (refmagrange[1] - refmagrange[0])
+
+        value = np.ones(use.size)
+
+        return cic(value, zredpos, nzredbins, refmagpos, nrefmagbins, isolated=True)
+
+
+def _partition_galaxy_reads(config, ngroup, natatime):
+    """
+    Partition the galaxies in the configured region into groups of reads
+    with approximately equal numbers of galaxies.
+
+    Parameters
+    ----------
+    config: `redmapper.Configuration`
+       Redmapper configuration object
+    ngroup: `int`
+       Number of groups to split into
+    natatime: `int`
+       Number of rows per read for a non-pixelized galaxy file
+
+    Returns
+    -------
+    groups: `list`
+       List of lists of reads.  Each read is a tuple of ('pixel', nside, hpix)
+       or ('rows', lo, hi).
+    """
+    if config.galfile_pixelized:
+        master = Entry.from_fits_file(config.galfile)
+        master_hpix = np.atleast_1d(master.hpix)
+        master_ngals = np.atleast_1d(master.ngals)
+
+        if len(config.d.hpix) > 0:
+            # We need to take a sub-region
+            theta, phi = hpg.pixel_to_angle(master.nside, master_hpix, lonlat=False, nest=False)
+            ipring_big = hpg.angle_to_pixel(config.d.nside, theta, phi, lonlat=False, nest=False)
+
+            _, subreg_indices = esutil.numpy_util.match(config.d.hpix, ipring_big)
+            subreg_indices = np.unique(subreg_indices)
+        else:
+            subreg_indices = np.arange(master_hpix.size)
+
+        subreg_indices = subreg_indices[master_ngals[subreg_indices] > 0]
+
+        reads = [('pixel', master.nside, master_hpix[i]) for i in subreg_indices]
+        ngals = master_ngals[subreg_indices]
+    else:
+        hdr = fitsio.read_header(config.galfile, ext=1)
+        nrows = hdr['NAXIS2']
+
+        los = np.arange(0, nrows, natatime)
+        his = np.clip(los + natatime, None, nrows)
+        reads = [('rows', lo, hi) for lo, hi in zip(los, his)]
+        ngals = his - los
+
+    # Put the largest reads first into the least-loaded group
+    groups = [[] for i in range(ngroup)]
+    loads = np.zeros(ngroup)
+    for i in np.argsort(-ngals, kind='stable'):
+        g = np.argmin(loads)
+        groups[g].append(reads[i])
+        loads[g] += ngals[i]
+
+    return [group for group in groups if len(group) > 0]
+
+
+def _read_galaxies(config, read, zredfile=None):
+    """
+    Read the galaxies for one read from _partition_galaxy_reads().
+
+    Parameters
+    ----------
+    config: `redmapper.Configuration`
+       Redmapper configuration object
+    read: `tuple`
+       ('pixel', nside, hpix) or ('rows', lo, hi)
+    zredfile: `str`, optional
+       Zred file to read (pixelized only).  Default is None.
+
+    Returns
+    -------
+    gals: `redmapper.GalaxyCatalog`
+       Galaxies that were read
+    """
+    if read[0] == 'pixel':
+        return GalaxyCatalog.from_galfile(config.galfile, nside=read[1], hpix=read[2],
+                                          border=0.0, zredfile=zredfile)
+    else:
+        return GalaxyCatalog.from_fits_file(config.galfile, rows=np.arange(read[1], read[2]))
@@ -18,7 +18,7 @@ from .zlambdacal import ZLambdaCalibrator
 from .prepmembers import PrepMembers
 from ..zred_runner import ZredRunCatalog, ZredRunPixels
 from ..background import BackgroundGenerator, ZredBackgroundGenerator
-from ..redmapper_run import RedmapperRun
+from ..redmapper_run import RedmapperRun, SharedGalaxies
 from ..zlambda import ZlambdaCorrectionPar
 from ..plotting import SpecPlot
 from ..mask import get_mask
@@ -406,73 +406,83 @@ class RedmapperCalibrationIteration(object):
             seeds.to_fits_file(iter_seedfile)
 
 
-        # Run the cluster finder in specmode (And consolidate likelihoods)
-        finalfile = self.config.redmapper_filename('final')
+        # The galaxies for the cluster finder runs are shared between the
+        # runs (if config.calib_run_shared_galaxies), and released when done.
+        shared_galaxies = SharedGalaxies()
+        try:
+            # Run the cluster finder in specmode (And consolidate likelihoods)
+            finalfile = self.config.redmapper_filename('final')
 
-        if os.path.isfile(finalfile):
-            self.config.logger.info('%s already there.  Skipping...' % (finalfile))
-        else:
-            self.config.logger.info("Running redmapper in specmode with seeds...")
-            self.config.zlambdafile = None
+            if os.path.isfile(finalfile):
+                self.config.logger.info('%s already there.  Skipping...' % (finalfile))
+            else:
+                self.config.logger.info("Running redmapper in specmode with seeds...")
+                self.config.zlambdafile = None
 
-            redmapper_run = RedmapperRun(self.config)
-            catfile, likefile = redmapper_run.run(specmode=True, keepz=True, consolidate_like=True, seedfile=iter_seedfile, cleaninput=True)
-            # check that catfile is the same as finalfile?
-            if catfile != finalfile:
-                raise RuntimeError("The output catfile %s should be the same as finalfile %s" % (catfile, finalfile))
+                redmapper_run = RedmapperRun(self.config)
+                catfile, likefile = redmapper_run.run(specmode=True, keepz=True, consolidate_like=True, seedfile=iter_seedfile, cleaninput=True,
+                                                      shared_galaxies=shared_galaxies)
+                # check that catfile is the same as finalfile?
+                if catfile != finalfile:
+                    raise RuntimeError("The output catfile %s should be the same as finalfile %s" % (catfile, finalfile))
 
-        # If it's the first iteration, calibrate random and satellite w functions
-        if iteration == 1:
-            sublikefile = self.config.redmapper_filename('sub_like')
+            # If it's the first iteration, calibrate random and satellite w functions
+            if iteration == 1:
+                sublikefile = self.config.redmapper_filename('sub_like')
 
-            if os.path.isfile(sublikefile):
-                self.config.logger.info('%s already there.  Skipping...' % (sublikefile))
-            else:
-                # Generate a subset of the likelihood file...
-                # Read these as GalaxyCatalogs to do matching
-                lcat = GalaxyCatalog.from_fits_file(self.config.redmapper_filename('like'))
-                pcat = GalaxyCatalog.from_fits_file(finalfile)
+                if os.path.isfile(sublikefile):
+                    self.config.logger.info('%s already there.  Skipping...' % (sublikefile))
+                else:
+                    # Generate a subset of the likelihood file...
+                    # Read these as GalaxyCatalogs to do matching
+                    lcat = GalaxyCatalog.from_fits_file(self.config.redmapper_filename('like'))
+                    pcat = GalaxyCatalog.from_fits_file(finalfile)
 
-                use, = np.where(pcat.Lambda > self.config.percolation_minlambda)
+                    use, = np.where(pcat.Lambda > self.config.percolation_minlambda)
 
-                # matching...
-                i0, i1, dd = lcat.match_many(pcat.ra[use], pcat.dec[use], 0.5/3600., maxmatch=1)
+                    # matching...
+                    i0, i1, dd = lcat.match_many(pcat.ra[use], pcat.dec[use], 0.5/3600., maxmatch=1)
 
-                sublcat = lcat[i1]
+                    sublcat = lcat[i1]
 
-                sublcat.to_fits_file(sublikefile)
+                    sublcat.to_fits_file(sublikefile)
 
-            outbase = self.config.d.outbase
+                outbase = self.config.d.outbase
 
-            self.config.d.outbase = '%s_rand' % (outbase)
-            catfile_for_rand_calib = self.config.redmapper_filename('final')
-            if os.path.isfile(catfile_for_rand_calib):
-                self.config.logger.info('%s already there.  Skipping...' % (catfile_for_rand_calib))
-            else:
-                self.config.logger.info("Running percolation for random centers...")
-                self.config.catfile = sublikefile
-                self.config.centerclass = 'CenteringRandom'
+                self.config.d.outbase = '%s_rand' % (outbase)
+                catfile_for_rand_calib = self.config.redmapper_filename('final')
+                if os.path.isfile(catfile_for_rand_calib):
+                    self.config.logger.info('%s already there.  Skipping...' % (catfile_for_rand_calib))
+                else:
+                    self.config.logger.info("Running percolation for random centers...")
+                    self.config.catfile = sublikefile
+                    self.config.centerclass = 'CenteringRandom'
+
+                    redmapper_run = RedmapperRun(self.config)
+                    redmapper_run.run(check=True, percolation_only=True, keepz=True, cleaninput=True,
+                                      shared_galaxies=shared_galaxies)
+
+                self.config.d.outbase = '%s_randsat' % (outbase)
+                catfile_for_randsat_calib = self.config.redmapper_filename('final')
+                if os.path.isfile(catfile_for_randsat_calib):
+                    self.config.logger.info('%s already there.  Skipping...' % (catfile_for_randsat_calib))
+                else:
+                    self.config.logger.info("Running percolation for random satellite centers...")
+                    self.config.catfile = sublikefile
+                    self.config.centerclass = 'CenteringRandomSatellite'
 
-                redmapper_run = RedmapperRun(self.config)
-                redmapper_run.run(check=True, percolation_only=True, keepz=True, cleaninput=True)
+                    redmapper_run = RedmapperRun(self.config)
+                    redmapper_run.run(check=True, percolation_only=True, keepz=True, cleaninput=True,
+                                      shared_galaxies=shared_galaxies)
 
-            self.config.d.outbase = '%s_randsat' % (outbase)
-            catfile_for_randsat_calib = self.config.redmapper_filename('final')
-            if os.path.isfile(catfile_for_randsat_calib):
-                self.config.logger.info('%s already there.  Skipping...' % (catfile_for_randsat_calib))
+                # Reset outbase
+                self.config.d.outbase = outbase
             else:
-                self.config.logger.info("Running percolation for random satellite centers...")
-                self.config.catfile = sublikefile
-                self.config.centerclass = 'CenteringRandomSatellite'
+                catfile_for_rand_calib = None
+                catfile_for_randsat_calib = None
+        finally:
+            shared_galaxies.clear()
 
-                redmapper_run = RedmapperRun(self.config)
-                redmapper_run.run(check=True, percolation_only=True, keepz=True, cleaninput=True)
-
-            # Reset outbase
-            self.config.d.outbase = outbase
-        else:
-            catfile_for_rand_calib = None
-            catfile_for_randsat_calib = None
 
         # Calibrate wcen
         self.config.centerclass = centerclass
@@ -8,12 +8,45 @@ import scipy.optimize
 import warnings
 
 from ..configuration import Configuration
-from ..utilities import sample_from_pdf, histoGauss, chisq_pdf
+from ..utilities import sample_from_pdf, histoGauss, chisq_pdf, get_rng
 from ..redsequence import RedSequenceColorPar
 from ..background import Background
 from ..cluster import ClusterCatalog
 from ..galaxy import GalaxyCatalog
 
+def _random_subsets(rng, n, nsub, ntrial):
+    """
+    Draw random ordered subsets of distinct indices, equivalent to the start
+    of a random permutation of n indices, for many trials at once.
+
+    Parameters
+    ----------
+    rng: `np.random.RandomState`
+       Random number generator
+    n: `int`
+       Number of indices to draw from
+    nsub: `int`
+       Number of indices in each subset
+    ntrial: `int`
+       Number of trials
+
+    Returns
+    -------
+    indices: `np.array`
+       Integer array of indices [ntrial, nsub]
+    """
+    indices = np.zeros((ntrial, nsub), dtype=np.int64)
+
+    # Each index is redrawn until it is not a repeat within its trial
+    for i in range(nsub):
+        draw = np.arange(ntrial)
+        while draw.size > 0:
+            indices[draw, i] = rng.randint(n, size=draw.size)
+            repeat = np.any(indices[draw, 0: i] == indices[draw, i][:, np.newaxis], axis=1)
+            draw = draw[repeat]
+
+    return indices
+
 class WcenFgFitter(object):
     """
     Class to fit the wcen foreground or satellite model.
@@ -306,7 +339,7 @@ class WcenCalibrator(object):
             self.phi1_msig_slope = self.config.phi1_msig_slope
 
         # Read in the parameters (fine steps)
-        zredstr = RedSequenceColorPar(self.config.parfile, fine=True)
+        zredstr = RedSequenceColorPar(self.config.parfile, fine=True, cachedir=self.config.redsequence_cachedir)
 
         # Read in the background
         bkg = Background(self.config.bkgfile)
@@ -480,7 +513,13 @@ class WcenCalibrator(object):
         def schechter(x, alpha=-1.0, mstar=0.0):
             return 10.**(0.4*(alpha + 1.0)*(mstar - x)) * np.exp(-10.**(0.4*(mstar - x)))
 
-        mag = sample_from_pdf(schechter, mrange, step, nmag, alpha=self.config.calib_lumfunc_alpha, mstar=mstar)
+        if self.config.wcen_mc_seed is not None:
+            rng = np.random.RandomState(seed=self.config.wcen_mc_seed)
+        else:
+            rng = get_rng()
+
+        mag = sample_from_pdf(schechter, mrange, step, nmag, rng=rng,
+                              alpha=self.config.calib_lumfunc_alpha, mstar=mstar)
 
         # We want to sample lambda galaxies from a schechter function...
         # And figure out the 3 brightest galaxies (m1, m2, m3)
@@ -491,17 +530,23 @@ class WcenCalibrator(object):
         m2 = np.zeros_like(m1)
         m3 = np.zeros_like(m1)
 
-        for i in range(ntrial):
-            r = np.random.rand(nmag)
-            st = np.argsort(r)
+        # The trials are run in chunks to bound the memory.  In each trial
+        # the galaxies for all the richnesses are drawn from the same random
+        # subset, and the 3 brightest are found with a partial sort.
+        nchunk = self.config.wcen_mc_ntrial_chunk
+        for i0 in range(0, ntrial, nchunk):
+            i1 = min(i0 + nchunk, ntrial)
+
+            indices = _random_subsets(rng, nmag, lambdas.max() - 1, i1 - i0)
+            mags = mag[indices]
 
             for j in range(nlambdas):
-                u = st[0:lambdas[j] - 1]
-                st2 = np.argsort(mag[u])
+                brightest = np.partition(mags[:, 0: lambdas[j] - 1], 2, axis=1)[:, 0: 3]
+                brightest.sort(axis=1)
 
-                m1[j, i] = mag[u[st2[0]]]
-                m2[j, i] = mag[u[st2[1]]]
-                m3[j, i] = mag[u[st2[2]]]
+                m1[j, i0: i1] = brightest[:, 0]
+                m2[j, i0: i1] = brightest[:, 1]
+                m3[j, i0: i1] = brightest[:, 2]
 
         mmstar1_mean = np.zeros(nlambdas)
         mmstar1_sigma = np.zeros(nlambdas)
@@ -945,7 +945,8 @@ class RedSequenceCalibrator(object):
         # This is temporary
         zredstr = RedSequenceColorPar(self.config.parfile)
 
-        zredc = ZredColor(zredstr, do_correction=do_correction)
+        zredc = ZredColor(zredstr, do_correction=do_correction,
+                          block_size=self.config.zred_block_size)
 
         gals.add_zred_fields(self.config.zred_nsamp)
 
@@ -12,7 +12,7 @@ from ..redsequence import RedSequenceColorPar
 from ..galaxy import GalaxyCatalog
 from ..cluster import ClusterCatalog
 from ..zlambda import ZlambdaCorrectionPar
-from ..utilities import make_nodes, CubicSpline, interpol
+from ..utilities import make_nodes, CubicSpline, interpol, spline_basis
 from ..fitters import MedZFitter
 from ..catalog import Entry
 
@@ -58,6 +58,11 @@ class ZLambdaFitter(object):
         if self._redshifts.size != self._loglambdas.size:
             raise ValueError("Number of redshifts must be equal to loglambdas")
 
+        # The spline basis matrices are computed once, so that each spline
+        # evaluation is a matrix-vector product.
+        self._basis = spline_basis(self._nodes, self._redshifts)
+        self._slope_basis = spline_basis(self._slope_nodes, self._redshifts)
+
     def fit(self, p0_delta, p0_slope, p0_scatter,
             fit_delta=False, fit_slope=False, fit_scatter=False,
             min_scatter=0.0):
@@ -115,14 +120,11 @@ class ZLambdaFitter(object):
 
         # Precompute
         if not self._fit_delta:
-            spl = CubicSpline(self._nodes, p0_delta)
-            self._gdelta = spl(self._redshifts)
+            self._gdelta = np.dot(self._basis, p0_delta)
         if not self._fit_slope:
-            spl = CubicSpline(self._slope_nodes, p0_slope)
-            self._gslope = spl(self._redshifts)
+            self._gslope = np.dot(self._slope_basis, p0_slope)
         if not self._fit_scatter:
-            spl = CubicSpline(self._slope_nodes, p0_scatter)
-            self._gscatter = np.clip(spl(self._redshifts), self._min_scatter, None)
+            self._gscatter = np.clip(np.dot(self._slope_basis, p0_scatter), self._min_scatter, None)
 
         # FIXME
         pars = scipy.optimize.fmin(self, p0, disp=False)
@@ -152,20 +154,19 @@ class ZLambdaFitter(object):
            Total cost function of negative log-likelihood to minimize.
         """
         if self._fit_delta:
-            spl = CubicSpline(self._nodes, pars[self._delta_index: self._delta_index + self._n_nodes])
-            gdelta = spl(self._redshifts)
+            gdelta = np.dot(self._basis, pars[self._delta_index: self._delta_index + self._n_nodes])
         else:
             gdelta = self._gdelta
 
         if self._fit_slope:
-            spl = CubicSpline(self._slope_nodes, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
-            gslope = spl(self._redshifts)
+            gslope = np.dot(self._slope_basis, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
         else:
             gslope = self._gslope
 
         if self._fit_scatter:
-            spl = CubicSpline(self._slope_nodes, pars[self._scatter_index: self._scatter_index + self._n_slope_nodes])
-            gscatter = np.clip(spl(self._redshifts), self._min_scatter, None)
+            gscatter = np.clip(np.dot(self._slope_basis,
+                                      pars[self._scatter_index: self._scatter_index + self._n_slope_nodes]),
+                               self._min_scatter, None)
         else:
             gscatter = self._gscatter
 
@@ -9,6 +9,193 @@ import fitsio
 import esutil as eu
 import numpy as np
 import itertools
+from collections import OrderedDict
+
+
+class _Columns(OrderedDict):
+    """
+    Ordered dictionary of lower-case column name to column array, used to
+    store a columnar Catalog.
+    """
+
+    @property
+    def size(self):
+        """
+        Return the number of rows.
+        """
+        for col in self.values():
+            return len(col)
+        return 0
+
+    @property
+    def dtype(self):
+        """
+        Return the numpy dtype of the columns.
+        """
+        return np.dtype([(name, col.dtype, col.shape[1:]) for name, col in self.items()])
+
+    def select(self, key, names=None, copy=False):
+        """
+        Select rows from the columns.
+
+        Parameters
+        ----------
+        key: `np.array` or `slice`
+           Integer or boolean array of rows, or slice
+        names: `list`, optional
+           Lower-case column names to select.  Default is None (all).
+        copy: `bool`, optional
+           Copy slices rather than returning views.  Default is False.
+
+        Returns
+        -------
+        columns: `_Columns`
+        """
+        if names is None:
+            names = list(self.keys())
+
+        selected = _Columns()
+        for name in names:
+            col = self[name][key]
+            if copy and isinstance(key, slice):
+                col = col.copy()
+            selected[name] = col
+
+        return selected
+
+    def loaded(self):
+        """
+        Return columns with all the arrays in memory.
+
+        Returns
+        -------
+        columns: `_Columns`
+        """
+        return self
+
+
+class _LazyFitsColumns(_Columns):
+    """
+    Columns of a fits table, each of which is read from the file on first
+    access.
+    """
+
+    def __init__(self, filename=None, ext=1, rows=None, columns=None, dtype=None):
+        """
+        Instantiate a _LazyFitsColumns.
+
+        Parameters
+        ----------
+        filename: `str`
+           Fits filename
+        ext: `int` or `str`, optional
+           Extension number or name.  Default is 1.
+        rows: `np.array`, optional
+           Row indices to read.  Default is None (all rows).
+        columns: `list`, optional
+           Columns to read immediately.  Default is None (none).
+        dtype: `np.dtype`, optional
+           Dtype of the columns to use.  Default is None (all from the file).
+        """
+        super(_LazyFitsColumns, self).__init__()
+
+        # The default arguments are only used for unpickling
+        if filename is None:
+            return
+
+        self._filename = filename
+        self._ext = ext
+
+        if dtype is None or rows is None:
+            with fitsio.FITS(filename) as fits:
+                if dtype is None:
+                    dtype = fits[ext].read(rows=np.zeros(0, dtype=np.int64),
+                                           lower=True, trim_strings=True).dtype
+                nrows = fits[ext].get_nrows()
+
+        self._all_rows = rows is None
+        if rows is None:
+            self._rows = np.arange(nrows)
+        else:
+            self._rows = np.atleast_1d(rows)
+        self._file_dtype = dtype
+
+        for name in dtype.names:
+            OrderedDict.__setitem__(self, name, None)
+
+        if columns is not None:
+            self.prefetch(columns)
+
+    def __getitem__(self, name):
+        col = OrderedDict.__getitem__(self, name)
+        if col is None:
+            self.prefetch([name])
+            col = OrderedDict.__getitem__(self, name)
+        return col
+
+    def values(self):
+        self.prefetch(list(self.keys()))
+        return [OrderedDict.__getitem__(self, name) for name in self]
+
+    def items(self):
+        self.prefetch(list(self.keys()))
+        return [(name, OrderedDict.__getitem__(self, name)) for name in self]
+
+    def prefetch(self, names):
+        """
+        Read columns from the file (if they have not been read already).
+
+        Parameters
+        ----------
+        names: `list`
+           Column names
+        """
+        to_read = [name.lower() for name in names if OrderedDict.__getitem__(self, name.lower()) is None]
+        if len(to_read) == 0:
+            return
+
+        with fitsio.FITS(self._filename) as fits:
+            array = fits[self._ext].read(columns=to_read, rows=None if self._all_rows else self._rows,
+                                         lower=True, trim_strings=True)
+
+        for name in to_read:
+            OrderedDict.__setitem__(self, name, array[name].copy())
+
+    @property
+    def size(self):
+        return self._rows.size
+
+    @property
+    def dtype(self):
+        dtype = []
+        for name in self:
+            col = OrderedDict.__getitem__(self, name)
+            if col is None:
+                dtype.append((name, self._file_dtype[name]))
+            else:
+                dtype.append((name, col.dtype, col.shape[1:]))
+        return np.dtype(dtype)
+
+    def select(self, key, names=None, copy=False):
+        if names is None:
+            names = list(self.keys())
+
+        # The columns that have not been read are read for the selected rows
+        dtype = self.dtype
+        selected = _LazyFitsColumns(self._filename, ext=self._ext, rows=self._rows[key],
+                                    dtype=np.dtype([(name, dtype[name]) for name in names]))
+        for name in names:
+            col = OrderedDict.__getitem__(self, name)
+            if col is not None:
+                col = col[key]
+                if copy and isinstance(key, slice):
+                    col = col.copy()
+                OrderedDict.__setitem__(selected, name, col)
+
+        return selected
+
+    def loaded(self):
+        return _Columns(self.items())
 
 
 class DataObject(object):
@@ -16,6 +203,16 @@ class DataObject(object):
     Generic DataObject class.
 
     This class wraps numpy ndarrays for more convenient use, and contains useful methods to saving/reading from fits files.
+
+    By default the data are stored in a single numpy structured array.  A
+    Catalog may instead be stored "columnar", with each column in its own
+    contiguous array (see Catalog.from_columns() and to_columnar()).  The
+    columns of a Catalog read with Catalog.from_fits_file(lazy=True) are
+    read from the file on first access.  The attribute access is the same
+    for all of these.  Accessing _ndarray of a columnar object returns a
+    structured array copy, and does not change the storage (see
+    to_ndarray() to convert in-place).  A single row of a columnar Catalog
+    is also a copy, rather than a view into the Catalog.
     """
 
     def __init__(self, *arrays):
@@ -82,15 +279,34 @@ class DataObject(object):
         return cls(np.zeros(size, dtype=dtype))
 
     def __getattr__(self, attr):
+        columns = self.__dict__.get('_columns')
+        if columns is None:
+            try:
+                return self._ndarray[attr.lower()]
+            except:
+                return object.__getattribute__(self, attr)
+
+        if attr == '_ndarray':
+            # A structured array copy; the columns are unchanged
+            return self._as_ndarray()
         try:
-            return self._ndarray[attr.lower()]
-        except:
+            return columns[attr.lower()]
+        except KeyError:
             return object.__getattribute__(self, attr)
 
     def __setattr__(self, attr, val):
         if attr == '_ndarray':
+            self.__dict__.pop('_columns', None)
             object.__setattr__(self, attr, val)
-        elif attr.lower() in self._ndarray.dtype.names:
+            return
+
+        columns = self.__dict__.get('_columns')
+        if columns is not None:
+            names = columns
+        else:
+            names = self._ndarray.dtype.names
+
+        if attr.lower() in names:
             if hasattr(val, "__len__"):
                 if len(val) == 1:
                     _val = val[0]
@@ -98,7 +314,10 @@ class DataObject(object):
                     _val = val
             else:
                 _val = val
-            self._ndarray[attr.lower()] = _val
+            if columns is not None:
+                columns[attr.lower()][...] = _val
+            else:
+                self._ndarray[attr.lower()] = _val
         else:
             object.__setattr__(self, attr, val)
 
@@ -107,8 +326,75 @@ class DataObject(object):
         """
         Return the numpy dtype associated with the DataObject.
         """
+        columns = self.__dict__.get('_columns')
+        if columns is not None:
+            return columns.dtype
         return self._ndarray.dtype
 
+    @property
+    def columnar(self):
+        """
+        Return True if the DataObject is stored as separate column arrays.
+        """
+        return self.__dict__.get('_columns') is not None
+
+    def to_columnar(self):
+        """
+        Convert the DataObject to be stored as separate contiguous column
+        arrays.  Modifications are done in-place.
+        """
+        if self.columnar:
+            return
+
+        columns = _Columns()
+        for name in self._ndarray.dtype.names:
+            columns[name] = self._ndarray[name].copy()
+
+        self._set_columns(columns)
+
+    def to_ndarray(self):
+        """
+        Convert a columnar DataObject to be stored as a single structured
+        array.  Modifications are done in-place.
+        """
+        if not self.columnar:
+            return
+
+        self._ndarray = self._as_ndarray()
+
+    def _set_columns(self, columns):
+        """
+        Internal method to set the column arrays, replacing the structured
+        array.
+
+        Parameters
+        ----------
+        columns: `_Columns`
+           Dictionary of lower-case column name to `np.ndarray`
+        """
+        self.__dict__.pop('_ndarray', None)
+        self.__dict__['_columns'] = columns
+
+    def _as_ndarray(self):
+        """
+        Internal method to get the data as a structured array, without
+        changing the storage.  This is a copy if the DataObject is columnar.
+
+        Returns
+        -------
+        array: `np.ndarray`
+           Structured array
+        """
+        columns = self.__dict__.get('_columns')
+        if columns is None:
+            return self._ndarray
+
+        array = np.zeros(columns.size, dtype=columns.dtype)
+        for name, col in columns.items():
+            array[name] = col
+
+        return array
+
     def add_fields(self, newdtype):
         """
         Add new fields to an existing DataObject (all filled with zeros).
@@ -119,6 +405,18 @@ class DataObject(object):
         newdtype: data-type
            `np.dtype` description
         """
+        if self.columnar:
+            # New columns are added without copying the existing columns
+            newdtype = np.dtype(newdtype)
+            columns = self._columns
+            for name in newdtype.names:
+                if name.lower() in columns:
+                    raise ValueError("Cannot merge arrays with duplicate names (%s)" % (name.lower()))
+            for name in newdtype.names:
+                columns[name.lower()] = np.zeros((columns.size, ) + newdtype[name].shape,
+                                                 dtype=newdtype[name].base)
+            return
+
         array = np.zeros(self._ndarray.size, newdtype)
         self._lower_array(array)
         self._ndarray = self._merge_arrays([self._ndarray, array])
@@ -140,15 +438,16 @@ class DataObject(object):
         indices: `np.array`, optional
            Indices of rows to output.  Default is None (output all).
         """
-        if self._ndarray.size == 1:
-            temp_array = np.zeros(1, dtype=self._ndarray.dtype)
-            temp_array[0] = self._ndarray
+        array = self._as_ndarray()
+        if array.size == 1:
+            temp_array = np.zeros(1, dtype=array.dtype)
+            temp_array[0] = array
             fitsio.write(filename, temp_array, clobber=clobber, header=header, extname=extname)
         else:
             if indices is None:
-                fitsio.write(filename, self._ndarray, clobber=clobber, header=header, extname=extname)
+                fitsio.write(filename, array, clobber=clobber, header=header, extname=extname)
             else:
-                fitsio.write(filename, self._ndarray[indices], clobber=clobber, header=header, extname=extname)
+                fitsio.write(filename, array[indices], clobber=clobber, header=header, extname=extname)
 
     def _merge_arrays(self, arrays):
         """
@@ -207,19 +506,19 @@ class DataObject(object):
 
     def __repr__(self):
         # return the representation of the underlying array
-        return repr(self._ndarray)
+        return repr(self._as_ndarray())
 
     def __str__(self):
         # return the string of the underlying array
-        return str(self._ndarray)
+        return str(self._as_ndarray())
 
     def __dir__(self):
         # lower case list of all the available variables
         # also need to know original __dir__!
         return sorted(set(
                 dir(type(self)) +
-                self.__dict__.keys() +
-                [x.lower() for x in self._ndarray.dtype.names]))
+                list(self.__dict__.keys()) +
+                [x.lower() for x in self.dtype.names]))
 
 
 class Entry(DataObject):
@@ -275,13 +574,155 @@ class Catalog(DataObject):
 
     entry_class = Entry
 
+    @classmethod
+    def from_fits_file(cls, filename, ext=1, rows=None, columns=None, lazy=False, **kwargs):
+        """
+        Construct a Catalog from a fits file.
+
+        Parameters
+        ----------
+        filename: `string`
+           Filename to read
+        ext: `int` or `string`, optional
+           Extension number or name.  Default is 1.
+        rows: `np.array`, optional
+           Row indices to read.  Default is None (read all rows).
+        columns: `list`, optional
+           Columns to read.  With lazy=True, these are read immediately and
+           the other columns are read on first access.  Default is None
+           (all columns).
+        lazy: `bool`, optional
+           Read each column from the file on first access?  Default is False.
+        **kwargs: additional keyword arguments for the Catalog class
+        """
+        if lazy:
+            return cls.from_columns(_LazyFitsColumns(filename, ext=ext, rows=rows, columns=columns),
+                                    **kwargs)
+
+        array = fitsio.read(filename, ext=ext, rows=rows, columns=columns, lower=True, trim_strings=True)
+        return cls(array, **kwargs)
+
+    @classmethod
+    def from_columns(cls, columns, **kwargs):
+        """
+        Construct a columnar Catalog from a dictionary of column arrays.
+
+        The arrays are used directly, and are not copied.
+
+        Parameters
+        ----------
+        columns: `dict`
+           Dictionary of column name to `np.ndarray`.  All arrays must have
+           the same length.
+        **kwargs: additional keyword arguments for the Catalog class
+        """
+        if isinstance(columns, _Columns):
+            _columns = columns
+        else:
+            _columns = _Columns()
+            size = None
+            for name, col in columns.items():
+                col = np.asarray(col)
+                if size is None:
+                    size = len(col)
+                elif len(col) != size:
+                    raise ValueError("Cannot merge arrays of different length")
+                _columns[name.lower()] = col
+
+        cat = cls(np.zeros(0, dtype=_columns.dtype), **kwargs)
+
+        # The class may have added default fields (e.g. ClusterCatalog)
+        dtype_augment = [dt for dt in cat._ndarray.dtype.descr if dt[0] not in _columns]
+
+        cat._set_columns(_columns)
+        if len(dtype_augment) > 0:
+            cat.add_fields(dtype_augment)
+
+        return cat
+
     @property
     def size(self):
         """
         Return the size of the Catalog.
         """
+        columns = self.__dict__.get('_columns')
+        if columns is not None:
+            return columns.size
         return self._ndarray.size
 
+    def take(self, indices, columns=None):
+        """
+        Get a columnar copy of a subset of rows and columns.
+
+        Only the requested columns are copied, and each is contiguous.
+
+        Parameters
+        ----------
+        indices: `np.array` or `slice`
+           Integer or boolean array of rows, or slice
+        columns: `list`, optional
+           List of column names.  Default is None (all columns).
+
+        Returns
+        -------
+        catalog: `redmapper.Catalog`
+           Columnar catalog of the same type
+        """
+        if columns is None:
+            columns = self.dtype.names
+        names = [name.lower() for name in columns]
+
+        _columns = self.__dict__.get('_columns')
+        if _columns is not None:
+            return type(self).from_columns(_columns.select(indices, names=names, copy=True))
+
+        selected = _Columns()
+        for name in names:
+            col = self._ndarray[name][indices]
+            if isinstance(indices, slice):
+                col = col.copy()
+            selected[name] = col
+
+        return type(self).from_columns(selected)
+
+    def _get_row(self, key):
+        """
+        Internal method to get a copy of a single row of a columnar catalog.
+
+        Parameters
+        ----------
+        key: `int`
+           Row index
+
+        Returns
+        -------
+        row: `np.ndarray`
+           Structured array of length 1
+        """
+        row = np.zeros(1, dtype=self.dtype)
+        for name, col in self._columns.items():
+            row[name][0] = col[key]
+
+        return row
+
+    def _get_column(self, name):
+        """
+        Internal method to get a column array (or view).
+
+        Parameters
+        ----------
+        name: `str`
+           Lower-case column name
+
+        Returns
+        -------
+        col: `np.ndarray`
+        """
+        columns = self.__dict__.get('_columns')
+        if columns is not None:
+            return columns[name]
+        return self._ndarray[name]
+
     def append(self, append_cat):
         """
         Append a number of rows to the catalog, in-place.
@@ -291,8 +732,19 @@ class Catalog(DataObject):
         append_cat: `redmapper.Catalog` or `np.ndarray`
            Catalog to append
         """
+        if self.columnar:
+            columns = self._columns.loaded()
+            for name, col in columns.items():
+                if isinstance(append_cat, Catalog):
+                    new_col = append_cat._get_column(name)
+                else:
+                    new_col = np.atleast_1d(append_cat)[name]
+                columns[name] = np.append(col, new_col, axis=0)
+            self._set_columns(columns)
+            return
+
         if isinstance(append_cat, Catalog):
-            self._ndarray = np.append(self._ndarray, append_cat._ndarray)
+            self._ndarray = np.append(self._ndarray, append_cat._as_ndarray())
         else:
             self._ndarray = np.append(self._ndarray, append_cat)
 
@@ -305,16 +757,111 @@ class Catalog(DataObject):
         n_new: `int`
            Number of new rows to append
         """
+        if self.columnar:
+            columns = self._columns.loaded()
+            for name, col in columns.items():
+                temp = np.zeros((n_new, ) + col.shape[1:], dtype=col.dtype)
+                columns[name] = np.append(col, temp, axis=0)
+            self._set_columns(columns)
+            return
+
         temp = np.zeros(n_new, dtype=self._ndarray.dtype)
         self._ndarray = np.append(self._ndarray, temp)
 
     def __len__(self): return self.size
 
     def __getitem__(self, key):
+        if self.columnar:
+            if isinstance(key, (int, np.integer)):
+                # Single entries are copies of the row
+                return self.entry_class(self._get_row(key))
+            return type(self).from_columns(self._columns.select(key))
+
         if isinstance(key, int):
             return self.entry_class(self._ndarray.__getitem__(key))
         return type(self)(self._ndarray.__getitem__(key))
 
     def __setitem__(self, key, val):
+        if self.columnar:
+            for name, col in self._columns.items():
+                if isinstance(val, Catalog):
+                    col[key] = val._get_column(name)
+                elif isinstance(val, DataObject):
+                    col[key] = val._ndarray[name]
+                else:
+                    col[key] = val[name]
+            return
+
         self._ndarray.__setitem__(key, val)
 
+
+
+class CatalogBuilder(object):
+    """
+    Accumulate rows for a Catalog without reallocating on every append.
+
+    Appending to a Catalog with Catalog.append() copies the full catalog each
+    time, which is quadratic when building a catalog from many small pieces
+    (such as members of each cluster).  The CatalogBuilder keeps a list of
+    blocks that are concatenated once when the Catalog is built.
+    """
+
+    def __init__(self, catalog_class=Catalog):
+        """
+        Instantiate a CatalogBuilder.
+
+        Parameters
+        ----------
+        catalog_class: `type`, optional
+           Catalog class (or derived class) to build.  Default is Catalog.
+        """
+        self.catalog_class = catalog_class
+        self._blocks = []
+        self._size = 0
+
+    @property
+    def size(self):
+        """
+        Return the number of rows accumulated.
+        """
+        return self._size
+
+    def __len__(self):
+        return self.size
+
+    def append(self, append_cat):
+        """
+        Append a number of rows to the builder.
+
+        Parameters
+        ----------
+        append_cat: `redmapper.Catalog` or `np.ndarray`
+           Catalog to append
+        """
+        if isinstance(append_cat, Catalog):
+            array = append_cat._as_ndarray()
+        else:
+            array = append_cat
+
+        self._blocks.append(np.atleast_1d(array))
+        self._size += self._blocks[-1].size
+
+    def to_catalog(self):
+        """
+        Build the Catalog from all the appended rows.
+
+        The blocks are concatenated once, and this may be called again after
+        further appends.
+
+        Returns
+        -------
+        catalog: `redmapper.Catalog` or None
+           Catalog of type self.catalog_class, or None if nothing was appended.
+        """
+        if len(self._blocks) == 0:
+            return None
+
+        if len(self._blocks) > 1:
+            self._blocks = [np.concatenate(self._blocks)]
+
+        return self.catalog_class(self._blocks[0])
@@ -11,6 +11,7 @@ import numpy as np
 
 from .utilities import gaussFunction
 from .utilities import interpol
+from .utilities import get_rng
 
 class Centering(object):
     """
@@ -375,8 +376,8 @@ class CenteringRandom(Centering):
         success: `bool`
            True when a center is successfully found. (Always True).
         """
-        r = self.cluster.r_lambda * np.sqrt(np.random.random(size=1))
-        phi = 2. * np.pi * np.random.random(size=1)
+        r = self.cluster.r_lambda * np.sqrt(get_rng().random(size=1))
+        phi = 2. * np.pi * get_rng().random(size=1)
 
         x = r * np.cos(phi) / (self.cluster.mpc_scale)
         y = r * np.sin(phi) / (self.cluster.mpc_scale)
@@ -431,7 +432,7 @@ class CenteringRandomSatellite(Centering):
         cdf = np.cumsum(pdf, dtype=np.float64)
         cdfi = (cdf * st.size).astype(np.int32)
 
-        rand = (np.random.uniform(size=1) * st.size).astype(np.int32)
+        rand = (get_rng().uniform(size=1) * st.size).astype(np.int32)
         ind = np.where(cdfi >= rand[0])[0][0]
         maxind = st[ind]
 
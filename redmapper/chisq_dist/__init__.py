@@ -1,2 +1,2 @@
 from . import chisq_dist_lib
-from .chisq_dist_lib import compute_chisq
+from .chisq_dist_lib import compute_chisq, compute_chisq_grouped
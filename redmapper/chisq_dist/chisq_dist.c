@@ -344,14 +344,14 @@ int chisq_dist(int mode, int do_chisq, int nophotoerr, int ncalc, int ncol,
 	  mvcovmat = gsl_matrix_view_array(&covmat_temp[covmat_stride*i], ncol, ncol);
 
 	  // and the ci matrix
-	  // copy from mode 0
+	  // copy from mode 0, with the slope from mode 1
 	  if (use_refmagerr) {
 	      // make the C_i matrix for the refmag err
 	      //  this is a matrix with ncol x ncol size
 	      gsl_matrix_set_zero(cimat);
 	      for (j=0;j<ncol;j++) {
 		  for (k=j;k<ncol;k++) {
-		      val = slope[j] * slope[k] * refmagerr[i] * refmagerr[i];
+		      val = slope[i*ncol+j] * slope[i*ncol+k] * refmagerr[i] * refmagerr[i];
 		      gsl_matrix_set(cimat, j, k, val);
 		      if (k != j) {
 			  gsl_matrix_set(cimat, k, j, val);
@@ -433,6 +433,285 @@ int chisq_dist(int mode, int do_chisq, int nophotoerr, int ncalc, int ncol,
   return 0;
 }
 
+// Cholesky decomposition of the symmetric matrix (a - shift*I) into the
+// lower triangular l.  Returns 1 if the matrix is not positive definite.
+#define CHOLESKY_DECOMP_BODY(N)				\
+    int i, j, k;					\
+    double sum;						\
+							\
+    for (j=0;j<(N);j++) {				\
+	sum = a[j*(N)+j] - shift;			\
+	for (k=0;k<j;k++) {				\
+	    sum -= l[j*(N)+k]*l[j*(N)+k];		\
+	}						\
+	if (sum <= 0.0) {				\
+	    return 1;					\
+	}						\
+	l[j*(N)+j] = sqrt(sum);				\
+	for (i=j+1;i<(N);i++) {				\
+	    sum = a[i*(N)+j];				\
+	    for (k=0;k<j;k++) {				\
+		sum -= l[i*(N)+k]*l[j*(N)+k];		\
+	    }						\
+	    l[i*(N)+j] = sum/l[j*(N)+j];		\
+	}						\
+    }							\
+    return 0;
+
+// chisq = b^T a^-1 b and the determinant of the covariance matrix a, from
+// the Cholesky decomposition and forward substitution.
+//
+// Returns 1 if a has an eigenvalue below MIN_EIGENVAL, in which case it
+// must go through check_and_fix_covmat() instead.  This is first checked
+// with the bound lambda_min >= det(a)/trace(a)^(n-1), and only if that
+// fails with the decomposition of (a - MIN_EIGENVAL*I).
+#define CHOLESKY_CHISQ_BODY(N, DECOMP, DECOMP_SHIFT)	\
+    int i, k;						\
+    double sum, trace, bound;				\
+    double l[(N)*(N)];					\
+    double ltest[(N)*(N)];				\
+    double x[(N)];					\
+							\
+    if (DECOMP) {					\
+	return 1;					\
+    }							\
+							\
+    trace = 0.0;					\
+    *det = 1.0;						\
+    *chisq = 0.0;					\
+    for (i=0;i<(N);i++) {				\
+	trace += a[i*(N)+i];				\
+	*det *= l[i*(N)+i]*l[i*(N)+i];			\
+	sum = b[i];					\
+	for (k=0;k<i;k++) {				\
+	    sum -= l[i*(N)+k]*x[k];			\
+	}						\
+	x[i] = sum/l[i*(N)+i];				\
+	*chisq += x[i]*x[i];				\
+    }							\
+							\
+    bound = *det;					\
+    for (i=1;i<(N);i++) {				\
+	bound /= trace;					\
+    }							\
+    if (bound < MIN_EIGENVAL && (DECOMP_SHIFT)) {	\
+	return 1;					\
+    }							\
+    return 0;
+
+static int cholesky_decomp(int n, const double *a, double *l, double shift) {
+    CHOLESKY_DECOMP_BODY(n)
+}
+
+static int cholesky_chisq(int n, const double *a, const double *b, double *chisq, double *det) {
+    CHOLESKY_CHISQ_BODY(n, cholesky_decomp(n, a, l, 0.0), cholesky_decomp(n, a, ltest, MIN_EIGENVAL))
+}
+
+// Fixed size versions for small ncol, with constant loop bounds so that
+// the compiler fully unrolls them.
+#define DEFINE_CHOLESKY_CHISQ(N)					\
+    static int cholesky_decomp_##N(const double *a, double *l, double shift) { \
+	CHOLESKY_DECOMP_BODY(N)						\
+    }									\
+    static int cholesky_chisq_##N(const double *a, const double *b, double *chisq, double *det) { \
+	CHOLESKY_CHISQ_BODY(N, cholesky_decomp_##N(a, l, 0.0), cholesky_decomp_##N(a, ltest, MIN_EIGENVAL)) \
+    }
+
+DEFINE_CHOLESKY_CHISQ(1)
+DEFINE_CHOLESKY_CHISQ(2)
+DEFINE_CHOLESKY_CHISQ(3)
+DEFINE_CHOLESKY_CHISQ(4)
+DEFINE_CHOLESKY_CHISQ(5)
+DEFINE_CHOLESKY_CHISQ(6)
+
+typedef int (*cholesky_chisq_func)(const double *a, const double *b, double *chisq, double *det);
+
+// The slow path, as in chisq_dist(): fix the covariance matrix if necessary
+// and invert it with an LU decomposition.
+static int lu_chisq(int ncol, double *a, double *b, double *chisq, double *det) {
+  gsl_matrix_view mvcovmat;
+  gsl_vector_view vvdc;
+  gsl_matrix *mmetric;
+  gsl_vector *vdcm;
+  gsl_permutation *pp;
+  int s;
+
+  mvcovmat = gsl_matrix_view_array(a, ncol, ncol);
+  vvdc = gsl_vector_view_array(b, ncol);
+  mmetric = gsl_matrix_alloc(ncol, ncol);
+  vdcm = gsl_vector_alloc(ncol);
+  pp = gsl_permutation_alloc(ncol);
+
+  check_and_fix_covmat(&mvcovmat.matrix);
+
+  gsl_linalg_LU_decomp(&mvcovmat.matrix, pp, &s);
+  gsl_linalg_LU_invert(&mvcovmat.matrix, pp, mmetric);
+  *det = gsl_linalg_LU_det(&mvcovmat.matrix, s);
+
+  gsl_blas_dgemv(CblasNoTrans, 1.0, mmetric, &vvdc.vector, 0.0, vdcm);
+  gsl_blas_ddot(vdcm, &vvdc.vector, chisq);
+
+  gsl_matrix_free(mmetric);
+  gsl_vector_free(vdcm);
+  gsl_permutation_free(pp);
+
+  return 0;
+}
+
+struct chisq_workspace *chisq_workspace_alloc(int ncol, int nz) {
+  struct chisq_workspace *ws;
+
+  if ((ws = (struct chisq_workspace *)calloc(1, sizeof(struct chisq_workspace))) == NULL) {
+      return NULL;
+  }
+  ws->ncol = ncol;
+  ws->nz = nz;
+  ws->covmat_ok = (int *)calloc(nz, sizeof(int));
+  ws->sst = (double *)calloc(nz*ncol*ncol, sizeof(double));
+  ws->cobs = (double *)calloc(ncol*ncol, sizeof(double));
+  ws->mat = (double *)calloc(ncol*ncol, sizeof(double));
+  ws->vdc = (double *)calloc(ncol, sizeof(double));
+
+  if (ws->covmat_ok == NULL || ws->sst == NULL || ws->cobs == NULL ||
+      ws->mat == NULL || ws->vdc == NULL) {
+      chisq_workspace_free(ws);
+      return NULL;
+  }
+
+  return ws;
+}
+
+void chisq_workspace_free(struct chisq_workspace *ws) {
+  if (ws == NULL) return;
+
+  free(ws->covmat_ok);
+  free(ws->sst);
+  free(ws->cobs);
+  free(ws->mat);
+  free(ws->vdc);
+  free(ws);
+}
+
+int chisq_dist_grouped(int nophotoerr, int ngal, int nz, int ncol,
+		       double *covmat, double *c, double *slope, double *pivotmag,
+		       double *refmag, double *refmagerr, double *magerr,
+		       double *color, double *lupcorr, void *chisq, void *lkhd,
+		       int use_float, double sigint, struct chisq_workspace *ws) {
+  // Many galaxies, many redshifts: every galaxy at every redshift
+  //     - refmag/refmagerr is an array with ngal
+  //     - color is a matrix with ncol x ngal
+  //     - magerr is a matrix with nmag x ngal
+  //     - c is a matrix with ncol x nz
+  //     - slope is a matrix with ncol x nz
+  //     - pivotmag is an array with nz
+  //     - lupcorr is a matrix with ncol x nz x ngal
+  //     - covmat is a matrix with ncol x ncol x nz
+  //     - chisq, lkhd are matrices with nz x ngal (or NULL to skip)
+  //
+  // covmat[ncol,ncol,nz]: (l*ncol+j)*ncol + k
+  // c[ncol,nz]: l*ncol + j
+  // slope[ncol,nz]: l*ncol + j
+  // pivotmag[nz]: l
+  // refmag[ngal]: i
+  // refmagerr[ngal]: i
+  // magerr[nmag,ngal]: i*nmag + j
+  // color[ncol,ngal]: i*ncol + j
+  // lupcorr[ncol,nz,ngal]: (i*nz + l)*ncol + j
+  // chisq, lkhd[nz,ngal]: i*nz + l
+
+  int i, j, k, l, ind;
+  int nmag = ncol+1;
+  int nsq = ncol*ncol;
+  int status;
+  double err2, refmagerr2;
+  double val_chisq, val_lkhd, det;
+  cholesky_chisq_func cholesky_chisq_n = NULL;
+
+  if (ws == NULL || ws->ncol != ncol || ws->nz < nz) {
+      return -1;
+  }
+
+  switch (ncol) {
+  case 1: cholesky_chisq_n = cholesky_chisq_1; break;
+  case 2: cholesky_chisq_n = cholesky_chisq_2; break;
+  case 3: cholesky_chisq_n = cholesky_chisq_3; break;
+  case 4: cholesky_chisq_n = cholesky_chisq_4; break;
+  case 5: cholesky_chisq_n = cholesky_chisq_5; break;
+  case 6: cholesky_chisq_n = cholesky_chisq_6; break;
+  }
+
+  // The sigint check and the slope outer products (for the C_i matrix)
+  // only depend on redshift.
+  for (l=0;l<nz;l++) {
+      ws->covmat_ok[l] = 1;
+      for (j=0;j<ncol;j++) {
+	  if (covmat[l*nsq + j*ncol + j] < sigint*sigint) {
+	      ws->covmat_ok[l] = 0;
+	  }
+	  for (k=0;k<ncol;k++) {
+	      ws->sst[l*nsq + j*ncol + k] = slope[l*ncol+j] * slope[l*ncol+k];
+	  }
+      }
+  }
+
+  for (i=0;i<ngal;i++) {
+      // The C_obs matrix only depends on the galaxy.  This is the same as
+      // M C M^T in chisq_dist(), with the tridiagonal M.
+      memset(ws->cobs, 0, nsq*sizeof(double));
+      if (!nophotoerr) {
+	  for (j=0;j<ncol;j++) {
+	      err2 = magerr[i*nmag+j+1]*magerr[i*nmag+j+1];
+	      ws->cobs[j*ncol+j] = magerr[i*nmag+j]*magerr[i*nmag+j] + err2;
+	      if (j < ncol-1) {
+		  ws->cobs[j*ncol+j+1] = -err2;
+		  ws->cobs[(j+1)*ncol+j] = -err2;
+	      }
+	  }
+      }
+      refmagerr2 = refmagerr[i]*refmagerr[i];
+
+      for (l=0;l<nz;l++) {
+	  ind = i*nz + l;
+
+	  if (!ws->covmat_ok[l]) {
+	      val_chisq = 1e11;
+	      val_lkhd = -1e11;
+	  } else {
+	      for (j=0;j<nsq;j++) {
+		  ws->mat[j] = covmat[l*nsq+j] + ws->cobs[j] + ws->sst[l*nsq+j]*refmagerr2;
+	      }
+	      for (j=0;j<ncol;j++) {
+		  ws->vdc[j] = (c[l*ncol+j] + slope[l*ncol+j]*(refmag[i] - pivotmag[l])) +
+		      lupcorr[ind*ncol+j] - color[i*ncol+j];
+	      }
+
+	      if (cholesky_chisq_n != NULL) {
+		  status = cholesky_chisq_n(ws->mat, ws->vdc, &val_chisq, &det);
+	      } else {
+		  status = cholesky_chisq(ncol, ws->mat, ws->vdc, &val_chisq, &det);
+	      }
+
+	      if (status) {
+		  // The slow path (rare)
+		  lu_chisq(ncol, ws->mat, ws->vdc, &val_chisq, &det);
+	      }
+
+	      val_lkhd = -0.5*val_chisq - 0.5*log(det);
+	  }
+
+	  if (use_float) {
+	      if (chisq != NULL) ((float *)chisq)[ind] = (float)val_chisq;
+	      if (lkhd != NULL) ((float *)lkhd)[ind] = (float)val_lkhd;
+	  } else {
+	      if (chisq != NULL) ((double *)chisq)[ind] = val_chisq;
+	      if (lkhd != NULL) ((double *)lkhd)[ind] = val_lkhd;
+	  }
+      }
+  }
+
+  return 0;
+}
+
 int check_and_fix_covmat(gsl_matrix *covmat) {
   int i, s, test;
   double eigenval_i;
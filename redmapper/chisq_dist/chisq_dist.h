@@ -7,6 +7,7 @@
 
 #define MIN_EIGENVAL 1E-6
 #define SIGINT_DEFAULT 0.001
+#define NCOL_UNROLL 6
 
 struct chisq_dist {
     int mode;
@@ -31,8 +32,23 @@ struct chisq_dist {
 };
 
 
+// Workspace for chisq_dist_grouped(), allocated once per block
+struct chisq_workspace {
+    int ncol;
+    int nz;
+    int *covmat_ok;  // [nz]: covmat passes the sigint test
+    double *sst;     // [nz, ncol, ncol]: outer product of the slopes
+    double *cobs;    // [ncol, ncol]: photometric covariance of one galaxy
+    double *mat;     // [ncol, ncol]: full covariance of one galaxy/redshift
+    double *vdc;     // [ncol]: color offset of one galaxy/redshift
+};
+
 int chisq_dist(int mode, int do_chisq, int nophotoerr, int ncalc, int ncol, double *covmat, double *c, double *slope, double *pivotmag, double *refmag, double *refmagerr, double *magerr, double *color, double *lupcorr, double *dist, double sigint);
 
+struct chisq_workspace *chisq_workspace_alloc(int ncol, int nz);
+void chisq_workspace_free(struct chisq_workspace *ws);
+
+int chisq_dist_grouped(int nophotoerr, int ngal, int nz, int ncol, double *covmat, double *c, double *slope, double *pivotmag, double *refmag, double *refmagerr, double *magerr, double *color, double *lupcorr, void *chisq, void *lkhd, int use_float, double sigint, struct chisq_workspace *ws);
 
 int check_and_fix_covmat(gsl_matrix *covmat);
 
@@ -263,3 +263,116 @@ def compute_chisq(covmat, c, slope, pivotmag, refmag, magerr, color, refmagerr=N
     else:
         return (chisq, lkhd)
 
+
+
+def compute_chisq_grouped(covmat, c, slope, pivotmag, refmag, magerr, color, refmagerr=None, lupcorr=None, calc_chisq=True, calc_lkhd=False, nophotoerr=False, dtype='f8'):
+    """
+    Compute the chi-squared for every galaxy in a set of galaxies at every
+    redshift in a set of redshifts.
+
+    All ngal x nz pairs are computed in one block.  The photometric
+    covariance of each galaxy is built once, and the chi-squared uses a
+    Cholesky decomposition (unrolled for ncol <= 6) rather than inverting the
+    covariance matrix.  Chi-squared and likelihood are computed together.
+
+    Parameters
+    ----------
+    covmat: `np.array`
+       Float array of covariance matrices, 3d, [ncol, ncol, nz]
+    c: `np.array`
+       Float array of colors at pivot magnitudes, 2d, [nz, ncol]
+    slope: `np.array`
+       Float array of slopes at pivot magnitudes, 2d, [nz, ncol]
+    pivotmag: `np.array`
+       Float array of pivot magnitudes, [nz]
+    refmag: `np.array`
+       Float array of reference (total) magnitudes, [ngal]
+    magerr: `np.array`
+       Float array of magnitude errors, 2d, [ngal, nmag]
+    color: `np.array`
+       Float array of colors, 2d, [ngal, ncol]
+    refmagerr: `np.array`, optional
+       Float array of reference magnitude errors, [ngal].  Default is None,
+       don't use reference magnitude error in computing chi-squared.
+    lupcorr: `np.array`, optional
+       Float array of luptitude corrections, 3d, [ngal, nz, ncol].  Default
+       is None, don't use luptitude corrections.
+    calc_chisq: `bool`, optional
+       Calculate chi-squared?  Default is True.
+    calc_lkhd: `bool`, optional
+       Calculate likelihood with determinant factor?  Default is False.
+    nophotoerr: `bool`, optional
+       Do not use photometric errors in chi-squared (intrinsic only)?
+       Default is False.
+    dtype: `str` or `np.dtype`, optional
+       Output type, 'f8' or 'f4'.  Default is 'f8'.
+
+    Returns
+    -------
+    chisq: `np.array`
+       Float array of chi-squared, [ngal, nz].  Present if calc_chisq=True.
+    lkhd: `np.array`
+       Float array of likelihoods, [ngal, nz].  Present if calc_lkhd=True.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float32:
+        use_float = True
+    elif dtype == np.float64:
+        use_float = False
+    else:
+        raise ValueError("dtype must be f4 or f8")
+
+    _c = np.ascontiguousarray(c, dtype='f8')
+    _slope = np.ascontiguousarray(slope, dtype='f8')
+    _pivotmag = np.ascontiguousarray(np.atleast_1d(pivotmag), dtype='f8')
+    _refmag = np.ascontiguousarray(np.atleast_1d(refmag), dtype='f8')
+    _magerr = np.ascontiguousarray(magerr, dtype='f8')
+    _color = np.ascontiguousarray(color, dtype='f8')
+
+    if (_c.ndim != 2):
+        raise ValueError("c must be 2D")
+
+    nz, ncol = _c.shape
+    ngal = _refmag.size
+    nmag = ncol + 1
+
+    if (_slope.shape != (nz, ncol)):
+        raise ValueError("slope must be nz x ncol")
+    if (_pivotmag.size != nz):
+        raise ValueError("pivotmag must be nz elements")
+    if (covmat.ndim != 3) or (covmat.shape != (ncol, ncol, nz)):
+        raise ValueError("covmat must be ncol x ncol x nz")
+    if (_magerr.shape != (ngal, nmag)):
+        raise ValueError("magerr must be ngal x nmag")
+    if (_color.shape != (ngal, ncol)):
+        raise ValueError("color must be ngal x ncol")
+
+    # The covariance matrices are symmetric, so each [ncol, ncol] block
+    # is stored contiguously by redshift.
+    _covmat = np.ascontiguousarray(np.moveaxis(covmat, 2, 0), dtype='f8')
+
+    if (refmagerr is None):
+        _refmagerr = np.zeros(ngal, dtype='f8')
+    else:
+        _refmagerr = np.ascontiguousarray(np.atleast_1d(refmagerr), dtype='f8')
+    if (_refmagerr.size != ngal):
+        raise ValueError("refmagerr must be ngal elements")
+
+    if (lupcorr is None):
+        _lupcorr = np.zeros((ngal, nz, ncol), dtype='f8')
+    else:
+        _lupcorr = np.ascontiguousarray(lupcorr, dtype='f8')
+    if (_lupcorr.shape != (ngal, nz, ncol)):
+        raise ValueError("lupcorr must be ngal x nz x ncol")
+
+    chisq, lkhd = _chisq_dist_pywrap.compute_grouped(calc_chisq, calc_lkhd, nophotoerr, use_float,
+                                                     _covmat, _c, _slope, _pivotmag,
+                                                     _refmag, _refmagerr, _magerr,
+                                                     _color, _lupcorr)
+
+    if calc_chisq and not calc_lkhd:
+        return chisq
+    elif not calc_chisq and calc_lkhd:
+        return lkhd
+    else:
+        return (chisq, lkhd)
@@ -165,12 +165,15 @@ PyObject* ChisqDistObject_compute(const struct ChisqDistObject* self, PyObject *
 	return chisq_obj;
     }
 
-    // and do the work.
+    // and do the work, without the GIL since chisq_dist only touches
+    // its own arrays.
+    Py_BEGIN_ALLOW_THREADS
     chisq_dist(self->chisq_dist->mode, do_chisq, nophotoerr, self->chisq_dist->ncalc,
 	       self->chisq_dist->ncol, self->chisq_dist->covmat, self->chisq_dist->c,
 	       self->chisq_dist->slope, self->chisq_dist->pivotmag, self->chisq_dist->refmag,
 	       self->chisq_dist->refmagerr, self->chisq_dist->magerr, self->chisq_dist->color,
 	       self->chisq_dist->lupcorr, chisq, self->chisq_dist->sigint);
+    Py_END_ALLOW_THREADS
 
     return PyArray_Return((PyArrayObject *) chisq_obj);
 }
@@ -228,7 +231,133 @@ static PyTypeObject PyChisqDistType = {
     PyType_GenericNew,                 /* tp_new */
 };
 
+static int
+check_grouped_array(PyArrayObject *obj, const char *name)
+{
+    char err[256];
+
+    if (!PyArray_Check(obj) || PyArray_TYPE(obj) != NPY_FLOAT64 ||
+	!PyArray_IS_C_CONTIGUOUS(obj)) {
+	sprintf(err, "%s must be a contiguous array of type float64", name);
+	PyErr_SetString(PyExc_ValueError, err);
+	return -1;
+    }
+    return 0;
+}
+
+PyObject* ChisqDist_compute_grouped(PyObject *self, PyObject *args)
+{
+    int do_chisq, do_lkhd, nophotoerr, use_float;
+    int ngal, nz, ncol;
+    int status;
+    npy_intp dims[2];
+    PyArrayObject *covmat_obj = NULL;
+    PyArrayObject *c_obj = NULL;
+    PyArrayObject *slope_obj = NULL;
+    PyArrayObject *pivotmag_obj = NULL;
+    PyArrayObject *refmag_obj = NULL;
+    PyArrayObject *refmagerr_obj = NULL;
+    PyArrayObject *magerr_obj = NULL;
+    PyArrayObject *color_obj = NULL;
+    PyArrayObject *lupcorr_obj = NULL;
+    PyObject *chisq_obj = NULL;
+    PyObject *lkhd_obj = NULL;
+    void *chisq = NULL;
+    void *lkhd = NULL;
+    struct chisq_workspace *ws;
+
+    if (!PyArg_ParseTuple(args,
+			  (char*)"iiiiOOOOOOOOO",
+			  &do_chisq,
+			  &do_lkhd,
+			  &nophotoerr,
+			  &use_float,
+			  &covmat_obj,
+			  &c_obj,
+			  &slope_obj,
+			  &pivotmag_obj,
+			  &refmag_obj,
+			  &refmagerr_obj,
+			  &magerr_obj,
+			  &color_obj,
+			  &lupcorr_obj)) {
+	PyErr_SetString(PyExc_RuntimeError,"Failed to parse args");
+	return NULL;
+    }
+
+    // The shapes are checked in chisq_dist_lib.compute_chisq_grouped()
+    if (check_grouped_array(covmat_obj, "covmat") ||
+	check_grouped_array(c_obj, "c") ||
+	check_grouped_array(slope_obj, "slope") ||
+	check_grouped_array(pivotmag_obj, "pivotmag") ||
+	check_grouped_array(refmag_obj, "refmag") ||
+	check_grouped_array(refmagerr_obj, "refmagerr") ||
+	check_grouped_array(magerr_obj, "magerr") ||
+	check_grouped_array(color_obj, "color") ||
+	check_grouped_array(lupcorr_obj, "lupcorr")) {
+	return NULL;
+    }
+
+    ngal = (int) PyArray_DIM(refmag_obj, 0);
+    nz = (int) PyArray_DIM(pivotmag_obj, 0);
+    ncol = (int) PyArray_DIM(c_obj, 1);
+
+    dims[0] = ngal;
+    dims[1] = nz;
+
+    if (do_chisq) {
+	chisq_obj = PyArray_ZEROS(2, dims, use_float ? NPY_FLOAT32 : NPY_FLOAT64, 0);
+	chisq = PyArray_DATA((PyArrayObject*)chisq_obj);
+    } else {
+	Py_INCREF(Py_None);
+	chisq_obj = Py_None;
+    }
+    if (do_lkhd) {
+	lkhd_obj = PyArray_ZEROS(2, dims, use_float ? NPY_FLOAT32 : NPY_FLOAT64, 0);
+	lkhd = PyArray_DATA((PyArrayObject*)lkhd_obj);
+    } else {
+	Py_INCREF(Py_None);
+	lkhd_obj = Py_None;
+    }
+
+    if ((ws = chisq_workspace_alloc(ncol, nz)) == NULL) {
+	Py_DECREF(chisq_obj);
+	Py_DECREF(lkhd_obj);
+	PyErr_SetString(PyExc_MemoryError, "Failed to allocate chisq workspace");
+	return NULL;
+    }
+
+    // and do the work, without the GIL since chisq_dist_grouped only
+    // touches its own arrays.
+    Py_BEGIN_ALLOW_THREADS
+    status = chisq_dist_grouped(nophotoerr, ngal, nz, ncol,
+				(double *) PyArray_DATA(covmat_obj),
+				(double *) PyArray_DATA(c_obj),
+				(double *) PyArray_DATA(slope_obj),
+				(double *) PyArray_DATA(pivotmag_obj),
+				(double *) PyArray_DATA(refmag_obj),
+				(double *) PyArray_DATA(refmagerr_obj),
+				(double *) PyArray_DATA(magerr_obj),
+				(double *) PyArray_DATA(color_obj),
+				(double *) PyArray_DATA(lupcorr_obj),
+				chisq, lkhd, use_float, SIGINT_DEFAULT, ws);
+    Py_END_ALLOW_THREADS
+
+    chisq_workspace_free(ws);
+
+    if (status != 0) {
+	Py_DECREF(chisq_obj);
+	Py_DECREF(lkhd_obj);
+	PyErr_SetString(PyExc_RuntimeError, "Failed to compute grouped chisq");
+	return NULL;
+    }
+
+    return Py_BuildValue("NN", chisq_obj, lkhd_obj);
+}
+
 static PyMethodDef ChisqDist_module_methods[] = {
+    {"compute_grouped", (PyCFunction)ChisqDist_compute_grouped, METH_VARARGS,
+     "compute_grouped(do_chisq, do_lkhd, nophotoerr, use_float, covmat, c, slope, pivotmag, refmag, refmagerr, magerr, color, lupcorr)"},
     {NULL}  /* Sentinel */
 };
 
@@ -9,9 +9,8 @@ import numpy as np
 import itertools
 import scipy.optimize
 import scipy.integrate
-import copy
 
-from .solver_nfw import Solver
+from .solver_nfw import Solver, solve_nfw_many
 from .catalog import Catalog, Entry
 from .utilities import chisq_pdf, calc_theta_i, MStar, schechter_pdf, nfw_pdf
 from .mask import HPMask
@@ -155,6 +154,7 @@ class Cluster(Entry):
 
         self._mstar = None
         self._mpc_scale = None
+        self._prematch = None
 
         if self.z > 0.0 and self.zredstr is not None:
             self.redshift = self.z
@@ -173,7 +173,9 @@ class Cluster(Entry):
     def set_neighbors(self, neighbors):
         """
         Set the neighbor galaxy catalog from a list of neighbors.  The input
-        neighbor catalog is deep-copied.
+        neighbor catalog is copied to a columnar catalog, so that each
+        neighbor column is contiguous and extra fields are added without
+        copying.
 
         Parameters
         ----------
@@ -185,7 +187,7 @@ class Cluster(Entry):
 
         self.neighbors = None
         if (neighbors is not None):
-            self.neighbors = copy.deepcopy(neighbors)
+            self.neighbors = neighbors.take(slice(None))
 
             # extra fields
             neighbor_extra_dtype = [('R', 'f8'),
@@ -239,7 +241,18 @@ class Cluster(Entry):
         else:
             radius_degrees = radius
 
-        indices, dists = galcat.match_one(self.ra, self.dec, radius_degrees)
+        if (self._prematch is not None and self._prematch['galcat'] is galcat and
+                self._prematch['ra'] == self.ra and self._prematch['dec'] == self.dec and
+                radius_degrees <= self._prematch['radius']):
+            # We can use the candidates from the bulk prematch
+            indices = self._prematch['indices']
+            dists = self._prematch['dists']
+            if radius_degrees < self._prematch['radius']:
+                use, = np.where(dists <= radius_degrees)
+                indices = indices[use]
+                dists = dists[use]
+        else:
+            indices, dists = galcat.match_one(self.ra, self.dec, radius_degrees)
 
         if maxmag is not None:
             use, = np.where(galcat.refmag[indices] <= maxmag)
@@ -253,6 +266,32 @@ class Cluster(Entry):
         # And we need to compute the r values here
         self._compute_neighbor_r()
 
+    def set_prematched_neighbors(self, galcat, radius, indices, dists):
+        """
+        Set candidate neighbors from a bulk prematch of many clusters.
+
+        Subsequent calls to find_neighbors() with the same galaxy catalog, at
+        the same position, and within the prematched radius will select from
+        these candidates rather than running a new match.
+
+        Parameters
+        ----------
+        galcat: `redmapper.GalaxyCatalog`
+           Full catalog of galaxies that was matched
+        radius: `float`
+           Radius (degrees) used in the prematch
+        indices: `np.array`
+           Integer array of galcat indices within radius
+        dists: `np.array`
+           Float array of distance (degrees) from each galaxy in indices
+        """
+        self._prematch = {'galcat': galcat,
+                          'ra': self.ra,
+                          'dec': self.dec,
+                          'radius': radius,
+                          'indices': indices,
+                          'dists': dists}
+
     def update_neighbors_dist(self):
         """
         Update the distance from the neighbors to the central galaxy (in degrees)
@@ -288,7 +327,7 @@ class Cluster(Entry):
            sigma(x) from radial profile
         """
         if idx is None:
-            idx = np.arange(len(self.neighbors))
+            idx = slice(None)
 
         sigx = nfw_pdf(self.neighbors.r[idx], rscale=rscale)
 
@@ -311,7 +350,7 @@ class Cluster(Entry):
            phi(x) for the cluster
         """
         if idx is None:
-            idx = np.arange(len(self.neighbors))
+            idx = slice(None)
 
         zind = self.zredstr.zindex(self._redshift)
         refind = self.zredstr.lumrefmagindex(normmag)
@@ -473,15 +512,118 @@ class Cluster(Entry):
         lam: `float`
            Cluster richness.  Will be < 0 when no cluster found.
         """
-        #set index for slicing self.neighbors
+        # set index for slicing self.neighbors; with no index the neighbor
+        # columns are used directly as views.
         if index is not None:
             idx = index
         else:
-            idx = np.arange(len(self.neighbors))
+            idx = slice(None)
+
+        inputs = self._calc_richness_inputs(mask, idx)
+
+        richness_obj = Solver(self.r0, self.beta, inputs['ucounts'], inputs['bcounts'],
+                              self.neighbors.r[idx], inputs['w'],
+                              cpars=inputs['cpars'], rsig=self.config.rsig)
+
+        # Call the solving routine
+        # this returns five items: lam_obj, p, pmem, rlam, theta_r
+        # Note that pmem used to be called "wvals" in IDL code
+        # pmem = p * pfree * theta_i * theta_r
+        lam, p, pmem, rlam, theta_r = richness_obj.solve_nfw()
 
+        return self._calc_richness_outputs(mask, idx, inputs, lam, p, pmem, rlam,
+                                           theta_r, calc_err=calc_err)
+
+    def calc_richness_redshifts(self, mask, redshifts, calc_err=True, index=None):
+        """
+        Calculate the richness for the cluster at a set of redshifts.
+
+        All the redshifts are solved together with one call to the nfw
+        solver.  The cluster is left at the last redshift, with the same
+        state as a sequence of calls to calc_richness().
+
+        Parameters
+        ----------
+        mask: `redmapper.Mask`
+           Footprint mask for survey
+        redshifts: `np.array`
+           Float array of redshifts
+        calc_err: `bool`, optional
+           Calculate the richness error?  Default is True.
+        index: `np.array`, optional
+           Integer array of neighbor indices.  Default is None (all).
+
+        Returns
+        -------
+        lams: `np.array`
+           Float array of cluster richness at each redshift.  Will be < 0
+           when no cluster found.
+        lam_errs: `np.array`
+           Float array of cluster richness error at each redshift.
+        """
+        if index is not None:
+            idx = index
+        else:
+            idx = slice(None)
+
+        redshifts = np.atleast_1d(redshifts)
+        nz = redshifts.size
+
+        # The inputs are computed in order, as the mask corrections
+        # consume random numbers.
+        inputs = []
+        for z in redshifts:
+            self.redshift = z
+            inputs.append(self._calc_richness_inputs(mask, idx))
+            # The neighbor r values are updated in place with the redshift
+            inputs[-1]['r'] = self.neighbors.r[idx].copy()
+
+        offsets = np.arange(nz + 1)*inputs[0]['ucounts'].size
+        lams, ps, pmems, rlams, theta_rs = solve_nfw_many(self.r0, self.beta, offsets,
+                                                          np.concatenate([inp['ucounts'] for inp in inputs]),
+                                                          np.concatenate([inp['bcounts'] for inp in inputs]),
+                                                          np.concatenate([inp['r'] for inp in inputs]),
+                                                          np.concatenate([inp['w'] for inp in inputs]),
+                                                          np.vstack([inp['cpars'] for inp in inputs]),
+                                                          rsig=self.config.rsig)
+
+        lam_out = np.zeros(nz)
+        lam_err_out = np.zeros(nz)
+        for i, z in enumerate(redshifts):
+            if nz > 1:
+                self.redshift = z
+            s = slice(offsets[i], offsets[i + 1])
+            lam_out[i] = self._calc_richness_outputs(mask, idx, inputs[i], lams[i],
+                                                     ps[s], pmems[s], rlams[i], theta_rs[s],
+                                                     calc_err=calc_err)
+            lam_err_out[i] = self.Lambda_e
+
+        return lam_out, lam_err_out
+
+    def _calc_richness_inputs(self, mask, idx):
+        """
+        Compute the inputs to the richness solver at the current redshift.
+
+        Parameters
+        ----------
+        mask: `redmapper.Mask`
+           Footprint mask for survey
+        idx: `np.array` or `slice`
+           Integer array of neighbor indices, or slice(None) for all.
+
+        Returns
+        -------
+        inputs: `dict`
+           Dictionary of solver inputs (ucounts, bcounts, w, cpars) and
+           intermediate values used to compute the outputs.
+        """
         maxmag = self.mstar - 2.5 * np.log10(self.config.lval_reference)
 
-        self.neighbors.chisq[idx] = self.zredstr.calculate_chisq(self.neighbors[idx], self._redshift)
+        if isinstance(idx, slice):
+            galaxies = self.neighbors
+        else:
+            galaxies = self.neighbors.take(idx, columns=self.zredstr.chisq_columns)
+        self.neighbors.chisq[idx] = self.zredstr.calculate_chisq(galaxies, self._redshift)
         rho = chisq_pdf(self.neighbors.chisq[idx], self.zredstr.ncol)
         nfw = self._calc_radial_profile(idx=idx)
         phi = self._calc_luminosity(maxmag, idx=idx) #phi is lumwt in the IDL code
@@ -499,15 +641,49 @@ class Cluster(Entry):
         except AttributeError:
             w = theta_i * np.ones_like(ucounts)
 
-        richness_obj = Solver(self.r0, self.beta, ucounts, bcounts,
-                              self.neighbors.r[idx], w,
-                              cpars=cpars, rsig=self.config.rsig)
+        return {'maxmag': maxmag,
+                'rho': rho,
+                'phi': phi,
+                'ucounts': ucounts,
+                'bcounts': bcounts,
+                'theta_i': theta_i,
+                'cpars': cpars,
+                'w': w}
 
-        # Call the solving routine
-        # this returns five items: lam_obj, p, pmem, rlam, theta_r
-        # Note that pmem used to be called "wvals" in IDL code
-        # pmem = p * pfree * theta_i * theta_r
-        lam, p, pmem, rlam, theta_r = richness_obj.solve_nfw()
+    def _calc_richness_outputs(self, mask, idx, inputs, lam, p, pmem, rlam, theta_r, calc_err=True):
+        """
+        Set the richness and neighbor probabilities from the solver outputs
+        at the current redshift.
+
+        Parameters
+        ----------
+        mask: `redmapper.Mask`
+           Footprint mask for survey
+        idx: `np.array` or `slice`
+           Integer array of neighbor indices, or slice(None) for all.
+        inputs: `dict`
+           Dictionary of solver inputs from _calc_richness_inputs()
+        lam: `float`
+           Richness from the solver
+        p: `np.array`
+           Float array of raw membership probabilities from the solver
+        pmem: `np.array`
+           Float array of membership probabilities from the solver
+        rlam: `float`
+           Cluster radius from the solver
+        theta_r: `np.array`
+           Float array of radial weights from the solver
+        calc_err: `bool`, optional
+           Calculate the richness error?  Default is True.
+
+        Returns
+        -------
+        lam: `float`
+           Cluster richness.  Will be < 0 when no cluster found.
+        """
+        maxmag = inputs['maxmag']
+        cpars = inputs['cpars']
+        bcounts = inputs['bcounts']
 
         # reset before setting subsets
         self.neighbors.theta_i[:] = 0.0
@@ -537,7 +713,7 @@ class Cluster(Entry):
                 lam_err = np.sqrt((1-bar_pmem) * lam_unscaled * self.scaleval**2. + lam_cerr**2.)
 
             # calculate pcol -- color only.  Don't need to worry about nfw norm!
-            ucounts = rho*phi
+            ucounts = inputs['rho']*inputs['phi']
 
             pcol = ucounts * lam/(ucounts * lam + bcounts)
             bad, = np.where((self.neighbors.r[idx] > rlam) | (self.neighbors.refmag[idx] > maxmag) |
@@ -545,7 +721,7 @@ class Cluster(Entry):
             pcol[bad] = 0.0
 
             # and set the values
-            self.neighbors.theta_i[idx] = theta_i
+            self.neighbors.theta_i[idx] = inputs['theta_i']
             self.neighbors.theta_r[idx] = theta_r
             self.neighbors.p[idx] = p
             self.neighbors.pcol[idx] = pcol
@@ -833,8 +1009,11 @@ class Cluster(Entry):
         and neighbor dist (in degrees).
         """
         if self.neighbors is not None and self._redshift is not None:
-            # Clipping at 1e-6 to avoid singularities.
-            self.neighbors.r = np.clip(self.mpc_scale * self.neighbors.dist, 1e-6, None)
+            # The angular distances are fixed, so this is a rescaling done
+            # in place.  Clipping at 1e-6 to avoid singularities.
+            r = self.neighbors.r
+            np.multiply(self.neighbors.dist, self.mpc_scale, out=r)
+            np.clip(r, 1e-6, None, out=r)
 
 
     def copy(self):
@@ -918,7 +1097,7 @@ class ClusterCatalog(Catalog):
             self.add_fields(dtype_augment)
 
     @classmethod
-    def from_catfile(cls, filename, **kwargs):
+    def from_catfile(cls, filename, columns=None, lazy=False, **kwargs):
         """
         Instantiate a ClusterCatalog from a catalog file
 
@@ -926,6 +1105,12 @@ class ClusterCatalog(Catalog):
         ----------
         filename: `str`
            Filename of catalog file
+        columns: `list`, optional
+           Columns to read.  With lazy=True, these are read immediately and
+           the other columns are read on first access.  Default is None
+           (all columns).
+        lazy: `bool`, optional
+           Read each column from the file on first access?  Default is False.
         r0: `float`, optional
            Richness/radius scale parameter.  Default to 1.0 h^-1 Mpc.
         beta: `float`, optional
@@ -941,7 +1126,10 @@ class ClusterCatalog(Catalog):
         zredbkg: `redmapper.ZredBackground`, optional
            Zred background.  Default is None.
         """
-        cat = fitsio.read(filename, ext=1, upper=True)
+        if lazy:
+            return cls.from_fits_file(filename, ext=1, columns=columns, lazy=True, **kwargs)
+
+        cat = fitsio.read(filename, ext=1, upper=True, columns=columns)
 
         return cls(cat, **kwargs)
 
@@ -978,23 +1166,21 @@ class ClusterCatalog(Catalog):
         return cls(np.zeros(size, dtype=cluster_dtype), **kwargs)
 
     def __getitem__(self, key):
+        kwargs = {'r0': self.r0,
+                  'beta': self.beta,
+                  'zredstr': self.zredstr,
+                  'config': self.config,
+                  'bkg': self.bkg,
+                  'cbkg': self.cbkg,
+                  'zredbkg': self.zredbkg}
         if isinstance(key, int):
             # Note that if we have members, we can associate them with the cluster
-            #  here.
-            return Cluster(cat_vals=self._ndarray.__getitem__(key),
-                           r0=self.r0,
-                           beta=self.beta,
-                           zredstr=self.zredstr,
-                           config=self.config,
-                           bkg=self.bkg,
-                           cbkg=self.cbkg,
-                           zredbkg=self.zredbkg)
+            #  here.  The Cluster is a view into the catalog, unless the
+            #  catalog is columnar, when it is a copy of the row.
+            if self.columnar:
+                return Cluster(cat_vals=self._get_row(key), **kwargs)
+            return Cluster(cat_vals=self._ndarray.__getitem__(key), **kwargs)
+        elif self.columnar:
+            return ClusterCatalog.from_columns(self._columns.select(key), **kwargs)
         else:
-            return ClusterCatalog(self._ndarray.__getitem__(key),
-                                  r0=self.r0,
-                                  beta=self.beta,
-                                  zredstr=self.zredstr,
-                                  config=self.config,
-                                  bkg=self.bkg,
-                                  cbkg=self.cbkg,
-                                  zredbkg=self.zredbkg)
+            return ClusterCatalog(self._ndarray.__getitem__(key), **kwargs)
@@ -9,8 +9,13 @@ This class has numerous methods that are overridden by the derived classes.
 import fitsio
 import numpy as np
 import esutil
+import hpgeom as hpg
 import os
 import gc
+import copy
+import threading
+import collections
+import concurrent.futures
 from esutil.cosmology import Cosmo
 
 from .configuration import Configuration
@@ -19,7 +24,7 @@ from .background import Background, ZredBackground
 from .color_background import ColorBackground
 from .mask import get_mask
 from .galaxy import GalaxyCatalog
-from .catalog import Catalog
+from .catalog import Catalog, CatalogBuilder
 from .cluster import Cluster
 from .cluster import ClusterCatalog
 from .depthmap import DepthMap
@@ -27,7 +32,7 @@ from .zlambda import Zlambda
 from .zlambda import ZlambdaCorrectionPar
 from .redsequence import RedSequenceColorPar
 from .depth_fitting import DepthLim
-from .utilities import getMemoryString
+from .utilities import getMemoryString, set_thread_rng
 
 ###################################################
 # Order of operations:
@@ -75,6 +80,17 @@ class ClusterRunner(object):
         self.use_rmask_settings = True
         self.cutgals_chisqmax = False
         self._filename = None
+        self._prematch = None
+        self._prematch_density = None
+
+        # Optional dict of inputs to share between runners on the same
+        # pixel (see _get_input())
+        self.input_cache = None
+
+        # Optional (zredfile, GalaxyCatalog) covering at least this pixel
+        # and border, to cut the galaxies from instead of reading them
+        # (see _read_galaxies())
+        self.shared_gals = None
 
         # Will want to add stuff to check that everything needed is present?
 
@@ -143,40 +159,53 @@ class ClusterRunner(object):
 
         # read in background
         if self.use_colorbkg:
-            self.cbkg = ColorBackground(self.config.bkgfile_color, usehdrarea=True)
+            self.cbkg = self._get_input(('cbkg', self.config.bkgfile_color),
+                                        lambda: ColorBackground(self.config.bkgfile_color, usehdrarea=True))
             self.bkg = None
         else:
-            self.bkg = Background(self.config.bkgfile)
+            self.bkg = self._get_input(('bkg', self.config.bkgfile),
+                                       lambda: Background(self.config.bkgfile))
             self.cbkg = None
 
         if self.zredbkg_required:
-            self.zredbkg = ZredBackground(self.config.bkgfile)
+            self.zredbkg = self._get_input(('zredbkg', self.config.bkgfile),
+                                           lambda: ZredBackground(self.config.bkgfile))
         else:
             self.zredbkg = None
 
         # read in parameters
         if self.use_parfile:
-            self.zredstr = RedSequenceColorPar(self.config.parfile, fine=True)
+            self.zredstr = self._get_input(('zredstr', self.config.parfile),
+                                           lambda: RedSequenceColorPar(self.config.parfile, fine=True,
+                                                                       cachedir=self.config.redsequence_cachedir))
         else:
             self.zredstr = RedSequenceColorPar(None, config=self.config)
 
         # And correction parameters
-        try:
-            self.zlambda_corr = ZlambdaCorrectionPar(parfile=self.config.zlambdafile,
-                                                     zlambda_pivot=self.config.zlambda_pivot)
-        except:
-            self.zlambda_corr = None
+        def _read_zlambda_corr():
+            try:
+                return ZlambdaCorrectionPar(parfile=self.config.zlambdafile,
+                                            zlambda_pivot=self.config.zlambda_pivot)
+            except:
+                return None
+
+        self.zlambda_corr = self._get_input(('zlambda_corr', self.config.zlambdafile, self.config.zlambda_pivot),
+                                            _read_zlambda_corr)
 
         # read in mask (if available)
         # This will read in the mask and maskgals
         #  Will work with any type of mask
-        self.mask = get_mask(self.config)
+        self.mask = self._get_input(('mask', self.config.maskfile, self.config.mask_mode),
+                                    lambda: get_mask(self.config))
 
         # read in the depth structure
-        try:
-            self.depthstr = DepthMap(self.config)
-        except:
-            self.depthstr = None
+        def _read_depthstr():
+            try:
+                return DepthMap(self.config)
+            except:
+                return None
+
+        self.depthstr = self._get_input(('depthstr', self.config.depthfile), _read_depthstr)
 
         if self.depthstr is None and not self.read_gals:
             raise RuntimeError("Must have a valid depthstr if read_gals is False")
@@ -205,44 +234,19 @@ class ClusterRunner(object):
                 refmag_low = -1000.0
                 refmag_high = 1000.0
 
-            if self.config.use_tempfiles_to_conserve_memory:
-                if self.cutgals_chisqmax:
-                    chisq_max = self.config.chisq_max
-                else:
-                    chisq_max = 1e100
-                self.gals = GalaxyCatalog.from_galfile(self.config.galfile,
-                                                       nside=self.config.d.nside,
-                                                       hpix=self.config.d.hpix,
-                                                       border=self.config.border,
-                                                       zredfile=zredfile,
-                                                       use_tempfile=True,
-                                                       refmag_range=[refmag_low, refmag_high],
-                                                       chisq_max=chisq_max,
-                                                       zspec=self.config.centering_use_zspec)
-
-                if zredfile is not None:
-                    self.did_read_zreds = True
+            if self.cutgals_chisqmax:
+                chisq_max = self.config.chisq_max
             else:
-                self.gals = GalaxyCatalog.from_galfile(self.config.galfile,
-                                                       nside=self.config.d.nside,
-                                                       hpix=self.config.d.hpix,
-                                                       border=self.config.border,
-                                                       zredfile=zredfile,
-                                                       zspec=self.config.centering_use_zspec)
-
-                # If the zredfile is not None and we didn't raise an exception,
-                # then we successfully read in the zreds
-                if zredfile is not None:
-                    self.did_read_zreds = True
+                chisq_max = 1e100
 
-                guse = ((self.gals.refmag > refmag_low) & (self.gals.refmag < refmag_high))
+            self.gals = self._read_galaxies(zredfile, [refmag_low, refmag_high], chisq_max)
 
-                if self.did_read_zreds and self.cutgals_chisqmax:
-                    guse &= (self.gals.chisq < self.config.chisq_max)
-                self.config.logger.info("Cutting %d of %d galaxies." % (guse.sum(), self.gals.size))
+            # If the zredfile is not None and we didn't raise an exception,
+            # then we successfully read in the zreds
+            if zredfile is not None:
+                self.did_read_zreds = True
 
-                # Cut the input galaxy file
-                self.gals = self.gals[guse]
+            self.config.logger.info("Read %d galaxies." % (self.gals.size))
 
             if len(self.gals) == 0:
                 self.config.logger.info("No good galaxies for %s in pixel %s" %
@@ -274,6 +278,95 @@ class ClusterRunner(object):
 
         return True
 
+    def _get_input(self, key, func):
+        """
+        Get an input (background, mask, etc), sharing it through
+        self.input_cache if set.
+
+        Parameters
+        ----------
+        key: `tuple`
+           Key describing the input in the cache
+        func: `function`
+           Function with no arguments to load the input
+
+        Returns
+        -------
+        value: `object`
+           The loaded (or cached) input
+        """
+        if self.input_cache is None:
+            return func()
+
+        if key not in self.input_cache:
+            self.input_cache[key] = func()
+
+        return self.input_cache[key]
+
+    def _read_galaxies(self, zredfile, refmag_range, chisq_max):
+        """
+        Read the galaxies for this run, sharing them through self.input_cache
+        if set.
+
+        The cuts are applied while reading (and pushed down to the reader
+        for a columnar galaxy store).  Shared galaxies are read without the
+        chisq cut, which is then applied for each runner.  If
+        self.shared_gals is set (with the same zredfile, if zreds are
+        required) the galaxies are cut from there instead of read.
+
+        Parameters
+        ----------
+        zredfile: `str`
+           Zred file to read, or None to not read zreds.
+        refmag_range: `list`
+           Refmag min, max to cut
+        chisq_max: `float`
+           Maximum chisq to cut (if reading zreds)
+
+        Returns
+        -------
+        gals: `redmapper.GalaxyCatalog`
+           Galaxy catalog
+        """
+        kwargs = dict(nside=self.config.d.nside,
+                      hpix=self.config.d.hpix,
+                      border=self.config.border,
+                      use_tempfile=self.config.use_tempfiles_to_conserve_memory,
+                      refmag_range=refmag_range,
+                      zspec=self.config.centering_use_zspec)
+
+        if self.shared_gals is not None and (zredfile is None or
+                                             self.shared_gals[0] == zredfile):
+            def _read(zredfile, chisq_max):
+                gals = self.shared_gals[1].cut_to_pixel(self.config.d.nside, self.config.d.hpix,
+                                                        border=self.config.border)
+                gals = gals._cut_on_read(refmag_range, chisq_max if zredfile is not None else None)
+                if gals is self.shared_gals[1]:
+                    # Never hand out the shared galaxies themselves
+                    gals = gals[np.arange(gals.size)]
+                return gals
+        else:
+            def _read(zredfile, chisq_max):
+                return GalaxyCatalog.from_galfile(self.config.galfile, zredfile=zredfile,
+                                                  chisq_max=chisq_max, **kwargs)
+
+        if self.input_cache is None:
+            return _read(zredfile, chisq_max)
+
+        key = ('gals', self.config.galfile, tuple(self.config.d.hpix), self.config.d.nside,
+               self.config.border, tuple(refmag_range), self.config.centering_use_zspec)
+
+        # Galaxies read with zreds may be used without them
+        if key not in self.input_cache or (zredfile is not None and
+                                           self.input_cache[key][0] != zredfile):
+            self.input_cache[key] = (zredfile, _read(zredfile, None))
+
+        gals = self.input_cache[key][1]
+        if zredfile is not None:
+            gals = gals._cut_on_read(None, chisq_max)
+
+        return gals
+
     def _more_setup(self, *args, **kwargs):
         """
         Additional setup for derived ClusterRunner classes.
@@ -340,6 +433,10 @@ class ClusterRunner(object):
             self.cat = None
             return
 
+        # The clusters are views into the catalog, so a columnar catalog
+        # (read lazily) is converted to a structured array.
+        self.cat.to_ndarray()
+
         # Match centers and galaxies if required
         if self.match_centers_to_galaxies:
             i0, i1, dist = self.gals.match_many(self.cat.ra, self.cat.dec, 1./3600.)
@@ -354,13 +451,16 @@ class ClusterRunner(object):
                 self.cat.zred_chisq = self.gals.zred_chisq[i1]
 
         # loop over clusters...
-        # at the moment, we are doing the matching once per cluster.
-        # if this proves too slow we can prematch bulk clusters as in the IDL code
+        # the neighbors are prematched in bulk blocks of clusters (as in the
+        # IDL code), unless neighbor_prematch_nclusters is 0.  The blocks are
+        # also limited by the expected number of matches (see
+        # _prematch_neighbors()).
 
         if self.do_percolation_masking or self.doublerun:
             self.pgal = np.zeros(self.gals.size, dtype=np.float32)
 
         self.members = None
+        members = CatalogBuilder()
 
         if self.doublerun:
             nruniter = 2
@@ -380,212 +480,500 @@ class ClusterRunner(object):
                     self.do_percolation_masking = True
                     self.record_members = True
 
-            cctr = 0
+            # The catalog may have been re-sorted; start a new prematch
+            self._prematch = None
+
+            if self.config.cluster_nthreads > 1 or self.config.cluster_seeded:
+                self._process_clusters_threaded(members)
+                continue
 
-            for cluster in self.cat:
-                cluster.maskgal_index = self.mask.select_maskgals_sample()
+            nprematch = self.config.neighbor_prematch_nclusters
+
+            for cctr, cluster in enumerate(self.cat):
+                if self.read_gals and nprematch > 0:
+                    if self._prematch is None or cctr >= self._prematch['end']:
+                        self._prematch_neighbors(cctr, cctr + nprematch)
+                    self._set_prematched_neighbors(cluster, cctr)
 
                 if ((cctr % 1000) == 0):
                     self.config.logger.info("%s: Working on cluster %d of %d" % (self.hpix_logstr, cctr, self.cat.size))
-                cctr += 1
 
-                # Note that the cluster is set with .z if available! (which becomes .redshift)
-                if self.use_maxmag_in_matching:
-                    maxmag = cluster.mstar - 2.5*np.log10(self.limlum)
-                else:
-                    maxmag = None
+                if self._run_cluster(cluster):
+                    self._commit_cluster(cluster, members)
+
+        self._prematch = None
+
+        # Concatenate the members once
+        self.members = members.to_catalog()
 
-                if self.read_gals:
-                    cluster.find_neighbors(self.maxrad, self.gals, megaparsec=True, maxmag=maxmag)
+        self._postprocess()
+        self._cleanup()
 
-                    if cluster.neighbors.size == 0:
-                        self._reset_bad_values(cluster)
-                        continue
+    def _run_cluster(self, cluster):
+        """
+        Run all the computations for a single cluster, short of recording
+        percolation and members (see _commit_cluster()).
 
-                    if self.do_percolation_masking:
-                        cluster.neighbors.pfree[:] = 1.0 - self.pgal[cluster.neighbors.index]
-                    else:
-                        cluster.neighbors.pfree[:] = 1.0
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to process
 
-                # FIXME: add mean ebv computation here.
+        Returns
+        -------
+        good: `bool`
+           True if the cluster is good and should be committed.
+        """
+        cluster.maskgal_index = self.mask.select_maskgals_sample()
 
-                if self.depthstr is None:
-                    # must approximate the limiting magnitude
+        # Note that the cluster is set with .z if available! (which becomes .redshift)
+        if self.use_maxmag_in_matching:
+            maxmag = cluster.mstar - 2.5*np.log10(self.limlum)
+        else:
+            maxmag = None
 
-                    self.depthlim.calc_maskdepth(self.mask.maskgals,
-                                                 cluster.neighbors.refmag, cluster.neighbors.refmag_err)
-                else:
-                    # get from the depth structure
-                    self.depthstr.calc_maskdepth(self.mask.maskgals,
-                                                 cluster.ra, cluster.dec, cluster.mpc_scale)
+        if self.read_gals:
+            cluster.find_neighbors(self.maxrad, self.gals, megaparsec=True, maxmag=maxmag)
 
-                cluster.lim_exptime = np.median(self.mask.maskgals.exptime)
-                cluster.lim_limmag = np.median(self.mask.maskgals.limmag)
-                cluster.lim_limmag_hard = self.config.limmag_catalog
+            if cluster.neighbors.size == 0:
+                self._reset_bad_values(cluster)
+                return False
 
-                # And survey masking (this may be a dummy)
-                self.mask.set_radmask(cluster)
+            if self.do_percolation_masking:
+                cluster.neighbors.pfree[:] = 1.0 - self.pgal[cluster.neighbors.index]
+            else:
+                cluster.neighbors.pfree[:] = 1.0
 
-                # And compute maskfrac here...approximate first computation
-                inside, = np.where(self.mask.maskgals.r < 1.0)
-                bad, = np.where(self.mask.maskgals.mark[inside] == 0)
-                cluster.maskfrac = float(bad.size) / float(inside.size)
+        # FIXME: add mean ebv computation here.
 
-                if cluster.maskfrac == 1.0 or cluster.lim_limmag <= 1.0:
-                    # This is a very bad cluster, and should not be used
-                    bad_cluster = True
-                else:
-                    # Do the cluster processing
-                    bad_cluster = self._process_cluster(cluster)
-
-                if bad_cluster:
-                    # This is a bad cluster and we can't continue
-                    self._reset_bad_values(cluster)
-                    continue
-
-                if self.read_gals:
-                    if self.config.bkg_local_compute and not self.config.bkg_local_use:
-                        if self.depthstr is None:
-                            depth = self.depthlim
-                        else:
-                            depth = self.depthstr
-                        cluster.bkg_local = cluster.compute_bkg_local(self.mask, depth)
-
-                if self.do_correct_zlambda and self.zlambda_corr is not None and self.read_gals:
-                    if self.do_pz:
-                        zlam, zlam_e, pzbins, pzvals = self.zlambda_corr.apply_correction(cluster.Lambda,
-                                                                                          cluster.z_lambda,
-                                                                                          cluster.z_lambda_e,
-                                                                                          pzbins=cluster.pzbins,
-                                                                                          pzvals=cluster.pz)
-                        cluster.pzbins = pzbins
-                        cluster.pzvals = pzvals
-                    else:
-                        zlam, zlam_e = self.zlambda_corr.apply_correction(cluster.Lambda,
-                                                                          cluster.z_lambda,
-                                                                          cluster.z_lambda_e)
-                    cluster.z_lambda = zlam
-                    cluster.z_lambda_e = zlam_e
-
-                # compute updated maskfrac (always)
-                inside, = np.where(self.mask.maskgals.r < cluster.r_lambda)
-                bad, = np.where(self.mask.maskgals.mark[inside] == 0)
-                if inside.size == 0:
-                    cluster.maskfrac = 1.0
+        if self.depthstr is None:
+            # must approximate the limiting magnitude
+
+            self.depthlim.calc_maskdepth(self.mask.maskgals,
+                                         cluster.neighbors.refmag, cluster.neighbors.refmag_err)
+        else:
+            # get from the depth structure
+            self.depthstr.calc_maskdepth(self.mask.maskgals,
+                                         cluster.ra, cluster.dec, cluster.mpc_scale)
+
+        cluster.lim_exptime = np.median(self.mask.maskgals.exptime)
+        cluster.lim_limmag = np.median(self.mask.maskgals.limmag)
+        cluster.lim_limmag_hard = self.config.limmag_catalog
+
+        # And survey masking (this may be a dummy)
+        self.mask.set_radmask(cluster)
+
+        # And compute maskfrac here...approximate first computation
+        inside, = np.where(self.mask.maskgals.r < 1.0)
+        bad, = np.where(self.mask.maskgals.mark[inside] == 0)
+        cluster.maskfrac = float(bad.size) / float(inside.size)
+
+        if cluster.maskfrac == 1.0 or cluster.lim_limmag <= 1.0:
+            # This is a very bad cluster, and should not be used
+            bad_cluster = True
+        else:
+            # Do the cluster processing
+            bad_cluster = self._process_cluster(cluster)
+
+        if bad_cluster:
+            # This is a bad cluster and we can't continue
+            self._reset_bad_values(cluster)
+            return False
+
+        if self.read_gals:
+            if self.config.bkg_local_compute and not self.config.bkg_local_use:
+                if self.depthstr is None:
+                    depth = self.depthlim
                 else:
-                    cluster.maskfrac = float(bad.size) / float(inside.size)
-
-                # compute additional dlambda bits (if desired)
-                if self.do_lam_plusminus and self.read_gals:
-                    cluster_temp = cluster.copy()
-
-                    cluster_temp.redshift = cluster.z_lambda - self.config.zlambda_epsilon
-                    lam_zmeps = cluster_temp.calc_richness(self.mask)
-                    elambda_zmeps = cluster_temp.lambda_e
-                    cluster_temp.redshift = cluster.z_lambda + self.config.zlambda_epsilon
-                    lam_zpeps = cluster_temp.calc_richness(self.mask)
-                    elambda_zpeps = cluster_temp.lambda_e
-
-                    if (lam_zmeps > 0 and lam_zpeps > 0):
-                        # Only compute if these are valid
-                        # During training, when we use the seed redshifts,
-                        #  we could fall out of the good range for a cluster
-                        cluster.dlambda_dz = (np.log(lam_zpeps) - np.log(lam_zmeps)) / (2. * self.config.zlambda_epsilon)
-                        cluster.dlambda_dz2 = (np.log(lam_zpeps) + np.log(lam_zmeps) - 2.*np.log(cluster.Lambda)) / (self.config.zlambda_epsilon**2.)
-
-                        cluster.dlambdavar_dz = (elambda_zpeps**2. - elambda_zmeps**2.) / (2.*self.config.zlambda_epsilon)
-                        cluster.dlambdavar_dz2 = (elambda_zpeps**2. + elambda_zmeps**2. - 2.*cluster.Lambda_e**2.) / (self.config.zlambda_epsilon**2.)
-
-                # and record pfree if desired
-                if self.do_percolation_masking and self.read_gals:
-                    # FIXME
-                    r_mask = (self.rmask_0 * (cluster.Lambda/100.)**self.rmask_beta *
-                              ((1. + cluster.redshift)/(1. + self.rmask_zpivot))**self.rmask_gamma)
-                    if (r_mask < cluster.r_lambda):
-                        r_mask = cluster.r_lambda
-                    cluster.r_mask = r_mask
-
-                    lim = cluster.mstar - 2.5*np.log10(self.percolation_lmask)
-
-                    u, = np.where((cluster.neighbors.refmag < lim) &
-                                  (cluster.neighbors.r < r_mask) &
-                                  (cluster.neighbors.p > 0.0))
-                    if (u.size > 0):
-                        self.pgal[cluster.neighbors.index[u]] += cluster.neighbors.p[u]
-
-                # and save members
-                # Note that this is probably horribly inefficient for memory
-                #  usage right now, but will start here and fix later if it
-                #  is a problem.
-
-                if self.read_gals:
-                    pfree_temp = cluster.neighbors.pfree[:]
-
-                if (self.use_memradius or self.use_memlum) and self.read_gals:
-                    ok = (cluster.neighbors.p > 0.01)
-
-                    if self.use_memradius:
-                        ok &= (cluster.neighbors.r < self.config.percolation_memradius * cluster.r_lambda)
-                    if self.use_memlum:
-                        ok &= (cluster.neighbors.refmag < (cluster.mstar - 2.5*np.log10(self.config.percolation_memlum)))
-
-                    # And set pfree_temp to zero when it is not okay
-                    pfree_temp[~ok] = 0.0
-                elif self.read_gals:
-                    # Only save members where pmem > 0.01 (for space)
-                    ok = (cluster.neighbors.pmem > 0.01)
-                    pfree_temp[~ok] = 0.0
-
-                if self.record_members and self.read_gals:
-                    pfree_temp = cluster.neighbors.pfree[:]
-
-                    if self.use_memradius or self.use_memlum:
-                        ok = (cluster.neighbors.p > 0.01)
-
-                        if self.use_memradius:
-                            ok &= (cluster.neighbors.r < self.config.percolation_memradius * cluster.r_lambda)
-                        if self.use_memlum:
-                            ok &= (cluster.neighbors.refmag < (cluster.mstar - 2.5*np.log10(self.config.percolation_memlum)))
-
-                        # And set pfree_temp to zero when it is not okay
-                        pfree_temp[~ok] = 0.0
-                    else:
-                        # Only save members where pmem > 0.01 (for space)
-                        ok = (cluster.neighbors.pmem > 0.01)
-                        pfree_temp[~ok] = 0.0
-
-                    memuse, = np.where((pfree_temp > 0.01) | (cluster.neighbors.centering_cand == 1))
-                    mem_temp = Catalog.zeros(memuse.size, dtype=self.config.member_dtype)
-
-                    mem_temp.mem_match_id[:] = cluster.mem_match_id
-                    mem_temp.id[:] = cluster.neighbors.id[memuse]
-                    mem_temp.z[:] = cluster.redshift
-                    mem_temp.ra[:] = cluster.neighbors.ra[memuse]
-                    mem_temp.dec[:] = cluster.neighbors.dec[memuse]
-                    mem_temp.r[:] = cluster.neighbors.r[memuse]
-                    mem_temp.p[:] = cluster.neighbors.p[memuse]
-                    mem_temp.pfree[:] = pfree_temp[memuse]
-                    mem_temp.pcol[:] = cluster.neighbors.pcol[memuse]
-                    mem_temp.theta_i[:] = cluster.neighbors.theta_i[memuse]
-                    mem_temp.theta_r[:] = cluster.neighbors.theta_r[memuse]
-                    mem_temp.refmag[:] = cluster.neighbors.refmag[memuse]
-                    mem_temp.refmag_err[:] = cluster.neighbors.refmag_err[memuse]
-                    if (self.did_read_zreds):
-                        mem_temp.zred[:] = cluster.neighbors.zred[memuse]
-                        mem_temp.zred_e[:] = cluster.neighbors.zred_e[memuse]
-                    mem_temp.chisq[:] = cluster.neighbors.chisq[memuse]
-                    mem_temp.ebv[:] = cluster.neighbors.ebv[memuse]
-                    mem_temp.mag[:, :] = cluster.neighbors.mag[memuse, :]
-                    mem_temp.mag_err[:, :] = cluster.neighbors.mag_err[memuse, :]
-
-                    # Worried this is going to be slow...
-                    if self.members is None:
-                        self.members = mem_temp
-                    else:
-                        self.members.append(mem_temp)
+                    depth = self.depthstr
+                cluster.bkg_local = cluster.compute_bkg_local(self.mask, depth)
+
+        if self.do_correct_zlambda and self.zlambda_corr is not None and self.read_gals:
+            if self.do_pz:
+                zlam, zlam_e, pzbins, pzvals = self.zlambda_corr.apply_correction(cluster.Lambda,
+                                                                                  cluster.z_lambda,
+                                                                                  cluster.z_lambda_e,
+                                                                                  pzbins=cluster.pzbins,
+                                                                                  pzvals=cluster.pz)
+                cluster.pzbins = pzbins
+                cluster.pzvals = pzvals
+            else:
+                zlam, zlam_e = self.zlambda_corr.apply_correction(cluster.Lambda,
+                                                                  cluster.z_lambda,
+                                                                  cluster.z_lambda_e)
+            cluster.z_lambda = zlam
+            cluster.z_lambda_e = zlam_e
+
+        # compute updated maskfrac (always)
+        inside, = np.where(self.mask.maskgals.r < cluster.r_lambda)
+        bad, = np.where(self.mask.maskgals.mark[inside] == 0)
+        if inside.size == 0:
+            cluster.maskfrac = 1.0
+        else:
+            cluster.maskfrac = float(bad.size) / float(inside.size)
 
-        self._postprocess()
-        self._cleanup()
+        # compute additional dlambda bits (if desired)
+        if self.do_lam_plusminus and self.read_gals:
+            cluster_temp = cluster.copy()
+
+            # Solve for the richness at z_lambda -/+ epsilon together
+            lams, elambdas = cluster_temp.calc_richness_redshifts(self.mask,
+                                                                  [cluster.z_lambda - self.config.zlambda_epsilon,
+                                                                   cluster.z_lambda + self.config.zlambda_epsilon])
+            lam_zmeps, lam_zpeps = lams
+            elambda_zmeps, elambda_zpeps = elambdas
+
+            if (lam_zmeps > 0 and lam_zpeps > 0):
+                # Only compute if these are valid
+                # During training, when we use the seed redshifts,
+                #  we could fall out of the good range for a cluster
+                cluster.dlambda_dz = (np.log(lam_zpeps) - np.log(lam_zmeps)) / (2. * self.config.zlambda_epsilon)
+                cluster.dlambda_dz2 = (np.log(lam_zpeps) + np.log(lam_zmeps) - 2.*np.log(cluster.Lambda)) / (self.config.zlambda_epsilon**2.)
+
+                cluster.dlambdavar_dz = (elambda_zpeps**2. - elambda_zmeps**2.) / (2.*self.config.zlambda_epsilon)
+                cluster.dlambdavar_dz2 = (elambda_zpeps**2. + elambda_zmeps**2. - 2.*cluster.Lambda_e**2.) / (self.config.zlambda_epsilon**2.)
+
+        return True
+
+    def _commit_cluster(self, cluster, members):
+        """
+        Record the percolation masking and members for a processed cluster.
+
+        This must be called serially in catalog order.
+
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to commit
+        members: `redmapper.CatalogBuilder`
+           Builder to accumulate members
+        """
+        # and record pfree if desired
+        if self.do_percolation_masking and self.read_gals:
+            # FIXME
+            r_mask = (self.rmask_0 * (cluster.Lambda/100.)**self.rmask_beta *
+                      ((1. + cluster.redshift)/(1. + self.rmask_zpivot))**self.rmask_gamma)
+            if (r_mask < cluster.r_lambda):
+                r_mask = cluster.r_lambda
+            cluster.r_mask = r_mask
+
+            lim = cluster.mstar - 2.5*np.log10(self.percolation_lmask)
+
+            u, = np.where((cluster.neighbors.refmag < lim) &
+                          (cluster.neighbors.r < r_mask) &
+                          (cluster.neighbors.p > 0.0))
+            if (u.size > 0):
+                self.pgal[cluster.neighbors.index[u]] += cluster.neighbors.p[u]
+
+        # and save members
+        # Note that this is probably horribly inefficient for memory
+        #  usage right now, but will start here and fix later if it
+        #  is a problem.
+
+        if self.read_gals:
+            pfree_temp = cluster.neighbors.pfree[:]
+
+        if (self.use_memradius or self.use_memlum) and self.read_gals:
+            ok = (cluster.neighbors.p > 0.01)
+
+            if self.use_memradius:
+                ok &= (cluster.neighbors.r < self.config.percolation_memradius * cluster.r_lambda)
+            if self.use_memlum:
+                ok &= (cluster.neighbors.refmag < (cluster.mstar - 2.5*np.log10(self.config.percolation_memlum)))
+
+            # And set pfree_temp to zero when it is not okay
+            pfree_temp[~ok] = 0.0
+        elif self.read_gals:
+            # Only save members where pmem > 0.01 (for space)
+            ok = (cluster.neighbors.pmem > 0.01)
+            pfree_temp[~ok] = 0.0
+
+        if self.record_members and self.read_gals:
+            pfree_temp = cluster.neighbors.pfree[:]
+
+            if self.use_memradius or self.use_memlum:
+                ok = (cluster.neighbors.p > 0.01)
+
+                if self.use_memradius:
+                    ok &= (cluster.neighbors.r < self.config.percolation_memradius * cluster.r_lambda)
+                if self.use_memlum:
+                    ok &= (cluster.neighbors.refmag < (cluster.mstar - 2.5*np.log10(self.config.percolation_memlum)))
+
+                # And set pfree_temp to zero when it is not okay
+                pfree_temp[~ok] = 0.0
+            else:
+                # Only save members where pmem > 0.01 (for space)
+                ok = (cluster.neighbors.pmem > 0.01)
+                pfree_temp[~ok] = 0.0
+
+            memuse, = np.where((pfree_temp > 0.01) | (cluster.neighbors.centering_cand == 1))
+            mem_temp = Catalog.zeros(memuse.size, dtype=self.config.member_dtype)
+
+            mem_temp.mem_match_id[:] = cluster.mem_match_id
+            mem_temp.id[:] = cluster.neighbors.id[memuse]
+            mem_temp.z[:] = cluster.redshift
+            mem_temp.ra[:] = cluster.neighbors.ra[memuse]
+            mem_temp.dec[:] = cluster.neighbors.dec[memuse]
+            mem_temp.r[:] = cluster.neighbors.r[memuse]
+            mem_temp.p[:] = cluster.neighbors.p[memuse]
+            mem_temp.pfree[:] = pfree_temp[memuse]
+            mem_temp.pcol[:] = cluster.neighbors.pcol[memuse]
+            mem_temp.theta_i[:] = cluster.neighbors.theta_i[memuse]
+            mem_temp.theta_r[:] = cluster.neighbors.theta_r[memuse]
+            mem_temp.refmag[:] = cluster.neighbors.refmag[memuse]
+            mem_temp.refmag_err[:] = cluster.neighbors.refmag_err[memuse]
+            if (self.did_read_zreds):
+                mem_temp.zred[:] = cluster.neighbors.zred[memuse]
+                mem_temp.zred_e[:] = cluster.neighbors.zred_e[memuse]
+            mem_temp.chisq[:] = cluster.neighbors.chisq[memuse]
+            mem_temp.ebv[:] = cluster.neighbors.ebv[memuse]
+            mem_temp.mag[:, :] = cluster.neighbors.mag[memuse, :]
+            mem_temp.mag_err[:, :] = cluster.neighbors.mag_err[memuse, :]
+
+            members.append(mem_temp)
+
+    def _process_clusters_threaded(self, members):
+        """
+        Process all the clusters with a pool of threads.
+
+        Clusters are run in parallel threads which share the galaxy catalog
+        and lookup tables, each with its own copy of the mask maskgals.  The
+        results are committed serially in catalog order.  Each cluster uses
+        its own random number generator, seeded in catalog order, so the
+        results do not depend on the number of threads or their scheduling.
+        This is also used with a single thread if config.cluster_seeded is
+        set, to get the same results as with multiple threads.
+
+        When percolating, a cluster is only started once all earlier clusters
+        with overlapping candidate neighbors have been committed.  As a
+        safeguard, if pgal for any of its neighbors has been updated after it
+        started, the cluster is rerun with the current values at commit time.
+
+        Parameters
+        ----------
+        members: `redmapper.CatalogBuilder`
+           Builder to accumulate members
+        """
+        nthreads = self.config.cluster_nthreads
+        nprematch = self.config.neighbor_prematch_nclusters
+
+        seeds = np.random.randint(0, 2**31 - 1, size=self.cat.size)
+
+        local = threading.local()
+
+        def _get_runner():
+            runner = getattr(local, 'runner', None)
+            if runner is None:
+                # Shallow copy of the runner with a private mask
+                runner = copy.copy(self)
+                runner.mask = self.mask.thread_copy()
+                local.runner = runner
+            return runner
+
+        def _worker(cluster, seed):
+            return _get_runner()._run_cluster_seeded(cluster, seed)
+
+        pending = collections.deque()
+
+        # When percolating, count the uncommitted clusters that may touch
+        # each galaxy, to avoid starting clusters that will need a rerun.
+        if self.do_percolation_masking and self.read_gals:
+            inflight = np.zeros(self.gals.size, dtype=np.int32)
+        else:
+            inflight = None
+
+        def _commit_next():
+            index, cluster, row, prematch, future = pending.popleft()
+            good = future.result()
+
+            if inflight is not None and prematch is not None:
+                inflight[prematch[1]] -= 1
+
+            if self.do_percolation_masking and cluster.neighbors is not None:
+                pfree = np.zeros_like(cluster.neighbors.pfree)
+                pfree[:] = 1.0 - self.pgal[cluster.neighbors.index]
+                if not np.array_equal(pfree, cluster.neighbors.pfree):
+                    # pgal was updated after this cluster started; rerun
+                    self.cat._ndarray[index] = row
+                    cluster = self.cat[index]
+                    if prematch is not None:
+                        cluster.set_prematched_neighbors(self.gals, *prematch)
+                    good = _get_runner()._run_cluster_seeded(cluster, seeds[index])
+
+            if good:
+                self._commit_cluster(cluster, members)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nthreads) as executor:
+            for cctr in range(self.cat.size):
+                cluster = self.cat[cctr]
+
+                prematch = None
+                if self.read_gals and nprematch > 0:
+                    if self._prematch is None or cctr >= self._prematch['end']:
+                        self._prematch_neighbors(cctr, cctr + nprematch)
+                    prematch = self._get_prematched_neighbors(cctr)
+                    cluster.set_prematched_neighbors(self.gals, *prematch)
+
+                if ((cctr % 1000) == 0):
+                    self.config.logger.info("%s: Working on cluster %d of %d" % (self.hpix_logstr, cctr, self.cat.size))
+
+                if inflight is not None and prematch is not None:
+                    if np.any(inflight[prematch[1]] > 0):
+                        # This overlaps an uncommitted cluster; wait for it.
+                        while len(pending) > 0:
+                            _commit_next()
+                    inflight[prematch[1]] += 1
+
+                row = self.cat._ndarray[cctr].copy() if self.do_percolation_masking else None
+
+                pending.append((cctr, cluster, row, prematch,
+                                executor.submit(_worker, cluster, seeds[cctr])))
+
+                while len(pending) >= 4*nthreads:
+                    _commit_next()
+
+            while len(pending) > 0:
+                _commit_next()
+
+    def _run_cluster_seeded(self, cluster, seed):
+        """
+        Run a cluster with a given random seed for the current thread.
+
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to process
+        seed: `int`
+           Random seed
+
+        Returns
+        -------
+        good: `bool`
+           True if the cluster is good and should be committed.
+        """
+        set_thread_rng(np.random.RandomState(seed=seed))
+        try:
+            return self._run_cluster(cluster)
+        finally:
+            set_thread_rng(None)
+
+    def _prematch_radius(self):
+        """
+        Get the maximum neighbor radius (Mpc) that will be requested for each
+        cluster, for the bulk neighbor prematch.
+
+        This may be overridden in derived classes.
+
+        Returns
+        -------
+        radius: `float`
+           Maximum matching radius (Mpc)
+        """
+        return self.maxrad
+
+    def _galaxy_density(self):
+        """
+        Estimate the mean surface density of the galaxies, for sizing the
+        bulk neighbor prematch blocks.
+
+        Returns
+        -------
+        density: `float`
+           Number of galaxies per square degree in the occupied area
+        """
+        if self._prematch_density is None:
+            # The occupied area is estimated from fine healpix pixels; empty
+            # pixels within the footprint make this an overestimate.
+            nside = 256
+            hpix = hpg.angle_to_pixel(nside, self.gals.ra, self.gals.dec)
+            area = np.unique(hpix).size * hpg.nside_to_pixel_area(nside, degrees=True)
+            self._prematch_density = self.gals.size / max(area, hpg.nside_to_pixel_area(nside, degrees=True))
+
+        return self._prematch_density
+
+    def _prematch_neighbors(self, start, end):
+        """
+        Match neighbors for a block of clusters in one pass.
+
+        The matches are stored in compressed (CSR) form in self._prematch,
+        such that each cluster's candidate neighbors are a slice.  The block
+        is shortened so that the expected number of matches (from the mean
+        galaxy density and the match radii) is no more than
+        config.neighbor_prematch_maxmatch, with at least one cluster per
+        block.  The end of the block is recorded in self._prematch['end'].
+
+        Parameters
+        ----------
+        start: `int`
+           Index of first cluster in the block
+        end: `int`
+           Index of the maximum end of the block (exclusive)
+        """
+        end = min(end, self.cat.size)
+
+        # Compute the radii in degrees as is done in Cluster, with a small
+        # cushion so that rounding cannot shrink the neighbor list.
+        z = np.clip(self.cat.z[start: end], 0.01, None)
+        mpc_scale = np.radians(1.) * self.cosmo.Da(0, z)
+        radius = 1.001 * self._prematch_radius() / mpc_scale
+
+        # Low redshift clusters (and large radii) can match a large fraction
+        # of the galaxies, so limit the expected matches in the block.
+        nexpected = np.cumsum(self._galaxy_density() * np.pi * radius**2.)
+        nblock = max(np.searchsorted(nexpected, self.config.neighbor_prematch_maxmatch,
+                                     side='right'), 1)
+        end = start + nblock
+        radius = radius[: nblock]
+
+        offsets, indices, dists = self.gals.match_many_grouped(self.cat.ra[start: end],
+                                                               self.cat.dec[start: end],
+                                                               radius)
+
+        self._prematch = {'start': start,
+                          'end': end,
+                          'radius': radius,
+                          'offsets': offsets,
+                          'indices': indices,
+                          'dists': dists}
+
+    def _set_prematched_neighbors(self, cluster, index):
+        """
+        Set the prematched neighbor candidates for a cluster.
+
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to set candidate neighbors
+        index: `int`
+           Index of the cluster in self.cat
+        """
+        cluster.set_prematched_neighbors(self.gals, *self._get_prematched_neighbors(index))
+
+    def _get_prematched_neighbors(self, index):
+        """
+        Get the prematched neighbor candidates for a cluster.
+
+        Parameters
+        ----------
+        index: `int`
+           Index of the cluster in self.cat
+
+        Returns
+        -------
+        radius: `float`
+           Matching radius (degrees)
+        indices: `np.array`
+           Integer array of candidate galaxy indices
+        dists: `np.array`
+           Float array of candidate distances (degrees)
+        """
+        i = index - self._prematch['start']
+        i0 = self._prematch['offsets'][i]
+        i1 = self._prematch['offsets'][i + 1]
+
+        return (self._prematch['radius'][i],
+                self._prematch['indices'][i0: i1],
+                self._prematch['dists'][i0: i1])
 
     def _postprocess(self):
         """
@@ -202,12 +202,17 @@ class Configuration(object):
     calib_nproc = ConfigField(default=1, required=True)
     calib_run_nproc = ConfigField(default=1, required=True)
     calib_run_min_nside = ConfigField(default=1, required=True)
+    calib_run_staged = ConfigField(default=False, required=False)
+    calib_run_staged_checkpoint = ConfigField(default=True, required=False)
+    calib_run_shared_galaxies = ConfigField(default=False, required=False)
+    calib_run_runtimefile = ConfigField()
 
     runcat_percolation_masking = ConfigField(default=True, required=False)
 
     outpath = ConfigField(default='./', required=True)
     plotpath = ConfigField(default='', required=True)
     logpath = ConfigField(default='logs', required=True)
+    redsequence_cachedir = ConfigField()
 
     border = ConfigField(default=0.0, required=True)
     hpix = ConfigField(default=[], required=True, isArray=True)
@@ -256,6 +261,8 @@ class Configuration(object):
     npzbins = ConfigField(default=21, required=True)
 
     zred_nsamp = ConfigField(default=4, required=True)
+    zred_block_size = ConfigField(default=1000, required=True)
+    zred_use_shared_memory = ConfigField(default=False, required=True)
 
     mstar_survey = ConfigField(default='sdss')
     mstar_band = ConfigField(default='i03')
@@ -311,12 +318,18 @@ class Configuration(object):
     bkg_zbinsize = ConfigField(default=0.02)
     bkg_zredbinsize = ConfigField(default=0.01)
     bkg_deepmode = ConfigField(default=False)
+    bkg_pixel_partition = ConfigField(default=False)
     calib_make_full_bkg = ConfigField(default=True)
     bkg_local_annuli = ConfigField(isArray=True, array_length=2,
                                    default=np.array([2.0, 3.0]))
     bkg_local_compute = ConfigField(default=False)
     bkg_local_use = ConfigField(default=False)
 
+    neighbor_prematch_nclusters = ConfigField(default=1000, required=True)
+    neighbor_prematch_maxmatch = ConfigField(default=5000000, required=True)
+    cluster_nthreads = ConfigField(default=1, required=True)
+    cluster_seeded = ConfigField(default=False, required=False)
+
     zlambda_pivot = ConfigField(default=30.0, required=True)
     zlambda_binsize = ConfigField(default=0.002, required=True)
     zlambda_maxiter = ConfigField(default=20, required=True)
@@ -347,6 +360,8 @@ class Configuration(object):
     phi1_mmstar_slope = ConfigField(required=False, default=-9999.0)
     phi1_msig_m = ConfigField(required=False, default=-9999.0)
     phi1_msig_slope = ConfigField(required=False, default=-9999.0)
+    wcen_mc_seed = ConfigField(required=False)
+    wcen_mc_ntrial_chunk = ConfigField(required=False, default=1000)
 
     firstpass_r0 = ConfigField(default=0.5, required=True)
     firstpass_beta = ConfigField(default=0.0, required=True)
@@ -377,6 +392,7 @@ class Configuration(object):
     zscan_beta = ConfigField(default=0.0, required=True)
     zscan_zstep = ConfigField(default=0.005, required=True)
     zscan_minlambda = ConfigField(default=3.0, required=True)
+    zscan_batch = ConfigField(default=True, required=True)
 
     vlim_lstar = ConfigField(default=0.2, required=False)
     vlim_depthfiles = ConfigField(default=[], required=False, isList=True)
@@ -385,6 +401,7 @@ class Configuration(object):
 
     consolidate_lambda_cuts = ConfigField(default=[5.0, 20.0], required=False, isArray=True)
     consolidate_vlim_lstars = ConfigField(default=[0.2, 5.0], required=False, isList=True)
+    consolidate_nproc = ConfigField(default=1, required=False)
     select_scaleval = ConfigField(default=False, required=True)
 
     redmagic_calib_nodesize = ConfigField(default=0.05, required=True)
@@ -405,6 +422,7 @@ class Configuration(object):
     redmagic_zmaxes = ConfigField(default=[], required=True, isArray=True)
     redmagic_constchis = ConfigField(default=[], required=True, isArray=True)
     redmagic_use_constchi = ConfigField(default=False, required=True)
+    redmagic_run_nproc = ConfigField(default=1, required=False)
 
     def __init__(self, configfile, outpath=None):
         """
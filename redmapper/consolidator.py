@@ -0,0 +1,228 @@
+"""Classes to consolidate pixel run outputs by streaming.
+"""
+import os
+import collections
+import concurrent.futures
+import numpy as np
+import fitsio
+import esutil
+
+
+class CatalogConsolidator(object):
+    """
+    Class to consolidate pixel cluster catalogs and members by streaming.
+
+    Each pixel is read (optionally in parallel threads ahead of use), cut,
+    given temporary unique mem_match_ids, and appended to the output files.
+    Only the ids and sort values of the clusters are kept in memory, and at
+    the end the mem_match_ids in the output files are replaced with the rank
+    of the sort value (e.g. likelihood).
+    """
+
+    def __init__(self, nproc=1):
+        """
+        Instantiate a CatalogConsolidator.
+
+        Parameters
+        ----------
+        nproc: `int`, optional
+           Number of threads for reading pixel files.  Default is 1.
+        """
+        self.nproc = nproc
+
+        self.ncluster = 0
+        self._sort_values = []
+        self._files = collections.OrderedDict()
+
+    def read(self, filenames, read_func):
+        """
+        Read a list of pixel files, in order.
+
+        With nproc > 1 the files are read ahead in parallel threads.
+
+        Parameters
+        ----------
+        filenames: `list`
+           List of filenames to read
+        read_func: `function`
+           Function that reads one filename
+
+        Yields
+        ------
+        filename: `str`
+           Filename that was read
+        value: `object`
+           Return value of read_func(filename)
+        """
+        if self.nproc <= 1:
+            for filename in filenames:
+                yield filename, read_func(filename)
+            return
+
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.nproc) as executor:
+            for filename in filenames:
+                pending.append((filename, executor.submit(read_func, filename)))
+                if len(pending) > 2*self.nproc:
+                    filename0, future = pending.popleft()
+                    yield filename0, future.result()
+
+            while len(pending) > 0:
+                filename0, future = pending.popleft()
+                yield filename0, future.result()
+
+    def select(self, cat, use, mem=None, sort_value=None):
+        """
+        Select clusters from a pixel and give them temporary unique
+        mem_match_ids, and cut the members to those clusters.
+
+        Parameters
+        ----------
+        cat: `redmapper.Catalog`
+           Pixel cluster catalog
+        use: `np.array`
+           Integer array of indices of clusters to keep
+        mem: `redmapper.Catalog`, optional
+           Pixel member catalog.  Default is None.
+        sort_value: `str`, optional
+           Name of the field for the final ranking of the clusters (in
+           decreasing order).  Default is None (do not renumber at the end).
+
+        Returns
+        -------
+        cat: `redmapper.Catalog`
+           Selected cluster catalog
+        mem: `redmapper.Catalog`
+           Selected member catalog (or None)
+        """
+        cat = cat[use]
+
+        new_ids = np.arange(use.size, dtype=np.int32) + self.ncluster + 1
+
+        if mem is not None:
+            a, b = esutil.numpy_util.match(cat.mem_match_id, mem.mem_match_id)
+            cat.mem_match_id = new_ids
+            mem.mem_match_id[b] = cat.mem_match_id[a]
+
+            # and we only want to store the members that matched!
+            mem = mem[b]
+        else:
+            cat.mem_match_id = new_ids
+
+        self.ncluster += use.size
+
+        if sort_value is not None:
+            self._sort_values.append(np.atleast_1d(getattr(cat, sort_value)).copy())
+
+        return cat, mem
+
+    def write(self, catfile, cat, memfile=None, mem=None, cat_indices=None, mem_indices=None):
+        """
+        Write (or append) clusters and members to output files.
+
+        The first write to a file clobbers it.
+
+        Parameters
+        ----------
+        catfile: `str`
+           Output cluster catalog filename
+        cat: `redmapper.Catalog`
+           Cluster catalog
+        memfile: `str`, optional
+           Output member filename.  Default is None.
+        mem: `redmapper.Catalog`, optional
+           Member catalog.  Default is None.
+        cat_indices: `np.array`, optional
+           Indices of clusters to write.  Default is None (all).
+        mem_indices: `np.array`, optional
+           Indices of members to write.  Default is None (all).
+        """
+        self._write(catfile, cat, cat_indices)
+        if memfile is not None:
+            self._write(memfile, mem, mem_indices)
+
+    def _write(self, filename, cat, indices):
+        """
+        Write (or append) a catalog to an output file.
+
+        Parameters
+        ----------
+        filename: `str`
+           Output filename
+        cat: `redmapper.Catalog`
+           Catalog to write
+        indices: `np.array`
+           Indices of rows to write (or None for all)
+        """
+        if indices is not None:
+            # Only the selected rows are converted (and read, if lazy)
+            cat = cat[indices]
+        array = np.atleast_1d(cat._as_ndarray())
+
+        if filename not in self._files:
+            self._files[filename] = fitsio.FITS(filename, mode='rw', clobber=True)
+            self._files[filename].write(array)
+        else:
+            self._files[filename][1].append(array)
+
+    def close(self):
+        """
+        Close all the output files.
+        """
+        for fits in self._files.values():
+            fits.close()
+
+    def filenames(self):
+        """
+        Get the list of output filenames that have been written.
+
+        Returns
+        -------
+        filenames: `list`
+           List of output filenames
+        """
+        return list(self._files.keys())
+
+    def renumber(self, catfiles, memfiles=[], sort_rows=False):
+        """
+        Replace the temporary mem_match_ids in the output files with the
+        rank of the sort value (in decreasing order), starting at 1.
+
+        Parameters
+        ----------
+        catfiles: `list`
+           List of output cluster catalog filenames
+        memfiles: `list`, optional
+           List of output member filenames.  Default is [].
+        sort_rows: `bool`, optional
+           Also sort the rows of the cluster catalogs by rank?
+           Default is False.
+        """
+        self.close()
+
+        if len(self._sort_values) > 0:
+            sort_values = np.concatenate(self._sort_values)
+        else:
+            sort_values = np.zeros(0)
+
+        st = np.argsort(sort_values)[::-1]
+
+        # The temporary ids are the index + 1
+        new_ids = np.zeros(self.ncluster + 1, dtype=np.int32)
+        new_ids[st + 1] = np.arange(st.size, dtype=np.int32) + 1
+
+        for catfile in catfiles:
+            if sort_rows:
+                cat = fitsio.read(catfile, ext=1)
+                cat['mem_match_id'] = new_ids[cat['mem_match_id']]
+                cat = cat[np.argsort(cat['mem_match_id'])]
+                fitsio.write(catfile, cat, clobber=True)
+            else:
+                with fitsio.FITS(catfile, mode='rw') as fits:
+                    ids = fits[1].read_column('mem_match_id')
+                    fits[1].write_column('mem_match_id', new_ids[ids])
+
+        for memfile in memfiles:
+            with fitsio.FITS(memfile, mode='rw') as fits:
+                ids = fits[1].read_column('mem_match_id')
+                fits[1].write_column('mem_match_id', new_ids[ids])
@@ -9,7 +9,7 @@ import scipy.optimize
 import esutil
 import warnings
 
-from .utilities import CubicSpline, interpol
+from .utilities import CubicSpline, interpol, spline_basis
 
 class MedZFitter(object):
     """
@@ -34,6 +34,8 @@ class MedZFitter(object):
         self._redshifts = redshifts.astype(np.float64)
         self._values = values.astype(np.float64)
 
+        self._basis = spline_basis(self._z_nodes, self._redshifts)
+
     def fit(self, p0, min_val=-np.inf, max_val=np.inf):
         """
         Perform a spline fit to the median value as a function of redshift.
@@ -82,8 +84,7 @@ class MedZFitter(object):
         t: `float`
            Median cost
         """
-        spl = CubicSpline(self._z_nodes, pars)
-        m = spl(self._redshifts)
+        m = np.dot(self._basis, pars)
 
         absdev = np.abs(self._values - m)
         t = np.sum(absdev.astype(np.float64))
@@ -178,6 +179,18 @@ class RedSequenceFitter(object):
         if self._mag_err2s.shape[1] != 2:
             raise ValueError("Mag_errs must by 2xNgals")
 
+        # The spline basis matrices are computed once, so that each spline
+        # evaluation is a matrix-vector product.
+        self._mean_basis = spline_basis(self._mean_nodes, self._redshifts)
+        if slope_nodes is None:
+            self._slope_basis = self._mean_basis
+        else:
+            self._slope_basis = spline_basis(self._slope_nodes, self._redshifts)
+        if scatter_nodes is None:
+            self._scatter_basis = self._mean_basis
+        else:
+            self._scatter_basis = spline_basis(self._scatter_nodes, self._redshifts)
+
         if trunc is not None:
             self._trunc = np.atleast_1d(trunc).astype(np.float64)
             if self._redshifts.size != self._trunc.size:
@@ -329,36 +342,32 @@ class RedSequenceFitter(object):
 
         # Precompute...
         if not self._fit_mean:
-            spl = CubicSpline(self._mean_nodes, p0_mean)
-            self._gmean = spl(self._redshifts)
+            self._gmean = np.dot(self._mean_basis, p0_mean)
         if not self._fit_slope:
-            spl = CubicSpline(self._slope_nodes, p0_slope)
-            self._gslope = spl(self._redshifts)
+            self._gslope = np.dot(self._slope_basis, p0_slope)
         if not self._fit_scatter:
-            spl = CubicSpline(self._scatter_nodes, p0_scatter)
             err_ratios = self._err_ratio_pars[0] + self._err_ratio_pars[1]*self._dmags_err_ratio
             if 0 in self._fit_err_ratio_ind:
                 e2 = (err_ratios**2.)*self._mag_err2s[:, 0]
             else:
-                e2 = self._mag_err2s[:, 0]
+                e2 = self._mag_err2s[:, 0].copy()
             if 1 in self._fit_err_ratio_ind:
                 e2 += (err_ratios**2.)*self._mag_err2s[:, 1]
             else:
                 e2 += self._mag_err2s[:, 1]
-            self._gsig = np.sqrt(np.clip(spl(self._redshifts), self._min_scatter, None)**2. + e2)
+            self._gsig = np.sqrt(np.clip(np.dot(self._scatter_basis, p0_scatter), self._min_scatter, None)**2. + e2)
 
         if not self._fit_scatter and self._trunc is not None:
             self._phi_bma = special.erf((self._trunc / self._gsig) / np.sqrt(2.))
 
-        res = scipy.optimize.minimize(self,
+        res = scipy.optimize.minimize(self.value_and_gradient,
                                       p0,
                                       method='L-BFGS-B',
                                       bounds=bounds,
-                                      jac=False,
+                                      jac=True,
                                       options={'maxfun': 2000,
                                                'maxiter': 2000,
                                                'maxcor': 20,
-                                               'eps': 1e-5,
                                                'gtol': 1e-8},
                                       callback=None)
         pars = res.x
@@ -390,38 +399,59 @@ class RedSequenceFitter(object):
         t: `float`
            Total negative log-likelihood.
         """
+        return self.value_and_gradient(pars)[0]
+
+    def value_and_gradient(self, pars):
+        """
+        Compute the red sequence log-likelihood (negative for minimization),
+        and its gradient with respect to the fit parameters.
+
+        Parameters
+        ----------
+        pars: `np.array`
+           Concatenated array of all the fit parameters
+
+        Returns
+        -------
+        t: `float`
+           Total negative log-likelihood.
+        grad: `np.array`
+           Float array of the gradient of t with respect to pars
+        """
         if self._fit_mean:
             # We are fitting the mean
-            spl = CubicSpline(self._mean_nodes, pars[self._mean_index: self._mean_index + self._n_mean_nodes])
-            gmean = spl(self._redshifts)
+            gmean = np.dot(self._mean_basis, pars[self._mean_index: self._mean_index + self._n_mean_nodes])
         else:
             gmean = self._gmean
 
         if self._fit_slope:
             # We are fitting the slope
-            spl = CubicSpline(self._slope_nodes, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
-            gslope = spl(self._redshifts)
+            gslope = np.dot(self._slope_basis, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
         else:
             gslope = self._gslope
 
         if self._fit_scatter:
             # We are fitting the scatter
-            spl = CubicSpline(self._scatter_nodes, pars[self._scatter_index: self._scatter_index + self._n_scatter_nodes])
+            scatter = np.dot(self._scatter_basis, pars[self._scatter_index: self._scatter_index + self._n_scatter_nodes])
             if self._has_err_ratios:
                 # Always the last one
                 err_ratio_pars = pars[-2: ]
             else:
                 err_ratio_pars = [1.0, 0.0]
             err_ratios = err_ratio_pars[0] + err_ratio_pars[1]*self._dmags_err_ratio
+            e2_ratio = np.zeros_like(err_ratios)
             if 0 in self._fit_err_ratio_ind:
                 e2 = (err_ratios**2.)*self._mag_err2s[:, 0]
+                e2_ratio += self._mag_err2s[:, 0]
             else:
-                e2 = self._mag_err2s[:, 0]
+                e2 = self._mag_err2s[:, 0].copy()
             if 1 in self._fit_err_ratio_ind:
                 e2 += (err_ratios**2.)*self._mag_err2s[:, 1]
+                e2_ratio += self._mag_err2s[:, 1]
             else:
                 e2 += self._mag_err2s[:, 1]
-            self._gsig = np.sqrt(np.clip(spl(self._redshifts), self._min_scatter, None)**2. + e2)
+            scatter_clipped = np.clip(scatter, self._min_scatter, None)
+            self._gsig = np.sqrt(scatter_clipped**2. + e2)
 
         if self._fit_scatter and self._trunc is not None:
             phi_bma = special.erf((self._trunc / self._gsig) / np.sqrt(2.))
@@ -450,22 +480,60 @@ class RedSequenceFitter(object):
                 warnings.simplefilter("ignore")
 
                 vals = np.log(self._probs * gci + (1.0 - self._probs) * self._bkgs)
+                # Derivative of vals with respect to log(gci)
+                dvals = self._probs * gci / (self._probs * gci + (1.0 - self._probs) * self._bkgs)
         else:
             # No probabilities or bkgs
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
 
                 vals = np.log(gci)
+                dvals = np.ones_like(vals)
 
         bad, = np.where(~np.isfinite(vals))
         vals[bad] = -100.0
+        dvals[bad] = 0.0
 
         if self._fit_scatter and self._use_scatter_prior:
             t = -(np.sum(vals) - np.sum(np.log(np.clip(pars[self._scatter_index: self._scatter_index + self._n_scatter_nodes], self._min_scatter, None))))
         else:
             t = -np.sum(vals)
 
-        return t
+        # And the gradient, with the chain rule through the model color
+        # and the total scatter.
+        grad = np.zeros(len(pars))
+
+        dt_dmodel = -dvals * xi / self._gsig
+        if self._fit_mean:
+            grad[self._mean_index: self._mean_index + self._n_mean_nodes] = np.dot(dt_dmodel, self._mean_basis)
+        if self._fit_slope:
+            grad[self._slope_index: self._slope_index + self._n_slope_nodes] = np.dot(dt_dmodel * self._dmags,
+                                                                                       self._slope_basis)
+
+        if self._fit_scatter:
+            dlng_dgsig = (xi**2. - 1.) / self._gsig
+            if self._trunc is not None:
+                u = (self._trunc / self._gsig) / np.sqrt(2.)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    dlng_dgsig += (2. / np.sqrt(np.pi)) * np.exp(-u**2.) * (u / self._gsig) / phi_bma
+                dlng_dgsig[bad] = 0.0
+            dt_dgsig = -dvals * dlng_dgsig
+
+            dgsig_dscatter = np.where(scatter > self._min_scatter, scatter_clipped / self._gsig, 0.0)
+            scatter_pars = pars[self._scatter_index: self._scatter_index + self._n_scatter_nodes]
+            grad[self._scatter_index: self._scatter_index + self._n_scatter_nodes] = np.dot(dt_dgsig * dgsig_dscatter,
+                                                                                             self._scatter_basis)
+            if self._use_scatter_prior:
+                grad[self._scatter_index: self._scatter_index + self._n_scatter_nodes] += np.where(scatter_pars > self._min_scatter,
+                                                                                                    1. / scatter_pars, 0.0)
+
+            if self._has_err_ratios:
+                dt_derr_ratio = dt_dgsig * err_ratios * e2_ratio / self._gsig
+                grad[-2] = np.sum(dt_derr_ratio)
+                grad[-1] = np.sum(dt_derr_ratio * self._dmags_err_ratio)
+
+        return t, grad
 
 class RedSequenceOffDiagonalFitter(object):
     """
@@ -755,6 +823,22 @@ class CorrectionFitter(object):
         else:
             self._ws = np.ones_like(self._redshifts)
 
+        # The spline basis matrices are computed once, so that each spline
+        # evaluation is a matrix-vector product.
+        self._mean_basis = spline_basis(self._mean_nodes, self._redshifts)
+        if slope_nodes is None:
+            self._slope_basis = self._mean_basis
+        else:
+            self._slope_basis = spline_basis(self._slope_nodes, self._redshifts)
+        if r_nodes is None:
+            self._r_basis = self._slope_basis
+        else:
+            self._r_basis = spline_basis(self._r_nodes, self._redshifts)
+        if bkg_nodes is None:
+            self._bkg_basis = self._slope_basis
+        else:
+            self._bkg_basis = spline_basis(self._bkg_nodes, self._redshifts)
+
     def fit(self, p0_mean, p0_slope, p0_r, p0_bkg, fit_mean=False, fit_slope=False, fit_r=False, fit_bkg=False):
         """
         Fit the zred correction factor.
@@ -831,29 +915,25 @@ class CorrectionFitter(object):
 
         # Precompute
         if not self._fit_mean:
-            spl = CubicSpline(self._mean_nodes, p0_mean)
-            self._gmean = spl(self._redshifts)
+            self._gmean = np.dot(self._mean_basis, p0_mean)
         if not self._fit_slope:
-            spl = CubicSpline(self._slope_nodes, p0_slope)
-            self._gslope = spl(self._redshifts)
+            self._gslope = np.dot(self._slope_basis, p0_slope)
         if not self._fit_r:
-            spl = CubicSpline(self._r_nodes, p0_r)
-            self._gr = spl(self._redshifts)
+            self._gr = np.dot(self._r_basis, p0_r)
         if not self._fit_bkg:
-            spl = CubicSpline(self._bkg_nodes, p0_bkg)
-            self._gbkg = np.clip(spl(self._redshifts), 1e-10, None)
+            self._gbkg = np.clip(np.dot(self._bkg_basis, p0_bkg), 1e-10, None)
             self._gci1 = (1. / np.sqrt(2. * np.pi * self._gbkg)) * np.exp(-self._dzs**2. / (2. * self._gbkg))
 
-        res = scipy.optimize.minimize(self,
+        res = scipy.optimize.minimize(self.value_and_gradient,
                                       p0,
                                       method='L-BFGS-B',
                                       bounds=bounds,
-                                      jac=False,
+                                      jac=True,
                                       options={'maxfun': 5000,
                                                'maxiter': 5000,
                                                'maxcor': 20,
-                                               'eps': 1e-5,
-                                               'gtol': 1e-10},
+                                               'gtol': 1e-10,
+                                               'ftol': 1e-14},
                                       callback=None)
         pars = res.x
 
@@ -883,48 +963,89 @@ class CorrectionFitter(object):
         t: `float`
            Total negative log-likelihood
         """
+        return self.value_and_gradient(pars)[0]
+
+    def value_and_gradient(self, pars):
+        """
+        Compute the correction log-likelihood (negative for minimization),
+        and its gradient with respect to the fit parameters.
+
+        Parameters
+        ----------
+        pars: `np.array`
+           Float array of the consolidate parameters
+
+        Returns
+        -------
+        t: `float`
+           Total negative log-likelihood
+        grad: `np.array`
+           Float array of the gradient of t with respect to pars
+        """
 
         if self._fit_mean:
-            spl = CubicSpline(self._mean_nodes, pars[self._mean_index: self._mean_index + self._n_mean_nodes])
-            gmean = spl(self._redshifts)
+            gmean = np.dot(self._mean_basis, pars[self._mean_index: self._mean_index + self._n_mean_nodes])
         else:
             gmean = self._gmean
 
         if self._fit_slope:
-            spl = CubicSpline(self._slope_nodes, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
-            gslope = spl(self._redshifts)
+            gslope = np.dot(self._slope_basis, pars[self._slope_index: self._slope_index + self._n_slope_nodes])
         else:
             gslope = self._gslope
 
         if self._fit_r:
-            spl = CubicSpline(self._r_nodes, pars[self._r_index: self._r_index + self._n_r_nodes])
-            gr = spl(self._redshifts)
+            gr = np.dot(self._r_basis, pars[self._r_index: self._r_index + self._n_r_nodes])
         else:
             gr = self._gr
 
         if self._fit_bkg:
-            #if pars[self._bkg_index: self._bkg_index + self._n_bkg_nodes].min() < 0.0:
-            #    return 1e11
-            spl = CubicSpline(self._bkg_nodes, pars[self._bkg_index: self._bkg_index + self._n_bkg_nodes])
-            gbkg = np.clip(spl(self._redshifts), 1e-10, None)
+            bkg = np.dot(self._bkg_basis, pars[self._bkg_index: self._bkg_index + self._n_bkg_nodes])
+            gbkg = np.clip(bkg, 1e-10, None)
             gci1 = (1. / np.sqrt(2. * np.pi * gbkg)) * np.exp(-self._dzs**2. / (2. * gbkg))
         else:
             gbkg = self._gbkg
             gci1 = self._gci1
 
         var0 = (gr * self._dz_errs)**2.
-        gci0 = (1. / np.sqrt(2. * np.pi * var0)) * np.exp(-(self._dzs - (gmean + gslope * self._dmags))**2. / (2. * var0))
+        delta = self._dzs - (gmean + gslope * self._dmags)
+        gci0 = (1. / np.sqrt(2. * np.pi * var0)) * np.exp(-delta**2. / (2. * var0))
 
         vals = self._ws * (self._probs * gci0 + (1. - self._probs) * gci1)
 
         bad, = np.where((~np.isfinite(vals)) | (vals <= 0.0))
         vals[bad] = 4e-44
 
-        vals = np.log(vals)
+        t = -np.sum(np.log(vals))
 
-        t = -np.sum(vals)
+        # And the gradient, with the derivatives of the two components
+        grad = np.zeros(len(pars))
 
-        return t
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            dt_dgci0 = -self._ws * self._probs / vals
+            dt_dgci1 = -self._ws * (1. - self._probs) / vals
+            dgci0_dmean = gci0 * delta / var0
+        dt_dgci0[bad] = 0.0
+        dt_dgci1[bad] = 0.0
+
+        if self._fit_mean:
+            grad[self._mean_index: self._mean_index + self._n_mean_nodes] = np.dot(dt_dgci0 * dgci0_dmean,
+                                                                                   self._mean_basis)
+        if self._fit_slope:
+            grad[self._slope_index: self._slope_index + self._n_slope_nodes] = np.dot(dt_dgci0 * dgci0_dmean * self._dmags,
+                                                                                      self._slope_basis)
+        if self._fit_r:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                dgci0_dr = gci0 * (delta**2. / var0 - 1.) / gr
+            dgci0_dr[bad] = 0.0
+            grad[self._r_index: self._r_index + self._n_r_nodes] = np.dot(dt_dgci0 * dgci0_dr, self._r_basis)
+        if self._fit_bkg:
+            dgci1_dbkg = np.where(bkg > 1e-10, gci1 * (self._dzs**2. / gbkg - 1.) / (2. * gbkg), 0.0)
+            dgci1_dbkg[bad] = 0.0
+            grad[self._bkg_index: self._bkg_index + self._n_bkg_nodes] = np.dot(dt_dgci1 * dgci1_dbkg, self._bkg_basis)
+
+        return t, grad
 
 
 class EcgmmFitter(object):
@@ -88,7 +88,8 @@ class GalaxyCatalog(Catalog):
 
     @classmethod
     def from_galfile(cls, filename, zredfile=None, nside=0, hpix=[], border=0.0, truth=False,
-                     use_tempfile=False, refmag_range=[-1000.0, 1000.0], chisq_max=1e100, zspec=False):
+                     use_tempfile=False, refmag_range=None, chisq_max=None, zspec=False,
+                     columns=None):
         """
         Generate a GalaxyCatalog from a redmapper "galfile."
 
@@ -96,10 +97,14 @@ class GalaxyCatalog(Catalog):
         ----------
         filename: `str`
            Filename of the redmapper "galfile" galaxy file.
-           This file may be a straight fits file or (recommended) a
-           galaxy table "master_table.fit" summary file.
+           This file may be a straight fits file, a (recommended) galaxy
+           table "master_table.fit" summary file, or a columnar galaxy
+           store table (see convert_galfile_to_columnar()).
         zredfile: `str`, optional
-           Filename of the redmapper zred "zreds_master_table.fit" summary file.
+           Filename of the redmapper zred "zreds_master_table.fit" summary file,
+           or a columnar galaxy store table which contains zreds.  With a
+           columnar galfile, a zred summary file must have been computed
+           from the store itself.
         nside: `int`, optional
            Nside of healpix sub-region to read in.  Default is 0 (full catalog).
         hpix: `list`, optional
@@ -111,12 +116,24 @@ class GalaxyCatalog(Catalog):
            Read in truth information if available (e.g. mocks)?  Default is False.
         use_tempfile : `bool`, optional
             Use a tempfile to store galaxies to conserve memory.
+            Not needed (and ignored) for a columnar galaxy store.
         refmag_range : `list`, optional
-            Refmag min, max to cut if using tempfile.
+            Refmag min, max to cut while reading.  Default is None (no cut).
         chisq_max : `float`, optional
-            Maximum chisq to cut if reading zreds and if using tempfile.
+            Maximum chisq to cut if reading zreds.  Default is None (no cut).
         zspec : `bool`, optional
             Read in zspec information if available?  Default is False.
+        columns : `list`, optional
+            Galaxy and zred columns to read.  The columns needed for cuts
+            (ra, dec, refmag, and chisq) are always read.  Default is None
+            (all columns).
+
+        Notes
+        -----
+        With a columnar galaxy store the cuts are applied before the bulk
+        of the galaxy columns are read.  Pixels are skipped entirely using
+        the per-pixel refmag/chisq stats in the table, and only the selected
+        rows of the requested columns are read.
         """
         if zredfile is not None:
             use_zred = True
@@ -149,21 +166,54 @@ class GalaxyCatalog(Catalog):
         hdr = fitsio.read_header(filename, ext=1)
         pixelated = hdr.get("PIXELS", 0)
         fitsformat = hdr.get("FITS", 0)
+        columnar = hdr.get("COLUMNAR", 0)
 
         # check zredfile
         if use_zred:
             zhdr = fitsio.read_header(zredfile, ext=1)
             zpixelated = zhdr.get("PIXELS", 0)
+            zcolumnar = zhdr.get("COLUMNAR", 0)
+            if zcolumnar and not zhdr.get("ZREDS", 0):
+                raise ValueError("Columnar zredfile %s does not contain zreds." % (zredfile))
+            if zcolumnar and not columnar:
+                raise ValueError("zredfile is a columnar store but galfile is not")
+            if columnar and not zcolumnar and not zhdr.get("STOREORD", 0):
+                # The store is sorted by refmag, so the rows of a zredfile
+                # computed from the original galfile do not line up.
+                raise ValueError("galfile is a columnar store but zredfile %s is not aligned with it.  "
+                                 "Use convert_galfile_to_columnar() with the zredfile, "
+                                 "or compute the zreds from the store." % (zredfile))
+
+        # Which columns are we reading?  Note that the columns required
+        # for cuts are always read.
+        if columns is not None:
+            keep_columns = set([col.lower() for col in columns]) | set(['ra', 'dec', 'refmag'])
+            if use_zred:
+                keep_columns.add('chisq')
+        else:
+            keep_columns = None
 
         if not pixelated:
-            cat = fitsio.read(filename, ext=1, upper=True)
+            if keep_columns is not None:
+                names = fitsio.FITS(filename)[1].get_colnames()
+                cat = fitsio.read(filename, ext=1, upper=True,
+                                  columns=[name for name in names if name.lower() in keep_columns])
+            else:
+                cat = fitsio.read(filename, ext=1, upper=True)
             if use_zred:
-                zcat = fitsio.read(zredfile, ext=1, upper=True)
+                if keep_columns is not None:
+                    names = fitsio.FITS(zredfile)[1].get_colnames()
+                    zcat = fitsio.read(zredfile, ext=1, upper=True,
+                                       columns=[name for name in names if name.lower() in keep_columns])
+                else:
+                    zcat = fitsio.read(zredfile, ext=1, upper=True)
                 if zcat.size != cat.size:
                     raise ValueError("zredfile is a different length (%d) than catfile (%d)" % (zcat.size, cat.size))
-                return cls(cat, zcat)
+                gals = cls(cat, zcat)
             else:
-                return cls(cat)
+                gals = cls(cat)
+
+            return gals._cut_on_read(refmag_range, chisq_max if use_zred else None)
         else:
             if use_zred:
                 if not zpixelated:
@@ -202,7 +252,7 @@ class GalaxyCatalog(Catalog):
                     fname = os.path.join(zpath, f.decode())
                 except AttributeError:
                     fname = os.path.join(zpath, f)
-                if os.path.isfile(fname):
+                if os.path.exists(fname):
                     mark[i] = True
 
             bad, = np.where(~mark)
@@ -215,18 +265,7 @@ class GalaxyCatalog(Catalog):
         trim_border = False
         if len(_hpix) == 1 and nside > 0 and border > 0.0:
             trim_border = True
-            nside_cutref = 512
-            boundaries = hpc.boundaries(nside, _hpix[0], step=nside_cutref//nside)
-
-            # Need to get the sub-pixels, use nest and bit-shifting.
-            bit_shift = 2*int(np.round(np.log2(nside_cutref/nside)))
-            inhpix_nest = np.arange(2**bit_shift, dtype=np.int32) + np.left_shift(hpg.ring_to_nest(nside, _hpix[0]), bit_shift)
-            inhpix = hpg.nest_to_ring(nside_cutref, inhpix_nest)
-
-            for i in range(boundaries.shape[1]):
-                pixint = hpc.query_disc(nside_cutref, boundaries[:, i], np.radians(border), inclusive=True, fact=8)
-                inhpix = np.append(inhpix, pixint)
-            inhpix = np.unique(inhpix)
+            nside_cutref, inhpix = _get_border_pixels(nside, _hpix[0], border)
 
         # create the catalog array to read into
 
@@ -235,7 +274,10 @@ class GalaxyCatalog(Catalog):
             first_fname = os.path.join(path, tab.filenames[indices[0]].decode())
         except AttributeError:
             first_fname = os.path.join(path, tab.filenames[indices[0]])
-        elt = fitsio.read(first_fname, ext=1, rows=0, lower=True)
+        if columnar:
+            elt = fitsio.read(filename, ext='GALDTYPE', lower=True)
+        else:
+            elt = fitsio.read(first_fname, ext=1, rows=0, lower=True)
         dtype_in = elt.dtype.descr
         if not truth:
             # Filter out any truth columns.
@@ -248,10 +290,14 @@ class GalaxyCatalog(Catalog):
                     mark.append(False)
 
             dtype = [dt for i, dt in enumerate(dtype_in) if mark[i]]
-            columns = [dt[0] for dt in dtype]
+            read_columns = [dt[0] for dt in dtype]
         else:
             dtype = dtype_in
-            columns = None
+            read_columns = None
+
+        if keep_columns is not None:
+            dtype = [dt for dt in dtype if dt[0] in keep_columns]
+            read_columns = [dt[0] for dt in dtype]
 
         # Confirm we have the columns
         if truth:
@@ -282,10 +328,32 @@ class GalaxyCatalog(Catalog):
             except AttributeError:
                 fname = os.path.join(zpath, ztab.filenames[indices[0]])
 
-            zelt = fitsio.read(fname, ext=1, rows=0, lower=True)
-            zcat_fields = [dt[0] for dt in zelt.dtype.descr]
-
-            dtype.extend(zelt.dtype.descr)
+            if zcolumnar:
+                zelt = fitsio.read(zredfile, ext='ZREDDTYPE', lower=True)
+            else:
+                zelt = fitsio.read(fname, ext=1, rows=0, lower=True)
+            zdtype = zelt.dtype.descr
+            if keep_columns is not None:
+                zdtype = [dt for dt in zdtype if dt[0] in keep_columns]
+            zcat_fields = [dt[0] for dt in zdtype]
+
+            dtype.extend(zdtype)
+
+        if columnar:
+            if not trim_border:
+                inhpix = None
+                nside_cutref = None
+            if use_zred:
+                cat = _read_columnar_galaxies(path, tab, indices, dtype, cat_fields,
+                                              zpath=zpath, ztab=ztab, zcat_fields=zcat_fields,
+                                              zcolumnar=zcolumnar,
+                                              refmag_range=refmag_range, chisq_max=chisq_max,
+                                              inhpix=inhpix, nside_cutref=nside_cutref)
+            else:
+                cat = _read_columnar_galaxies(path, tab, indices, dtype, cat_fields,
+                                              refmag_range=refmag_range,
+                                              inhpix=inhpix, nside_cutref=nside_cutref)
+            return cls(cat)
 
         if use_tempfile:
             # Start the temporary file
@@ -309,9 +377,9 @@ class GalaxyCatalog(Catalog):
             if use_tempfile:
                 # Read into temporary buffer
                 tempcat = np.zeros(tab.ngals[index], dtype=dtype)
-                tempcat[cat_fields][:] = fitsio.read(fname, ext=1, lower=True, columns=columns)
+                tempcat[cat_fields][:] = fitsio.read(fname, ext=1, lower=True, columns=read_columns)
             else:
-                cat[cat_fields][ctr: ctr + tab.ngals[index]] = fitsio.read(fname, ext=1, lower=True, columns=columns)
+                cat[cat_fields][ctr: ctr + tab.ngals[index]] = fitsio.read(fname, ext=1, lower=True, columns=read_columns)
 
             if use_zred:
                 # Note that this effectively checks that the numbers of rows in each file match properly (though the exception will be cryptic...)
@@ -322,14 +390,17 @@ class GalaxyCatalog(Catalog):
 
                 if use_tempfile:
                     # Read into temporary buffer
-                    tempcat[zcat_fields][:] = fitsio.read(fname, ext=1, lower=True)
+                    tempcat[zcat_fields][:] = fitsio.read(fname, ext=1, lower=True, columns=zcat_fields)
                 else:
-                    cat[zcat_fields][ctr: ctr + tab.ngals[index]] = fitsio.read(fname, ext=1, lower=True)
+                    cat[zcat_fields][ctr: ctr + tab.ngals[index]] = fitsio.read(fname, ext=1, lower=True,
+                                                                                columns=zcat_fields)
 
             if use_tempfile:
                 # Cut down the tempcat based on refmag low/high and chisq_max
-                guse = ((tempcat['refmag'] > refmag_range[0]) & (tempcat['refmag'] < refmag_range[1]))
-                if use_zred:
+                guse = np.ones(tempcat.size, dtype=bool)
+                if refmag_range is not None:
+                    guse &= ((tempcat['refmag'] > refmag_range[0]) & (tempcat['refmag'] < refmag_range[1]))
+                if use_zred and chisq_max is not None:
                     guse &= (tempcat['chisq'] < chisq_max)
 
                 if guse.sum() > 0:
@@ -360,10 +431,81 @@ class GalaxyCatalog(Catalog):
                 ipring = hpg.angle_to_pixel(nside_cutref, cat['ra'], cat['dec'], nest=False)
                 _, indices = esutil.numpy_util.match(inhpix, ipring)
 
-                return cls(cat[indices])
+                gals = cls(cat[indices])
             else:
-                # No cuts
-                return cls(cat)
+                gals = cls(cat)
+
+            return gals._cut_on_read(refmag_range, chisq_max if use_zred else None)
+
+    def cut_to_pixel(self, nside, hpix, border=0.0):
+        """
+        Cut the galaxies to a healpix sub-region and border, selecting the
+        same galaxies (in the same order) as reading that sub-region with
+        from_galfile().
+
+        This is used to take the galaxies for one pixel from a larger galaxy
+        catalog that has already been read.
+
+        Parameters
+        ----------
+        nside: `int`
+           Nside of healpix sub-region.  If 0, all galaxies are kept.
+        hpix: `list`
+           Healpix numbers (ring format) of sub-region.  If empty, all
+           galaxies are kept.
+        border: `float`, optional
+           Border around hpix (in degrees).  Default is 0.0.
+
+        Returns
+        -------
+        gals: `redmapper.GalaxyCatalog`
+           Cut galaxy catalog.  This is self if no cut is applied.
+        """
+        if not isinstance(hpix, Iterable):
+            hpix = [hpix]
+
+        if nside == 0 or len(hpix) == 0:
+            return self
+
+        if border > 0.0:
+            if len(hpix) != 1:
+                raise NotImplementedError("Cannot cut a boundary around a pixel list.")
+            nside_cutref, inhpix = _get_border_pixels(nside, hpix[0], border)
+        else:
+            nside_cutref = nside
+            inhpix = np.unique(hpix)
+
+        ipring = hpg.angle_to_pixel(nside_cutref, self.ra, self.dec, nest=False)
+        _, indices = esutil.numpy_util.match(inhpix, ipring)
+
+        return self[indices]
+
+    def _cut_on_read(self, refmag_range, chisq_max):
+        """
+        Cut the galaxies on refmag and chisq after reading.
+
+        Parameters
+        ----------
+        refmag_range: `list`
+           Refmag min, max to cut.  May be None to skip the refmag cut.
+        chisq_max: `float`
+           Maximum chisq to cut.  May be None to skip the chisq cut.
+
+        Returns
+        -------
+        gals: `redmapper.GalaxyCatalog`
+           Cut galaxy catalog.  This is self if no galaxies are cut.
+        """
+        guse = np.ones(self.size, dtype=bool)
+        if refmag_range is not None:
+            guse &= ((self.refmag > refmag_range[0]) & (self.refmag < refmag_range[1]))
+        if chisq_max is not None:
+            guse &= (self.chisq < chisq_max)
+
+        if np.all(guse):
+            return self
+
+        return self[guse]
 
     @property
     def galcol(self):
@@ -473,6 +615,44 @@ class GalaxyCatalog(Catalog):
 
         return self._htm_matcher.match(ras, decs, radius, maxmatch=maxmatch)
 
+    def match_many_grouped(self, ras, decs, radius):
+        """
+        Match many ra/dec positions to the galaxy catalog, grouped by position.
+
+        This runs a single match for all the positions, and returns the
+        matches in compressed (CSR) form, such that the galaxies matched to
+        position i are indices[offsets[i]: offsets[i + 1]], in the same order
+        as returned by match_one().  Slicing these arrays does not copy.
+
+        Parameters
+        ----------
+        ras: `np.array`
+           Float arrays of right ascensions to match to.
+        decs: `np.array`
+           Float arrays of declinations to match to.
+        radius: `np.array` or `float`
+           Float array or float match radius in degrees.
+
+        Returns
+        -------
+        offsets: `np.array`
+           Integer array of offsets into indices/dists [npos + 1]
+        indices: `np.array`
+           Integer array of GalaxyCatalog indices matched to each position
+        dists: `np.array`
+           Float array of distance (degrees) from each galaxy in indices
+        """
+        ras = np.atleast_1d(ras)
+
+        i0, i1, dists = self.match_many(ras, decs, radius, maxmatch=0)
+
+        st = np.argsort(i0, kind='stable')
+
+        offsets = np.zeros(ras.size + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(i0, minlength=ras.size))
+
+        return offsets, i1[st], dists[st]
+
 def get_subpixel_indices(galtable, hpix=[], border=0.0, nside=0):
     """
     Routine to get subpixel indices from a galaxy table.
@@ -520,6 +700,324 @@ def get_subpixel_indices(galtable, hpix=[], border=0.0, nside=0):
 
     return indices
 
+def _get_border_pixels(nside, hpix, border):
+    """
+    Get the fine healpix pixels covering a pixel and a border around it.
+
+    Parameters
+    ----------
+    nside: `int`
+       Nside of the pixel
+    hpix: `int`
+       Healpix number (ring format) of the pixel
+    border: `float`
+       Border around hpix (in degrees)
+
+    Returns
+    -------
+    nside_cutref: `int`
+       Nside of the fine pixels
+    inhpix: `np.array`
+       Integer array of unique fine pixels (ring format)
+    """
+    nside_cutref = 512
+    boundaries = hpc.boundaries(nside, hpix, step=nside_cutref//nside)
+
+    # Need to get the sub-pixels, use nest and bit-shifting.
+    bit_shift = 2*int(np.round(np.log2(nside_cutref/nside)))
+    inhpix_nest = np.arange(2**bit_shift, dtype=np.int32) + np.left_shift(hpg.ring_to_nest(nside, hpix), bit_shift)
+    inhpix = hpg.nest_to_ring(nside_cutref, inhpix_nest)
+
+    for i in range(boundaries.shape[1]):
+        pixint = hpc.query_disc(nside_cutref, boundaries[:, i], np.radians(border), inclusive=True, fact=8)
+        inhpix = np.append(inhpix, pixint)
+
+    return nside_cutref, np.unique(inhpix)
+
+def _read_columnar_galaxies(path, tab, indices, dtype, cat_fields,
+                            zpath=None, ztab=None, zcat_fields=[], zcolumnar=False,
+                            refmag_range=None, chisq_max=None,
+                            inhpix=None, nside_cutref=None):
+    """
+    Read galaxies from a columnar galaxy store, pushing down the cuts.
+
+    Each pixel is sorted by refmag, so the refmag cut is a contiguous range
+    of rows.  The chisq and border cuts are then computed from just the
+    chisq and ra/dec columns, and only the selected rows of the remaining
+    columns are read.
+
+    Parameters
+    ----------
+    path: `str`
+       Path of the columnar store table
+    tab: `redmapper.Entry`
+       Columnar store table
+    indices: `np.array`
+       Integer array of table pixel indices to read
+    dtype: `list`
+       Output dtype, including zred columns
+    cat_fields: `list`
+       Galaxy columns to read from the store
+    zpath: `str`, optional
+       Path of the zred table.  Default is None (no zreds).
+    ztab: `redmapper.Entry`, optional
+       Zred table.  Default is None (no zreds).
+    zcat_fields: `list`, optional
+       Zred columns to read.  Default is [].
+    zcolumnar: `bool`, optional
+       The zred table is a columnar store (rather than aligned fits files).
+       Default is False.
+    refmag_range: `list`, optional
+       Refmag min, max to cut.  Default is None (no cut).
+    chisq_max: `float`, optional
+       Maximum chisq to cut.  Default is None (no cut).
+    inhpix: `np.array`, optional
+       Integer array of nside_cutref (ring) pixels to keep for the border cut.
+       Default is None (no border cut).
+    nside_cutref: `int`, optional
+       Nside for the border cut.  Default is None.
+
+    Returns
+    -------
+    cat: `np.ndarray`
+       Galaxy array with dtype
+    """
+    def _pixel_path(_path, filename):
+        try:
+            return os.path.join(_path, filename.decode())
+        except AttributeError:
+            return os.path.join(_path, filename)
+
+    def _read_zred_columns(index, names, rows):
+        zname = _pixel_path(zpath, ztab.filenames[index])
+        if zcolumnar:
+            return {name: np.load(os.path.join(zname, name + '.npy'), mmap_mode='r')[rows]
+                    for name in names}
+        zcat = fitsio.read(zname, ext=1, rows=rows, columns=names, lower=True)
+        return {name: zcat[name] for name in names}
+
+    # First pass: figure out which rows to read from each pixel.
+    use_indices = []
+    use_rows = []
+    for index in indices:
+        if tab.ngals[index] == 0:
+            continue
+        if refmag_range is not None and (tab.refmag_max[index] <= refmag_range[0] or
+                                         tab.refmag_min[index] >= refmag_range[1]):
+            continue
+        if chisq_max is not None and zcolumnar and ztab.chisq_min[index] >= chisq_max:
+            continue
+
+        pixdir = _pixel_path(path, tab.filenames[index])
+
+        if refmag_range is not None:
+            refmag = np.load(os.path.join(pixdir, 'refmag.npy'), mmap_mode='r')
+            rows = np.arange(np.searchsorted(refmag, refmag_range[0], side='right'),
+                             np.searchsorted(refmag, refmag_range[1], side='left'))
+        else:
+            rows = np.arange(tab.ngals[index])
+
+        if chisq_max is not None and rows.size > 0:
+            chisq = _read_zred_columns(index, ['chisq'], rows)['chisq']
+            rows = rows[chisq < chisq_max]
+
+        if inhpix is not None and rows.size > 0:
+            ra = np.load(os.path.join(pixdir, 'ra.npy'), mmap_mode='r')[rows]
+            dec = np.load(os.path.join(pixdir, 'dec.npy'), mmap_mode='r')[rows]
+            ipring = hpg.angle_to_pixel(nside_cutref, ra, dec, nest=False)
+            _, inside = esutil.numpy_util.match(inhpix, ipring)
+            rows = rows[np.sort(inside)]
+
+        if rows.size > 0:
+            use_indices.append(index)
+            use_rows.append(rows)
+
+    # Second pass: read the selected rows.
+    cat = np.zeros(np.sum([rows.size for rows in use_rows], dtype=np.int64), dtype=dtype)
+
+    ctr = 0
+    for index, rows in zip(use_indices, use_rows):
+        pixdir = _pixel_path(path, tab.filenames[index])
+        for name in cat_fields:
+            cat[name][ctr: ctr + rows.size] = np.load(os.path.join(pixdir, name + '.npy'),
+                                                      mmap_mode='r')[rows]
+
+        if len(zcat_fields) > 0:
+            zcols = _read_zred_columns(index, zcat_fields, rows)
+            for name in zcat_fields:
+                cat[name][ctr: ctr + rows.size] = zcols[name]
+
+        ctr += rows.size
+
+    return cat
+
+
+def convert_galfile_to_columnar(galfile, outbase, zredfile=None, clobber=False):
+    """
+    Convert a pixelated galaxy table to a columnar galaxy store.
+
+    The store table "<outbase>_master_table.fit" has the same layout as
+    the galaxy table, with per-pixel refmag_min/refmag_max (and chisq_min
+    with zreds) stats.  Each pixel is a directory with one .npy file per
+    column, with the galaxies sorted by refmag.  If a zredfile is given the
+    zreds are stored with the galaxies, and the store table may be used as
+    both the galfile and the zredfile.  Otherwise, zreds must be computed
+    from the store itself, as the rows are not aligned with the input
+    zredfile.
+
+    Parameters
+    ----------
+    galfile: `str`
+       Input pixelated galaxy table "master_table.fit" file
+    outbase: `str`
+       Output filename base string (including path)
+    zredfile: `str`, optional
+       Input zred table file.  Default is None (no zreds).
+    clobber: `bool`, optional
+       Clobber existing store table?  Default is False.
+
+    Returns
+    -------
+    filename: `str`
+       Filename of the store table
+    """
+    filename = '%s_master_table.fit' % (outbase)
+
+    if os.path.basename(filename) == filename:
+        raise RuntimeError("outbase %s must contain a path (absolute or relative)" % (outbase))
+    if os.path.isfile(filename) and not clobber:
+        raise RuntimeError("Columnar galaxy table %s already exists and clobber is False." % (filename))
+
+    hdr = fitsio.read_header(galfile, ext=1)
+    if not hdr.get("PIXELS", 0) or not hdr.get("FITS", 0) or hdr.get("COLUMNAR", 0):
+        raise ValueError("Can only convert a pixelated fits galfile.")
+
+    tab = Entry.from_fits_file(galfile, ext=1)
+    path = os.path.dirname(os.path.abspath(galfile))
+
+    if zredfile is not None:
+        ztab = Entry.from_fits_file(zredfile, ext=1)
+        zpath = os.path.dirname(os.path.abspath(zredfile))
+
+    outpath = os.path.dirname(filename)
+    outbase_nopath = os.path.basename(outbase)
+    if not os.path.exists(outpath):
+        os.makedirs(outpath)
+
+    def _pixel_path(_path, fname):
+        try:
+            return os.path.join(_path, fname.decode())
+        except AttributeError:
+            return os.path.join(_path, fname)
+
+    npix = tab.hpix.size
+    refmag_min = np.zeros(npix, dtype=np.float32)
+    refmag_max = np.zeros(npix, dtype=np.float32)
+    chisq_min = np.zeros(npix, dtype=np.float32)
+    ngals = np.zeros(npix, dtype=np.int32)
+    mark = np.ones(npix, dtype=bool)
+
+    galdtype = None
+    zreddtype = None
+    for i in range(npix):
+        gals = fitsio.read(_pixel_path(path, tab.filenames[i]), ext=1, lower=True)
+        if galdtype is None:
+            galdtype = gals.dtype
+
+        if zredfile is not None:
+            zname = _pixel_path(zpath, ztab.filenames[i])
+            if not os.path.isfile(zname):
+                # Matching from_galfile, pixels without zreds are skipped
+                mark[i] = False
+                continue
+            zreds = fitsio.read(zname, ext=1, lower=True)
+            if zreds.size != gals.size:
+                raise ValueError("zred file %s is a different length (%d) than galaxy file (%d)" %
+                                 (zname, zreds.size, gals.size))
+            if zreddtype is None:
+                zreddtype = zreds.dtype
+
+        st = np.argsort(gals['refmag'], kind='stable')
+
+        pixdir = os.path.join(outpath, '%s_%07d' % (outbase_nopath, tab.hpix[i]))
+        if not os.path.exists(pixdir):
+            os.makedirs(pixdir)
+
+        for name in gals.dtype.names:
+            col = gals[name][st]
+            np.save(os.path.join(pixdir, name + '.npy'), col.astype(col.dtype.newbyteorder('=')))
+        if zredfile is not None:
+            for name in zreds.dtype.names:
+                col = zreds[name][st]
+                np.save(os.path.join(pixdir, name + '.npy'), col.astype(col.dtype.newbyteorder('=')))
+            chisq_min[i] = zreds['chisq'].min() if zreds.size > 0 else 0.0
+
+        ngals[i] = gals.size
+        if gals.size > 0:
+            refmag_min[i] = gals['refmag'][st[0]]
+            refmag_max[i] = gals['refmag'][st[-1]]
+
+    if zredfile is not None and not np.any(mark):
+        raise ValueError("There are no zred files associated with the galaxy pixels.")
+
+    use, = np.where(mark)
+
+    # Build the store table with the same fields as the galaxy table
+    filename_dtype = 'a%d' % (len(outbase_nopath) + 9)
+    dtype = []
+    for dt in tab._ndarray.dtype.descr:
+        if dt[0] == 'filenames':
+            dtype.append(('filenames', filename_dtype, (use.size, )))
+        elif dt[0] in ('hpix', 'ra_pix', 'dec_pix', 'ngals'):
+            dtype.append((dt[0], dt[1], (use.size, )))
+        else:
+            dtype.append(dt)
+    # Older galaxy tables do not record truth/zspec, which cannot be
+    # checked from the store pixels
+    for name in ('has_truth', 'has_zspec'):
+        if name not in tab._ndarray.dtype.names:
+            dtype.append((name, 'i2'))
+    dtype.extend([('refmag_min', 'f4', (use.size, )),
+                  ('refmag_max', 'f4', (use.size, ))])
+    if zredfile is not None:
+        dtype.append(('chisq_min', 'f4', (use.size, )))
+
+    outtab = Entry(np.zeros(1, dtype=dtype))
+    for name in tab._ndarray.dtype.names:
+        if name == 'filenames':
+            continue
+        if name in ('hpix', 'ra_pix', 'dec_pix', 'ngals'):
+            outtab._ndarray[name] = tab._ndarray[name][use]
+        else:
+            outtab._ndarray[name] = tab._ndarray[name]
+    if 'has_truth' not in tab._ndarray.dtype.names:
+        outtab.has_truth = 'ztrue' in galdtype.names
+    if 'has_zspec' not in tab._ndarray.dtype.names:
+        outtab.has_zspec = 'zspec' in galdtype.names
+    for j, i in enumerate(use):
+        outtab.filenames[j] = '%s_%07d' % (outbase_nopath, tab.hpix[i])
+    outtab.ngals = ngals[use]
+    outtab.refmag_min = refmag_min[use]
+    outtab.refmag_max = refmag_max[use]
+    if zredfile is not None:
+        outtab.chisq_min = chisq_min[use]
+
+    outhdr = fitsio.FITSHDR()
+    outhdr['PIXELS'] = 1
+    outhdr['FITS'] = 1
+    outhdr['COLUMNAR'] = 1
+    outhdr['ZREDS'] = 1 if zredfile is not None else 0
+
+    outtab.to_fits_file(filename, header=outhdr, clobber=True)
+
+    # And record the column dtypes for reading
+    fitsio.write(filename, np.zeros(1, dtype=galdtype), extname='GALDTYPE')
+    if zredfile is not None:
+        fitsio.write(filename, np.zeros(1, dtype=zreddtype), extname='ZREDDTYPE')
+
+    return filename
+
+
 class FakeMaskConfig(object):
     """
     A simple fake config to read in a mask
@@ -6,6 +6,8 @@ import esutil
 import fitsio
 import numpy as np
 import os
+import copy
+from collections import OrderedDict
 from scipy.special import erf
 import scipy.integrate
 import healsparse
@@ -13,7 +15,7 @@ import healsparse
 from .catalog import Catalog,Entry
 from .utilities import TOTAL_SQDEG, SEC_PER_DEG, astro_to_sphere, calc_theta_i, apply_errormodels
 from .utilities import make_lockfile, sample_from_pdf, chisq_pdf, schechter_pdf, nfw_pdf
-from .utilities import get_healsparse_subpix_indices
+from .utilities import get_healsparse_subpix_indices, get_rng
 
 CURRENT_MASKGAL_VERSION = 7
 
@@ -26,6 +28,11 @@ class Mask(object):
     #   We need a routine that looks at the mask_mode and instantiates
     #   the correct type.  How is this typically done?
 
+    # Maskgal fields that are set for each cluster, and are kept in scratch
+    # space owned by the mask.  All the other fields are read-only.
+    maskgal_scratch_fields = ['mark', 'refmag', 'refmag_obs', 'refmag_obs_err',
+                              'limmag', 'exptime', 'm50', 'eff', 'w', 'zp', 'nsig']
+
     def __init__(self, config, include_maskgals=True):
         """
         Instantiate a placeholder geometry mask that will describe all galaxies
@@ -40,6 +47,10 @@ class Mask(object):
         """
         self.config = config
 
+        self.maskgals = None
+        self._maskgals_scratch = None
+        self._radec_scratch = None
+
         # This will raise if maskgals aren't available
         if include_maskgals:
             self.read_maskgals(config.maskgalfile)
@@ -91,14 +102,19 @@ class Mask(object):
 
         # Read the maskgals
         # These are going to be *all* the maskgals, but we only operate on a subset
-        # at a time
-        self.maskgals_all = Catalog.from_fits_file(maskgalfile)
+        # at a time.  They are memory-mapped read-only, so that the pages are
+        # shared by all the processes using the same file.
+        self.maskgals_all = Catalog.from_columns(_memmap_fits_columns(maskgalfile))
+        self._maskgals_scratch = None
 
     def select_maskgals_sample(self, maskgal_index=None):
         """
         Select a subset of maskgals by sampling.
 
-        This will set self.maskgals to the subset in question.
+        This will set self.maskgals to the subset in question.  The fields in
+        maskgal_scratch_fields are copied into scratch space owned by the
+        mask (and reused for every sample), and the other fields are
+        read-only views of maskgals_all.
 
         Parameters
         ----------
@@ -108,13 +124,52 @@ class Mask(object):
         """
 
         if maskgal_index is None:
-            maskgal_index = np.random.choice(self.config.maskgal_nsamples)
+            maskgal_index = get_rng().choice(self.config.maskgal_nsamples)
 
-        self.maskgals = self.maskgals_all[maskgal_index * self.config.maskgal_ngals:
-                                              (maskgal_index + 1) * self.config.maskgal_ngals]
+        lo = maskgal_index * self.config.maskgal_ngals
+        hi = (maskgal_index + 1) * self.config.maskgal_ngals
+
+        if self._maskgals_scratch is None:
+            columns = OrderedDict()
+            for name, col in self.maskgals_all._columns.items():
+                if name in self.maskgal_scratch_fields:
+                    columns[name] = np.zeros((hi - lo, ) + col.shape[1:], dtype=col.dtype.newbyteorder('='))
+                else:
+                    columns[name] = col[lo: hi]
+            self._maskgals_scratch = Catalog.from_columns(columns)
+
+        # Copy the scratch fields, and swap in views for the others
+        columns = self._maskgals_scratch._columns
+        for name, col in self.maskgals_all._columns.items():
+            if name in self.maskgal_scratch_fields:
+                columns[name][:] = col[lo: hi]
+            else:
+                columns[name] = col[lo: hi]
+
+        self.maskgals = self._maskgals_scratch
 
         return maskgal_index
 
+    def thread_copy(self):
+        """
+        Make a copy of the mask for use in a worker thread.
+
+        The copy shares the mask map and maskgals_all, but has its own
+        scratch space for the selected maskgals samples, so that
+        modifications to maskgals are private to the thread.
+
+        Returns
+        -------
+        mask: `redmapper.Mask`
+           Copy of the mask
+        """
+        mask = copy.copy(self)
+        mask._maskgals_scratch = None
+        mask._radec_scratch = None
+        mask.maskgals = None
+
+        return mask
+
     def gen_maskgals(self, maskgalfile):
         """
         Method to generate the maskgal monte carlo galaxies.
@@ -274,8 +329,23 @@ class Mask(object):
            Cluster to get position/redshift/scaling
         """
         # note this probably can be in the superclass, no?
-        ras = cluster.ra + self.maskgals.x/(cluster.mpc_scale)/np.cos(np.radians(cluster.dec))
-        decs = cluster.dec + self.maskgals.y/(cluster.mpc_scale)
+        cosdec = np.cos(np.radians(cluster.dec))
+
+        # The positions are computed in place in reusable buffers, of the
+        # type that the expression ra + x/mpc_scale/cosdec would have.
+        dtype = np.result_type(self.maskgals.x, cluster.mpc_scale, cosdec, cluster.ra).newbyteorder('=')
+        if (self._radec_scratch is None or self._radec_scratch.dtype != dtype or
+                self._radec_scratch.shape[1] != self.maskgals.size):
+            self._radec_scratch = np.zeros((2, self.maskgals.size), dtype=dtype)
+        ras = self._radec_scratch[0, :]
+        decs = self._radec_scratch[1, :]
+
+        np.divide(self.maskgals.x, cluster.mpc_scale, out=ras)
+        np.divide(ras, cosdec, out=ras)
+        np.add(cluster.ra, ras, out=ras)
+        np.divide(self.maskgals.y, cluster.mpc_scale, out=decs)
+        np.add(cluster.dec, decs, out=decs)
+
         self.maskgals.mark = self.compute_radmask(ras,decs)
 
     def calc_maskcorr(self, mstar, maxmag, limmag):
@@ -400,10 +470,62 @@ class HPMask(Mask):
         fracgood[gd] = self.sparse_fracgood.get_values_pos(ras[gd], decs[gd], lonlat=True)
 
         radmask = np.zeros(ras.size, dtype=bool)
-        radmask[np.where(fracgood > np.random.rand(ras.size))] = True
+        radmask[np.where(fracgood > get_rng().rand(ras.size))] = True
         return radmask
 
 
+def _memmap_fits_columns(filename, ext=1):
+    """
+    Memory-map the columns of a fits binary table, read-only.
+
+    Numeric columns are mapped directly from the file (in the byte order of
+    the file), so the pages are shared by all the processes that map the
+    same file.  Other columns (logical, string, or scaled) are read into
+    memory.
+
+    Parameters
+    ----------
+    filename: `str`
+       Fits filename
+    ext: `int` or `str`, optional
+       Extension to map.  Default is 1.
+
+    Returns
+    -------
+    columns: `OrderedDict`
+       Dictionary of lower-case column name to read-only `np.ndarray`
+    """
+    with fitsio.FITS(filename) as fits:
+        hdr = fits[ext].read_header()
+        offsets = fits[ext].get_offsets()
+        dtype = fits[ext].get_rec_dtype()[0]
+        nrows = fits[ext].get_nrows()
+
+    table = None
+    if nrows > 0 and dtype.itemsize == hdr['NAXIS1']:
+        table = np.memmap(filename, dtype=dtype, mode='r', offset=offsets['data_start'], shape=(nrows, ))
+
+    to_read = []
+    for i, name in enumerate(dtype.names):
+        if (table is None or dtype[name].base.kind not in ['f', 'i', 'u'] or
+                ('TSCAL%d' % (i + 1)) in hdr or ('TZERO%d' % (i + 1)) in hdr):
+            to_read.append(name)
+
+    if len(to_read) > 0:
+        array = fitsio.read(filename, ext=ext, columns=to_read)
+
+    columns = OrderedDict()
+    for name in dtype.names:
+        if name in to_read:
+            col = array[name]
+            col.flags.writeable = False
+        else:
+            col = table[name]
+        columns[name.lower()] = col
+
+    return columns
+
+
 def get_mask(config, include_maskgals=True):
     """
     Convenience function to look at a config file and load the appropriate type of mask.
@@ -47,7 +47,10 @@ class MemPredict(object):
         except AttributeError:
             first_fname = os.path.join(path, tab.filenames[0])
 
-        elt = fitsio.read(first_fname, ext=1, rows=0, lower=True)
+        if fitsio.read_header(self.config.galfile, ext=1).get('COLUMNAR', 0):
+            elt = fitsio.read(self.config.galfile, ext='GALDTYPE', lower=True)
+        else:
+            elt = fitsio.read(first_fname, ext=1, rows=0, lower=True)
         dtype_in = elt.dtype.descr
         # Remove truth information
         mark = []
@@ -71,7 +74,10 @@ class MemPredict(object):
             except AttributeError:
                 fname = os.path.join(zpath, ztab.filenames[0])
 
-            zelt = fitsio.read(fname, ext=1, rows=0, lower=True)
+            if fitsio.read_header(self.config.zredfile, ext=1).get('COLUMNAR', 0):
+                zelt = fitsio.read(self.config.zredfile, ext='ZREDDTYPE', lower=True)
+            else:
+                zelt = fitsio.read(fname, ext=1, rows=0, lower=True)
             nbytes += zelt[0].nbytes
 
         # Now compute the number of bytes per galaxy tile
@@ -14,6 +14,7 @@ from ..catalog import Catalog, Entry
 from ..utilities import read_members, astro_to_sphere
 from ..plotting import SpecPlot, NzPlot, NLambdaPlot, PositionPlot
 from ..galaxy import GalaxyCatalog
+from ..consolidator import CatalogConsolidator
 
 class RedmapperConsolidateTask(object):
     """
@@ -109,22 +110,17 @@ class RedmapperConsolidateTask(object):
             vlim_masks = [VolumeLimitMaskFixed(self.config)]
             vlim_areas = [vlim_masks[0].get_areas()]
 
-        started = np.zeros((len(self.lambda_cuts), len(vlim_masks)), dtype=bool)
         cat_filename_dict = {}
 
-        # Unique counter for temporary ids
-        ctr = 0
+        # The consolidator gives unique temporary ids, and renumbers at the end
+        consolidator = CatalogConsolidator(nproc=self.config.consolidate_nproc)
 
-        all_ids = np.zeros(0, dtype=np.int32)
-        all_likelihoods = np.zeros(0, dtype=np.float64)
+        def _read_pixel(catfile):
+            # Read in catalog and members
+            return Catalog.from_fits_file(catfile, ext=1), read_members(catfile)
 
-        for catfile in catfiles:
-            # Read in catalog
-            self.config.logger.info("Reading %s" % (os.path.basename(catfile)))
-            cat = Catalog.from_fits_file(catfile, ext=1)
-
-            # and read in members
-            mem = read_members(catfile)
+        for catfile, (cat, mem) in consolidator.read(catfiles, _read_pixel):
+            self.config.logger.info("Read %s" % (os.path.basename(catfile)))
 
             # Extract pixnum from name
 
@@ -177,22 +173,9 @@ class RedmapperConsolidateTask(object):
                 self.config.logger.info('Warning: no good clusters in pixel %d' % (hpix))
                 continue
 
-            cat = cat[use]
-
-            # match catalog with members via mem_match_id
-            a, b = esutil.numpy_util.match(cat.mem_match_id, mem.mem_match_id)
-
-            # put in new, temporary IDs
-            cat.mem_match_id = np.arange(use.size) + ctr
-            mem.mem_match_id[b] = cat.mem_match_id[a]
-            ctr += use.size
-
-            # Cut down members
-            mem = mem[b]
-
-            # Append ALL IDs and likelihoods for sorting here
-            all_ids = np.append(all_ids, cat.mem_match_id)
-            all_likelihoods = np.append(all_likelihoods, cat.lnlamlike)
+            # Put in new, temporary IDs, cut down members, and record the
+            # likelihoods for sorting at the end
+            cat, mem = consolidator.select(cat, use, mem=mem, sort_value='lnlamlike')
 
             # loop over minlambda
             for i, minlambda in enumerate(self.lambda_cuts):
@@ -208,7 +191,7 @@ class RedmapperConsolidateTask(object):
 
                     _, mem_use = esutil.numpy_util.match(cat.mem_match_id[cat_use], mem.mem_match_id)
 
-                    if not started[i, j]:
+                    if (i, j) not in cat_filename_dict:
                         # Figure out filename
                         if len(self.vlim_lstars) > 0:
                             extraname = 'lgt%02d_vl%02d' % (minlambda, int(self.vlim_lstars[j]*10))
@@ -221,58 +204,29 @@ class RedmapperConsolidateTask(object):
                         parts = os.path.basename(cat_fname).split('_catalog')
                         cat_filename_dict[(i, j)] = (parts[0], cat_fname, mem_fname)
 
-                        # Write out new fits files...
-                        cat.to_fits_file(cat_fname, clobber=True, indices=cat_use)
-                        mem.to_fits_file(mem_fname, clobber=True, indices=mem_use)
-
-                        started[i, j] = True
-                    else:
-                        # Append to existing fits files
-                        with fitsio.FITS(cat_filename_dict[(i, j)][1], mode='rw') as fits:
-                            fits[1].append(cat._ndarray[cat_use])
-
-                        with fitsio.FITS(cat_filename_dict[(i, j)][2], mode='rw') as fits:
-                            fits[1].append(mem._ndarray[mem_use])
-
-        # Sort and renumber ...
-        st = np.argsort(all_likelihoods)[::-1]
-
-        all_ids_sorted = all_ids[st]
-        new_ids = np.arange(all_ids.size) + 1
+                    # Write out (or append to) the fits files
+                    consolidator.write(cat_filename_dict[(i, j)][1], cat,
+                                       memfile=cat_filename_dict[(i, j)][2], mem=mem,
+                                       cat_indices=cat_use, mem_indices=mem_use)
 
-        # Now we have the index of all_ids_sorted to new_ids
-
-        # Read in specified columns and overwrite in each case
+        # Sort by likelihood and renumber in all the files
+        consolidator.renumber([cat_filename_dict[key][1] for key in cat_filename_dict],
+                              memfiles=[cat_filename_dict[key][2] for key in cat_filename_dict])
 
         for i, minlambda in enumerate(self.lambda_cuts):
             for j, vlim_mask in enumerate(vlim_masks):
-                catfits = fitsio.FITS(cat_filename_dict[(i, j)][1], mode='rw')
-                memfits = fitsio.FITS(cat_filename_dict[(i, j)][2], mode='rw')
-
-                cat_ids = catfits[1].read_column('mem_match_id')
-                mem_ids = memfits[1].read_column('mem_match_id')
-
-                # Every time we see an id we replace it
-                aa, bb = esutil.numpy_util.match(all_ids_sorted, cat_ids)
-                cat_ids[bb] = new_ids[aa]
-                aa, bb = esutil.numpy_util.match(all_ids_sorted, mem_ids)
-                mem_ids[bb] = new_ids[aa]
-
-                catfits[1].write_column('mem_match_id', cat_ids)
-                memfits[1].write_column('mem_match_id', mem_ids)
-
-                catfits.close()
-                memfits.close()
+                if (i, j) not in cat_filename_dict:
+                    continue
 
                 if do_plots:
                     # We want to plot the zspec plot and the n(z) plot
-                    cat = Catalog.from_fits_file(cat_filename_dict[(i, j)][1])
+                    cat = Catalog.from_fits_file(cat_filename_dict[(i, j)][1], lazy=True)
 
                     self.config.d.outbase = cat_filename_dict[(i, j)][0]
                     specplot = SpecPlot(self.config)
 
                     if self.config.has_truth:
-                        mem = Catalog.from_fits_file(cat_filename_dict[(i, j)][2])
+                        mem = Catalog.from_fits_file(cat_filename_dict[(i, j)][2], lazy=True)
                         specplot.plot_cluster_catalog_from_members(cat, mem, title=self.config.d.outbase, withversion=False)
                     else:
                         specplot.plot_cluster_catalog(cat, title=self.config.d.outbase, withversion=False)
@@ -345,15 +299,25 @@ class RuncatConsolidateTask(object):
             use, = np.where(spec.z_err < self.config.calib_spec_max_zerr)
             spec = spec[use]
 
-        started = False
-        for catfile in catfiles:
-            # Read in catalog
-            self.config.logger.info("Reading %s" % (os.path.basename(catfile)))
-            cat = Catalog.from_fits_file(catfile, ext=1)
+        cat_fname = self.config.redmapper_filename('%s_catalog' % (cattype), withversion=True)
+        if consolidate_members:
+            mem_fname = self.config.redmapper_filename('%s_catalog_members' % (cattype), withversion=True)
+        else:
+            mem_fname = None
 
-            # and read in members
+        consolidator = CatalogConsolidator(nproc=self.config.consolidate_nproc)
+
+        def _read_pixel(catfile):
+            # Read in catalog and members
+            cat = Catalog.from_fits_file(catfile, ext=1)
             if consolidate_members:
                 mem = read_members(catfile)
+            else:
+                mem = None
+            return cat, mem
+
+        for catfile, (cat, mem) in consolidator.read(catfiles, _read_pixel):
+            self.config.logger.info("Read %s" % (os.path.basename(catfile)))
 
             # Extract pixnum from name
 
@@ -398,32 +362,18 @@ class RuncatConsolidateTask(object):
                 self.config.logger.info('Warning: no good clusters in pixel %d' % (hpix))
                 continue
 
-            cat = cat[use]
-
-            if not started:
-                # Figure out filename
-                cat_fname = self.config.redmapper_filename('%s_catalog' % (cattype), withversion=True)
-                cat.to_fits_file(cat_fname, clobber=True)
-
-                if consolidate_members:
-                    mem_fname = self.config.redmapper_filename('%s_catalog_members' % (cattype), withversion=True)
-                    mem.to_fits_file(mem_fname, clobber=True)
+            # Write out (or append to) the fits files
+            consolidator.write(cat_fname, cat, memfile=mem_fname, mem=mem, cat_indices=use)
 
-                started = True
-            else:
-                with fitsio.FITS(cat_fname, mode='rw') as fits:
-                    fits[1].append(cat._ndarray)
-                if consolidate_members:
-                    with fitsio.FITS(mem_fname, mode='rw') as fits:
-                        fits[1].append(mem._ndarray)
+        consolidator.close()
 
         if do_plots:
-            cat = Catalog.from_fits_file(cat_fname)
+            cat = Catalog.from_fits_file(cat_fname, lazy=True)
             self.config.d.outbase = cat_name
             specplot = SpecPlot(self.config)
 
             if self.config.has_truth:
-                mem = Catalog.from_fits_file(mem_fname)
+                mem = Catalog.from_fits_file(mem_fname, lazy=True)
                 specplot.plot_cluster_catalog_from_members(cat, mem, title=self.config.d.outbase)
             else:
                 specplot.plot_cluster_catalog(cat, title=self.config.d.outbase)
@@ -0,0 +1,236 @@
+"""Classes to schedule redmapper runs on many pixels.
+"""
+import os
+import tempfile
+import numpy as np
+import fitsio
+import hpgeom as hpg
+import esutil
+import scipy.optimize
+
+from .catalog import Entry
+
+
+class PixelCostModel(object):
+    """
+    Class to estimate the cost (runtime) of running redmapper on a pixel.
+
+    The cost is modeled as
+
+       cost = c_0 + c_gal * ngal + c_seed * nseed
+
+    where ngal is the number of galaxies in the pixel (scaled up to include
+    the border), and nseed is the number of seeds (scaled the same way).
+    The galaxy counts come from the galaxy master table.  The coefficients
+    are refit to the actual runtimes of previous runs recorded in the
+    runtime file.  Runtimes are recorded per run mode (e.g. full,
+    staged, or percolation-only runs), and only the runtimes of the same
+    mode are used in the fit.
+    """
+
+    # Rough default coefficients (seconds), used until we have runtimes
+    default_coeffs = np.array([1.0, 1e-3, 1e-1])
+
+    def __init__(self, galfile, nside, border=0.0, seedfile=None, runtimefile=None, mode='full'):
+        """
+        Instantiate a PixelCostModel.
+
+        Parameters
+        ----------
+        galfile: `str`
+           Galaxy master table filename
+        nside: `int`
+           Healpix nside of the pixels to run
+        border: `float`, optional
+           Border around each pixel (degrees).  Default is 0.0.
+        seedfile: `str`, optional
+           Seed file with ra/dec of seeds.  Default is None.
+        runtimefile: `str`, optional
+           File to record runtimes for refining the model.  Default is None.
+        mode: `str`, optional
+           Run mode that the runtimes are recorded for.  Default is 'full'.
+        """
+        self.galtab = Entry.from_fits_file(galfile, ext=1)
+        self.nside = nside
+        self.border = border
+        self.runtimefile = runtimefile
+        self.mode = mode
+
+        self.seed_hpix = None
+        if seedfile is not None and os.path.isfile(seedfile):
+            seeds = fitsio.read(seedfile, ext=1, columns=['ra', 'dec'], lower=True)
+            self.seed_hpix = hpg.angle_to_pixel(nside, seeds['ra'], seeds['dec'], nest=False)
+
+        self.coeffs = self.default_coeffs.copy()
+        self.refit()
+
+    def _border_factor(self):
+        """
+        Get the ratio of the pixel area including the border to the
+        pixel area.
+
+        Returns
+        -------
+        factor: `float`
+           Area ratio
+        """
+        side = np.sqrt(hpg.nside_to_pixel_area(self.nside, degrees=True))
+        return ((side + 2.0*self.border) / side)**2.
+
+    def features(self, pixels):
+        """
+        Compute the cost model features for a list of pixels.
+
+        Parameters
+        ----------
+        pixels: `np.array`
+           Integer array of healpix pixels (ring format)
+
+        Returns
+        -------
+        ngal: `np.array`
+           Float array of estimated number of galaxies (including border)
+        nseed: `np.array`
+           Float array of estimated number of seeds (including border)
+        """
+        pixels = np.atleast_1d(pixels)
+
+        tab_hpix = np.atleast_1d(self.galtab.hpix)
+        tab_ngals = np.atleast_1d(self.galtab.ngals).astype(np.float64)
+
+        ngal = np.zeros(pixels.size)
+
+        if self.nside >= self.galtab.nside:
+            # Each pixel gets an area-weighted fraction of its parent
+            theta, phi = hpg.pixel_to_angle(self.nside, pixels, lonlat=False, nest=False)
+            parent = hpg.angle_to_pixel(self.galtab.nside, theta, phi, lonlat=False, nest=False)
+            a, b = esutil.numpy_util.match(tab_hpix, parent)
+            ngal[b] = tab_ngals[a] * (float(self.galtab.nside) / self.nside)**2.
+        else:
+            # Sum all the galaxy table pixels in each pixel
+            theta, phi = hpg.pixel_to_angle(self.galtab.nside, tab_hpix, lonlat=False, nest=False)
+            parent = hpg.angle_to_pixel(self.nside, theta, phi, lonlat=False, nest=False)
+            a, b = esutil.numpy_util.match(pixels, parent)
+            np.add.at(ngal, a, tab_ngals[b])
+
+        nseed = np.zeros(pixels.size)
+        if self.seed_hpix is not None:
+            a, b = esutil.numpy_util.match(pixels, self.seed_hpix)
+            np.add.at(nseed, a, 1.0)
+
+        factor = self._border_factor()
+
+        return ngal*factor, nseed*factor
+
+    def estimate(self, pixels):
+        """
+        Estimate the cost of running a list of pixels.
+
+        Parameters
+        ----------
+        pixels: `np.array`
+           Integer array of healpix pixels (ring format)
+
+        Returns
+        -------
+        cost: `np.array`
+           Float array of estimated cost (seconds)
+        """
+        ngal, nseed = self.features(pixels)
+
+        return self.coeffs[0] + self.coeffs[1]*ngal + self.coeffs[2]*nseed
+
+    def order(self, pixels):
+        """
+        Order a list of pixels from most to least expensive.
+
+        Parameters
+        ----------
+        pixels: `np.array`
+           Integer array of healpix pixels (ring format)
+
+        Returns
+        -------
+        ordered_pixels: `np.array`
+           Integer array of pixels sorted by decreasing estimated cost
+        """
+        pixels = np.atleast_1d(pixels)
+        cost = self.estimate(pixels)
+
+        # Stable sort so that ties keep the input order
+        return pixels[np.argsort(-cost, kind='stable')]
+
+    def record(self, pixels, runtimes):
+        """
+        Record the runtimes of a list of pixels to the runtime file, and
+        refit the model.
+
+        Parameters
+        ----------
+        pixels: `np.array`
+           Integer array of healpix pixels (ring format)
+        runtimes: `np.array`
+           Float array of runtimes (seconds)
+        """
+        if self.runtimefile is None:
+            return
+
+        pixels = np.atleast_1d(pixels)
+        ngal, nseed = self.features(pixels)
+
+        new = np.zeros(pixels.size, dtype=[('mode', 'a20'),
+                                           ('nside', 'i4'),
+                                           ('hpix', 'i8'),
+                                           ('ngal', 'f8'),
+                                           ('nseed', 'f8'),
+                                           ('runtime', 'f8')])
+        new['mode'] = self.mode
+        new['nside'] = self.nside
+        new['hpix'] = pixels
+        new['ngal'] = ngal
+        new['nseed'] = nseed
+        new['runtime'] = runtimes
+
+        if os.path.isfile(self.runtimefile):
+            new = np.concatenate((fitsio.read(self.runtimefile, ext=1, lower=True), new))
+
+        # Write to a temporary file and move it into place, so that the
+        # runtime file is never left partially written.
+        fd, tempfilename = tempfile.mkstemp(suffix='.fit',
+                                            dir=os.path.dirname(os.path.abspath(self.runtimefile)))
+        os.close(fd)
+        try:
+            fitsio.write(tempfilename, new, clobber=True)
+            os.replace(tempfilename, self.runtimefile)
+        finally:
+            if os.path.isfile(tempfilename):
+                os.remove(tempfilename)
+
+        self.refit()
+
+    def refit(self):
+        """
+        Refit the model coefficients to the recorded runtimes (if any) for
+        this run mode.
+
+        The coefficients are constrained to be non-negative.  If there are
+        not enough runtimes recorded, the default coefficients are used.
+        """
+        if self.runtimefile is None or not os.path.isfile(self.runtimefile):
+            return
+
+        runtimes = fitsio.read(self.runtimefile, ext=1, lower=True)
+        runtimes = runtimes[np.char.strip(runtimes['mode'].astype(str)) == self.mode]
+
+        # Only use the columns that vary
+        design = np.vstack((np.ones(runtimes.size), runtimes['ngal'], runtimes['nseed'])).T
+        use = np.ones(3, dtype=bool)
+        use[1:] = (np.std(design[:, 1:], axis=0) > 0.0)
+
+        if runtimes.size <= use.sum():
+            return
+
+        coeffs, _ = scipy.optimize.nnls(design[:, use], runtimes['runtime'])
+
+        self.coeffs = np.zeros(3)
+        self.coeffs[use] = coeffs
@@ -51,7 +51,7 @@ class GenerateRandoms(object):
             self.vlim_mask = vlim_mask
 
         if redmapper_cat is None:
-            self.redmapper_cat = ClusterCatalog.from_fits_file(self.config.catfile)
+            self.redmapper_cat = ClusterCatalog.from_fits_file(self.config.catfile, lazy=True)
         else:
             self.redmapper_cat = redmapper_cat
 
@@ -258,7 +258,7 @@ class RandomWeigher(object):
             self.vlim_mask = vlim_mask
 
         if redmapper_cat is None:
-            self.redmapper_cat = ClusterCatalog.from_fits_file(self.config.catfile)
+            self.redmapper_cat = ClusterCatalog.from_fits_file(self.config.catfile, lazy=True)
         else:
             self.redmapper_cat = redmapper_cat
 
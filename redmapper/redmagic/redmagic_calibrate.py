@@ -13,7 +13,7 @@ from ..fitters import MedZFitter
 from ..redsequence import RedSequenceColorPar
 from ..galaxy import GalaxyCatalog
 from ..catalog import Catalog, Entry
-from ..utilities import make_nodes, CubicSpline, interpol, read_members
+from ..utilities import make_nodes, CubicSpline, interpol, read_members, spline_basis
 from ..plotting import SpecPlot, NzPlot
 from ..volumelimit import VolumeLimitMask, VolumeLimitMaskFixed
 from .redmagic_selector import RedmagicSelector
@@ -125,6 +125,11 @@ class RedmagicParameterFitter(object):
         if len(self._zrange) != 2:
             raise ValueError("zrange must have 2 elements")
 
+        # The spline basis matrices are computed once, so that each spline
+        # evaluation is a matrix-vector product.
+        self._basis = spline_basis(self._nodes, self._z)
+        self._corrbasis = spline_basis(self._corrnodes, self._z)
+
     def fit(self, p0_cval, biaspars=None, eratiopars=None, afterburner=False):
         """
         Fit the redMaGiC parameters.
@@ -155,13 +160,12 @@ class RedmagicParameterFitter(object):
                 raise RuntimeError("Must set biaspars, eratiopars if using the afterburner")
 
             # Set _zredmagic based on the afterburner values
-            spl = CubicSpline(self._corrnodes, biaspars)
-            self._zredmagic = self._z - spl(self._z)
+            bias = np.dot(self._corrbasis, biaspars)
+            self._zredmagic = self._z - bias
 
-            self._zredmagic_samp = self._zsamp - spl(self._z)
+            self._zredmagic_samp = self._zsamp - bias
 
-            spl = CubicSpline(self._corrnodes, eratiopars)
-            self._zredmagic_e = self._z_err * spl(self._z)
+            self._zredmagic_e = self._z_err * np.dot(self._corrbasis, eratiopars)
         else:
             self._zredmagic[:] = self._z
             self._zredmagic_e[:] = self._z_err
@@ -196,8 +200,7 @@ class RedmagicParameterFitter(object):
            Float array of best-fit eratio parameters
         """
 
-        spl = CubicSpline(self._nodes, cval)
-        chi2max = np.clip(spl(self._z), 0.1, self._maxchi)
+        chi2max = np.clip(np.dot(self._basis, cval), 0.1, self._maxchi)
 
         ab_mask = ((self._chisq[self._ab_use] < chi2max[self._ab_use]) &
                    (self._refmag[self._ab_use] < (self._mstar[self._ab_use] - 2.5 * np.log10(self._etamin))))
@@ -217,8 +220,7 @@ class RedmagicParameterFitter(object):
         mzfitter = MedZFitter(self._corrnodes, self._z[ab_gd], delta_gd)
         pars_bias = mzfitter.fit(p0_bias, min_val=-0.1, max_val=0.1)
 
-        spl = CubicSpline(self._corrnodes, pars_bias)
-        delta_med_gd = spl(self._z[ab_gd])
+        delta_med_gd = np.dot(self._corrbasis[ab_gd, :], pars_bias)
 
         y = 1.4826 * np.abs(delta_gd - delta_med_gd) / self._z_err[ab_gd]
 
@@ -243,8 +245,7 @@ class RedmagicParameterFitter(object):
         """
 
         # chi2max is computed at the raw redshift
-        spl = CubicSpline(self._nodes, pars)
-        chi2max = np.clip(spl(self._z), 0.1, self._maxchi)
+        chi2max = np.clip(np.dot(self._basis, pars), 0.1, self._maxchi)
 
         # zsamp = self._randomn * self._zredmagic_e + self._zredmagic
 
@@ -373,7 +374,7 @@ class RedmagicCalibrator(object):
         gals.zuse_e = gals.zred_uncorr_e
         gals.zredmagic_samp = gals.zred_samp
 
-        zredstr = RedSequenceColorPar(self.config.parfile, fine=True)
+        zredstr = RedSequenceColorPar(self.config.parfile, fine=True, cachedir=self.config.redsequence_cachedir)
 
         mstar_init = zredstr.mstar(gals.zuse)
 
@@ -13,7 +13,7 @@ from ..galaxy import GalaxyCatalog
 from ..configuration import Configuration
 from ..volumelimit import VolumeLimitMask, VolumeLimitMaskFixed
 from ..redsequence import RedSequenceColorPar
-from ..utilities import CubicSpline
+from ..utilities import CubicSpline, FixedGridCubicSpline
 
 class RedmagicSelector(object):
     """
@@ -55,7 +55,7 @@ class RedmagicSelector(object):
 
         self.modes = self.calib_data.keys()
 
-        self.zredstr = RedSequenceColorPar(self.config.parfile, fine=True)
+        self.zredstr = RedSequenceColorPar(self.config.parfile, fine=True, cachedir=self.config.redsequence_cachedir)
 
         if vlim_masks is None:
             self.vlim_masks = OrderedDict()
@@ -90,7 +90,7 @@ class RedmagicSelector(object):
 
         self.spec = None
 
-    def select_redmagic_galaxies(self, gals, mode, return_indices=False):
+    def select_redmagic_galaxies(self, gals, mode, return_indices=False, rng=None):
         """
         Select redMaGiC galaxies from a galaxy catalog, according to the mode.
 
@@ -102,6 +102,9 @@ class RedmagicSelector(object):
            redMaGiC mode to select
         return_indices: `bool`, optional
            Return the indices of the galaxies selected.  Default is False.
+        rng: `np.random.RandomState`, optional
+           Random number generator for sampling zredmagic_samp when the
+           galaxies do not have zred_samp.  Default is None (use np.random).
 
         Returns
         -------
@@ -147,24 +150,26 @@ class RedmagicSelector(object):
         except (ValueError, AttributeError) as e:
             # Sample from zred + zred_e (not optimal, for old catalogs)
             zredmagic_samp = np.zeros((zredmagic.size, 1))
-            zredmagic_samp[:, 0] = np.random.normal(loc=zredmagic,
-                                                    scale=zredmagic_e,
-                                                    size=zredmagic.size)
+            if rng is None:
+                rng = np.random
+            zredmagic_samp[:, 0] = rng.normal(loc=zredmagic,
+                                               scale=zredmagic_e,
+                                               size=zredmagic.size)
 
         spl = CubicSpline(calstr.nodes, calstr.cmax, fixextrap=True)
         chi2max = np.clip(spl(gals.zred_uncorr), 0.1, calstr.maxchi)
 
         if calstr.run_afterburner:
-            spl = CubicSpline(calstr.corrnodes, calstr.bias, fixextrap=True)
-            offset = spl(gals.zred_uncorr)
+            # The bias and eratio share the nodes and are evaluated together
+            spl = FixedGridCubicSpline(calstr.corrnodes, gals.zred_uncorr, fixextrap=True)
+            offset, eratio = spl([calstr.bias, calstr.eratio])
             zredmagic -= offset
 
             if calstr.apply_afterburner:
                 for i in range(zredmagic_samp.shape[1]):
                     zredmagic_samp[:, i] -= offset
 
-            spl = CubicSpline(calstr.corrnodes, calstr.eratio, fixextrap=True)
-            zredmagic_e *= spl(gals.zred_uncorr)
+            zredmagic_e *= eratio
 
         # Compute mstar
         mstar = self.zredstr.mstar(zredmagic)
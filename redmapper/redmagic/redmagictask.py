@@ -3,6 +3,9 @@ import os
 import numpy as np
 import glob
 import fitsio
+import multiprocessing
+import threading
+import queue
 
 from ..configuration import Configuration
 from .redmagic_selector import RedmagicSelector
@@ -36,13 +39,19 @@ l           Output path.  Default is None, use same absolute
 
         self.config = Configuration(configfile, outpath=path)
 
-    def run(self, modes=None, clobber=False, do_plots=True, n_randoms=None, rng=None):
+    def run(self, modes=None, clobber=False, do_plots=True, n_randoms=None, rng=None, nproc=None):
         """
         Run redMaGiC selection over a full catalog.
 
         The modes are optional, if not specified all the modes
         will be run.
 
+        The pixels are selected in parallel processes, and the selected
+        galaxies are written by a separate thread in pixel order, so the
+        output files do not depend on the number of processes.  Each pixel
+        has its own random seed, drawn from rng, so that any random samples
+        also do not depend on the number of processes.
+
         Parameters
         ----------
         modes: `list`, optional
@@ -57,9 +66,15 @@ l           Output path.  Default is None, use same absolute
            If >0, then that many randoms are generated.
         rng : `np.random.RandomState`, optional
            Pre-set random number generator.  Default is None.
+        nproc: `int`, optional
+           Number of processes for the selection.  Default is None,
+           which uses config.redmagic_run_nproc.
         """
         self.config.start_file_logging()
 
+        if nproc is None:
+            nproc = self.config.redmagic_run_nproc
+
         if rng is None:
             rng = np.random.RandomState()
 
@@ -85,34 +100,46 @@ l           Output path.  Default is None, use same absolute
         # Loop over all pixels in the galaxy table
         tab = Entry.from_fits_file(self.config.galfile)
 
-        started = [False] * n_modes
-
         self.config.logger.info("Making redMaGiC selection for %d modes and %d pixels" % (n_modes, tab.hpix.size))
         if self.config.has_truth:
             self.config.logger.info("Using truth information for zspec")
 
-        for i, pix in enumerate(tab.hpix):
-            gals = GalaxyCatalog.from_galfile(self.config.galfile,
-                                              zredfile=self.config.zredfile,
-                                              nside=tab.nside,
-                                              hpix=pix,
-                                              border=0.0,
-                                              truth=self.config.has_truth)
+        self._selector = selector
+        self._modes = modes
+        self._nside = tab.nside
 
-            # Loop over all modes
-            for j, mode in enumerate(modes):
-                # Select the red galaxies
-                red_gals = selector.select_redmagic_galaxies(gals, mode)
-
-                # Spool out redMaGiC galaxies
-                if not started[j]:
-                    # write a new file (and overwrite if necessary, since we
-                    # already did the clobber check)
-                    red_gals.to_fits_file(filenames[j], clobber=True)
-                    started[j] = True
-                else:
-                    with fitsio.FITS(filenames[j], mode='rw') as fits:
-                        fits[1].append(red_gals._ndarray)
+        seeds = rng.randint(low=0, high=2**31, size=tab.hpix.size)
+
+        # The writer thread appends to the output files while the
+        # next pixels are being selected.
+        write_queue = queue.Queue(maxsize=2*nproc)
+        write_errors = []
+        writer = threading.Thread(target=self._writer, args=(write_queue, filenames, write_errors))
+        writer.start()
+
+        try:
+            if nproc == 1:
+                for pix, seed in zip(tab.hpix, seeds):
+                    write_queue.put(self._worker(pix, seed))
+            else:
+                # The forked workers inherit the selector, so only the
+                # pixel numbers and seeds are sent.  imap keeps the pixel order.
+                mp_ctx = multiprocessing.get_context("fork")
+                pool = mp_ctx.Pool(processes=nproc, initializer=_init_worker, initargs=(self, ))
+                try:
+                    for red_arrays in pool.imap(_select_pixel, zip(tab.hpix, seeds), chunksize=1):
+                        write_queue.put(red_arrays)
+                    pool.close()
+                finally:
+                    # Do not leave workers running if a pixel failed
+                    pool.terminate()
+                    pool.join()
+        finally:
+            write_queue.put(None)
+            writer.join()
+
+        if len(write_errors) > 0:
+            raise write_errors[0]
 
         # Load in catalogs and make plots!
         if do_plots:
@@ -170,3 +197,108 @@ l           Output path.  Default is None, use same absolute
             rand_generator.generate_randoms(_n_randoms, randfile, clobber=clobber, rng=rng)
 
         self.config.stop_file_logging()
+
+    def _worker(self, pix, seed):
+        """
+        Select redMaGiC galaxies from one pixel for all the modes.
+
+        Parameters
+        ----------
+        pix: `int`
+           Healpix pixel number (ring format)
+        seed: `int`
+           Random seed for the pixel
+
+        Returns
+        -------
+        red_arrays: `list`
+           List of `np.ndarray` of selected galaxies, one for each mode
+        """
+        gals = GalaxyCatalog.from_galfile(self.config.galfile,
+                                          zredfile=self.config.zredfile,
+                                          nside=self._nside,
+                                          hpix=pix,
+                                          border=0.0,
+                                          truth=self.config.has_truth)
+
+        rng = np.random.RandomState(seed=seed)
+
+        return [self._selector.select_redmagic_galaxies(gals, mode, rng=rng)._ndarray for mode in self._modes]
+
+    def _writer(self, write_queue, filenames, write_errors):
+        """
+        Write selected redMaGiC galaxies to the output files, in the order
+        they are put on the queue, until None is received.
+
+        The first write to each file overwrites it (since we already did the
+        clobber check).  After an error, the queue is still drained so that
+        the selection does not block.
+
+        Parameters
+        ----------
+        write_queue: `queue.Queue`
+           Queue of lists of `np.ndarray`, one for each output file
+        filenames: `list`
+           List of output filenames, one for each mode
+        write_errors: `list`
+           List to append any exception raised while writing
+        """
+        fits_files = [None] * len(filenames)
+
+        try:
+            while True:
+                red_arrays = write_queue.get()
+                if red_arrays is None:
+                    break
+                if len(write_errors) > 0:
+                    continue
+
+                try:
+                    for j, red_array in enumerate(red_arrays):
+                        if fits_files[j] is None:
+                            fits_files[j] = fitsio.FITS(filenames[j], mode='rw', clobber=True)
+                            fits_files[j].write(red_array)
+                        else:
+                            fits_files[j][1].append(red_array)
+                except Exception as e:
+                    write_errors.append(e)
+        finally:
+            for fits in fits_files:
+                if fits is not None:
+                    fits.close()
+
+
+_worker_task = None
+
+
+def _init_worker(task):
+    """
+    Initialize a forked worker process for the redMaGiC selection.
+
+    The task is inherited from the parent process.
+
+    Parameters
+    ----------
+    task: `redmapper.redmagic.RunRedmagicTask`
+       Task with the selector and modes set
+    """
+    global _worker_task
+
+    _worker_task = task
+
+
+def _select_pixel(pix_seed):
+    """
+    Select redMaGiC galaxies from one pixel (for multiprocessing).
+
+    Parameters
+    ----------
+    pix_seed: `tuple`
+       Healpix pixel number (ring format) and random seed for the pixel
+
+    Returns
+    -------
+    red_arrays: `list`
+       List of `np.ndarray` of selected galaxies, one for each mode
+    """
+    return _worker_task._worker(*pix_seed)
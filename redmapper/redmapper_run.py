@@ -7,11 +7,13 @@ import copy
 import fitsio
 import re
 import os
+import time
 import esutil
 import hpgeom as hpg
 from esutil.cosmology import Cosmo
 
 import multiprocessing
+import concurrent.futures
 
 import types
 try:
@@ -22,11 +24,113 @@ except ImportError:
 from .utilities import _pickle_method
 
 from .catalog import Catalog, Entry
+from .galaxy import GalaxyCatalog
 from .run_firstpass import RunFirstPass
 from .run_likelihoods import RunLikelihoods
 from .run_percolation import RunPercolation
+from .pixel_scheduler import PixelCostModel
+from .consolidator import CatalogConsolidator
 from .utilities import getMemoryString
 
+# Galaxies shared with the forked worker processes, as (zredfile, gals).
+# This is only set while the worker pool of RedmapperRun.run() is running.
+_shared_galaxies = None
+
+
+def _file_key(filename):
+    """
+    Get a key for a file that changes when the file is modified.
+
+    Parameters
+    ----------
+    filename: `str`
+       Filename (may be None)
+
+    Returns
+    -------
+    key: `tuple`
+       (filename, mtime, size), or None if filename is None.
+    """
+    if filename is None:
+        return None
+
+    stat = os.stat(filename)
+    return (filename, stat.st_mtime, stat.st_size)
+
+
+class SharedGalaxies(object):
+    """
+    Store of the galaxies (and zreds) for the region of a RedmapperRun, read
+    once and shared with the forked worker processes which cut out their own
+    pixels.
+
+    The galaxies are kept for following runs on the same region with the
+    same (unmodified) galaxy and zred files, until clear() is called.
+    """
+
+    def __init__(self):
+        """
+        Instantiate an empty SharedGalaxies store.
+        """
+        self._key = None
+        self._shared_gals = None
+
+    def get(self, config):
+        """
+        Get the galaxies for the region of a run, reading them if they
+        are not stored.
+
+        This must be called before the nside of the config is changed for
+        the split pixels.
+
+        Parameters
+        ----------
+        config: `redmapper.Configuration`
+           Configuration object
+
+        Returns
+        -------
+        shared_gals: `tuple`
+           (zredfile, GalaxyCatalog) or None if galaxies cannot be shared.
+        """
+        if len(config.d.hpix) > 1 and config.border > 0.0:
+            config.logger.info("Cannot share galaxies for a run on a pixel list.  "
+                               "Reading galaxies for each pixel.")
+            self.clear()
+            return None
+
+        key = (_file_key(config.galfile), _file_key(config.zredfile), config.d.nside,
+               tuple(config.d.hpix), config.border, config.centering_use_zspec)
+
+        if self._shared_gals is not None and self._key == key:
+            config.logger.info("Using %d shared galaxies." % (self._shared_gals[1].size))
+            return self._shared_gals
+
+        # Release the old galaxies before reading
+        self.clear()
+
+        gals = GalaxyCatalog.from_galfile(config.galfile,
+                                          zredfile=config.zredfile,
+                                          nside=config.d.nside,
+                                          hpix=config.d.hpix,
+                                          border=config.border,
+                                          use_tempfile=config.use_tempfiles_to_conserve_memory,
+                                          zspec=config.centering_use_zspec)
+        self._key = key
+        self._shared_gals = (config.zredfile, gals)
+
+        config.logger.info("Read %d shared galaxies." % (gals.size))
+
+        return self._shared_gals
+
+    def clear(self):
+        """
+        Release the stored galaxies.
+        """
+        self._key = None
+        self._shared_gals = None
+
+
 class RedmapperRun(object):
     """
     Class to run various stages of the redmapper finder using multiprocessing.
@@ -55,7 +159,7 @@ class RedmapperRun(object):
 
     def run(self, specmode=False, seedfile=None, check=True,
             percolation_only=False, consolidate_like=False, keepz=False, cleaninput=False,
-            consolidate=True):
+            consolidate=True, shared_galaxies=None):
         """
         Run the redmapper cluster finder using multiprocessing.
 
@@ -78,6 +182,10 @@ class RedmapperRun(object):
            Processing stage should clean out bad clusters?  Default is False.
         consolidate: `bool`, optional
            Consolidate the pixel runs for the percolated files?  Default is True.
+        shared_galaxies: `redmapper.redmapper_run.SharedGalaxies`, optional
+           Store of shared galaxies to reuse between runs, if
+           config.calib_run_shared_galaxies is set.  Default is None,
+           which reads the shared galaxies for this run only.
 
         Returns
         -------
@@ -95,6 +203,7 @@ class RedmapperRun(object):
         self.percolation_only = percolation_only
         self.keepz = keepz
         self.cleaninput = cleaninput
+        self.consolidate_like = consolidate_like
 
         if self.specmode and not self.keepz:
             raise RuntimeError("Must set keepz=True when specmode=True")
@@ -105,6 +214,25 @@ class RedmapperRun(object):
 
         self.config.logger.info("Running on %d pixels" % (len(pixels_split)))
 
+        # The galaxies are shared with the workers through the fork, so
+        # they can only be shared with the fork start method.
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_ctx = multiprocessing.get_context("fork")
+        else:
+            mp_ctx = multiprocessing.get_context()
+
+        # Read the galaxies for the full region once, before the worker
+        # processes are forked, if they are to be shared.
+        shared_gals = None
+        if self.config.calib_run_shared_galaxies:
+            if mp_ctx.get_start_method() != 'fork':
+                self.config.logger.info("Cannot share galaxies without the fork start method.  "
+                                        "Reading galaxies for each pixel.")
+            else:
+                if shared_galaxies is None:
+                    shared_galaxies = SharedGalaxies()
+                shared_gals = shared_galaxies.get(self.config)
+
         # run each individual one
         nside_orig = self.config.d.nside
         self.config.d.nside = nside_split
@@ -113,16 +241,52 @@ class RedmapperRun(object):
         if seedfile is not None:
             # Use the specified seedfile if desired
             self.config.seedfile = seedfile
-        mp_ctx = multiprocessing.get_context("fork")
-        pool = mp_ctx.Pool(processes=self.config.calib_run_nproc)
-        if self.percolation_only:
-            retvals = pool.map(self._percolation_only_worker, pixels_split, chunksize=1)
-            #retvals = list(map(self._percolation_only_worker, pixels_split))
+
+        # Each pixel has its own random seed so that the results do not
+        # depend on the order in which the pixels are run, or on which
+        # process runs them.
+        seeds = np.random.randint(low=0, high=2**31, size=len(pixels_split))
+        pixel_seeds = dict(zip(pixels_split, seeds))
+
+        # With multiple processes, run the most expensive pixels first; each
+        # process takes the next pixel from the queue when it is free.
+        cost_model = None
+        if self.config.calib_run_nproc > 1:
+            if self.percolation_only:
+                mode = 'percolation_only'
+            elif self.config.calib_run_staged:
+                mode = 'staged'
+            else:
+                mode = 'full'
+            cost_model = PixelCostModel(self.config.galfile, nside_split,
+                                        border=self.config.border,
+                                        seedfile=(self.config.catfile if self.percolation_only
+                                                  else self.config.seedfile),
+                                        runtimefile=self.config.calib_run_runtimefile,
+                                        mode=mode)
+            pixels_ordered = cost_model.order(pixels_split)
         else:
-            retvals = pool.map(self._worker, pixels_split, chunksize=1)
-            #retvals = list(map(self._worker, pixels_split))
-        pool.close()
-        pool.join()
+            pixels_ordered = pixels_split
+
+        global _shared_galaxies
+        _shared_galaxies = shared_gals
+        try:
+            pool = mp_ctx.Pool(processes=self.config.calib_run_nproc)
+            results = list(pool.imap_unordered(self._timed_worker,
+                                               [(hpix, pixel_seeds[hpix]) for hpix in pixels_ordered],
+                                               chunksize=1))
+            #results = list(map(self._timed_worker, [(hpix, pixel_seeds[hpix]) for hpix in pixels_ordered]))
+            pool.close()
+            pool.join()
+        finally:
+            _shared_galaxies = None
+
+        if cost_model is not None:
+            cost_model.record([x[0][0] for x in results], [x[1] for x in results])
+
+        # Put the results back in pixel order for consolidation
+        retvals_dict = {x[0][0]: x[0] for x in results}
+        retvals = [retvals_dict[hpix] for hpix in pixels_split]
 
         # Reset the seedfile
         self.config.seedfile = orig_seedfile
@@ -151,6 +315,17 @@ class RedmapperRun(object):
         else:
             return finalfile
 
+    def _get_shared_galaxies(self):
+        """
+        Get the shared galaxies for the workers.
+
+        Returns
+        -------
+        shared_gals: `tuple`
+           (zredfile, GalaxyCatalog) or None if galaxies are not shared.
+        """
+        return _shared_galaxies
+
     def _get_pixel_splits(self):
         """
         Get the subpixels on which to run to optimally split the input catalog
@@ -282,23 +457,21 @@ class RedmapperRun(object):
             if outfile_there and not members:
                 return outfile
 
-        # How many clusters are there?  (This is the maxmimum before cuts)
-        ncluster = 0
-        for f in filenames:
-            hdr = fitsio.read_header(f, ext=1)
-            ncluster += hdr['NAXIS2']
-
-        element = Entry.from_fits_file(filenames[0], ext=1, rows=0)
-        dtype = element._ndarray.dtype
-
-        ubercat = Catalog(np.zeros(ncluster, dtype=dtype))
-        ctr = 0
-
-        ubermem = None
+        consolidator = CatalogConsolidator(nproc=self.config.consolidate_nproc)
 
-        for hpix, f in zip(hpixels, filenames):
-            cat = Catalog.from_fits_file(f, ext=1)
+        def _read_pixel(f):
+            # The other columns are only read for the clusters that are kept
+            cat = Catalog.from_fits_file(f, ext=1, lazy=True,
+                                         columns=['ra', 'dec', 'maskfrac', 'lambda', 'scaleval'])
+            if members:
+                parts = f.split('.fit')
+                mem = Catalog.from_fits_file(parts[0] + '_members.fit', lazy=True,
+                                             columns=['mem_match_id'])
+            else:
+                mem = None
+            return cat, mem
 
+        for hpix, (f, (cat, mem)) in zip(hpixels, consolidator.read(filenames, _read_pixel)):
             # Cut to minlambda, maxfrac, and within a pixel
             if self.config.d.nside > 0:
                 ipring = hpg.angle_to_pixel(self.config.d.nside, cat.ra, cat.dec, nest=False)
@@ -314,57 +487,60 @@ class RedmapperRun(object):
             if use.size == 0:
                 continue
 
-            cat = cat[use]
-
             if members:
-                parts = f.split('.fit')
-                mem = Catalog.from_fits_file(parts[0] + '_members.fit')
-
                 # We are going to replace the mem_match_ids in the consolidated catalog,
                 # because the ones generated in the pixels aren't unique
-                new_ids = np.arange(use.size, dtype=np.int32) + ctr + 1
-
-                a, b = esutil.numpy_util.match(cat.mem_match_id, mem.mem_match_id)
-                cat.mem_match_id = new_ids
-                mem.mem_match_id[b] = cat.mem_match_id[a]
+                cat, mem = consolidator.select(cat, use, mem=mem, sort_value='lnlike')
+                consolidator.write(outfile, cat, memfile=memfile, mem=mem)
+            else:
+                consolidator.write(outfile, cat, cat_indices=use)
 
-                # and we only want to store the members that matched!
-                mem = mem[b]
+        consolidator.close()
 
-            # And copy the fields
-            for n in dtype.names:
-                ubercat._ndarray[n][ctr: ctr + cat.size] = cat._ndarray[n]
+        if outfile not in consolidator.filenames():
+            # No clusters survived; write an empty catalog
+            element = Entry.from_fits_file(filenames[0], ext=1, rows=0)
+            fitsio.write(outfile, np.zeros(0, dtype=element._ndarray.dtype), clobber=True)
+        elif members:
+            # Now we need a final sorting by likelihood and mem_match_id replacement
+            consolidator.renumber([outfile], memfiles=[memfile], sort_rows=True)
 
-            if members:
-                if ubermem is None:
-                    ubermem = mem
-                else:
-                    ubermem.append(mem)
+        return outfile
 
-            ctr += cat.size
+    def _timed_worker(self, hpix_seed):
+        """
+        Do the run on one pixel with the appropriate worker, and record the
+        runtime (for multiprocessing).
 
-        # Crop the catalog to the range that we had clusters
-        ubercat = ubercat[0:ctr]
+        The numpy random state of the worker process is seeded for the pixel
+        before the run.
 
-        # Now we need a final sorting by likelihood and mem_match_id replacement
-        if members:
-            st = np.argsort(ubercat.lnlike)[::-1]
-            ubercat = ubercat[st]
+        Parameters
+        ----------
+        hpix_seed: `tuple`
+           Healpix ring pixel to run and random seed for the pixel.
 
-            a, b = esutil.numpy_util.match(ubercat.mem_match_id, ubermem.mem_match_id)
+        Outputs
+        -------
+        retval: `tuple`
+           Return value from the worker (see _worker())
+        runtime: `float`
+           Runtime (seconds)
+        """
+        hpix, seed = hpix_seed
 
-            ubercat.mem_match_id = np.arange(ubercat.size, dtype=np.int32) + 1
-            ubermem.mem_match_id[b] = ubercat.mem_match_id[a]
+        starttime = time.time()
 
-        # And write out...
-        # We can clobber because if it was already there and we wanted to check
-        # that already happened
-        ubercat.to_fits_file(outfile, clobber=True)
+        np.random.seed(seed=seed)
 
-        if members:
-            ubermem.to_fits_file(memfile, clobber=True)
+        if self.percolation_only:
+            retval = self._percolation_only_worker(hpix)
+        elif self.config.calib_run_staged:
+            retval = self._staged_worker(hpix)
+        else:
+            retval = self._worker(hpix)
 
-        return outfile
+        return (retval, time.time() - starttime)
 
     def _worker(self, hpix):
         """
@@ -400,7 +576,10 @@ class RedmapperRun(object):
 
         # Need to add checks about success, and whether a file was output
         #  (especially border pixels in sims)
+        shared_gals = self._get_shared_galaxies()
+
         firstpass = RunFirstPass(config, specmode=self.specmode)
+        firstpass.shared_gals = shared_gals
 
         if not os.path.isfile(firstpass.filename) or not self.check:
             firstpass.run(keepz=self.keepz, cleaninput=self.cleaninput)
@@ -422,6 +601,7 @@ class RedmapperRun(object):
         del firstpass
 
         like = RunLikelihoods(config)
+        like.shared_gals = shared_gals
 
         if not os.path.isfile(like.filename) or not self.check:
             like.run(keepz=self.keepz)
@@ -443,6 +623,7 @@ class RedmapperRun(object):
         del like
 
         perc = RunPercolation(config)
+        perc.shared_gals = shared_gals
 
         if not os.path.isfile(perc.filename) or not self.check:
             perc.run(keepz=self.keepz)
@@ -461,6 +642,138 @@ class RedmapperRun(object):
 
         return (hpix, firstpass_filename, like_filename, perc_filename)
 
+    def _staged_worker(self, hpix):
+        """
+        Do the run on one pixel (for multiprocessing), with all the stages
+        in memory.
+
+        The firstpass, likelihood, and percolation stages share the galaxies,
+        backgrounds, red sequence parameters, mask, and depth map, which are
+        only read once, and the cluster catalog is passed directly from one
+        stage to the next.  The firstpass and likelihood files are only
+        written as checkpoints if config.calib_run_staged_checkpoint is set
+        (or the likelihoods are to be consolidated), in a background thread.
+
+        Parameters
+        ----------
+        hpix: `int`
+           Healpix ring pixel to run.
+
+        Outputs
+        -------
+        hpix: `int`
+           Healpix ring number that was run.
+        firstpass_filename: `str`
+           Filename for firstpass file (None if not written).
+        like_filename: `str`
+           Filename for likelihood file (None if not written).
+        perc_filename: `str`
+           Filename for percolation file.
+        """
+
+        self.config.logger.info("Running staged on pixel %d" % (hpix))
+
+        config = self.config.copy()
+        config.cosmo = Cosmo(H0=self._H0, omega_l=self._omega_l, omega_m=self._omega_m)
+
+        config.d.hpix = [hpix]
+
+        config.d.outbase = '%s_%d_%05d' % (self.config.d.outbase, self.config.d.nside, hpix)
+
+        input_cache = {}
+        shared_gals = self._get_shared_galaxies()
+
+        checkpoint_firstpass = config.calib_run_staged_checkpoint
+        checkpoint_like = config.calib_run_staged_checkpoint or self.consolidate_like
+
+        perc = RunPercolation(config)
+        perc_filename = perc.filename
+
+        if os.path.isfile(perc_filename) and self.check:
+            self.config.logger.info("Percolation file %s already present.  Skipping..." % (perc_filename))
+            like_filename = RunLikelihoods(config).filename
+            if not os.path.isfile(like_filename):
+                like_filename = None
+            return (hpix, None, like_filename, perc_filename)
+
+        firstpass_filename = None
+        like_filename = None
+        checkpoints = []
+
+        # The checkpoint files are written in a background thread.  The
+        # catalogs are not modified after they are handed to the next stage,
+        # which makes its own copy.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            firstpass = RunFirstPass(config, specmode=self.specmode)
+            firstpass.input_cache = input_cache
+            firstpass.shared_gals = shared_gals
+
+            if not os.path.isfile(firstpass.filename) or not self.check:
+                firstpass.run(keepz=self.keepz, cleaninput=self.cleaninput)
+
+                if (firstpass.cat is None or
+                    (firstpass.cat is not None and firstpass.cat.size == 0)):
+                    # We did not get a firstpass catalog
+                    self.config.logger.info("Did not produce a firstpass catalog for pixel %d" % (hpix))
+                    return (hpix, None, None, None)
+
+                incat = firstpass.cat
+
+                if checkpoint_firstpass:
+                    firstpass_filename = firstpass.filename
+                    checkpoints.append(executor.submit(firstpass.output, savemembers=False,
+                                                       withversion=False, clobber=True))
+            else:
+                self.config.logger.info("Firstpass file %s already present.  Skipping..." % (firstpass.filename))
+                firstpass_filename = firstpass.filename
+                config.catfile = firstpass_filename
+                incat = None
+
+            like = RunLikelihoods(config)
+            like.input_cache = input_cache
+            like.shared_gals = shared_gals
+
+            if not os.path.isfile(like.filename) or not self.check:
+                like.run(keepz=self.keepz, incat=incat)
+
+                if (like.cat is None or
+                    (like.cat is not None and like.cat.size == 0)):
+                    # We did not get a likelihood catalog
+                    self.config.logger.info("Did not produce a likelihood catalog for pixel %d" % (hpix))
+                    return (hpix, firstpass_filename, None, None)
+
+                incat = like.cat
+
+                if checkpoint_like:
+                    like_filename = like.filename
+                    checkpoints.append(executor.submit(like.output, savemembers=False,
+                                                       withversion=False, clobber=True))
+            else:
+                self.config.logger.info("Likelihood file %s already present.  Skipping..." % (like.filename))
+                like_filename = like.filename
+                config.catfile = like_filename
+                incat = None
+
+            perc = RunPercolation(config)
+            perc.input_cache = input_cache
+            perc.shared_gals = shared_gals
+
+            perc.run(keepz=self.keepz, incat=incat)
+
+            if (perc.cat is None or
+                (perc.cat is not None and perc.cat.size == 0)):
+                # We did not get a percolation catalog
+                self.config.logger.info("Did not produce a percolation catalog for pixel %d" % (hpix))
+                return (hpix, firstpass_filename, like_filename, None)
+
+            perc.output(savemembers=True, withversion=False, clobber=True)
+
+            # Raise any errors from writing the checkpoints
+            for checkpoint in checkpoints:
+                checkpoint.result()
+
+        return (hpix, firstpass_filename, like_filename, perc.filename)
+
     def _percolation_only_worker(self, hpix):
         """
         Do a percolation only run on one pixel (for multiprocessing).
@@ -492,6 +805,7 @@ class RedmapperRun(object):
         config.d.outbase = '%s_%05d' % (self.config.d.outbase, hpix)
 
         perc = RunPercolation(config)
+        perc.shared_gals = self._get_shared_galaxies()
         if not os.path.isfile(perc.filename) or not self.check:
             perc.run(keepz=self.keepz, cleaninput=self.cleaninput)
 
@@ -3,14 +3,20 @@
 This class describes the red-sequence parameterization, and contains various
 methods for using the model.
 """
+import os
+import json
+import hashlib
+import tempfile
+import shutil
 import fitsio
 import esutil
 import numpy as np
 from scipy import interpolate
 
-from .chisq_dist import compute_chisq
+from ._version import __version__
+from .chisq_dist import compute_chisq, compute_chisq_grouped
 from .catalog import Catalog
-from .utilities import CubicSpline, MStar
+from .utilities import FixedGridCubicSpline, MStar
 from .utilities import schechter_pdf, RedGalInitialColors
 
 class RedSequenceColorPar(object):
@@ -20,7 +26,14 @@ class RedSequenceColorPar(object):
     This is the fundamental basis of the redmapper red sequence model.
     """
 
-    def __init__(self, filename, zbinsize=None, minsig=0.01, fine=False, zrange=None, config=None, limmag=None):
+    # Increment this when the interpolated model changes, to invalidate caches
+    _cache_version = 2
+
+    # Galaxy columns used by calculate_chisq()
+    chisq_columns = ['refmag', 'refmag_err', 'mag', 'mag_err']
+
+    def __init__(self, filename, zbinsize=None, minsig=0.01, fine=False, zrange=None, config=None, limmag=None,
+                 cachedir=None):
         """
         Instantiate a RedSequenceColorPar object.
 
@@ -57,8 +70,18 @@ class RedSequenceColorPar(object):
            RedSequenceColorPar
         limmag: `float`, optional
            Maximum magnitude to do red-sequence interpolation.
+        cachedir: `str`, optional
+           Directory to cache the interpolated model.  The cache is keyed
+           on the contents of the parameter file and the interpolation
+           options, and is read back memory-mapped, so that many processes
+           share one copy.  Default is None (no caching).
         """
 
+        if filename is not None and cachedir is not None:
+            cache_key = self._cache_key(filename, zbinsize, minsig, fine, zrange, limmag)
+            if self._read_cache(cachedir, cache_key):
+                return
+
         if filename is None:
             if config is None:
                 raise ValueError("Must have either filename or config")
@@ -200,24 +223,22 @@ class RedSequenceColorPar(object):
 
             # set the pivotmag
             self.pivotmag = np.zeros(self.z.size, dtype=np.float64)
-            spl=CubicSpline(pars[0][pivotmag_name+'_Z'],pars[0][pivotmag_name])
-            self.pivotmag[:] = spl(self.z)
-
-            # and the max/min refmag
-            spl=CubicSpline(pars[0][pivotmag_name+'_Z'], pars[0]['MAX'+refmag_name])
-            self.maxrefmag = spl(self.z)
-            spl=CubicSpline(pars[0][pivotmag_name+'_Z'], pars[0]['MIN'+refmag_name])
-            self.minrefmag = spl(self.z)
+            # All the splines are evaluated at self.z, and the splines with
+            # the same nodes are evaluated together.
+            spl=FixedGridCubicSpline.cached(pars[0][pivotmag_name+'_Z'], self.z)
+            self.pivotmag[:], self.maxrefmag, self.minrefmag = spl([pars[0][pivotmag_name],
+                                                                    pars[0]['MAX'+refmag_name],
+                                                                    pars[0]['MIN'+refmag_name]])
 
             # c/slope
             self.c = np.zeros((nz,ncol),dtype=np.float64)
             self.slope = np.zeros((nz,ncol),dtype=np.float64)
             for j in range(ncol):
                 jstring='%02d' % (j)
-                spl=CubicSpline(pars[0]['Z'+jstring],pars[0]['C'+jstring])
-                self.c[:,j] = spl(self.z)
-                spl=CubicSpline(pars[0]['ZS'+jstring],pars[0]['SLOPE'+jstring])
-                self.slope[:,j] = spl(self.z)
+                spl=FixedGridCubicSpline.cached(pars[0]['Z'+jstring], self.z)
+                self.c[:,j] = spl(pars[0]['C'+jstring])
+                spl=FixedGridCubicSpline.cached(pars[0]['ZS'+jstring], self.z)
+                self.slope[:,j] = spl(pars[0]['SLOPE'+jstring])
 
             # sigma/covmat
             self.sigma = np.zeros((ncol,ncol,nz),dtype=np.float64)
@@ -231,18 +252,20 @@ class RedSequenceColorPar(object):
                 self.mag_err_ratio_slope[:] = pars[0]['MAG_ERR_RATIO_SLOPE'][:]
                 self.mag_err_ratio_pivot = pars[0]['MAG_ERR_RATIO_PIVOT']
 
+            # All the sigma elements are interpolated together
+            spl=FixedGridCubicSpline.cached(pars[0]['COVMAT_Z'], self.z)
+            sigma = spl(pars[0]['SIGMA'])
+
             # diagonals
             for j in range(ncol):
-                spl=CubicSpline(pars[0]['COVMAT_Z'],pars[0]['SIGMA'][j,j,:])
-                self.sigma[j,j,:] = np.clip(spl(self.z), minsig, None)
+                self.sigma[j,j,:] = np.clip(sigma[j,j,:], minsig, None)
 
                 self.covmat[j,j,:] = self.sigma[j,j,:]*self.sigma[j,j,:]
 
             # off-diagonals
             for j in range(ncol):
                 for k in range(j+1,ncol):
-                    spl=CubicSpline(pars[0]['COVMAT_Z'],pars[0]['SIGMA'][j,k,:])
-                    self.sigma[j,k,:] = spl(self.z)
+                    self.sigma[j,k,:] = sigma[j,k,:]
 
                     too_high,=np.where(self.sigma[j,k,:] > 0.99)
                     if (too_high.size > 0):
@@ -257,27 +280,21 @@ class RedSequenceColorPar(object):
                     self.covmat[k,j,:] = self.covmat[j,k,:]
 
             # volume factor
-            spl=CubicSpline(pars[0]['VOLUME_FACTOR_Z'],pars[0]['VOLUME_FACTOR'])
-            self.volume_factor = spl(self.z)
+            spl=FixedGridCubicSpline.cached(pars[0]['VOLUME_FACTOR_Z'], self.z)
+            self.volume_factor = spl(pars[0]['VOLUME_FACTOR'])
 
             # corrections
-            spl=CubicSpline(pars[0]['CORR_Z'],pars[0]['CORR'])
-            self.corr = spl(self.z)
-            spl=CubicSpline(pars[0]['CORR_SLOPE_Z'],pars[0]['CORR_SLOPE'])
-            self.corr_slope = spl(self.z)
-
-            spl=CubicSpline(pars[0]['CORR_Z'],pars[0]['CORR2'])
-            self.corr2 = spl(self.z)
-            spl=CubicSpline(pars[0]['CORR_SLOPE_Z'],pars[0]['CORR2_SLOPE'])
-            self.corr2_slope = spl(self.z)
+            spl=FixedGridCubicSpline.cached(pars[0]['CORR_Z'], self.z)
+            self.corr, self.corr2 = spl([pars[0]['CORR'], pars[0]['CORR2']])
+            spl_slope=FixedGridCubicSpline.cached(pars[0]['CORR_SLOPE_Z'], self.z)
+            self.corr_slope, self.corr2_slope = spl_slope([pars[0]['CORR_SLOPE'], pars[0]['CORR2_SLOPE']])
 
             if 'CORR_R' in pars.dtype.names:
                 # protect against stupidity
                 if (pars[0]['CORR_R'][0] <= 0.0) :
                     self.corr_r = np.ones(nz)
                 else:
-                    spl=CubicSpline(pars[0]['CORR_SLOPE_Z'],pars[0]['CORR_R'])
-                    self.corr_r = spl(self.z)
+                    self.corr_r = spl_slope(pars[0]['CORR_R'])
 
                 test,=np.where(self.corr_r < 0.5)
                 if (test.size > 0) : self.corr_r[test] = 0.5
@@ -285,8 +302,7 @@ class RedSequenceColorPar(object):
                 if (pars[0]['CORR2_R'][0] <= 0.0):
                     self.corr2_r = np.ones(nz)
                 else:
-                    spl=CubicSpline(pars[0]['CORR_SLOPE_Z'],pars[0]['CORR2_R'])
-                    self.corr2_r = spl(self.z)
+                    self.corr2_r = spl_slope(pars[0]['CORR2_R'])
 
                 test,=np.where(self.corr2_r < 0.5)
                 if (test.size > 0) : self.corr2_r[test] = 0.5
@@ -380,6 +396,125 @@ class RedSequenceColorPar(object):
         self.mstar_band = mstar_band
         self.limmag = limmag
 
+        if filename is not None and cachedir is not None:
+            self._write_cache(cachedir, cache_key)
+
+    def _cache_key(self, filename, zbinsize, minsig, fine, zrange, limmag):
+        """
+        Compute the cache key for an interpolated model.
+
+        Parameters
+        ----------
+        filename: `str`
+           Filename of the fits file to load parameters from
+        zbinsize: `float`
+           Redshift binning to interpolate model
+        minsig: `float`
+           Minimum intrinsic scatter
+        fine: `bool`
+           Use fine binning for interpolation
+        zrange: `np.array`
+           Redshift range to do interpolation
+        limmag: `float`
+           Maximum magnitude to do red-sequence interpolation
+
+        Returns
+        -------
+        key: `str`
+           Hex digest of the parameter file contents and options
+        """
+        m = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            m.update(f.read())
+
+        if zrange is not None:
+            zrange = [float(z) for z in zrange]
+        options = [self._cache_version, __version__, zbinsize, minsig, fine, zrange, limmag]
+        m.update(repr(options).encode())
+
+        return m.hexdigest()
+
+    def _read_cache(self, cachedir, key):
+        """
+        Read the interpolated model from the cache, if available.
+
+        Arrays are memory-mapped read-only.
+
+        Parameters
+        ----------
+        cachedir: `str`
+           Cache directory
+        key: `str`
+           Cache key
+
+        Returns
+        -------
+        found: `bool`
+           True if the model was read from the cache.
+        """
+        path = os.path.join(cachedir, 'redsequence_%s' % (key))
+        if not os.path.isdir(path):
+            return False
+
+        with open(os.path.join(path, 'scalars.json')) as f:
+            scalars = json.load(f)
+
+        for name, (value, dtype) in scalars.items():
+            if dtype is not None:
+                value = np.dtype(dtype).type(value)
+            setattr(self, name, value)
+
+        for name in scalars['_arrays'][0]:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+
+        del self._arrays
+
+        return True
+
+    def _write_cache(self, cachedir, key):
+        """
+        Write the interpolated model to the cache.
+
+        The cache entry is written to a temporary directory and renamed
+        into place, so concurrent writers are safe.
+
+        Parameters
+        ----------
+        cachedir: `str`
+           Cache directory
+        key: `str`
+           Cache key
+        """
+        path = os.path.join(cachedir, 'redsequence_%s' % (key))
+        if os.path.isdir(path):
+            return
+
+        if not os.path.exists(cachedir):
+            os.makedirs(cachedir, exist_ok=True)
+
+        temppath = tempfile.mkdtemp(dir=cachedir, prefix='redsequence_tmp_')
+
+        arrays = []
+        scalars = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, np.ndarray):
+                np.save(os.path.join(temppath, name + '.npy'), value)
+                arrays.append(name)
+            elif isinstance(value, np.generic):
+                scalars[name] = (value.item(), value.dtype.str)
+            else:
+                scalars[name] = (value, None)
+        scalars['_arrays'] = (arrays, None)
+
+        with open(os.path.join(temppath, 'scalars.json'), 'w') as f:
+            json.dump(scalars, f)
+
+        try:
+            os.rename(temppath, path)
+        except OSError:
+            # Another process got there first
+            shutil.rmtree(temppath, True)
+
     def mstar(self,z):
         """
         Look up mstar at a set of redshifts
@@ -561,6 +696,51 @@ class RedSequenceColorPar(object):
                              lupcorr=self.lupcorr[magind,zind,:],
                              calc_chisq=calc_chisq, calc_lkhd=calc_lkhd)
 
+    def calculate_chisq_grouped(self, galaxies, zs, calc_lkhd=False, z_is_index=False, dtype='f8'):
+        """
+        Compute chisq for every galaxy in a set of galaxies at every redshift
+        in an array of redshifts, in one block.
+
+        Parameters
+        ----------
+        galaxies: `redmapper.GalaxyCatalog`
+           Catalog of galaxies to compute chisq values.
+        zs: `np.array`
+           Float array of redshifts or integer array of redshift indices
+        calc_lkhd: `bool`, optional
+           Calculate likelihood rather than chisq.  Default is False.
+        z_is_index: `bool`, optional
+           The zs are indices and not redshifts.  Default is False.
+        dtype: `str` or `np.dtype`, optional
+           Output type, 'f8' or 'f4'.  Default is 'f8'.
+
+        Returns
+        -------
+        chisqs: `np.array`
+           Float array of chisq values, [ngal, nz].
+        """
+        calc_chisq = not calc_lkhd
+
+        if z_is_index:
+            zinds = np.atleast_1d(zs)
+        else:
+            zinds = np.atleast_1d(self.zindex(zs))
+        maginds = np.atleast_1d(self.refmagindex(galaxies.refmag))
+        galcolor = np.atleast_2d(galaxies.galcol)
+
+        mag_err = np.atleast_2d(galaxies.mag_err).copy()
+        dmags = np.atleast_1d(galaxies.refmag) - self.mag_err_ratio_pivot
+        for j in range(self.nmag):
+            mag_err[:, j] *= self.mag_err_ratio_intercept[j] + self.mag_err_ratio_slope[j]*dmags
+
+        return compute_chisq_grouped(self.covmat[:, :, zinds], self.c[zinds, :],
+                                     self.slope[zinds, :], self.pivotmag[zinds],
+                                     galaxies.refmag, mag_err,
+                                     galcolor,
+                                     refmagerr=galaxies.refmag_err,
+                                     lupcorr=self.lupcorr[maginds[:, np.newaxis], zinds[np.newaxis, :], :],
+                                     calc_chisq=calc_chisq, calc_lkhd=calc_lkhd, dtype=dtype)
+
 
     def plot_redsequence_diag(self, fig, ind, bands):
         """
@@ -80,6 +80,9 @@ class RunLikelihoods(ClusterRunner):
            Default is False.
         cleaninput: `bool`, optional
            Clean seed clusters that are out of the footprint?  Default is False.
+        incat: `redmapper.ClusterCatalog`, optional
+           Input cluster catalog to use instead of reading config.catfile.
+           Default is None.
         """
 
         return super(RunLikelihoods, self).run(*args, **kwargs)
@@ -95,19 +98,34 @@ class RunLikelihoods(ClusterRunner):
            Default is False.
         cleaninput: `bool`, optional
            Clean seed clusters that are out of the footprint?  Default is False.
+        incat: `redmapper.ClusterCatalog`, optional
+           Input cluster catalog to use instead of reading config.catfile.
+           Default is None.
         """
 
         self.cleaninput = kwargs.pop('cleaninput', False)
-
-        self.config.logger.info("%s: Likelihoods using catfile: %s" % (self.hpix_logstr, self.config.catfile))
-
-        self.cat = ClusterCatalog.from_catfile(self.config.catfile,
-                                               zredstr=self.zredstr,
-                                               config=self.config,
-                                               bkg=self.bkg,
-                                               cosmo=self.cosmo,
-                                               r0=self.r0,
-                                               beta=self.beta)
+        incat = kwargs.pop('incat', None)
+
+        if incat is not None:
+            self.config.logger.info("%s: Likelihoods using input catalog" % (self.hpix_logstr))
+
+            self.cat = ClusterCatalog(incat._ndarray.copy(),
+                                      zredstr=self.zredstr,
+                                      config=self.config,
+                                      bkg=self.bkg,
+                                      cosmo=self.cosmo,
+                                      r0=self.r0,
+                                      beta=self.beta)
+        else:
+            self.config.logger.info("%s: Likelihoods using catfile: %s" % (self.hpix_logstr, self.config.catfile))
+
+            self.cat = ClusterCatalog.from_catfile(self.config.catfile,
+                                                   zredstr=self.zredstr,
+                                                   config=self.config,
+                                                   bkg=self.bkg,
+                                                   cosmo=self.cosmo,
+                                                   r0=self.r0,
+                                                   beta=self.beta)
 
         keepz = kwargs.pop('keepz', False)
 
@@ -99,6 +99,9 @@ class RunPercolation(ClusterRunner):
            Were input cluster seeds from spectroscopy for training?  Default is False.
         cleaninput: `bool`, optional
            Clean seed clusters that are out of the footprint?  Default is False.
+        incat: `redmapper.ClusterCatalog`, optional
+           Input cluster catalog to use instead of reading config.catfile.
+           Default is None.
         """
 
         return super(RunPercolation, self).run(*args, **kwargs)
@@ -118,21 +121,41 @@ class RunPercolation(ClusterRunner):
            Were input cluster seeds from spectroscopy for training?  Default is False.
         cleaninput: `bool`, optional
            Clean seed clusters that are out of the footprint?  Default is False.
+        incat: `redmapper.ClusterCatalog`, optional
+           Input cluster catalog to use instead of reading config.catfile.
+           Default is None.
         """
 
         self.cleaninput = kwargs.pop('cleaninput', False)
-
-        self.config.logger.info("%s: Percolation using catfile: %s" % (self.hpix_logstr, self.config.catfile))
-
-        # read in the catalog...
-        self.cat = ClusterCatalog.from_catfile(self.config.catfile,
-                                               zredstr=self.zredstr,
-                                               config=self.config,
-                                               bkg=self.bkg,
-                                               zredbkg=self.zredbkg,
-                                               cosmo=self.cosmo,
-                                               r0=self.r0,
-                                               beta=self.beta)
+        incat = kwargs.pop('incat', None)
+
+        if incat is not None:
+            self.config.logger.info("%s: Percolation using input catalog" % (self.hpix_logstr))
+
+            self.cat = ClusterCatalog(incat._ndarray.copy(),
+                                      zredstr=self.zredstr,
+                                      config=self.config,
+                                      bkg=self.bkg,
+                                      zredbkg=self.zredbkg,
+                                      cosmo=self.cosmo,
+                                      r0=self.r0,
+                                      beta=self.beta)
+        else:
+            self.config.logger.info("%s: Percolation using catfile: %s" % (self.hpix_logstr, self.config.catfile))
+
+            # read in the catalog...  The other columns are only read for
+            # the clusters that pass the cuts.
+            self.cat = ClusterCatalog.from_catfile(self.config.catfile,
+                                                   lazy=True,
+                                                   columns=['z', 'lnlike', 'lambda', 'refmag',
+                                                            'mem_match_id'],
+                                                   zredstr=self.zredstr,
+                                                   config=self.config,
+                                                   bkg=self.bkg,
+                                                   zredbkg=self.zredbkg,
+                                                   cosmo=self.cosmo,
+                                                   r0=self.r0,
+                                                   beta=self.beta)
 
         self.keepz = kwargs.pop('keepz', False)
         self.keepid = kwargs.pop('keepid', False)
@@ -10,13 +10,14 @@ import esutil
 from .cluster import ClusterCatalog
 from .background import Background
 from .mask import HPMask
-from .galaxy import GalaxyCatalog
 from .cluster import Cluster
 from .cluster import ClusterCatalog
 from .depthmap import DepthMap
 from .zlambda import Zlambda
 from .zlambda import ZlambdaCorrectionPar
 from .cluster_runner import ClusterRunner
+from .solver_nfw import solve_nfw_many
+from .utilities import chisq_pdf, calc_theta_i, schechter_pdf, nfw_pdf
 from .centering import CenteringBCG, CenteringWcenZred, CenteringRandom, CenteringRandomSatellite
 
 
@@ -109,32 +110,25 @@ class RunZScan(ClusterRunner):
 
         return True
 
-    def _process_cluster(self, cluster):
-        """Process a single position with RunZScan.
+    def _prematch_radius(self):
+        """Maximum neighbor radius (Mpc) for the bulk prematch.
+
+        This includes the expanded radius used in the refinement step, which
+        is matched at a higher redshift than the initial lowest redshift.
+        """
+        return max(self.maxrad, 2.0*self.refine_maxrad)
+
+    def _scan_redshifts(self, cluster):
+        """Compute the richness and likelihood at all scan redshifts.
+
+        Results are recorded in cluster.lambda_steps and
+        cluster.likelihood_steps.
 
         Parameters
         ----------
         cluster: `redmapper.Cluster`
            Cluster to compute richness.
         """
-        bad = False
-        done = False
-
-        cluster.z_steps[:] = self.z_array
-        cluster.lambda_steps[:] = -1.0
-        cluster.likelihood_steps[:] = -1.0
-        cluster.lmax = -1.0
-        cluster.max_ind = -1
-        cluster.zmax = -1.0
-
-        if self.depthstr is None:
-            # Compute the mask depth from the galaxies in the region
-            # This sets all the maskgals limmag to the same value
-            self.depthlim.calc_maskdepth(self.mask.maskgals,
-                                         cluster.neighbors.refmag,
-                                         cluster.neighbors.refmag_err)
-
-        # First pass, do the full scan
         for zb, zuse in enumerate(self.z_array):
             # Set the cluster redshift, and update distances
             cluster.redshift = zuse
@@ -179,6 +173,153 @@ class RunZScan(ClusterRunner):
             cluster.lambda_steps[zb] = lam
             cluster.likelihood_steps[zb] = like
 
+    def _scan_redshifts_batch(self, cluster):
+        """Compute the richness and likelihood at all scan redshifts in a batch.
+
+        This computes the chisq for all the neighbors at all the redshifts
+        in one call, the radial/luminosity filters as arrays over
+        redshift and neighbor, and solves for the richness at all the
+        redshifts in one call.  The mask corrections are computed per
+        redshift.  Results are recorded in cluster.lambda_steps and
+        cluster.likelihood_steps.
+
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to compute richness.
+        """
+        # The neighbor distances do not depend on redshift
+        cluster.update_neighbors_dist()
+        neighbors = cluster.neighbors
+
+        zs = np.clip(self.z_array, 0.01, None)
+        mstar = np.atleast_1d(self.zredstr.mstar(zs))
+        mpc_scale = np.radians(1.) * cluster.cosmo.Da(0, zs)
+
+        # Note that the per-redshift values are cast to the type they
+        # would have as scalars operating on the neighbor arrays.
+        scalar_dtype = np.result_type(mstar.dtype.type(0), neighbors.refmag)
+
+        # Select galaxies that are bright enough, within the radius
+        maxmag = (mstar - 2.5*np.log10(self.limlum)).astype(scalar_dtype)
+        r = np.clip(mpc_scale[:, np.newaxis] * neighbors.dist[np.newaxis, :], 1e-6, None)
+        lc = ((neighbors.refmag[np.newaxis, :] < maxmag[:, np.newaxis]) &
+              (r < self.maxrad))
+
+        zgood, = np.where(lc.sum(axis=1) >= 2)
+        if zgood.size == 0:
+            # There is nothing at any redshift
+            return
+
+        # The mask corrections must be computed per redshift
+        lummaxmag = mstar - 2.5*np.log10(self.config.lval_reference)
+        cpars = np.zeros((zgood.size, 4))
+        for i, zb in enumerate(zgood):
+            cluster.redshift = self.z_array[zb]
+
+            self.mask.set_radmask(cluster)
+            if self.depthstr is not None:
+                self.depthstr.calc_maskdepth(self.mask.maskgals,
+                                             cluster.ra, cluster.dec, cluster.mpc_scale)
+
+            cpars[i, :] = self.mask.calc_maskcorr(mstar[zb], lummaxmag[zb], self.zredstr.limmag)
+
+        # All the (redshift, neighbor) pairs, ordered by redshift
+        zind, gind = np.nonzero(lc[zgood, :])
+        offsets = np.zeros(zgood.size + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lc[zgood, :].sum(axis=1))
+        zind = zgood[zind]
+
+        pairgals = neighbors.take(gind, columns=self.zredstr.chisq_columns)
+
+        refmag = pairgals.refmag
+        r_pair = r[zind, gind]
+
+        chisq = self.zredstr.calculate_chisq(pairgals, zs[zind]).astype(neighbors.chisq.dtype)
+        rho = chisq_pdf(chisq, self.zredstr.ncol)
+        nfw = nfw_pdf(r_pair, rscale=0.15)
+
+        lumzind = np.atleast_1d(self.zredstr.zindex(zs))
+        lumrefind = np.atleast_1d(self.zredstr.lumrefmagindex(lummaxmag))
+        normalization = self.zredstr.lumnorm[lumrefind, lumzind]
+        phi = schechter_pdf(refmag, alpha=self.zredstr.alpha,
+                            mstar=mstar.astype(scalar_dtype)[zind])
+        phi /= normalization.astype(np.result_type(normalization.dtype.type(0), phi))[zind]
+
+        ucounts = (2*np.pi*r_pair) * nfw * phi * rho
+        sigma_g = self.bkg.sigma_g_lookup(zs[zind], chisq, refmag)
+        bcounts = 2. * np.pi * r_pair * (sigma_g/mpc_scale[zind]**2.)
+
+        theta_i = calc_theta_i(refmag, pairgals.refmag_err,
+                               lummaxmag.astype(scalar_dtype)[zind], self.zredstr.limmag)
+        w = theta_i * neighbors.pfree[gind]
+
+        lams, p, pmem, rlams, theta_r = solve_nfw_many(cluster.r0, cluster.beta, offsets,
+                                                       ucounts, bcounts, r_pair, w, cpars,
+                                                       rsig=self.config.rsig)
+
+        for i, zb in enumerate(zgood):
+            lam = lams[i]
+            pmem_z = pmem[offsets[i]: offsets[i + 1]]
+
+            # This also checks for crazy invalid values
+            if lam < 0.0 or pmem_z.max() == 0.0:
+                lam = -1.0
+                cluster.scaleval = -1.0
+                pmem_z = np.zeros_like(pmem_z)
+            else:
+                cluster.scaleval = np.absolute(lam / np.sum(pmem_z))
+
+            if lam < self.min_lambda:
+                # There is nothing at this redshift
+                continue
+
+            # Compute likelihood, since we have a cluster here;
+            # we want to avoid the central galaxy for this computation
+            # (if there is one).
+            incut, = np.where((pmem_z > 0.0) &
+                              (r_pair[offsets[i]: offsets[i + 1]] > 1e-6) &
+                              (pmem_z < 1.0))
+            if incut.size > 0:
+                like = -lam/cluster.scaleval - np.sum(np.log(1.0 - pmem_z[incut]))
+            else:
+                like = -1.0
+
+            # Record
+            cluster.lambda_steps[zb] = lam
+            cluster.likelihood_steps[zb] = like
+
+    def _process_cluster(self, cluster):
+        """Process a single position with RunZScan.
+
+        Parameters
+        ----------
+        cluster: `redmapper.Cluster`
+           Cluster to compute richness.
+        """
+        bad = False
+        done = False
+
+        cluster.z_steps[:] = self.z_array
+        cluster.lambda_steps[:] = -1.0
+        cluster.likelihood_steps[:] = -1.0
+        cluster.lmax = -1.0
+        cluster.max_ind = -1
+        cluster.zmax = -1.0
+
+        if self.depthstr is None:
+            # Compute the mask depth from the galaxies in the region
+            # This sets all the maskgals limmag to the same value
+            self.depthlim.calc_maskdepth(self.mask.maskgals,
+                                         cluster.neighbors.refmag,
+                                         cluster.neighbors.refmag_err)
+
+        # First pass, do the full scan
+        if self.config.zscan_batch:
+            self._scan_redshifts_batch(cluster)
+        else:
+            self._scan_redshifts(cluster)
+
         # Find max likelihood
         cluster.max_ind = np.argmax(cluster.likelihood_steps)
         cluster.lmax = cluster.likelihood_steps[cluster.max_ind]
@@ -67,3 +67,25 @@ int solver_nfw(double r0, double beta, long ngal,
 
   return 0;
 }
+
+int solver_nfw_many(double r0, double beta, long nprob, long *starts, long *ngals,
+                    double *ucounts, double *bcounts, double *r, double *w,
+                    double *lambda, double *p, double *wt, double *rlambda, double *theta_r,
+                    double tol, double *cpars, double rsig)
+{
+  // Solve a stack of problems, where the ngals[k] galaxies of problem k are
+  // stored starting at starts[k] and cpars at [k*CPAR_NTERMS].  This
+  // covers both ragged (starts = offsets) and padded (starts = k*npad) stacks.
+  long k, start;
+
+  for (k=0;k<nprob;k++) {
+    start = starts[k];
+
+    solver_nfw(r0, beta, ngals[k],
+               &ucounts[start], &bcounts[start], &r[start], &w[start],
+               &lambda[k], &p[start], &wt[start], &rlambda[k], &theta_r[start],
+               tol, &cpars[k*CPAR_NTERMS], rsig);
+  }
+
+  return 0;
+}
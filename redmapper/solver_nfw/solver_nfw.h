@@ -38,5 +38,10 @@ int solver_nfw(double r0, double beta, long ngal,
 	       double *lambda, double *p, double *wt, double *rlambda, double *theta_r,
                double tol, double *cpars, double rsig);
 
+int solver_nfw_many(double r0, double beta, long nprob, long *starts, long *ngals,
+                    double *ucounts, double *bcounts, double *r, double *w,
+                    double *lambda, double *p, double *wt, double *rlambda, double *theta_r,
+                    double tol, double *cpars, double rsig);
+
 
 #endif
@@ -92,3 +92,176 @@ class Solver(object):
         """
         return self._solver.solve_nfw()
 
+
+
+def solve_nfw_many(r0, beta, offsets, ucounts, bcounts, r, w, cpars, rsig=0.0):
+    """
+    Solve for the radius/richness/pmem using the nfw weights for a stack
+    of problems in one call.
+
+    The galaxies for problem k are stored in the slice
+    [offsets[k]: offsets[k + 1]] of the galaxy arrays.  All the problems
+    share r0, beta, and rsig.  The GIL is released while solving.
+
+    Parameters
+    ----------
+    r0: `float`
+       Normalization of the radius-richness relation (Mpc)
+    beta: `float`
+       Power-law slope of the radius-richness relation.
+    offsets: `np.array`
+       Integer array of offsets for each problem [nprob + 1]
+    ucounts: `np.array`
+       Float array of u(x) for the cluster neighbors.
+    bcounts: `np.array`
+       Float array of b(x) for the cluster neighbors.
+    r: `np.array`
+       Float array of radii for the cluster neighbors (Mpc).
+    w: `np.array`
+       Float array of theta_i * p_free weights
+    cpars: `np.array`
+       Float array of masking correction factor polynomial
+       parameters [nprob, 4].
+    rsig: `float`, optional
+       Radial softening parameter for theta_r(r).  Default is 0.0
+       (no softening).
+
+    Returns
+    -------
+    lambda: `np.array`
+       Float array [nprob] with richness lambda
+    p: `np.array`
+       Float array with raw membership probabilities (no theta_i, theta_r,
+       pfree) for neighbors.
+    wt: `np.array`
+       Float array with total membership probabilities
+       (p * theta_r * theta_i * pfree) for neighbors.
+    r_lambda: `np.array`
+       Float array [nprob] with r_lambda radius
+    theta_r: `np.array`
+       Float array with theta_r(r) for neighbors.
+    """
+    _offsets = np.ascontiguousarray(offsets, dtype='i8')
+    _ucounts = np.ascontiguousarray(ucounts, dtype='f8')
+    _bcounts = np.ascontiguousarray(bcounts, dtype='f8')
+    _r = np.ascontiguousarray(r, dtype='f8')
+    _w = np.ascontiguousarray(w, dtype='f8')
+    _cpars = np.ascontiguousarray(cpars, dtype='f8')
+
+    if _offsets.ndim != 1 or _offsets.size < 1:
+        raise ValueError("offsets must be a 1d array with at least one element")
+    if _offsets[0] != 0 or np.any(np.diff(_offsets) < 0):
+        raise ValueError("offsets must start at 0 and be non-decreasing")
+
+    ngal = _ucounts.size
+    if (_offsets[-1] != ngal):
+        raise ValueError("offsets must end at the length of ucounts")
+    if (ngal != _bcounts.size):
+        raise ValueError("ucounts and bcounts must be same length")
+    if (ngal != _r.size):
+        raise ValueError("ucounts and r must be the same length")
+    if (ngal != _w.size):
+        raise ValueError("ucounts and w must be the same length")
+    if (_cpars.size != 4*(_offsets.size - 1)):
+        raise ValueError("cpars must have 4 elements per problem")
+
+    return _solver_nfw_pywrap.solve_nfw_many(float(r0), float(beta),
+                                             _offsets[: -1].copy(),
+                                             np.diff(_offsets),
+                                             _ucounts,
+                                             _bcounts,
+                                             _r,
+                                             _w,
+                                             _cpars,
+                                             float(rsig))
+
+
+def solve_nfw_padded(r0, beta, ucounts, bcounts, r, w, cpars, ngals=None, rsig=0.0):
+    """
+    Solve for the radius/richness/pmem using the nfw weights for a stack
+    of problems stored in padded 2d arrays.
+
+    Row k of the galaxy arrays holds problem k, where only the first
+    ngals[k] entries are used.  All the problems share r0, beta, and rsig.
+    The GIL is released while solving.
+
+    Parameters
+    ----------
+    r0: `float`
+       Normalization of the radius-richness relation (Mpc)
+    beta: `float`
+       Power-law slope of the radius-richness relation.
+    ucounts: `np.array`
+       Float array of u(x) for the cluster neighbors [nprob, npad].
+    bcounts: `np.array`
+       Float array of b(x) for the cluster neighbors [nprob, npad].
+    r: `np.array`
+       Float array of radii for the cluster neighbors (Mpc) [nprob, npad].
+    w: `np.array`
+       Float array of theta_i * p_free weights [nprob, npad].
+    cpars: `np.array`
+       Float array of masking correction factor polynomial
+       parameters [nprob, 4].
+    ngals: `np.array`, optional
+       Integer array of the number of galaxies in each problem [nprob].
+       Default is None (all rows are full).
+    rsig: `float`, optional
+       Radial softening parameter for theta_r(r).  Default is 0.0
+       (no softening).
+
+    Returns
+    -------
+    lambda: `np.array`
+       Float array [nprob] with richness lambda
+    p: `np.array`
+       Float array [nprob, npad] with raw membership probabilities.
+       Padding entries are 0.
+    wt: `np.array`
+       Float array [nprob, npad] with total membership probabilities.
+       Padding entries are 0.
+    r_lambda: `np.array`
+       Float array [nprob] with r_lambda radius
+    theta_r: `np.array`
+       Float array [nprob, npad] with theta_r(r) for neighbors.
+       Padding entries are 0.
+    """
+    _ucounts = np.ascontiguousarray(ucounts, dtype='f8')
+    _bcounts = np.ascontiguousarray(bcounts, dtype='f8')
+    _r = np.ascontiguousarray(r, dtype='f8')
+    _w = np.ascontiguousarray(w, dtype='f8')
+    _cpars = np.ascontiguousarray(cpars, dtype='f8')
+
+    if _ucounts.ndim != 2:
+        raise ValueError("ucounts must be a 2d array")
+    nprob, npad = _ucounts.shape
+
+    if (_bcounts.shape != _ucounts.shape):
+        raise ValueError("ucounts and bcounts must be same shape")
+    if (_r.shape != _ucounts.shape):
+        raise ValueError("ucounts and r must be the same shape")
+    if (_w.shape != _ucounts.shape):
+        raise ValueError("ucounts and w must be the same shape")
+    if (_cpars.size != 4*nprob):
+        raise ValueError("cpars must have 4 elements per problem")
+
+    if ngals is None:
+        _ngals = np.full(nprob, npad, dtype='i8')
+    else:
+        _ngals = np.ascontiguousarray(ngals, dtype='i8')
+        if (_ngals.size != nprob):
+            raise ValueError("ngals must have one element per problem")
+        if np.any(_ngals < 0) or np.any(_ngals > npad):
+            raise ValueError("ngals must be between 0 and the padded length")
+
+    lam, p, wt, rlam, theta_r = _solver_nfw_pywrap.solve_nfw_many(float(r0), float(beta),
+                                                                  np.arange(nprob, dtype='i8')*npad,
+                                                                  _ngals,
+                                                                  _ucounts,
+                                                                  _bcounts,
+                                                                  _r,
+                                                                  _w,
+                                                                  _cpars,
+                                                                  float(rsig))
+
+    return (lam, p.reshape(nprob, npad), wt.reshape(nprob, npad),
+            rlam, theta_r.reshape(nprob, npad))
@@ -117,11 +117,14 @@ PyObject* SolverObject_solver_nfw(const struct SolverObject* self, PyObject *arg
     self->solver->rlambda = (double *) PyArray_DATA((PyArrayObject*)rlam_obj);
     self->solver->theta_r = (double *) PyArray_DATA((PyArrayObject*)thetar_obj);
 
+    // the solver only touches its own arrays, so other threads can run
+    Py_BEGIN_ALLOW_THREADS
     solver_nfw(self->solver->r0, self->solver->beta, self->solver->ngal,
 	       self->solver->ucounts, self->solver->bcounts, self->solver->r,
 	       self->solver->w, self->solver->lambda, self->solver->p, self->solver->wt,
                self->solver->rlambda, self->solver->theta_r,
 	       TOL_DEFAULT, self->solver->cpars, self->solver->rsig);
+    Py_END_ALLOW_THREADS
 
     // this needs to return the tuple.
 
@@ -189,7 +192,92 @@ static PyTypeObject PySolverType = {
 };
 
 
+PyObject* solver_nfw_many_pywrap(PyObject *self, PyObject *args)
+{
+    double r0;
+    double beta;
+    PyArrayObject *starts_obj = NULL;
+    PyArrayObject *ngals_obj = NULL;
+    PyArrayObject *ucounts_obj = NULL;
+    PyArrayObject *bcounts_obj = NULL;
+    PyArrayObject *r_obj = NULL;
+    PyArrayObject *w_obj = NULL;
+    PyArrayObject *cpars_obj = NULL;
+    double rsig;
+    npy_intp dims[1];
+    long nprob, ngal;
+    PyObject* lam_obj = NULL;
+    PyObject* rlam_obj = NULL;
+    PyObject* p_obj = NULL;
+    PyObject* wt_obj = NULL;
+    PyObject* thetar_obj = NULL;
+
+    if (!PyArg_ParseTuple(args,
+                          (char*)"ddOOOOOOOd",
+                          &r0,
+                          &beta,
+                          &starts_obj,
+                          &ngals_obj,
+                          &ucounts_obj,
+                          &bcounts_obj,
+                          &r_obj,
+                          &w_obj,
+                          &cpars_obj,
+                          &rsig)) {
+        PyErr_SetString(PyExc_RuntimeError,"Failed to parse args");
+        return NULL;
+    }
+
+    nprob = (long) PyArray_SIZE(starts_obj);
+    ngal = (long) PyArray_SIZE(ucounts_obj);
+
+    if (PyArray_SIZE(ngals_obj) != nprob) {
+        PyErr_SetString(PyExc_ValueError, "starts and ngals must be the same length");
+        return NULL;
+    }
+
+    if (PyArray_SIZE(cpars_obj) != nprob*CPAR_NTERMS) {
+        PyErr_SetString(PyExc_ValueError, "cpars with wrong number of terms");
+        return NULL;
+    }
+
+    dims[0] = nprob;
+    lam_obj = PyArray_ZEROS(1, dims, NPY_DOUBLE, 0);
+    rlam_obj = PyArray_ZEROS(1, dims, NPY_DOUBLE, 0);
+
+    dims[0] = ngal;
+    p_obj = PyArray_ZEROS(1, dims, NPY_DOUBLE, 0);
+    wt_obj = PyArray_ZEROS(1, dims, NPY_DOUBLE, 0);
+    thetar_obj = PyArray_ZEROS(1, dims, NPY_DOUBLE, 0);
+
+    Py_BEGIN_ALLOW_THREADS
+    solver_nfw_many(r0, beta, nprob,
+                    (long *) PyArray_DATA(starts_obj),
+                    (long *) PyArray_DATA(ngals_obj),
+                    (double *) PyArray_DATA(ucounts_obj),
+                    (double *) PyArray_DATA(bcounts_obj),
+                    (double *) PyArray_DATA(r_obj),
+                    (double *) PyArray_DATA(w_obj),
+                    (double *) PyArray_DATA((PyArrayObject*)lam_obj),
+                    (double *) PyArray_DATA((PyArrayObject*)p_obj),
+                    (double *) PyArray_DATA((PyArrayObject*)wt_obj),
+                    (double *) PyArray_DATA((PyArrayObject*)rlam_obj),
+                    (double *) PyArray_DATA((PyArrayObject*)thetar_obj),
+                    TOL_DEFAULT, (double *) PyArray_DATA(cpars_obj), rsig);
+    Py_END_ALLOW_THREADS
+
+    PyObject* retval = PyTuple_New(5);
+    PyTuple_SET_ITEM(retval, 0, lam_obj);
+    PyTuple_SET_ITEM(retval, 1, p_obj);
+    PyTuple_SET_ITEM(retval, 2, wt_obj);
+    PyTuple_SET_ITEM(retval, 3, rlam_obj);
+    PyTuple_SET_ITEM(retval, 4, thetar_obj);
+
+    return retval;
+}
+
 static PyMethodDef Solver_module_methods[] = {
+    {"solve_nfw_many", (PyCFunction)solver_nfw_many_pywrap, METH_VARARGS, "solve_nfw_many(r0, beta, starts, ngals, ucounts, bcounts, r, w, cpars, rsig)"},
     {NULL}  /* Sentinel */
 };
 
@@ -17,6 +17,9 @@ import esutil
 import sys
 import os
 import warnings
+import threading
+import weakref
+from collections import OrderedDict
 
 ###################################
 ## Useful constants/conversions ##
@@ -24,6 +27,38 @@ import warnings
 TOTAL_SQDEG = 4 * 180**2 / np.pi
 SEC_PER_DEG = 3600
 
+_thread_rng = threading.local()
+
+def get_rng():
+    """
+    Get the random number generator for the current thread.
+
+    This is the np.random module (which uses the global numpy random
+    state) unless a generator has been set for the thread with
+    set_thread_rng().
+
+    Returns
+    -------
+    rng: `np.random.RandomState` or `np.random`
+       Random number generator
+    """
+    rng = getattr(_thread_rng, 'rng', None)
+    if rng is None:
+        return np.random
+    return rng
+
+def set_thread_rng(rng):
+    """
+    Set the random number generator for the current thread.
+
+    Parameters
+    ----------
+    rng: `np.random.RandomState` or None
+       Random number generator.  None reverts to the global numpy random
+       state.
+    """
+    _thread_rng.rng = rng
+
 def astro_to_sphere(ra, dec):
     """
     Convert astronomical ra/dec to healpix theta, phi coordinates.
@@ -434,6 +469,170 @@ class CubicSpline(object):
 
             return vals
 
+def spline_basis(x, xvals):
+    """
+    Compute the basis matrix of a natural cubic spline.
+
+    The natural cubic spline is linear in the node values, so that
+    CubicSpline(x, y)(xvals) is equal to np.dot(basis, y).  This is used for
+    fitting spline node values, where the basis can be computed once and
+    also gives the derivatives with respect to the node values.
+
+    Parameters
+    ----------
+    x: `np.array`
+       Float array of node positions
+    xvals: `np.array`
+       Float array of x values to compute interpolation
+
+    Returns
+    -------
+    basis: `np.array`
+       Float array of shape (len(xvals), len(x))
+    """
+    x = np.atleast_1d(x).astype(np.float64)
+    xvals = np.atleast_1d(xvals).astype(np.float64)
+    npts = len(x)
+
+    # The same banded matrix as CubicSpline, with a right-hand side for
+    # each node value
+    mat = np.zeros((3, npts))
+    mat[1,1:-1] = (x[2:  ]-x[0:-2])/3.
+    mat[2,0:-2] = (x[1:-1]-x[0:-2])/6.
+    mat[0,2:  ] = (x[2:  ]-x[1:-1])/6.
+    mat[1,0] = 1.
+    mat[1,-1] = 1.
+
+    bb = np.zeros((npts, npts))
+    inds = np.arange(1, npts - 1)
+    bb[inds, inds + 1] = 1./(x[2:  ]-x[1:-1])
+    bb[inds, inds] = -1./(x[2:  ]-x[1:-1]) - 1./(x[1:-1]-x[0:-2])
+    bb[inds, inds - 1] = 1./(x[1:-1]-x[0:-2])
+    y2 = solve_banded((1,1), mat, bb)
+
+    lo = np.searchsorted(x, xvals)-1
+    lo = np.clip(lo, 0, npts-2)
+    hi = lo + 1
+    dx = x[hi] - x[lo]
+    a = (x[hi] - xvals)/dx
+    b = (xvals-x[lo])/dx
+
+    basis = ((a**3-a)*dx**2./6.)[:, np.newaxis]*y2[lo, :] + ((b**3-b)*dx**2./6.)[:, np.newaxis]*y2[hi, :]
+    rows = np.arange(xvals.size)
+    basis[rows, lo] += a
+    basis[rows, hi] += b
+
+    return basis
+
+class FixedGridCubicSpline(object):
+    """
+    Natural cubic spline evaluated at a fixed set of x values.
+
+    The linear map from the node values to the values at xvals (see
+    spline_basis) is computed once, and each evaluation with new node values
+    is a matrix product.  Many sets of node values can be evaluated at once.
+
+    Use FixedGridCubicSpline.cached() to reuse the map for the same nodes
+    and the same xvals array.
+    """
+    _cache = OrderedDict()
+    _cache_size = 32
+    _cache_lock = threading.RLock()
+
+    def __init__(self, x, xvals, fixextrap=False):
+        """
+        Instantiate a FixedGridCubicSpline object.
+
+        Parameters
+        ----------
+        x: `np.array`
+           Float array of node positions
+        xvals: `np.array`
+           Float array of x values to compute interpolation
+        fixextrap: `bool`, optional
+           Fix the extrapolation at the end of the node positions.
+           Default is False.
+        """
+        self.x = np.atleast_1d(x).astype(np.float64)
+        self.fixextrap = fixextrap
+
+        xvals = np.atleast_1d(xvals)
+        self.basis = spline_basis(self.x, xvals)
+
+        if fixextrap:
+            lo, = np.where(xvals < self.x[0])
+            self.basis[lo, :] = 0.0
+            self.basis[lo, 0] = 1.0
+
+            hi, = np.where(xvals > self.x[-1])
+            self.basis[hi, :] = 0.0
+            self.basis[hi, -1] = 1.0
+
+    @classmethod
+    def cached(cls, x, xvals, fixextrap=False):
+        """
+        Get a FixedGridCubicSpline, reusing a previous one for the same node
+        positions and the same xvals array.
+
+        The xvals array is matched by identity, so it must not be modified
+        while it is in use.  The cache holds a limited number of splines, and
+        a spline is dropped when its xvals array is deleted.
+
+        Parameters
+        ----------
+        x: `np.array`
+           Float array of node positions
+        xvals: `np.ndarray`
+           Float array of x values to compute interpolation
+        fixextrap: `bool`, optional
+           Fix the extrapolation at the end of the node positions.
+           Default is False.
+
+        Returns
+        -------
+        spl: `redmapper.utilities.FixedGridCubicSpline`
+        """
+        key = (np.atleast_1d(x).astype(np.float64).tobytes(), id(xvals), fixextrap)
+
+        with cls._cache_lock:
+            entry = cls._cache.get(key)
+            if entry is not None and entry[0]() is xvals:
+                cls._cache.move_to_end(key)
+                return entry[1]
+
+        spl = cls(x, xvals, fixextrap=fixextrap)
+
+        def _remove(ref, key=key):
+            with cls._cache_lock:
+                entry = cls._cache.get(key)
+                if entry is not None and entry[0] is ref:
+                    del cls._cache[key]
+
+        with cls._cache_lock:
+            cls._cache[key] = (weakref.ref(xvals, _remove), spl)
+            while len(cls._cache) > cls._cache_size:
+                cls._cache.popitem(last=False)
+
+        return spl
+
+    def __call__(self, y):
+        """
+        Compute spline interpolation.
+
+        Parameters
+        ----------
+        y: `np.array`
+           Float array of node values.  The last axis is the node axis,
+           and any leading axes are evaluated together.
+
+        Returns
+        -------
+        vals: `np.array`
+           Spline interpolated values at xvals, with the same leading axes
+           as y and a last axis of length len(xvals).
+        """
+        return np.dot(np.asarray(y, dtype=np.float64), self.basis.T)
+
 def calc_theta_i(mag, mag_err, maxmag, limmag):
     """
     Calculate the luminosity function smooth cutoff function, theta_i.
@@ -516,12 +715,12 @@ def apply_errormodels(maskgals, mag_in, b=None, err_ratio=1.0, fluxmode=False,
         noise = np.sqrt(noise**2. + ((np.log(10.)/2.5) * sigma0 * tflux)**2.)
 
     if lnscat is not None:
-        noise = np.exp(np.log(noise) + lnscat * np.random.normal(size=noise.size))
+        noise = np.exp(np.log(noise) + lnscat * get_rng().normal(size=noise.size))
 
     if nonoise:
         flux = tflux
     else:
-        flux = tflux + noise*random.standard_normal(mag_in.size)
+        flux = tflux + noise*get_rng().standard_normal(mag_in.size)
 
     if fluxmode:
         mag = flux/maskgals.exptime
@@ -880,7 +1079,7 @@ def make_nodes(zrange, nodesize, maxnode=None):
 ## Sample from a pdf
 #######################
 
-def sample_from_pdf(f, ran, step, nsamp, **kwargs):
+def sample_from_pdf(f, ran, step, nsamp, rng=None, **kwargs):
     """
     Sample from a PDF described by a function f.
 
@@ -894,6 +1093,8 @@ def sample_from_pdf(f, ran, step, nsamp, **kwargs):
        Step size for interpolation.
     nsamp: `int`
        Number of samples from pdf
+    rng: `np.random.RandomState`, optional
+       Random number generator.  Default is None (numpy global state).
     **kwargs: `dict`
        Extra arguments to call f()
 
@@ -909,12 +1110,13 @@ def sample_from_pdf(f, ran, step, nsamp, **kwargs):
     cdf = np.cumsum(pdf, dtype=np.float64)
     cdfi = (cdf * x.size).astype(np.int32)
 
-    rand = (np.random.uniform(size=nsamp) * x.size).astype(np.int32)
+    if rng is None:
+        rng = np.random
+
+    rand = (rng.uniform(size=nsamp) * x.size).astype(np.int32)
 
-    samples = np.zeros(nsamp)
-    for i in range(nsamp):
-        test, = np.where(cdfi >= rand[i])
-        samples[i] = x[test[0]]
+    # The first x where cdfi >= rand
+    samples = x[np.searchsorted(cdfi, rand, side='left')]
 
     return samples
 
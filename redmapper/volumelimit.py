@@ -105,7 +105,7 @@ class VolumeLimitMask(object):
                 raise RuntimeError("Could not find specified vlim_depthfile %s" % (fname))
 
         # Read in the red-sequence parameters
-        zredstr = RedSequenceColorPar(self.config.parfile, fine=True)
+        zredstr = RedSequenceColorPar(self.config.parfile, fine=True, cachedir=self.config.redsequence_cachedir)
 
         # create the redshift bins
         zbinsize = 0.001 # arbitrary fine bin
@@ -279,9 +279,7 @@ class Zlambda(object):
         """
         nsteps = 10
         steps = self.config.zlambda_parab_step * np.arange(nsteps) + z_lambda - self.config.zlambda_parab_step * (nsteps - 1) / 2
-        likes = np.zeros(nsteps)
-        for i in range(nsteps):
-             likes[i] = self._bracket_fn(steps[i])
+        likes = self._bracket_fn_grid(steps)
         fit = np.polyfit(steps, likes, 2)
 
         if fit[0] > 0.0:
@@ -308,11 +306,36 @@ class Zlambda(object):
         t: `float`
            Total (negative) likelihood at redshift z
         """
-        likelihoods = self.zredstr.calculate_chisq(self.cluster.neighbors[self._zlambda_in_rad],
+        likelihoods = self.zredstr.calculate_chisq(self.cluster.neighbors.take(self._zlambda_in_rad,
+                                                                               columns=self.zredstr.chisq_columns),
                                                    z, calc_lkhd=True)
         t = -np.sum(self._zlambda_pw*likelihoods)
         return t
 
+    def _bracket_fn_grid(self, zs):
+        """
+        Compute z_lambda likelihood (negative for minimization) at a grid of
+        redshifts.
+
+        All the redshifts are evaluated with one grouped chisq computation.
+
+        Parameters
+        ----------
+        zs: `np.array`
+           Float array of redshifts to compute z_lambda likelihood
+
+        Returns
+        -------
+        t: `np.array`
+           Float array of total (negative) likelihood at each redshift
+        """
+        zs = np.atleast_1d(zs)
+
+        neighbors = self.cluster.neighbors.take(self._zlambda_in_rad, columns=self.zredstr.chisq_columns)
+        likelihoods = self.zredstr.calculate_chisq_grouped(neighbors, zs, calc_lkhd=True)
+        t = -np.sum(self._zlambda_pw[:, np.newaxis]*likelihoods, axis=0)
+        return t
+
     def _delta_bracket_fn(self, z):
         """
         Compute the difference in likelihood between that at redshift z and a
@@ -492,35 +515,12 @@ class Zlambda(object):
             # go to lower redshift
             dztest = 0.05
 
-            lowz = z_lambda - dztest
-            ratio = 1.0
-            while (lowz >= self.zredstr.z[0] and (ratio > 0.01)):
-                val = -self._bracket_fn(lowz)
-
-                ln_lkhd = val - pk
-                with np.errstate(over="raise"):
-                    pz = np.exp(val - pk) * self.zredstr.volume_factor[self.zredstr.zindex(lowz)]
-
-                ratio = pz/pz0
-
-                if (ratio > 0.01):
-                    lowz -= dztest
+            lowz = self._zlambda_pz_edge(z_lambda, -dztest, pk, pz0)
 
             # clip to lower value
             lowz = np.clip(lowz, self.zredstr.z[0], None)
 
-            highz = z_lambda + dztest
-            ratio = 1.0
-            while (highz <= self.zredstr.z[-2] and ratio > 0.01):
-                val = -self._bracket_fn(highz)
-
-                ln_lkhd = val - pk
-                pz = np.exp(ln_lkhd) * self.zredstr.volume_factor[self.zredstr.zindex(highz)]
-
-                ratio = pz / pz0
-
-                if ratio > 0.01:
-                    highz += dztest
+            highz = self._zlambda_pz_edge(z_lambda, dztest, pk, pz0)
 
             highz = np.clip(highz, None, self.zredstr.z[-2])
 
@@ -534,9 +534,7 @@ class Zlambda(object):
 
         # Now compute for each of the bins
 
-        ln_lkhd = np.zeros(self.config.npzbins)
-        for i in range(self.config.npzbins):
-            ln_lkhd[i] = -self._bracket_fn(pzbins[i])
+        ln_lkhd = -self._bracket_fn_grid(pzbins)
 
         ln_lkhd = ln_lkhd - np.max(ln_lkhd)
         pz = np.exp(ln_lkhd) * self.zredstr.volume_factor[self.zredstr.zindex(pzbins)]
@@ -551,6 +549,66 @@ class Zlambda(object):
 
         return pzbins, pz
 
+    def _zlambda_pz_edge(self, z_lambda, dztest, pk, pz0):
+        """
+        Step away from z_lambda to find where p(z) drops below 1% of the peak.
+
+        The likelihoods at all the steps within the redshift range are
+        computed in one batch.
+
+        Parameters
+        ----------
+        z_lambda: `float`
+           Central z_lambda redshift
+        dztest: `float`
+           Redshift step; negative to step to lower redshift
+        pk: `float`
+           Likelihood at z_lambda
+        pz0: `float`
+           Volume factor at z_lambda
+
+        Returns
+        -------
+        zedge: `float`
+           Redshift of the edge of p(z), before clipping to the redshift range
+        """
+        # Step in the same way as an iterative search, to get the same redshifts.
+        zsteps = []
+        zedge = z_lambda + dztest
+        if dztest < 0.0:
+            while zedge >= self.zredstr.z[0]:
+                zsteps.append(zedge)
+                zedge += dztest
+        else:
+            while zedge <= self.zredstr.z[-2]:
+                zsteps.append(zedge)
+                zedge += dztest
+
+        if len(zsteps) == 0:
+            return zedge
+
+        zsteps = np.array(zsteps)
+        vals = -self._bracket_fn_grid(zsteps)
+
+        with np.errstate(over="ignore"):
+            pz = np.exp(vals - pk) * self.zredstr.volume_factor[np.atleast_1d(self.zredstr.zindex(zsteps))]
+
+        ratio = pz / pz0
+
+        low, = np.where(ratio <= 0.01)
+        if low.size > 0:
+            zedge = zsteps[low[0]]
+            nused = low[0] + 1
+        else:
+            nused = zsteps.size
+
+        if dztest < 0.0 and not np.all(np.isfinite(pz[: nused])):
+            # Overflow on the low side is an error.
+            raise FloatingPointError("overflow encountered in exp")
+
+        return zedge
+
+
 class ZlambdaCorrectionPar(object):
     """
     Class to describe the z_lambda correction parameters
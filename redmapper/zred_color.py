@@ -8,6 +8,7 @@ import copy
 
 from .galaxy import GalaxyCatalog
 from .utilities import interpol, sample_from_pdf
+from .chisq_dist import compute_chisq
 
 class ZredColor(object):
     """
@@ -16,7 +17,7 @@ class ZredColor(object):
     """
 
     def __init__(self, zredstr, sigint=0.001, do_correction=True,
-                 use_photoerr=True, zrange=None):
+                 use_photoerr=True, zrange=None, block_size=1000):
         """
         Instantiate a ZredColor object.
 
@@ -33,6 +34,9 @@ class ZredColor(object):
         zrange: `list`, optional
            Redshift range.  Useful for testing.  Default is None (use
            zredstr redshift range).
+        block_size: `int`, optional
+           Number of galaxies to compute at once in the batch zred engine.
+           This bounds the memory used for the chisq grid.  Default is 1000.
         """
         self.zredstr = zredstr
 
@@ -40,6 +44,7 @@ class ZredColor(object):
         self.do_correction = do_correction
         self.use_photoerr = use_photoerr
         self.zrange = zrange
+        self.block_size = block_size
 
         self.nz = self.zredstr.z.size - 1
         self.notextrap, = np.where(~self.zredstr.extrapolated)
@@ -53,7 +58,7 @@ class ZredColor(object):
             self.zbinstart = u[0]
             self.zbinstop = u[-1]
 
-    def compute_zreds(self, galaxies):
+    def compute_zreds(self, galaxies, batch=True):
         """
         Compute zreds for a catalog of galaxies.
 
@@ -63,10 +68,19 @@ class ZredColor(object):
         ----------
         galaxies: `redmapper.GalaxyCatalog`
            Catalog of galaxies to compute zred.
+        batch: `bool`, optional
+           Use the vectorized batch engine, computing self.block_size
+           galaxies at a time.  If False, loop over galaxies with
+           compute_zred().  Default is True.
         """
 
-        for galaxy in galaxies:
-            self.compute_zred(galaxy, no_corrections=True)
+        if batch:
+            for i0 in range(0, galaxies.size, self.block_size):
+                self._compute_zreds_block(galaxies,
+                                          np.arange(i0, min(i0 + self.block_size, galaxies.size)))
+        else:
+            for galaxy in galaxies:
+                self.compute_zred(galaxy, no_corrections=True)
 
         if self.do_correction:
             # Bulk processing
@@ -278,6 +292,339 @@ class ZredColor(object):
 
         # and we're done
 
+    def _compute_zreds_block(self, galaxies, indices):
+        """
+        Compute uncorrected zreds for a block of galaxies with array operations.
+
+        This reproduces compute_zred(galaxy, no_corrections=True) for each
+        galaxy in the block, including the order of the random draws for
+        zred_samp, but evaluates the chisq grid for all the galaxies and
+        redshift bins in one call.
+
+        Will set galaxies.zred, galaxies.zred_e, etc. for the block.
+
+        Parameters
+        ----------
+        galaxies: `redmapper.GalaxyCatalog`
+           Catalog of galaxies to compute zred.
+        indices: `np.array`
+           Integer array of indices of the galaxies in the block.
+        """
+
+        gals = galaxies[indices]
+        ngal = indices.size
+        z = self.zredstr.z[: self.nz]
+
+        # The redshift bins to compute for each galaxy (see compute_zred)
+        zbins_limited = ((gals.refmag[:, np.newaxis] < self.zredstr.maxrefmag[np.newaxis, :]) &
+                         (gals.refmag[:, np.newaxis] > self.zredstr.minrefmag[np.newaxis, :]) &
+                         (self.zredstr.z[np.newaxis, :] < 100.0))
+        good = (zbins_limited.sum(axis=1) >= 2)
+
+        neighbors = 10
+        zbinmin = np.clip(np.argmax(zbins_limited, axis=1) - neighbors, 0, self.nz)
+        zbinmax = np.clip(zbins_limited.shape[1] - 1 - np.argmax(zbins_limited[:, ::-1], axis=1) + neighbors,
+                          0, self.nz)
+        zinds = np.arange(self.nz)
+        in_zbins = ((zinds[np.newaxis, :] >= zbinmin[:, np.newaxis]) &
+                    (zinds[np.newaxis, :] < zbinmax[:, np.newaxis]) &
+                    good[:, np.newaxis])
+        gal_inds, zbins = np.where(in_zbins)
+
+        lndist = np.zeros((ngal, self.nz)) - 1e12
+        chisq = np.zeros((ngal, self.nz)) + 1e12
+
+        lndist[gal_inds, zbins], chisq[gal_inds, zbins] = self._calculate_lndist_block(gals, gal_inds, zbins)
+
+        # move from log space to regular space
+        maxlndist = np.max(lndist, axis=1)
+        dist = np.zeros_like(lndist)
+        with np.errstate(invalid='ignore', over='ignore'):
+            dist[gal_inds, zbins] = np.exp(lndist[gal_inds, zbins] - maxlndist[gal_inds])
+
+        # fix infinities and NaNs
+        dist[~np.isfinite(dist)] = 0.0
+
+        # take the maximum where not extrapolated
+        ind = self.notextrap[np.argmax(dist[:, self.notextrap], axis=1)]
+
+        # The integrals are done over a different number of bins for each
+        # galaxy, so we group galaxies with the same number of bins.
+        calcinds = (dist > 1e-5)
+        ncalc = calcinds.sum(axis=1)
+        ncalc_groups = [(n, np.where(good & (ncalc == n))[0]) for n in np.unique(ncalc[good])]
+
+        zred_temp = np.zeros(ngal)
+        zred_e = np.zeros(ngal)
+        for n, rows in ncalc_groups:
+            tdist, zcalc = self._gather_rows(dist, z, calcinds, rows, n)
+            norm = self._integrate_rows(tdist, zcalc)
+            zred_temp[rows] = self._integrate_rows(tdist * zcalc, zcalc) / norm
+            zred_e[rows] = self._integrate_rows(tdist * zcalc**2., zcalc) / norm - zred_temp[rows]**2.
+
+        with np.errstate(invalid='ignore'):
+            zred_e = np.where(zred_e < 0.0, 1.0, np.sqrt(zred_e))
+        zred_e = np.where(zred_e > 0.005, zred_e, 0.005)
+
+        zred = zred_temp.copy()
+
+        # Now fit a parabola to get the perfect zred
+        neighbors = 2
+        use = (lndist > -1e10)
+        minuse = np.argmax(use, axis=1)
+        maxuse = self.nz - 1 - np.argmax(use[:, ::-1], axis=1)
+
+        minindex = np.where(minuse > ind - neighbors, minuse, ind - neighbors)
+        maxindex = np.where(maxuse < ind + neighbors, maxuse, ind + neighbors)
+        # If it hits a wall, then move in the other direction to ensure we have at least neighbors*2+1 points
+        hit_min = (minindex == minuse)
+        hit_max = ~hit_min & (maxindex == maxuse)
+        maxindex = np.where(hit_min, np.minimum(minuse + 2*neighbors, maxuse), maxindex)
+        minindex = np.where(hit_max, np.maximum(maxuse - 1 - 2*neighbors, minuse), minindex)
+
+        nfit = maxindex - minindex + 1
+        do_fit = good & (use.sum(axis=1) >= neighbors*2 + 1) & (nfit >= 5)
+
+        for n in np.unique(nfit[do_fit]):
+            rows, = np.where(do_fit & (nfit == n))
+            fitinds = minindex[rows, np.newaxis] + np.arange(n)[np.newaxis, :]
+
+            X = np.zeros((rows.size, n, 3))
+            X[:, :, 1] = z[fitinds]
+            X[:, :, 0] = X[:, :, 1] * X[:, :, 1]
+            X[:, :, 2] = 1
+            y = lndist[rows[:, np.newaxis], fitinds]
+
+            XT = np.transpose(X, (0, 2, 1))
+            fit = np.matmul(np.matmul(np.linalg.inv(np.matmul(XT, X)), XT), y[:, :, np.newaxis])[:, :, 0]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ztry = -fit[:, 1] / (2.0 * fit[:, 0])
+            # Don't let it move too far, or it's a bad fit
+            move = (fit[:, 0] < 0.0) & (np.abs(ztry - zred[rows]) < 2.0*zred_e[rows])
+            zred[rows[move]] = ztry[move]
+
+        # And compute values at the real zred peak
+        x = (z[np.newaxis, :] - zred[:, np.newaxis]) / zred_e[:, np.newaxis]
+        newdist = np.exp(-0.5 * x * x)
+
+        bad = ((lndist < -1e10) | (~np.isfinite(lndist)))
+        newdist[bad] = 0.0
+        lndist[bad] = -1e11
+
+        lkhd = np.zeros(ngal)
+        for n, rows in ncalc_groups:
+            tnewdist, zcalc = self._gather_rows(newdist, z, calcinds, rows, n)
+            tlndist, _ = self._gather_rows(lndist, z, calcinds, rows, n)
+            lkhd[rows] = (self._integrate_rows(tnewdist * tlndist, zcalc) /
+                          self._integrate_rows(tnewdist, zcalc))
+
+        # Get chisq at the closest bin position
+        zbin = np.argmin(np.abs(zred[:, np.newaxis] - z[np.newaxis, :]), axis=1)
+        chisq = chisq[np.arange(ngal), zbin]
+
+        ok = good & np.isfinite(lkhd)
+
+        # And sample the uncorrected p(z)
+        nsamp = gals.zred_samp[0].size
+        zred_samp = np.zeros((ngal, nsamp)) + zred[:, np.newaxis]
+
+        gdzbins = ((dist > 1e-10) & (np.isfinite(dist)))
+        to_sample, = np.where(ok & (gdzbins.sum(axis=1) >= 3))
+
+        # The random numbers are drawn in galaxy order to match compute_zred()
+        rand = np.random.uniform(size=(to_sample.size, nsamp))
+
+        if to_sample.size > 0:
+            # Galaxies with the same set of good bins share a pdf sampling grid
+            patterns, inverse = np.unique(gdzbins[to_sample], axis=0, return_inverse=True)
+            for i in range(patterns.shape[0]):
+                sub, = np.where(inverse.ravel() == i)
+                rows = to_sample[sub]
+                pzbins, = np.where(patterns[i])
+
+                pz = dist[rows[:, np.newaxis], pzbins[np.newaxis, :]]
+                n = scipy.integrate.simpson(y=pz, x=z[pzbins], axis=1)
+                pz /= n[:, np.newaxis]
+
+                pdf = scipy.interpolate.interp1d(z[pzbins], pz, kind='quadratic', axis=1,
+                                                 bounds_error=False, fill_value=0.0)
+                zred_samp[rows, :] = self._sample_from_pdfs(pdf,
+                                                            [z[pzbins[0]], z[pzbins[-1]]],
+                                                            0.0001,
+                                                            rand[sub, :])
+
+        # Finally store the values
+        zred[~ok] = -1.0
+        zred_e[~ok] = -1.0
+        chisq[~ok] = -1.0
+        lkhd[~ok] = -1000.0
+
+        galaxies.zred[indices] = zred
+        galaxies.zred_e[indices] = zred_e
+        galaxies.zred2[indices] = zred
+        galaxies.zred2_e[indices] = zred_e
+        galaxies.zred_uncorr[indices] = zred
+        galaxies.zred_uncorr_e[indices] = zred_e
+        galaxies.chisq[indices] = chisq
+        galaxies.lkhd[indices] = lkhd
+        galaxies.zred_samp[indices[ok]] = zred_samp[ok, :].reshape(galaxies.zred_samp[indices[ok]].shape)
+
+    def _gather_rows(self, values, z, mask, rows, n):
+        """
+        Gather the n masked values from each of a set of rows.
+
+        Parameters
+        ----------
+        values: `np.array`
+           Float array of values [ngal, nz]
+        z: `np.array`
+           Float array of redshifts [nz]
+        mask: `np.array`
+           Boolean array of values to gather [ngal, nz]
+        rows: `np.array`
+           Integer array of rows which each have n masked values
+        n: `int`
+           Number of masked values in each row
+
+        Returns
+        -------
+        gathered: `np.array`
+           Float array of gathered values [rows.size, n]
+        zgathered: `np.array`
+           Float array of gathered redshifts [rows.size, n]
+        """
+        rowmask = mask[rows, :]
+        gathered = values[rows, :][rowmask].reshape(rows.size, n)
+        zgathered = np.broadcast_to(z, rowmask.shape)[rowmask].reshape(rows.size, n)
+
+        return gathered, zgathered
+
+    def _integrate_rows(self, y, x):
+        """
+        Integrate each row of y over x, as done for a single galaxy.
+
+        Uses the trapezoid rule if there are at least 3 points per row,
+        and a plain sum otherwise.
+
+        Parameters
+        ----------
+        y: `np.array`
+           Float array of values to integrate [nrow, n]
+        x: `np.array`
+           Float array of abscissae [nrow, n]
+
+        Returns
+        -------
+        integral: `np.array`
+           Float array of integrals [nrow]
+        """
+        if y.shape[1] >= 3:
+            return scipy.integrate.trapezoid(y, x, axis=1)
+        else:
+            return np.sum(y, axis=1)
+
+    def _sample_from_pdfs(self, f, ran, step, rand):
+        """
+        Sample from a set of PDFs, with pre-drawn uniform random numbers.
+
+        This is the vectorized equivalent of utilities.sample_from_pdf().
+
+        Parameters
+        ----------
+        f: `function`
+           Function returning the PDFs [npdf, nx] at an array of x values
+        ran: `list`
+           Two-element range over which to sample.
+        step: `float`
+           Step size for interpolation.
+        rand: `np.array`
+           Float array of uniform random numbers [npdf, nsamp]
+
+        Returns
+        -------
+        samples: `np.array`
+           Float array of samples from the PDFs [npdf, nsamp]
+        """
+        x = np.arange(ran[0], ran[1], step)
+        pdf = np.ascontiguousarray(f(x))
+        pdf /= np.sum(pdf, axis=1)[:, np.newaxis]
+        cdf = np.cumsum(pdf, axis=1, dtype=np.float64)
+        cdfi = (cdf * x.size).astype(np.int32)
+
+        randi = (rand * x.size).astype(np.int32)
+
+        # The first element where cdfi >= randi is the first element where
+        # the running maximum of cdfi >= randi, which can be found with a
+        # sorted search.  Each row is offset so a single search can be used.
+        cdfi = np.maximum.accumulate(cdfi, axis=1).astype(np.int64)
+        minval = min(cdfi.min(), randi.min())
+        stride = max(cdfi.max(), randi.max()) - minval + 1
+        offsets = np.arange(cdfi.shape[0], dtype=np.int64)[:, np.newaxis] * stride - minval
+
+        inds = np.searchsorted((cdfi + offsets).ravel(), (randi + offsets).ravel())
+        inds = inds.reshape(randi.shape) - np.arange(cdfi.shape[0])[:, np.newaxis] * x.size
+
+        return x[inds]
+
+    def _calculate_lndist_block(self, galaxies, gal_inds, zbins):
+        """
+        Calculate the log-likelihood for a list of (galaxy, redshift bin) pairs.
+
+        Parameters
+        ----------
+        galaxies: `redmapper.GalaxyCatalog`
+           Galaxies to compute likelihoods
+        gal_inds: `np.array`
+           Integer array of galaxy indices
+        zbins: `np.array`
+           Integer array of redshift bins, same length as gal_inds
+
+        Returns
+        -------
+        lndist: `np.array`
+           Log-likelihood for the pairs
+        chisq: `np.array`
+           Fit chi-squared for the pairs
+        """
+
+        if gal_inds.size == 0:
+            return (np.zeros(0), np.zeros(0))
+
+        refmag = galaxies.refmag[gal_inds]
+        magind = np.atleast_1d(self.zredstr.refmagindex(galaxies.refmag))[gal_inds]
+
+        # Follow the type promotion of calculate_chisq_redshifts() so that
+        # the errors match the single-galaxy computation.
+        dmag_dtype = (refmag.dtype.type(0.0) - self.zredstr.mag_err_ratio_pivot).dtype
+        dmag = refmag.astype(dmag_dtype) - self.zredstr.mag_err_ratio_pivot
+        mag_err = galaxies.mag_err[gal_inds, :]
+        mag_err *= (self.zredstr.mag_err_ratio_intercept[np.newaxis, :] +
+                    self.zredstr.mag_err_ratio_slope[np.newaxis, :]*dmag[:, np.newaxis])
+
+        # Mode 2: many galaxies, many redshifts
+        chisq = compute_chisq(self.zredstr.covmat[:, :, zbins], self.zredstr.c[zbins, :],
+                              self.zredstr.slope[zbins, :], self.zredstr.pivotmag[zbins],
+                              refmag, mag_err,
+                              galaxies.galcol[gal_inds, :],
+                              refmagerr=galaxies.refmag_err[gal_inds],
+                              lupcorr=self.zredstr.lupcorr[magind, zbins, :],
+                              calc_chisq=True, calc_lkhd=False)
+
+        lndist = -0.5 * chisq
+
+        lndistcorr = np.log((10.**(0.4 * (self.zredstr.alpha + 1.0) *
+                                   (self.zredstr._mstar[zbins] - refmag)) *
+                             np.exp(-10.**(0.4 * (self.zredstr._mstar[zbins] - refmag)))) *
+                            self.zredstr.volume_factor[zbins])
+
+        lndist += lndistcorr
+
+        bad, = np.where(~np.isfinite(lndist))
+        lndist[bad] = -1e11
+
+        return (lndist, chisq)
+
     def _calculate_lndist(self, galaxy, zbins):
         """
         Calculate the log-likelihood for a list of redshift bins.
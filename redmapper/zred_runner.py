@@ -9,6 +9,7 @@ import os
 import time
 
 import multiprocessing
+from multiprocessing import shared_memory
 
 import types
 try:
@@ -41,7 +42,8 @@ class ZredRunCatalog(object):
         self.config = config.copy()
         self.config.cosmo = None
 
-    def run(self, galaxyfile, outfile, clobber=False, nperproc=None, maxperproc=500000):
+    def run(self, galaxyfile, outfile, clobber=False, nperproc=None, maxperproc=500000,
+            use_shared_memory=None):
         """
         Run a galaxy file to compute zreds and output zreds to output file.
 
@@ -60,18 +62,23 @@ class ZredRunCatalog(object):
         maxperproc: `int`, optional
            Maximum number to run per processor, when doing automatic
            division.   Default is 500000.
+        use_shared_memory: `bool`, optional
+           Read the galaxy catalog once into shared memory, and have the
+           workers write zreds directly into a shared output array.
+           Default is None, which uses config.zred_use_shared_memory.
         """
 
+        if use_shared_memory is None:
+            use_shared_memory = self.config.zred_use_shared_memory
+
         self.galaxyfile = galaxyfile
         self.outfile = outfile
 
         hdr = fitsio.read_header(self.galaxyfile, ext=1)
         ngal = hdr['NAXIS2']
 
-        zredstr = RedSequenceColorPar(self.config.parfile)
-        self.zredc = ZredColor(zredstr)
-
-        zreds = Catalog(np.zeros(ngal, dtype=zred_extra_dtype(self.config.zred_nsamp)))
+        zredstr = RedSequenceColorPar(self.config.parfile, cachedir=self.config.redsequence_cachedir)
+        self.zredc = ZredColor(zredstr, block_size=self.config.zred_block_size)
 
         if nperproc is None:
             nperproc = int(float(ngal) / (self.config.calib_nproc - 0.1))
@@ -80,6 +87,12 @@ class ZredRunCatalog(object):
         inds = np.arange(0, ngal, nperproc)
         worker_list = [(ind, np.clip(ind + nperproc, None, ngal)) for ind in inds]
 
+        if use_shared_memory:
+            self._run_shared_memory(worker_list, ngal, outfile, clobber)
+            return
+
+        zreds = Catalog(np.zeros(ngal, dtype=zred_extra_dtype(self.config.zred_nsamp)))
+
         mp_ctx = multiprocessing.get_context("fork")
         pool = mp_ctx.Pool(processes=self.config.calib_nproc)
         retvals = pool.map(self._worker, worker_list, chunksize=1)
@@ -149,6 +162,106 @@ class ZredRunCatalog(object):
                 galaxies.lkhd, galaxies.chisq)
 
 
+    def _run_shared_memory(self, worker_list, ngal, outfile, clobber):
+        """
+        Run the galaxy file through shared memory.
+
+        The input columns are read once into a shared memory block, and the
+        workers write their zreds directly into a shared output block, so
+        nothing but the index ranges are passed to and from the workers.
+
+        Parameters
+        ----------
+        worker_list: `list`
+           List of 2-element [first, last) index ranges to compute.
+        ngal: `int`
+           Number of galaxies in the galaxy file.
+        outfile: `str`
+           Output zred file
+        clobber: `bool`
+           Clobber existing outfile?
+        """
+        columns = ['refmag', 'refmag_err', 'mag', 'mag_err']
+
+        with fitsio.FITS(self.galaxyfile) as fits:
+            in_dtype = fits[1].read(columns=columns, rows=[0], lower=True).dtype
+        out_dtype = np.dtype(zred_extra_dtype(self.config.zred_nsamp))
+
+        shm_in = shared_memory.SharedMemory(create=True, size=max(ngal*in_dtype.itemsize, 1))
+        shm_out = shared_memory.SharedMemory(create=True, size=max(ngal*out_dtype.itemsize, 1))
+
+        self._shared = {'ngal': ngal,
+                        'in_name': shm_in.name,
+                        'in_dtype': in_dtype,
+                        'out_name': shm_out.name,
+                        'out_dtype': out_dtype}
+
+        try:
+            in_cat = np.ndarray(ngal, dtype=in_dtype, buffer=shm_in.buf)
+            with fitsio.FITS(self.galaxyfile) as fits:
+                for ind_range in worker_list:
+                    in_cat[ind_range[0]: ind_range[1]] = fits[1].read(columns=columns,
+                                                                      rows=np.arange(ind_range[0], ind_range[1]),
+                                                                      lower=True)
+            del in_cat
+
+            mp_ctx = multiprocessing.get_context("fork")
+            pool = mp_ctx.Pool(processes=self.config.calib_nproc)
+            try:
+                pool.map(self._shared_memory_worker, worker_list, chunksize=1)
+                pool.close()
+            finally:
+                # Make sure no worker is still using the shared memory
+                # (e.g. after an exception) before it is unlinked.
+                pool.terminate()
+                pool.join()
+
+            zreds = Catalog(np.ndarray(ngal, dtype=out_dtype, buffer=shm_out.buf))
+            zreds.to_fits_file(outfile, clobber=clobber)
+            del zreds
+        finally:
+            self._shared = None
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
+
+    def _shared_memory_worker(self, ind_range):
+        """
+        Do the run on a specific list of galaxies, reading from and writing
+        to shared memory.
+
+        Parameters
+        ----------
+        ind_range: `list`
+           2-element list with first and last index to compute zred.
+
+        Returns
+        -------
+        ind_range: `list`
+           Index range that was input
+        """
+        shm_in = shared_memory.SharedMemory(name=self._shared['in_name'])
+        shm_out = shared_memory.SharedMemory(name=self._shared['out_name'])
+
+        in_cat = np.ndarray(self._shared['ngal'], dtype=self._shared['in_dtype'], buffer=shm_in.buf)
+        galaxies = GalaxyCatalog(in_cat[ind_range[0]: ind_range[1]])
+        galaxies.add_zred_fields(self.config.zred_nsamp)
+        del in_cat
+
+        self.zredc.compute_zreds(galaxies)
+
+        zreds = np.ndarray(self._shared['ngal'], dtype=self._shared['out_dtype'], buffer=shm_out.buf)
+        for name in zreds.dtype.names:
+            zreds[name][ind_range[0]: ind_range[1]] = galaxies._ndarray[name.lower()]
+        del zreds
+
+        shm_in.close()
+        shm_out.close()
+
+        return ind_range
+
+
 class ZredRunPixels(object):
     """
     Class to run a pixelized galaxy catalog to compute zreds, using
@@ -209,8 +322,8 @@ class ZredRunPixels(object):
         if not os.path.exists(self.zredpath):
             os.makedirs(self.zredpath)
 
-        zredstr = RedSequenceColorPar(self.config.parfile)
-        self.zredc = ZredColor(zredstr)
+        zredstr = RedSequenceColorPar(self.config.parfile, cachedir=self.config.redsequence_cachedir)
+        self.zredc = ZredColor(zredstr, block_size=self.config.zred_block_size)
 
         self.galtable = Entry.from_fits_file(self.config.galfile)
         indices = list(get_subpixel_indices(self.galtable,
@@ -338,6 +451,10 @@ class ZredRunPixels(object):
 
         hdr = fitsio.FITSHDR()
         hdr['PIXELS'] = 1
+        # Record if the zreds are in the (refmag sorted) order of a
+        # columnar galaxy store, so they can be read with the store.
+        if fitsio.read_header(self.config.galfile, ext=1).get('COLUMNAR', 0):
+            hdr['STOREORD'] = 1
 
         zredtable.to_fits_file(self.config.zredfile, header=hdr, clobber=True)
 
@@ -13,6 +13,7 @@ scripts = ['bin/redmapper_run_zred_pixel.py',
            'bin/redmagic_run.py',
            'bin/redmapper_convert_mask_to_healsparse.py',
            'bin/redmapper_convert_depthfile_to_healsparse.py',
+           'bin/redmapper_convert_galfile_to_columnar.py',
            'bin/redmapper_run_many_pixels_same_node.py',
            'bin/redmapper_build_docker.py',
            'bin/redmapper_consolidate_runcat.py',
@@ -71,6 +71,42 @@ class BackgroundTestCase(unittest.TestCase):
         py_outputs = zredbkg.sigma_g_lookup(zred, refmag)
         testing.assert_almost_equal(py_outputs, idl_outputs, decimal=3)
 
+    def test_bkg_lookup(self):
+        """
+        Test the cached lookup tables of a redmapper background.
+        """
+        file_name, file_path = 'test_bkg.fit', 'data_for_tests'
+        bkg = Background('%s/%s' % (file_path, file_name))
+
+        random_state = np.random.RandomState(seed=12345)
+        chisq = random_state.uniform(-1.0, bkg.chisqbins[-1] + 2.0, size=1000)
+        refmag = random_state.uniform(bkg.refmagbins[0] - 1.0, bkg.refmagbins[-1] + 1.0, size=1000)
+        chisq[: 10] = bkg.chisqbins[: 10]
+        refmag[: 10] = bkg.refmagbins[: 10]
+
+        bkg.lookup_cache_size = 2
+        for z in [0.2, 0.3, 0.2, 0.4, 0.35]:
+            # Direct lookup in the full table
+            zind = int(np.clip(np.round((z - bkg.zbins[0]) / (bkg.zbins[1] - bkg.zbins[0])), 0, bkg.zbins.size - 1))
+            chisqind = np.searchsorted(bkg.chisqbins, chisq) - 1
+            refmagind = np.searchsorted(bkg.refmagbins, refmag) - 1
+            expected = bkg.sigma_g[refmagind, chisqind, zind]
+            bad = ((chisq < bkg.chisqbins[0]) | (chisq > bkg.chisqbins[-1] + bkg.chisqbinsize) |
+                   (refmag <= bkg.refmagbins[0]) | (refmag > bkg.refmagbins[-1] + bkg.refmagbinsize))
+            expected[bad] = np.inf
+
+            testing.assert_array_equal(bkg.sigma_g_lookup(z, chisq, refmag, allow0=True), expected)
+            expected[expected == 0.0] = np.inf
+            testing.assert_array_equal(bkg.sigma_g_lookup(z, chisq, refmag), expected)
+
+            # And with an array of redshifts (which is not cached)
+            zs = np.full(chisq.size, z)
+            zs[0] += 0.1
+            expected[0] = bkg.sigma_g_lookup(z + 0.1, chisq[0: 1], refmag[0: 1])[0]
+            testing.assert_array_equal(bkg.sigma_g_lookup(zs, chisq, refmag), expected)
+
+            self.assertLessEqual(len(bkg._lookup_cache), bkg.lookup_cache_size)
+
     def test_generatebkg(self):
         """
         Test generation of a background file.
@@ -96,8 +132,8 @@ class BackgroundTestCase(unittest.TestCase):
         # Some spot-testing...
         testing.assert_equal(bkg[0]['sigma_g'].shape, (48, 40, 5))
         testing.assert_equal(bkg[0]['sigma_lng'].shape, (48, 40, 5))
-        testing.assert_almost_equal(bkg[0]['sigma_g'][30, 20, 2], 2.8444533)
-        testing.assert_almost_equal(bkg[0]['sigma_g'][30, 10, 3], 7.4324584)
+        testing.assert_almost_equal(bkg[0]['sigma_g'][30, 20, 2], 2.8444390)
+        testing.assert_almost_equal(bkg[0]['sigma_g'][30, 10, 3], 7.4324632)
         testing.assert_almost_equal(bkg[0]['sigma_lng'][30, 10, 3], 3.7618985, 4)
         testing.assert_almost_equal(bkg[0]['sigma_lng'][45, 10, 3], 0.0)
 
@@ -142,6 +178,39 @@ class BackgroundTestCase(unittest.TestCase):
         testing.assert_almost_equal(zbkg[0]['sigma_g'][47, 8], 30501.8398438, decimal=5)
         testing.assert_almost_equal(zbkg[0]['sigma_g'][30, 0], 384.3362732, decimal=5)
 
+    def test_generatebkg_pixel_partition(self):
+        """
+        Test generation of background files partitioned by galaxy pixel.
+        """
+        config_file = os.path.join('data_for_tests', 'testconfig.yaml')
+
+        config = Configuration(config_file)
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+        config.outpath = self.test_dir
+
+        config.zrange = [0.1, 0.2]
+        config.zredfile = os.path.join('data_for_tests', 'zreds_test', 'dr8_test_zreds_master_table.fit')
+
+        bkgs = []
+        zbkgs = []
+        for pixel_partition in [False, True]:
+            config.bkg_pixel_partition = pixel_partition
+            config.calib_nproc = 2 if pixel_partition else 1
+            config.bkgfile = os.path.join(config.outpath, '%s_testbkg_%d.fit' % (config.d.outbase, int(pixel_partition)))
+
+            gen = BackgroundGenerator(config)
+            gen.run(clobber=True)
+            gen = ZredBackgroundGenerator(config)
+            gen.run(clobber=False)
+
+            bkgs.append(fitsio.read(config.bkgfile, ext='CHISQBKG'))
+            zbkgs.append(fitsio.read(config.bkgfile, ext='ZREDBKG'))
+
+        testing.assert_array_almost_equal(bkgs[1][0]['sigma_g'], bkgs[0][0]['sigma_g'], 4)
+        testing.assert_array_almost_equal(bkgs[1][0]['sigma_lng'], bkgs[0][0]['sigma_lng'], 4)
+        testing.assert_array_almost_equal(zbkgs[1][0]['sigma_g'], zbkgs[0][0]['sigma_g'], 3)
+
     def setUp(self):
         self.test_dir = None
 
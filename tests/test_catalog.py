@@ -0,0 +1,241 @@
+import unittest
+import numpy.testing as testing
+import numpy as np
+import tempfile
+import shutil
+import os
+import fitsio
+from collections import OrderedDict
+
+from redmapper import Catalog, CatalogBuilder
+from redmapper import ClusterCatalog
+
+
+class CatalogBuilderTestCase(unittest.TestCase):
+    """
+    Tests for redmapper.CatalogBuilder, for accumulating catalog rows.
+    """
+    def test_catalogbuilder(self):
+        """
+        Test building a catalog from blocks.
+        """
+        dtype = [('mem_match_id', 'i4'),
+                 ('ra', 'f8'),
+                 ('mag', 'f4', 5)]
+
+        builder = CatalogBuilder()
+        self.assertIsNone(builder.to_catalog())
+
+        catalog = None
+        for i in range(20):
+            block = Catalog.zeros(i, dtype=dtype)
+            block.mem_match_id[:] = i
+            block.ra[:] = np.arange(i)
+            block.mag[:, :] = float(i)
+
+            builder.append(block)
+
+            if catalog is None:
+                catalog = block
+            else:
+                catalog.append(block)
+
+        testing.assert_equal(builder.size, catalog.size)
+        testing.assert_equal(len(builder), catalog.size)
+
+        built = builder.to_catalog()
+        self.assertIsInstance(built, Catalog)
+        testing.assert_array_equal(built._ndarray, catalog._ndarray)
+
+        # And we can append more rows after building, including raw arrays
+        builder.append(np.zeros(3, dtype=dtype))
+        built = builder.to_catalog()
+        testing.assert_equal(built.size, catalog.size + 3)
+        testing.assert_array_equal(built._ndarray[: catalog.size], catalog._ndarray)
+
+        # And the catalog class can be specified
+        builder = CatalogBuilder(catalog_class=ClusterCatalog)
+        builder.append(np.zeros(2, dtype=[('mem_match_id', 'i4')]))
+        self.assertIsInstance(builder.to_catalog(), ClusterCatalog)
+
+    def test_catalogbuilder_scaling(self):
+        """
+        Test that CatalogBuilder does not copy the rows on append, and only
+        concatenates the blocks once when building, so that it scales
+        linearly with the number of blocks (unlike repeated Catalog.append).
+        """
+        dtype = [('mem_match_id', 'i4'),
+                 ('id', 'i8'),
+                 ('ra', 'f8'),
+                 ('dec', 'f8'),
+                 ('mag', 'f4', 5),
+                 ('mag_err', 'f4', 5)]
+
+        block = Catalog.zeros(50, dtype=dtype)
+        nblock = 1000
+
+        builder = CatalogBuilder()
+        for i in range(nblock):
+            builder.append(block)
+
+        # Appending keeps the blocks without copying
+        self.assertEqual(len(builder._blocks), nblock)
+        for b in builder._blocks:
+            self.assertTrue(np.shares_memory(b, block._ndarray))
+
+        # Building concatenates once, and keeps the result
+        built = builder.to_catalog()
+        testing.assert_equal(built.size, nblock*block.size)
+        self.assertEqual(len(builder._blocks), 1)
+
+        # So further appends only add their own blocks
+        builder.append(block)
+        self.assertEqual(len(builder._blocks), 2)
+        testing.assert_equal(builder.to_catalog().size, (nblock + 1)*block.size)
+        self.assertEqual(len(builder._blocks), 1)
+
+    def test_catalog_columnar(self):
+        """
+        Test columnar catalogs against structured array catalogs.
+        """
+        dtype = [('id', 'i8'),
+                 ('ra', 'f8'),
+                 ('mag', 'f4', 5)]
+
+        catalog = Catalog.zeros(10, dtype=dtype)
+        catalog.id[:] = np.arange(10)
+        catalog.ra[:] = np.arange(10)*2.0
+        catalog.mag[:, :] = np.arange(50).reshape(10, 5)
+
+        columnar = Catalog.from_columns({'ID': catalog.id.copy(),
+                                         'ra': catalog.ra.copy(),
+                                         'mag': catalog.mag.copy()})
+        self.assertTrue(columnar.columnar)
+        self.assertFalse(catalog.columnar)
+        self.assertEqual(columnar.dtype, catalog.dtype)
+        testing.assert_equal(len(columnar), 10)
+        self.assertTrue(columnar.mag.flags['C_CONTIGUOUS'])
+
+        # Setting and slicing
+        columnar.ra = np.arange(10)*3.0
+        catalog.ra = np.arange(10)*3.0
+        testing.assert_array_equal(columnar[2: 5]._as_ndarray(), catalog[2: 5]._ndarray)
+        testing.assert_array_equal(columnar[np.array([5, 1])]._as_ndarray(), catalog[np.array([5, 1])]._ndarray)
+        testing.assert_equal(columnar[3].ra, catalog[3].ra)
+        columnar[0] = catalog[9]._ndarray
+        testing.assert_equal(columnar.id[0], 9)
+
+        # A single row is a view into a structured array catalog, and a copy
+        # of the row of a columnar catalog
+        catalog[1].ra = -1.0
+        testing.assert_equal(catalog.ra[1], -1.0)
+        columnar[1].ra = -1.0
+        testing.assert_equal(columnar.ra[1], 3.0)
+        catalog.ra[1] = 3.0
+
+        # A subset of rows and columns
+        sub = catalog.take(np.array([1, 2, 3]), columns=['mag'])
+        self.assertTrue(sub.columnar)
+        self.assertEqual(sub.dtype.names, ('mag', ))
+        testing.assert_array_equal(sub.mag, catalog.mag[1: 4, :])
+
+        # Adding fields does not change the existing columns
+        mag = columnar.mag
+        columnar.add_fields([('dec', 'f8'), ('zred_samp', 'f4', 3)])
+        self.assertIs(columnar.mag, mag)
+        testing.assert_array_equal(columnar.zred_samp.shape, [10, 3])
+        self.assertRaises(ValueError, columnar.add_fields, [('ra', 'f8')])
+
+        # Appending and extending
+        columnar.append(columnar[: 2])
+        columnar.extend(3)
+        testing.assert_equal(columnar.size, 15)
+        testing.assert_array_equal(columnar.id[10: 12], columnar.id[: 2])
+
+        # Getting the structured array does not change the storage
+        array = columnar._ndarray
+        self.assertTrue(columnar.columnar)
+        testing.assert_equal(array.size, 15)
+        testing.assert_array_equal(array['mag'], columnar.mag)
+        array['id'][0] = -1
+        testing.assert_equal(columnar.id[0], 9)
+
+        # Converting back to a structured array
+        columnar.to_ndarray()
+        self.assertFalse(columnar.columnar)
+        testing.assert_equal(columnar._ndarray.size, 15)
+        testing.assert_equal(columnar.id[0], 9)
+        testing.assert_array_equal(columnar.mag[: 10, :], mag)
+        testing.assert_array_equal(columnar.mag[12:, :], 0.0)
+
+        catalog.to_columnar()
+        self.assertTrue(catalog.columnar)
+        testing.assert_array_equal(catalog.mag[1: 4, :], sub.mag)
+
+    def test_catalog_lazy(self):
+        """
+        Test reading catalog columns from a file on first access.
+        """
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+        filename = os.path.join(self.test_dir, 'test_lazy.fit')
+
+        array = np.zeros(20, dtype=[('MEM_MATCH_ID', 'i4'),
+                                    ('RA', 'f8'),
+                                    ('Z_LAMBDA', 'f4'),
+                                    ('LAMBDA', 'f4'),
+                                    ('PZ', 'f4', 21)])
+        array['MEM_MATCH_ID'] = np.arange(20) + 1
+        array['RA'] = np.arange(20)*0.1
+        array['Z_LAMBDA'] = np.linspace(0.1, 0.5, 20)
+        array['LAMBDA'] = np.arange(20)*5.0
+        array['PZ'] = np.arange(20*21).reshape(20, 21)
+        fitsio.write(filename, array)
+
+        def _is_read(cat, name):
+            return OrderedDict.__getitem__(cat._columns, name) is not None
+
+        eager = Catalog.from_fits_file(filename)
+        lazy = Catalog.from_fits_file(filename, lazy=True, columns=['lambda'])
+        self.assertTrue(lazy.columnar)
+        self.assertEqual(lazy.dtype, eager.dtype)
+        testing.assert_equal(lazy.size, 20)
+        self.assertTrue(_is_read(lazy, 'lambda'))
+        self.assertFalse(_is_read(lazy, 'pz'))
+
+        # Selecting rows does not read the other columns
+        use, = np.where(lazy.Lambda > 40.0)
+        sub = lazy[use[::-1]]
+        self.assertFalse(_is_read(lazy, 'z_lambda'))
+        self.assertFalse(_is_read(sub, 'pz'))
+        testing.assert_array_equal(sub.z_lambda, eager.z_lambda[use[::-1]])
+        self.assertFalse(_is_read(sub, 'pz'))
+        testing.assert_array_equal(sub._as_ndarray(), eager._ndarray[use[::-1]])
+
+        testing.assert_array_equal(lazy.take(np.arange(5), columns=['pz']).pz, eager.pz[: 5, :])
+        testing.assert_equal(lazy[3].mem_match_id, 4)
+
+        # Writes to a column are kept
+        sub.mem_match_id[:] = 0
+        testing.assert_array_equal(sub._ndarray['mem_match_id'], 0)
+        self.assertTrue(sub.columnar)
+
+        # And a lazy cluster catalog gets the default cluster fields
+        cat = ClusterCatalog.from_catfile(filename, lazy=True, columns=['ra'])
+        cat_eager = ClusterCatalog.from_catfile(filename)
+        self.assertEqual(cat.dtype.names, cat_eager.dtype.names)
+        testing.assert_array_equal(cat[5: 10]._as_ndarray(), cat_eager[5: 10]._ndarray)
+        self.assertTrue(cat[5: 10].columnar)
+        testing.assert_almost_equal(cat[2].Lambda, 10.0)
+        self.assertTrue(cat.columnar)
+
+    def setUp(self):
+        self.test_dir = None
+
+    def tearDown(self):
+        if self.test_dir is not None:
+            if os.path.exists(self.test_dir):
+                shutil.rmtree(self.test_dir, True)
+
+
+if __name__=='__main__':
+    unittest.main()
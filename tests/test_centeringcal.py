@@ -43,10 +43,22 @@ class CenteringCalibratorTestCase(unittest.TestCase):
 
         # First, the schechter monte carlo.
         # These are very approximate, but checking for any unexpected changes
-        testing.assert_almost_equal(wc.phi1_mmstar_m, -1.13451727, 5)
-        testing.assert_almost_equal(wc.phi1_mmstar_slope, -0.37794289, 5)
-        testing.assert_almost_equal(wc.phi1_msig_m, 0.49644922, 5)
-        testing.assert_almost_equal(wc.phi1_msig_slope, -0.13314551, 5)
+        testing.assert_almost_equal(wc.phi1_mmstar_m, -0.95146220, 5)
+        testing.assert_almost_equal(wc.phi1_mmstar_slope, -0.57818657, 5)
+        testing.assert_almost_equal(wc.phi1_msig_m, 0.39680579, 5)
+        testing.assert_almost_equal(wc.phi1_msig_slope, -0.00149910, 5)
+
+        # With a seed, the schechter monte carlo does not depend on the
+        # global random state
+        config.wcen_mc_seed = 12345
+        phi1_vals = []
+        for seed in [1000, 2000]:
+            random.seed(seed=seed)
+            wc._schechter_montecarlo_calib(testing=True)
+            phi1_vals.append([wc.phi1_mmstar_m, wc.phi1_mmstar_slope,
+                              wc.phi1_msig_m, wc.phi1_msig_slope])
+        testing.assert_array_equal(phi1_vals[0], phi1_vals[1])
+        config.wcen_mc_seed = None
 
         # Make sure the output file is there...
         self.assertTrue(os.path.isfile(config.wcenfile))
@@ -55,9 +67,9 @@ class CenteringCalibratorTestCase(unittest.TestCase):
         vals = config._wcen_vals()
         config._set_vars_from_dict(vals)
 
-        testing.assert_almost_equal(config.wcen_Delta0, -1.41107068614, 4)
-        testing.assert_almost_equal(config.wcen_Delta1, -0.324385870342, 4)
-        testing.assert_almost_equal(config.wcen_sigma_m, 0.3654790486, 4)
+        testing.assert_almost_equal(config.wcen_Delta0, -1.42179687680, 4)
+        testing.assert_almost_equal(config.wcen_Delta1, -0.319740924180, 4)
+        testing.assert_almost_equal(config.wcen_sigma_m, 0.3595316056, 4)
         testing.assert_almost_equal(config.wcen_pivot, 30.0, 4)
 
         testing.assert_almost_equal(config.lnw_fg_mean, -0.269133136174, 4)
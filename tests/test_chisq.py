@@ -2,6 +2,7 @@ import unittest
 import numpy.testing as testing
 import numpy as np
 import fitsio
+import timeit
 
 import redmapper
 
@@ -75,5 +76,114 @@ class ChisqColorTestCase(unittest.TestCase):
         testing.assert_almost_equal(lkhd, mode2data['LKHD'],decimal=2)
 
 
+class ChisqGroupedTestCase(unittest.TestCase):
+    """
+    Test computation of chisq for many galaxies at many redshifts at once.
+    """
+    def _get_galaxies(self):
+        """
+        Read the red-sequence parameters and the mode 0 test galaxies.
+        """
+        file_path = 'data_for_tests'
+
+        zredstr = redmapper.RedSequenceColorPar('%s/%s' % (file_path, 'test_dr8_pars.fit'), fine=True)
+
+        data = fitsio.read('%s/%s' % (file_path, 'testgals_chisq_mode0.fit'), ext=1)
+        galaxies = redmapper.GalaxyCatalog.zeros(data.size, dtype=[('refmag', 'f4'),
+                                                                   ('refmag_err', 'f4'),
+                                                                   ('mag', 'f4', 5),
+                                                                   ('mag_err', 'f4', 5)])
+        galaxies.refmag = data['REFMAG']
+        galaxies.refmag_err = data['REFMAG_ERR']
+        galaxies.mag = data['MODEL_MAG']
+        galaxies.mag_err = data['MODEL_MAGERR']
+
+        return zredstr, galaxies
+
+    def test_chisq_grouped(self):
+        """
+        Test the grouped chisq for many galaxies at many redshifts against
+        the single redshift computation.
+        """
+        zredstr, galaxies = self._get_galaxies()
+        zs = np.linspace(0.1, 0.5, 20)
+
+        for calc_lkhd in [False, True]:
+            grouped = zredstr.calculate_chisq_grouped(galaxies, zs, calc_lkhd=calc_lkhd)
+            testing.assert_array_equal(grouped.shape, [len(galaxies), zs.size])
+            for i, z in enumerate(zs):
+                testing.assert_array_almost_equal(grouped[:, i],
+                                                  zredstr.calculate_chisq(galaxies, z, calc_lkhd=calc_lkhd),
+                                                  decimal=8)
+
+            grouped_f4 = zredstr.calculate_chisq_grouped(galaxies, zs, calc_lkhd=calc_lkhd, dtype='f4')
+            self.assertEqual(grouped_f4.dtype, np.float32)
+            testing.assert_array_almost_equal(grouped_f4, grouped.astype(np.float32))
+
+        # Larger ncol (no unrolled path), a covariance matrix that needs
+        # fixing, and a covariance matrix that fails the sigint test.
+        np.random.seed(12345)
+        ngal = 50
+        nz = 5
+        ncol = 8
+        a = np.random.normal(size=(nz, ncol, ncol))*0.05
+        covmat = np.einsum('zij,zkj->zik', a, a) + 0.002*np.identity(ncol)
+        covmat[0, :, :] = 1e-4*np.identity(ncol)
+        covmat[0, 0, 1] = covmat[0, 1, 0] = 1.01e-4
+        covmat[1, 0, 0] = 1e-7
+        covmat = np.moveaxis(covmat, 0, 2)
+        c = np.random.normal(size=(nz, ncol))
+        slope = np.random.normal(scale=0.1, size=(nz, ncol))
+        pivotmag = np.random.uniform(low=18.0, high=20.0, size=nz)
+        refmag = np.random.uniform(low=17.0, high=21.0, size=ngal)
+        magerr = np.random.uniform(low=0.0, high=0.1, size=(ngal, ncol + 1))
+        color = np.random.normal(size=(ngal, ncol))
+
+        gind, zind = np.meshgrid(np.arange(ngal), np.arange(nz), indexing='ij')
+        gind = gind.ravel()
+        zind = zind.ravel()
+
+        for nophotoerr in [False, True]:
+            chisq, lkhd = redmapper.compute_chisq_grouped(covmat, c, slope, pivotmag, refmag, magerr, color,
+                                                          calc_chisq=True, calc_lkhd=True,
+                                                          nophotoerr=nophotoerr)
+            chisq2, lkhd2 = redmapper.compute_chisq(covmat[:, :, zind], c[zind, :], slope[zind, :],
+                                                    pivotmag[zind], refmag[gind], magerr[gind, :],
+                                                    color[gind, :], calc_chisq=True, calc_lkhd=True,
+                                                    nophotoerr=nophotoerr)
+            testing.assert_array_almost_equal(chisq.ravel(), chisq2)
+            testing.assert_array_almost_equal(lkhd.ravel(), lkhd2)
+            testing.assert_array_equal(chisq[:, 1], 1e11)
+
+        self.assertRaises(ValueError, redmapper.compute_chisq_grouped, covmat, c, slope, pivotmag,
+                          refmag, magerr, color, dtype='i4')
+
+    def test_chisq_grouped_benchmark(self):
+        """
+        Benchmark galaxy-redshift chisq evaluations per second, computed one
+        redshift at a time and grouped, and check that they agree.
+        """
+        zredstr, galaxies = self._get_galaxies()
+        galaxies = galaxies[np.tile(np.arange(len(galaxies)), 10)]
+        zs = np.linspace(0.1, 0.5, 50)
+        nevals = len(galaxies)*zs.size
+
+        def _single():
+            return np.array([zredstr.calculate_chisq(galaxies, z) for z in zs]).T
+
+        def _grouped():
+            return zredstr.calculate_chisq_grouped(galaxies, zs)
+
+        # The grouped kernel sums in a different order, so the agreement is
+        # to rounding rather than bitwise.
+        testing.assert_allclose(_grouped(), _single(), rtol=1e-12)
+
+        t_single = min(timeit.repeat(_single, number=1, repeat=3))
+        t_grouped = min(timeit.repeat(_grouped, number=1, repeat=3))
+
+        print("chisq evaluations per second: single redshift %.3g, grouped %.3g" %
+              (nevals/t_single, nevals/t_grouped))
+
+
 if __name__=='__main__':
     unittest.main()
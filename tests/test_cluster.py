@@ -88,6 +88,18 @@ class ClusterTestCase(unittest.TestCase):
         testing.assert_almost_equal(cluster.Lambda, 24.366407, 5)
         testing.assert_almost_equal(cluster.lambda_e, 2.5137918, 5)
 
+        # An explicit index of all the neighbors must give the same answer
+        pmem = cluster.neighbors.pmem.copy()
+        random.seed(seed=0)
+        richness_index = cluster.calc_richness(mask, index=np.arange(len(cluster.neighbors)))
+        testing.assert_almost_equal(richness_index, richness)
+        testing.assert_array_almost_equal(cluster.neighbors.pmem, pmem)
+
+        # And the neighbor radii are rescaled with the redshift
+        cluster.redshift = hdr['Z'] + 0.05
+        testing.assert_array_almost_equal(cluster.neighbors.r,
+                                          np.clip(cluster.mpc_scale*cluster.neighbors.dist, 1e-6, None))
+
         return
 
 
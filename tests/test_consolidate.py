@@ -7,16 +7,18 @@ import tempfile
 import shutil
 import fitsio
 import os
+import esutil
 
 from redmapper.pipeline import RedmapperConsolidateTask
-from redmapper import Configuration, ClusterCatalog
+from redmapper import Configuration, ClusterCatalog, Catalog
+from redmapper.consolidator import CatalogConsolidator
 
 class ConsolidateTestCase(unittest.TestCase):
     """
     Test the parallelized cluster catalog consolidation code in
     redmapper.pipeline.RedmapperConsolidateTask
     """
-    def runTest(self):
+    def test_redmapper_consolidate(self):
         """
         Test redmapper.pipeline.RedmapperConsolidateTask
         """
@@ -106,6 +108,62 @@ class ConsolidateTestCase(unittest.TestCase):
                     ctr += 1
         self.assertEqual(ctr, cat0.size)
 
+    def test_catalog_consolidator(self):
+        """
+        Test redmapper.consolidator.CatalogConsolidator
+        """
+        random.seed(seed=12345)
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+
+        # Make pixel catalogs with 2 members per cluster
+        filenames = []
+        for i in range(4):
+            cat = np.zeros(5, dtype=[('mem_match_id', 'i4'),
+                                     ('lnlike', 'f8')])
+            cat['mem_match_id'] = np.arange(cat.size) + 1
+            cat['lnlike'] = random.random(size=cat.size)
+            mem = np.zeros(cat.size*2, dtype=[('mem_match_id', 'i4'),
+                                              ('lnlike', 'f8')])
+            mem['mem_match_id'] = np.repeat(cat['mem_match_id'], 2)
+            mem['lnlike'] = np.repeat(cat['lnlike'], 2)
+
+            filenames.append(os.path.join(self.test_dir, 'cat_%d.fit' % (i)))
+            fitsio.write(filenames[-1], cat)
+            fitsio.write(filenames[-1].replace('.fit', '_members.fit'), mem)
+
+        def _read_pixel(filename):
+            return (Catalog.from_fits_file(filename),
+                    Catalog.from_fits_file(filename.replace('.fit', '_members.fit')))
+
+        catfile = os.path.join(self.test_dir, 'consolidated.fit')
+        memfile = os.path.join(self.test_dir, 'consolidated_members.fit')
+
+        consolidator = CatalogConsolidator(nproc=2)
+        read = []
+        for filename, (cat, mem) in consolidator.read(filenames, _read_pixel):
+            read.append(filename)
+            # Keep all but the first cluster
+            cat, mem = consolidator.select(cat, np.arange(1, cat.size), mem=mem, sort_value='lnlike')
+            consolidator.write(catfile, cat, memfile=memfile, mem=mem)
+        consolidator.renumber([catfile], memfiles=[memfile], sort_rows=True)
+
+        # Files are read in order
+        self.assertEqual(read, filenames)
+
+        cat = fitsio.read(catfile, ext=1)
+        mem = fitsio.read(memfile, ext=1)
+
+        self.assertEqual(cat.size, 16)
+        self.assertEqual(mem.size, 32)
+        testing.assert_array_equal(cat['mem_match_id'], np.arange(cat.size) + 1)
+        self.assertTrue(np.all(np.diff(cat['lnlike']) <= 0.0))
+
+        # And the members follow their clusters
+        a, b = esutil.numpy_util.match(cat['mem_match_id'], mem['mem_match_id'])
+        self.assertEqual(b.size, mem.size)
+        testing.assert_array_equal(cat['lnlike'][a], mem['lnlike'][b])
+
     def setUp(self):
         self.test_dir = None
 
@@ -144,6 +144,103 @@ class FitterTestCase(unittest.TestCase):
         testing.assert_almost_equal(slopepars3, [-0.01054824, -0.01296713, -0.01605626], 4)
         testing.assert_almost_equal(scatpars3, [0.03453208, 0.04054536, 0.03832689], 4)
 
+    def test_fitter_gradients(self):
+        """
+        Test the analytic gradients of redmapper.fitters.RedSequenceFitter
+        and redmapper.fitters.CorrectionFitter against finite differences.
+        """
+        file_path = 'data_for_tests'
+
+        def numerical_gradient(fitter, pars, step=1e-7):
+            grad = np.zeros(pars.size)
+            for i in range(pars.size):
+                dpars = np.zeros(pars.size)
+                dpars[i] = step
+                grad[i] = (fitter(pars + dpars) - fitter(pars - dpars)) / (2. * step)
+            return grad
+
+        fitdata = fitsio.read(file_path + '/test_rsfit.fit', ext=1)
+        nodes = make_nodes([0.1, 0.2], 0.05)
+        mag_err = np.zeros((fitdata.size, 2))
+        mag_err[:, 0] = fitdata['GALCOLOR_ERR']
+        mag_err[:, 1] = 0.02
+        dmags = fitdata['REFMAG'] - np.median(fitdata['REFMAG'])
+
+        np.random.seed(12345)
+        rsfitter = RedSequenceFitter(nodes, fitdata['Z'], fitdata['GALCOLOR'], mag_err,
+                                     dmags=dmags, trunc=np.full(fitdata.size, 0.1),
+                                     probs=np.random.uniform(low=0.2, high=1.0, size=fitdata.size),
+                                     bkgs=np.random.uniform(low=0.0, high=2.0, size=fitdata.size),
+                                     use_scatter_prior=True, dmags_err_ratio=dmags)
+
+        p0_mean = np.array([0.95, 1.09, 1.26])
+        p0_slope = np.array([-0.01, -0.015, -0.02])
+        p0_scatter = np.array([0.03, 0.035, 0.04])
+        rsfitter.fit(p0_mean, p0_slope, p0_scatter, fit_mean=True, fit_slope=True, fit_scatter=True,
+                     err_ratio_pars=[1.2, 0.1])
+        pars = np.concatenate([p0_mean, p0_slope, p0_scatter, [1.2, 0.1]])
+        t, grad = rsfitter.value_and_gradient(pars)
+        testing.assert_almost_equal(t, rsfitter(pars))
+        testing.assert_allclose(grad, numerical_gradient(rsfitter, pars), rtol=1e-5, atol=1e-3)
+
+        # Fitting the scatter does not change the input errors
+        rsfitter.fit(p0_mean, p0_slope, p0_scatter, fit_scatter=True)
+        testing.assert_allclose(rsfitter.value_and_gradient(p0_scatter)[1],
+                                numerical_gradient(rsfitter, p0_scatter), rtol=1e-5, atol=1e-3)
+
+
+        fitdata = fitsio.read(file_path + '/test_zredcorr_values.fit', ext=1)
+        corrfitter = CorrectionFitter(fitdata['NODES'][0],
+                                      fitdata['Z'][0],
+                                      fitdata['DZ'][0],
+                                      fitdata['DZ_ERR'][0],
+                                      slope_nodes=fitdata['SNODES'][0],
+                                      probs=fitdata['PI'][0],
+                                      dmags=fitdata['DMAG'][0],
+                                      ws=fitdata['W'][0])
+
+        p0_mean = np.array([0.005, 0.002, 0.001])
+        p0_slope = np.array([0.01, -0.01])
+        p0_r = np.array([0.8, 0.35])
+        p0_bkg = np.array([0.001, 0.0004])
+        corrfitter.fit(p0_mean, p0_slope, p0_r, p0_bkg, fit_mean=True, fit_slope=True, fit_r=True, fit_bkg=True)
+        pars = np.concatenate([p0_mean, p0_slope, p0_r, p0_bkg])
+        t, grad = corrfitter.value_and_gradient(pars)
+        testing.assert_almost_equal(t, corrfitter(pars))
+        testing.assert_allclose(grad, numerical_gradient(corrfitter, pars), rtol=1e-5, atol=1e-3)
+
+    def test_red_sequence_fitter_errors(self):
+        """
+        Test that redmapper.fitters.RedSequenceFitter does not accumulate
+        the extra error term into its stored magnitude errors.
+        """
+        file_path = 'data_for_tests'
+
+        fitdata = fitsio.read(file_path + '/test_rsfit.fit', ext=1)
+        nodes = make_nodes([0.1, 0.2], 0.05)
+        mag_err = np.zeros((fitdata.size, 2))
+        mag_err[:, 0] = fitdata['GALCOLOR_ERR']
+        mag_err[:, 1] = 0.02
+
+        rsfitter = RedSequenceFitter(nodes, fitdata['Z'], fitdata['GALCOLOR'], mag_err)
+        mag_err2s = rsfitter._mag_err2s.copy()
+
+        p0_mean = np.array([0.95, 1.09, 1.26])
+        p0_slope = np.zeros(nodes.size)
+        p0_scatter = np.array([0.03, 0.035, 0.04])
+
+        # Fitting the mean precomputes the total error once
+        rsfitter.fit(p0_mean, p0_slope, p0_scatter, fit_mean=True)
+        testing.assert_array_equal(rsfitter._mag_err2s, mag_err2s)
+
+        # Fitting the scatter computes the total error on every call
+        rsfitter.fit(p0_mean, p0_slope, p0_scatter, fit_scatter=True)
+        testing.assert_array_equal(rsfitter._mag_err2s, mag_err2s)
+        t = rsfitter(p0_scatter)
+        for i in range(3):
+            self.assertEqual(rsfitter(p0_scatter), t)
+        testing.assert_array_equal(rsfitter._mag_err2s, mag_err2s)
+
     def test_zred_correction_fitter(self):
         """
         Run tests of redmapper.fitters.CorrectionFitter
@@ -172,23 +269,23 @@ class FitterTestCase(unittest.TestCase):
         p0_bkg = np.zeros(fitdata['SNODES'][0].size) + 0.01
         pars_mean, = corrfitter.fit(p0_mean, p0_slope, p0_r, p0_bkg, fit_mean=True)
 
-        testing.assert_almost_equal(pars_mean, np.array([0.00483505, 0.00159392, -0.00018447]), 5)
+        testing.assert_almost_equal(pars_mean, np.array([0.0048383, 0.00159805, -0.00019054]), 5)
 
         p0_mean = pars_mean
         pars_r, = corrfitter.fit(p0_mean, p0_slope, p0_r, p0_bkg, fit_r=True)
 
-        testing.assert_almost_equal(pars_r, np.array([0.79166451, 0.35962414]), 5)
+        testing.assert_almost_equal(pars_r, np.array([0.79169708, 0.3595552]), 5)
 
         p0_r = pars_r
         pars_bkg, = corrfitter.fit(p0_mean, p0_slope, p0_r, p0_bkg, fit_bkg=True)
 
-        testing.assert_almost_equal(pars_bkg, np.array([0., 0.00043553]), 5)
+        testing.assert_almost_equal(pars_bkg, np.array([0., 0.00043053]), 5)
         p0_bkg = pars_bkg
         pars_mean, pars_r, pars_bkg = corrfitter.fit(p0_mean, p0_slope, p0_r, p0_bkg, fit_mean=True, fit_r=True, fit_bkg=True)
 
-        testing.assert_almost_equal(pars_mean, np.array([0.00518834, 0.00178504, 0.00117311]), 5)
-        testing.assert_almost_equal(pars_r, np.array([0.81519327, 0.33098604]), 5)
-        testing.assert_almost_equal(pars_bkg, np.array([0., 0.00043576]), 5)
+        testing.assert_almost_equal(pars_mean, np.array([0.00519579, 0.00178836, 0.00117834]), 5)
+        testing.assert_almost_equal(pars_r, np.array([0.81502408, 0.33094599]), 5)
+        testing.assert_almost_equal(pars_bkg, np.array([0., 0.00044067]), 5)
 
     def test_error_bin_fitter(self):
         """Test the error ratio fitter."""
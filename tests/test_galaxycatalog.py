@@ -8,6 +8,7 @@ import tempfile
 import shutil
 import os
 import esutil
+import redmapper
 
 from redmapper import Configuration
 from redmapper import GalaxyCatalog
@@ -68,6 +69,13 @@ class GalaxyCatalogTestCase(unittest.TestCase):
         # this isn't really a big enough sample catalog to fully test...
         testing.assert_equal(gals_sub.size, 2511)
 
+        # and cutting the same subregion from the full catalog gives the
+        # same galaxies in the same order
+        gals_cut = gals_all.cut_to_pixel(128, [9218], border=0.1)
+        testing.assert_array_equal(gals_cut._ndarray, gals_sub._ndarray)
+        gals_cut = gals_all.cut_to_pixel(64, [2163, 2296])
+        testing.assert_equal(gals_cut.size, a.size)
+
         # and test the matching...
 
         indices, dists = gals_all.match_one(140.5, 65.0, 0.2)
@@ -84,6 +92,15 @@ class GalaxyCatalogTestCase(unittest.TestCase):
         testing.assert_equal(test.size, 666 - 521)
         testing.assert_array_less(dists[test], 0.1)
 
+        # and the grouped matching should be the same as match_one
+        offsets, indices, dists = gals_all.match_many_grouped([140.5, 141.2],
+                                                              [65.0, 65.2], [0.2, 0.1])
+        testing.assert_array_equal(offsets, [0, 521, 666])
+        for i, (ra, dec, rad) in enumerate(zip([140.5, 141.2], [65.0, 65.2], [0.2, 0.1])):
+            indices1, dists1 = gals_all.match_one(ra, dec, rad)
+            testing.assert_array_equal(indices[offsets[i]: offsets[i + 1]], indices1)
+            testing.assert_array_equal(dists[offsets[i]: offsets[i + 1]], dists1)
+
         # read in a subregion, with border, with tempfile
         gals_sub2 = GalaxyCatalog.from_galfile(os.path.join(file_path, galfile),
                                                hpix=9218, nside=128, border=0.1, use_tempfile=True)
@@ -313,6 +330,88 @@ class GalaxyCatalogTestCase(unittest.TestCase):
         self.assertEqual(tab2.has_truth, 0)
         self.assertEqual(tab2.has_zspec, 1)
 
+    def test_galaxycatalog_columnar(self):
+        """
+        Test converting to and reading from a columnar galaxy store.
+        """
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+
+        file_path = 'data_for_tests'
+        galfile = os.path.join(file_path, 'pixelized_dr8_test', 'dr8_test_galaxies_master_table.fit')
+        zredfile = os.path.join(file_path, 'zreds_test', 'dr8_test_zreds_master_table.fit')
+
+        storefile = redmapper.galaxy.convert_galfile_to_columnar(galfile,
+                                                                 os.path.join(self.test_dir, 'dr8_test_columnar'),
+                                                                 zredfile=zredfile)
+
+        # The store table can be used for the config galfile stats
+        tab = Entry.from_fits_file(galfile)
+        tab2 = Entry.from_fits_file(storefile)
+        testing.assert_array_equal(tab2.hpix, tab.hpix)
+        testing.assert_array_equal(tab2.ngals, tab.ngals)
+        testing.assert_equal(tab2.nmag, tab.nmag)
+
+        def _compare(gals, gals2):
+            testing.assert_equal(gals2.size, gals.size)
+            self.assertEqual(gals2.dtype.names, gals.dtype.names)
+            a, b = esutil.numpy_util.match(gals.id, gals2.id)
+            testing.assert_equal(a.size, gals.size)
+            for name in gals.dtype.names:
+                testing.assert_array_equal(gals2._ndarray[name][b], gals._ndarray[name][a])
+
+        # Full catalog, no cuts
+        _compare(GalaxyCatalog.from_galfile(galfile),
+                 GalaxyCatalog.from_galfile(storefile))
+
+        # Subregion with border, zreds, and cuts
+        kwargs = dict(hpix=9218, nside=128, border=0.1,
+                      refmag_range=[16.0, 19.5], chisq_max=20.0)
+        gals = GalaxyCatalog.from_galfile(galfile, zredfile=zredfile, **kwargs)
+        self.assertGreater(gals.size, 0)
+        testing.assert_array_less(gals.chisq, 20.0)
+        testing.assert_array_less(16.0, gals.refmag)
+        testing.assert_array_less(gals.refmag, 19.5)
+        _compare(gals, GalaxyCatalog.from_galfile(storefile, zredfile=storefile, **kwargs))
+        _compare(gals, GalaxyCatalog.from_galfile(galfile, zredfile=zredfile,
+                                                  use_tempfile=True, **kwargs))
+
+        # And with a subset of columns
+        gals = GalaxyCatalog.from_galfile(galfile, zredfile=zredfile,
+                                          columns=['id', 'mag', 'zred'], **kwargs)
+        self.assertEqual(sorted(gals.dtype.names),
+                         sorted(['id', 'ra', 'dec', 'refmag', 'mag', 'zred', 'chisq']))
+        _compare(gals, GalaxyCatalog.from_galfile(storefile, zredfile=storefile,
+                                                  columns=['id', 'mag', 'zred'], **kwargs))
+
+        # The store is sorted by refmag, so the original zreds do not line up
+        self.assertRaises(ValueError, GalaxyCatalog.from_galfile, storefile,
+                          zredfile=zredfile, **kwargs)
+
+        # But zreds in the order of a store without zreds may be used
+        storefile2 = redmapper.galaxy.convert_galfile_to_columnar(galfile,
+                                                                  os.path.join(self.test_dir, 'dr8_test_nozred'))
+        store = Entry.from_fits_file(storefile2)
+        ztab = Entry.from_fits_file(zredfile)
+        for i in range(store.hpix.size):
+            pixgals = GalaxyCatalog.from_galfile(galfile, zredfile=zredfile,
+                                                 nside=store.nside, hpix=[store.hpix[i]])
+            ids = np.load(os.path.join(self.test_dir, store.filenames[i], 'id.npy'))
+            a, b = esutil.numpy_util.match(pixgals.id, ids)
+            zreds = np.zeros(ids.size, dtype=fitsio.read(os.path.join(os.path.dirname(zredfile),
+                                                                      ztab.filenames[0]),
+                                                         ext=1, rows=0).dtype)
+            for name in zreds.dtype.names:
+                zreds[name][b] = pixgals._ndarray[name.lower()][a]
+            fitsio.write(os.path.join(self.test_dir, 'zreds_%07d.fit' % (store.hpix[i])), zreds)
+            store.filenames[i] = 'zreds_%07d.fit' % (store.hpix[i])
+        hdr = fitsio.FITSHDR()
+        hdr['PIXELS'] = 1
+        hdr['STOREORD'] = 1
+        zredfile2 = os.path.join(self.test_dir, 'dr8_test_nozred_zreds_master_table.fit')
+        store.to_fits_file(zredfile2, header=hdr)
+        _compare(gals, GalaxyCatalog.from_galfile(storefile2, zredfile=zredfile2,
+                                                  columns=['id', 'mag', 'zred'], **kwargs))
+
     def setUp(self):
         self.test_dir = None
 
@@ -68,6 +68,22 @@ class MaskTestCase(unittest.TestCase):
         comp = np.array([False, True, True, True, False])
         testing.assert_equal(mask2.compute_radmask(RAs, Decs), comp)
 
+        # The maskgals are shared read-only; only the scratch fields are copied
+        maskgals_all = fitsio.read(config.maskgalfile, ext=1, lower=True)
+        self.assertFalse(mask.maskgals_all.r.flags['WRITEABLE'])
+        testing.assert_array_equal(mask.maskgals_all.r, maskgals_all['r'])
+        mask.select_maskgals_sample(maskgal_index=1)
+        sample = maskgals_all[config.maskgal_ngals: 2*config.maskgal_ngals]
+        testing.assert_array_equal(mask.maskgals.x, sample['x'])
+        self.assertFalse(mask.maskgals.x.flags['WRITEABLE'])
+        self.assertTrue(mask.maskgals.refmag.flags['WRITEABLE'])
+
+        # And a thread copy gets its own scratch fields
+        mask_copy = mask.thread_copy()
+        mask_copy.select_maskgals_sample(maskgal_index=1)
+        mask_copy.maskgals.refmag[:] = -1.0
+        testing.assert_array_equal(mask.maskgals.refmag, sample['refmag'])
+
     def test_maskgals(self):
         """
         Test generation of maskgals file.
@@ -0,0 +1,85 @@
+import unittest
+import numpy.testing as testing
+import numpy as np
+import tempfile
+import shutil
+import os
+import hpgeom as hpg
+
+from redmapper import Configuration
+from redmapper import PixelCostModel
+
+class PixelCostModelTestCase(unittest.TestCase):
+    """
+    Tests of redmapper.PixelCostModel, which estimates the cost of running
+    redmapper on pixels.
+    """
+    def test_pixel_cost_model(self):
+        """
+        Test redmapper.PixelCostModel estimates and refitting.
+        """
+        file_path = 'data_for_tests'
+        configfile = 'testconfig.yaml'
+
+        config = Configuration(os.path.join(file_path, configfile))
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+        runtimefile = os.path.join(self.test_dir, 'runtimes.fit')
+
+        # The galaxy table is nside 128; coarser pixels sum the galaxies
+        model = PixelCostModel(config.galfile, 64, seedfile=os.path.join(file_path, 'test_dr8_specseeds.fit'),
+                               runtimefile=runtimefile)
+        pixels = np.array([2163, 2296, 2297, 2434, 0])
+        ngal, nseed = model.features(pixels)
+        testing.assert_almost_equal(ngal.sum(), model.galtab.ngals.sum())
+        testing.assert_equal(ngal[-1], 0.0)
+        testing.assert_equal(nseed[-1], 0.0)
+        self.assertGreater(nseed.sum(), 0.0)
+
+        ordered = model.order(pixels)
+        cost = model.estimate(ordered)
+        self.assertTrue(np.all(np.diff(cost) <= 0.0))
+        self.assertEqual(ordered[-1], 0)
+
+        # Finer pixels get a fraction of their parent
+        model_fine = PixelCostModel(config.galfile, 256)
+        parent_nest = hpg.ring_to_nest(128, model.galtab.hpix[0])
+        children = hpg.nest_to_ring(256, np.arange(4) + 4*parent_nest)
+        ngal_fine, _ = model_fine.features(children)
+        testing.assert_array_almost_equal(ngal_fine, model.galtab.ngals[0]/4.)
+
+        # The border increases the cost
+        model_border = PixelCostModel(config.galfile, 64, border=0.5)
+        ngal_border, _ = model_border.features(pixels)
+        self.assertTrue(np.all(ngal_border[:-1] > ngal[:-1]))
+
+        # Recorded runtimes refine the model
+        runtimes = 2.0 + 0.01*ngal + 0.5*nseed
+        model.record(pixels, runtimes)
+        self.assertTrue(os.path.isfile(runtimefile))
+        testing.assert_array_almost_equal(model.estimate(pixels), runtimes, 4)
+
+        # And the model is refit when read back
+        model2 = PixelCostModel(config.galfile, 64, runtimefile=runtimefile)
+        testing.assert_array_almost_equal(model2.coeffs, model.coeffs)
+
+        # Runtimes are only used for the same run mode
+        model_staged = PixelCostModel(config.galfile, 64, runtimefile=runtimefile, mode='staged')
+        testing.assert_array_equal(model_staged.coeffs, PixelCostModel.default_coeffs)
+        model_staged.record(pixels, 2.0*runtimes)
+        model3 = PixelCostModel(config.galfile, 64, runtimefile=runtimefile)
+        testing.assert_array_almost_equal(model3.coeffs, model.coeffs)
+
+        # And no temporary files are left behind
+        self.assertEqual(os.listdir(self.test_dir), ['runtimes.fit'])
+
+    def setUp(self):
+        self.test_dir = None
+
+    def tearDown(self):
+        if self.test_dir is not None:
+            if os.path.exists(self.test_dir):
+                shutil.rmtree(self.test_dir, True)
+
+if __name__=='__main__':
+    unittest.main()
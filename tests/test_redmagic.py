@@ -201,6 +201,14 @@ class RedmagicCalTestCase(unittest.TestCase):
         rerun_redmagic = RunRedmagicTask(rerun_configfile)
         rerun_redmagic.run(clobber=True)
 
+        # And the parallel selection with the same seed writes the same catalog
+        rerun_redmagic = RunRedmagicTask(rerun_configfile)
+        rerun_redmagic.run(clobber=True, do_plots=False, n_randoms=0, rng=random.RandomState(12345), nproc=2)
+
+        red_cat2 = GalaxyCatalog.from_fits_file(rmcatfile)
+        for name in red_cat.dtype.names:
+            testing.assert_array_equal(red_cat2._ndarray[name], red_cat._ndarray[name])
+
     def setUp(self):
         self.test_dir = None
 
@@ -14,7 +14,9 @@ from redmapper import Configuration
 from redmapper import GalaxyCatalog
 from redmapper import RedSequenceColorPar
 from redmapper import RedmapperRun
+from redmapper.redmapper_run import SharedGalaxies
 from redmapper import Catalog
+from redmapper import PixelCostModel
 
 class RedmapperRunTestCase(unittest.TestCase):
     """
@@ -67,13 +69,137 @@ class RedmapperRunTestCase(unittest.TestCase):
         # Spot checks to look for regressions
         testing.assert_equal(cat.size, 23)
         self.assertGreater(cat.Lambda.min(), 3.0)
-        testing.assert_array_almost_equal(cat.Lambda[0: 3], np.array([24.351152, 17.944063, 7.7384853]))
+        testing.assert_array_almost_equal(cat.Lambda[0: 3], np.array([24.076563, 17.944063, 7.7384853]))
 
         # And check that the members are all accounted for...
         mem = Catalog.from_fits_file(os.path.join(config.outpath, '%s_final_members.fit' % (config.d.outbase)))
         a, b = esutil.numpy_util.match(cat.mem_match_id, mem.mem_match_id)
         testing.assert_equal(a.size, mem.size)
 
+    def test_redmapper_run_staged(self):
+        """
+        Run test of redmapper.RedmapperRun with the in-memory staged pipeline,
+        and with galaxies shared between the pixels.
+        """
+        file_path = 'data_for_tests'
+        configfile = 'testconfig.yaml'
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+
+        cats = []
+        for staged, shared in [(False, False), (True, False), (True, True)]:
+            random.seed(seed=12345)
+
+            config = Configuration(os.path.join(file_path, configfile))
+            config.outpath = os.path.join(self.test_dir, 'staged%d_shared%d' % (staged, shared))
+            os.makedirs(config.outpath)
+            config.calib_run_nproc = 1
+            config.calib_run_staged = staged
+            config.calib_run_staged_checkpoint = False
+            config.calib_run_shared_galaxies = shared
+            config.seedfile = os.path.join(file_path, 'test_dr8_specseeds.fit')
+            config.zredfile = os.path.join(file_path, 'zreds_test', 'dr8_test_zreds_master_table.fit')
+
+            redmapper_run = RedmapperRun(config)
+            redmapper_run.run(specmode=True, keepz=True, seedfile=config.seedfile)
+
+            cats.append(Catalog.from_fits_file(os.path.join(config.outpath, '%s_final.fit' % (config.d.outbase))))
+
+        # The firstpass checkpoint file should not have been written
+        self.assertEqual(len([f for f in os.listdir(config.outpath) if 'firstpass' in f]), 0)
+
+        for cat in cats[1:]:
+            testing.assert_equal(cat.size, cats[0].size)
+            for name in ['mem_match_id', 'ra', 'dec', 'z_lambda', 'Lambda', 'lambda_e']:
+                testing.assert_array_almost_equal(getattr(cat, name), getattr(cats[0], name))
+
+    def test_redmapper_run_order(self):
+        """
+        Test that redmapper.RedmapperRun gives the same catalog when the
+        recorded runtimes change the order in which the pixels are run.
+        """
+        file_path = 'data_for_tests'
+        configfile = 'testconfig.yaml'
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+        runtimefile = os.path.join(self.test_dir, 'runtimes.fit')
+
+        cats = []
+        orders = []
+        for i in range(2):
+            random.seed(seed=12345)
+
+            config = Configuration(os.path.join(file_path, configfile))
+            config.outpath = os.path.join(self.test_dir, 'run%d' % (i))
+            os.makedirs(config.outpath)
+            config.calib_run_nproc = 2
+            config.calib_run_runtimefile = runtimefile
+            config.seedfile = os.path.join(file_path, 'test_dr8_specseeds.fit')
+            config.zredfile = os.path.join(file_path, 'zreds_test', 'dr8_test_zreds_master_table.fit')
+
+            redmapper_run = RedmapperRun(config)
+            nside, pixels = redmapper_run._get_pixel_splits()
+
+            if i == 1:
+                # Record runtimes that reverse the estimated costs
+                os.remove(runtimefile)
+                model = PixelCostModel(config.galfile, nside, seedfile=config.seedfile,
+                                       runtimefile=runtimefile)
+                cost = model.estimate(pixels)
+                model.record(pixels, cost.max() + cost.min() - cost)
+
+            orders.append(PixelCostModel(config.galfile, nside, seedfile=config.seedfile,
+                                         runtimefile=runtimefile).order(pixels))
+
+            redmapper_run.run(specmode=True, keepz=True, seedfile=config.seedfile)
+
+            cats.append(Catalog.from_fits_file(os.path.join(config.outpath, '%s_final.fit' % (config.d.outbase))))
+
+        self.assertFalse(np.array_equal(orders[0], orders[1]))
+
+        testing.assert_equal(cats[1].size, cats[0].size)
+        for name in cats[0].dtype.names:
+            testing.assert_array_equal(cats[1]._ndarray[name], cats[0]._ndarray[name])
+
+    def test_shared_galaxies(self):
+        """
+        Test redmapper.redmapper_run.SharedGalaxies, which keeps the galaxies
+        shared between runs until the files change.
+        """
+        file_path = 'data_for_tests'
+        configfile = 'testconfig.yaml'
+
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+
+        # Use a copy of the zreds so that the file can be touched
+        zredpath = os.path.join(self.test_dir, 'zreds_test')
+        shutil.copytree(os.path.join(file_path, 'zreds_test'), zredpath)
+
+        config = Configuration(os.path.join(file_path, configfile))
+        config.zredfile = os.path.join(zredpath, 'dr8_test_zreds_master_table.fit')
+
+        shared_galaxies = SharedGalaxies()
+        zredfile, gals = shared_galaxies.get(config)
+        self.assertEqual(zredfile, config.zredfile)
+        self.assertGreater(gals.size, 0)
+
+        # The same files and region reuse the galaxies
+        self.assertIs(shared_galaxies.get(config)[1], gals)
+
+        # A modified file is read again
+        mtime = os.stat(config.zredfile).st_mtime
+        os.utime(config.zredfile, (mtime + 10.0, mtime + 10.0))
+        gals2 = shared_galaxies.get(config)[1]
+        self.assertIsNot(gals2, gals)
+        testing.assert_array_equal(gals2.zred, gals.zred)
+
+        # And a different region is read again
+        config.border += 0.1
+        self.assertIsNot(shared_galaxies.get(config)[1], gals2)
+
+        shared_galaxies.clear()
+        self.assertIsNone(shared_galaxies._shared_gals)
+
     def setUp(self):
         self.test_dir = None
 
@@ -2,6 +2,10 @@ import unittest
 import numpy.testing as testing
 import numpy as np
 import fitsio
+import tempfile
+import shutil
+import os
+import time
 
 import redmapper
 
@@ -10,7 +14,7 @@ class RedSequenceColorTestCase(unittest.TestCase):
     Tests of redmapper.RedSequenceColorPar, including reading and interpolation.
     """
 
-    def runTest(self):
+    def test_redsequence(self):
         """
         Run tests of redmapper.RedSequenceColorPar.
         """
@@ -125,6 +129,52 @@ class RedSequenceColorTestCase(unittest.TestCase):
         testing.assert_almost_equal(zredstr.c[extrap_indices, 2], np.array([0.38392715, 1.0715787]))
         testing.assert_almost_equal(zredstr.c[extrap_indices, 3], np.array([0.30677113, 0.49210047]))
 
+    def test_redsequence_cache(self):
+        """
+        Test caching of the interpolated redmapper.RedSequenceColorPar.
+        """
+        self.test_dir = tempfile.mkdtemp(dir='./', prefix='TestRedmapper-')
+
+        parfile = os.path.join('data_for_tests', 'test_dr8_pars.fit')
+
+        t = time.time()
+        zredstr = redmapper.RedSequenceColorPar(parfile, fine=True)
+        t_build = time.time() - t
+
+        # The first call builds and writes the cache, the second reads it
+        zredstr_write = redmapper.RedSequenceColorPar(parfile, fine=True, cachedir=self.test_dir)
+        t = time.time()
+        zredstr_read = redmapper.RedSequenceColorPar(parfile, fine=True, cachedir=self.test_dir)
+        t_read = time.time() - t
+
+        print("Build %.4f s, read from cache %.4f s" % (t_build, t_read))
+
+        for zs in [zredstr_write, zredstr_read]:
+            self.assertEqual(sorted(zs.__dict__.keys()), sorted(zredstr.__dict__.keys()))
+            for name, value in zredstr.__dict__.items():
+                if isinstance(value, np.ndarray):
+                    testing.assert_array_equal(getattr(zs, name), value)
+                    self.assertEqual(getattr(zs, name).dtype, value.dtype)
+                else:
+                    self.assertEqual(getattr(zs, name), value)
+                    self.assertEqual(type(getattr(zs, name)), type(value))
+
+        # The cached arrays are memory-mapped
+        self.assertIsInstance(zredstr_read.lupcorr, np.memmap)
+
+        # And different options use different cache entries
+        zredstr_coarse = redmapper.RedSequenceColorPar(parfile, cachedir=self.test_dir)
+        testing.assert_equal(zredstr_coarse.z.size, 132 + 1)
+        testing.assert_equal(len(os.listdir(self.test_dir)), 2)
+
+    def setUp(self):
+        self.test_dir = None
+
+    def tearDown(self):
+        if self.test_dir is not None:
+            if os.path.exists(self.test_dir):
+                shutil.rmtree(self.test_dir, True)
+
 
 if __name__=='__main__':
     unittest.main()
@@ -54,5 +54,29 @@ class RuncatTestCase(unittest.TestCase):
         testing.assert_almost_equal(runcat.cat.z_lambda_e, [0.0063079,  0.0135317, -1.], 5)
         testing.assert_almost_equal(runcat.cat.bkg_local, [1.18146, 1.73055, 0.], 5)
 
+        serial = runcat.cat
+
+        # With a seed for each cluster the results should not depend on the
+        # number of threads.  The seeded run uses different random numbers
+        # than the serial run, so it agrees with the serial version only
+        # within the errors.
+        cats = []
+        for nthreads in [1, 2, 3]:
+            random.seed(seed=12345)
+            config.cluster_nthreads = nthreads
+            config.cluster_seeded = True
+            runcat = RunCatalog(config)
+            runcat.run(do_percolation_masking=True)
+            cats.append(runcat.cat)
+
+        for name in ['mem_match_id', 'Lambda', 'lambda_e', 'z_lambda', 'z_lambda_e', 'bkg_local']:
+            testing.assert_array_equal(getattr(cats[1], name), getattr(cats[0], name))
+            testing.assert_array_equal(getattr(cats[2], name), getattr(cats[0], name))
+
+        ok, = np.where(serial.Lambda > 0.0)
+        testing.assert_array_equal(cats[0].Lambda[serial.Lambda <= 0.0], -1.0)
+        testing.assert_array_less(np.abs(cats[0].Lambda[ok] - serial.Lambda[ok]), serial.lambda_e[ok])
+        testing.assert_array_less(np.abs(cats[0].z_lambda[ok] - serial.z_lambda[ok]), serial.z_lambda_e[ok])
+
 if __name__=='__main__':
     unittest.main()
@@ -50,8 +50,8 @@ class SelectSpecRedTestCase(unittest.TestCase):
         redgals = fitsio.read(config.redgalfile, ext=1)
         redgalmodel = fitsio.read(config.redgalmodelfile, ext=1)
 
-        self.assertGreaterEqual(redgals.size, 1197)
-        self.assertLessEqual(redgals.size, 1198)
+        self.assertGreaterEqual(redgals.size, 1199)
+        self.assertLessEqual(redgals.size, 1200)
 
         testing.assert_almost_equal(redgalmodel['meancol'][0][:, 1],
                                     np.array([0.78079545, 1.0870565,  1.4724078]), 3)
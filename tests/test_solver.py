@@ -2,6 +2,7 @@ import unittest
 import numpy.testing as testing
 import numpy as np
 import fitsio
+import time
 
 import redmapper
 
@@ -9,7 +10,7 @@ class SolverNFWTestCase(unittest.TestCase):
     """
     Tests for redmapper zero-finding solver.
     """
-    def runTest(self):
+    def test_solver_nfw(self):
         """
         Run tests on redmapper.Solver
         """
@@ -45,6 +46,104 @@ class SolverNFWTestCase(unittest.TestCase):
         testing.assert_almost_equal(rlambda,data[0]['R0']*(data[0]['LAMBDA']/100.)**data[0]['BETA'])
         testing.assert_almost_equal(theta_r,data[0]['THETA_R'],6)
 
+        # and test the stacked solver against single solves, including
+        # an empty problem
+        ngal = data[0]['UCOUNTS'].size
+        offsets = np.array([0, ngal, ngal, 2*ngal])
+        stack = lambda x: np.concatenate([x, x[::-1]])
+        cpars = np.vstack([data[0]['CPARS'], data[0]['CPARS'], np.zeros(4)])
+
+        lams,ps,wts,rlams,theta_rs=redmapper.solver_nfw.solve_nfw_many(data[0]['R0'],data[0]['BETA'],offsets,stack(data[0]['UCOUNTS']),stack(data[0]['BCOUNTS']),stack(data[0]['R']),stack(data[0]['W']),cpars,rsig=data[0]['RSIG'])
+
+        testing.assert_equal(lams.size, 3)
+        testing.assert_almost_equal(lams[0],lam)
+        testing.assert_array_almost_equal(ps[0: ngal],p)
+        testing.assert_array_almost_equal(wts[0: ngal],wt)
+        testing.assert_almost_equal(rlams[0],rlambda)
+        testing.assert_array_almost_equal(theta_rs[0: ngal],theta_r)
+        testing.assert_equal(lams[1], -1.0)
+
+        solver=redmapper.Solver(data[0]['R0'],data[0]['BETA'],data[0]['UCOUNTS'][::-1],data[0]['BCOUNTS'][::-1],data[0]['R'][::-1],data[0]['W'][::-1],cpars=np.zeros(4),rsig=data[0]['RSIG'])
+        lam2,p2,wt2,rlambda2,theta_r2=solver.solve_nfw()
+        testing.assert_almost_equal(lams[2],lam2)
+        testing.assert_array_almost_equal(wts[ngal: ],wt2)
+
+        testing.assert_raises(ValueError,redmapper.solver_nfw.solve_nfw_many,data[0]['R0'],data[0]['BETA'],offsets,stack(data[0]['UCOUNTS']),stack(data[0]['BCOUNTS']),stack(data[0]['R']),stack(data[0]['W']),cpars[0: 2, :],rsig=data[0]['RSIG'])
+
+    def test_solver_many_benchmark(self):
+        """
+        Benchmark the stacked solvers against per-call redmapper.Solver
+        """
+        file_name = 'test_solver_data.fit'
+        file_path = 'data_for_tests'
+
+        data=fitsio.read('%s/%s' % (file_path,file_name),ext=1)
+        data[0]['CPARS'] = data[0]['CPARS'][::-1]
+
+        ngal = data[0]['UCOUNTS'].size
+        nprob = 200
+
+        # Make a set of problems with different numbers of galaxies
+        np.random.seed(12345)
+        ngals = np.random.randint(ngal // 2, ngal + 1, size=nprob)
+        offsets = np.zeros(nprob + 1, dtype=np.int64)
+        offsets[1: ] = np.cumsum(ngals)
+        cpars = np.tile(data[0]['CPARS'], (nprob, 1))
+
+        ucounts = np.concatenate([data[0]['UCOUNTS'][0: n] for n in ngals])
+        bcounts = np.concatenate([data[0]['BCOUNTS'][0: n] for n in ngals])
+        r = np.concatenate([data[0]['R'][0: n] for n in ngals])
+        w = np.concatenate([data[0]['W'][0: n] for n in ngals])
+
+        t = time.time()
+        lams_single = np.zeros(nprob)
+        wts_single = np.zeros(ucounts.size)
+        for i in range(nprob):
+            s = slice(offsets[i], offsets[i + 1])
+            solver = redmapper.Solver(data[0]['R0'], data[0]['BETA'], ucounts[s], bcounts[s],
+                                      r[s], w[s], cpars=cpars[i, :], rsig=data[0]['RSIG'])
+            lam, p, wt, rlambda, theta_r = solver.solve_nfw()
+            lams_single[i] = lam
+            wts_single[s] = wt
+        t_single = time.time() - t
+
+        t = time.time()
+        lams, ps, wts, rlams, theta_rs = redmapper.solver_nfw.solve_nfw_many(data[0]['R0'], data[0]['BETA'],
+                                                                             offsets, ucounts, bcounts, r, w,
+                                                                             cpars, rsig=data[0]['RSIG'])
+        t_many = time.time() - t
+
+        testing.assert_array_equal(lams, lams_single)
+        testing.assert_array_equal(wts, wts_single)
+
+        # And the padded version
+        ucounts_pad = np.zeros((nprob, ngal))
+        bcounts_pad = np.zeros((nprob, ngal))
+        r_pad = np.zeros((nprob, ngal))
+        w_pad = np.zeros((nprob, ngal))
+        for i in range(nprob):
+            ucounts_pad[i, 0: ngals[i]] = data[0]['UCOUNTS'][0: ngals[i]]
+            bcounts_pad[i, 0: ngals[i]] = data[0]['BCOUNTS'][0: ngals[i]]
+            r_pad[i, 0: ngals[i]] = data[0]['R'][0: ngals[i]]
+            w_pad[i, 0: ngals[i]] = data[0]['W'][0: ngals[i]]
+
+        t = time.time()
+        lams_pad, ps_pad, wts_pad, rlams_pad, theta_rs_pad = redmapper.solver_nfw.solve_nfw_padded(data[0]['R0'], data[0]['BETA'],
+                                                                                                   ucounts_pad, bcounts_pad, r_pad, w_pad,
+                                                                                                   cpars, ngals=ngals, rsig=data[0]['RSIG'])
+        t_padded = time.time() - t
+
+        testing.assert_array_equal(lams_pad, lams_single)
+        for i in range(nprob):
+            testing.assert_array_equal(wts_pad[i, 0: ngals[i]], wts_single[offsets[i]: offsets[i + 1]])
+            testing.assert_array_equal(wts_pad[i, ngals[i]: ], 0.0)
+
+        testing.assert_raises(ValueError, redmapper.solver_nfw.solve_nfw_padded, data[0]['R0'], data[0]['BETA'],
+                              ucounts_pad, bcounts_pad, r_pad, w_pad, cpars, ngals=ngals + ngal, rsig=data[0]['RSIG'])
+
+        print("%d solves: Solver %.1f/s, solve_nfw_many %.1f/s, solve_nfw_padded %.1f/s" %
+              (nprob, nprob / t_single, nprob / t_many, nprob / t_padded))
+
 
 if __name__=='__main__':
     unittest.main()
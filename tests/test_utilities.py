@@ -5,7 +5,7 @@ import fitsio
 import esutil
 
 import redmapper
-from redmapper.utilities import CubicSpline, sample_from_pdf
+from redmapper.utilities import CubicSpline, FixedGridCubicSpline, sample_from_pdf, spline_basis
 
 class SplineTestCase(unittest.TestCase):
     """
@@ -28,6 +28,22 @@ class SplineTestCase(unittest.TestCase):
         # these numbers are also from redMaPPer 6.3.1, DR8
         testing.assert_almost_equal(vals,np.array([14.648017,19.792828,19.973761,20.301322],dtype=np.float64),decimal=6)
 
+        # The spline basis gives the same interpolation
+        basis = spline_basis(xx, np.array([0.01, 0.44, 0.55, 0.665]))
+        testing.assert_almost_equal(np.dot(basis, yy), vals)
+
+        # And the fixed-grid spline, for several sets of node values at once
+        xvals = np.array([0.01, 0.44, 0.55, 0.665])
+        spl = FixedGridCubicSpline.cached(xx, xvals)
+        self.assertIs(FixedGridCubicSpline.cached(xx, xvals), spl)
+        vals2 = spl([yy, 2.0*yy])
+        testing.assert_array_equal(vals2.shape, [2, xvals.size])
+        testing.assert_almost_equal(vals2[0, :], vals)
+        testing.assert_almost_equal(vals2[1, :], 2.0*vals)
+
+        spl = FixedGridCubicSpline(xx, xvals, fixextrap=True)
+        testing.assert_almost_equal(spl(yy), CubicSpline(xx, yy, fixextrap=True)(xvals))
+
         # Test the pdf inverter
         def power(x, exp=1.0):
             return x ** exp
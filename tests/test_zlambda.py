@@ -67,6 +67,11 @@ class ZlambdaTestCase(unittest.TestCase):
         testing.assert_almost_equal(cluster.z_lambda, 0.22666427, 6)
         testing.assert_almost_equal(cluster.z_lambda_err, 0.00443601, 4)
 
+        # the batched likelihood grid should match the single redshift version
+        zgrid = zlam.pzbins
+        testing.assert_array_almost_equal(zlam._bracket_fn_grid(zgrid),
+                                          np.array([zlam._bracket_fn(z) for z in zgrid]))
+
         # zlambda_err test
         z_lambda_err = zlam._zlambda_calc_gaussian_err(cluster.z_lambda)
 
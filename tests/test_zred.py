@@ -85,6 +85,54 @@ class ZredTestCase(unittest.TestCase):
         use2, = np.where(np.abs(delta_zred2_e) < 1e-3)
         testing.assert_array_less(0.98, float(use2.size) / float(delta_zred2_e.size))
 
+    def test_zred_batch(self):
+        """
+        Test redmapper.ZredColor batch computation against looping over
+        galaxies, and compare the timing.
+        """
+
+        file_path = 'data_for_tests'
+
+        zred_filename = 'test_dr8_pars.fit'
+        zredstr = RedSequenceColorPar(file_path + '/' + zred_filename)
+
+        galaxy_filename = 'test_dr8_gals_with_zred.fit'
+        galaxies = GalaxyCatalog.from_fits_file(file_path + '/' + galaxy_filename)
+
+        galaxies.add_fields([('zred_samp', 'f4', 4)])
+
+        galaxies_scalar = copy.deepcopy(galaxies)
+        galaxies_batch = copy.deepcopy(galaxies)
+
+        zredc = ZredColor(zredstr, block_size=1000)
+
+        np.random.seed(seed=12345)
+        starttime = time.time()
+        zredc.compute_zreds(galaxies_scalar, batch=False)
+        scalar_time = time.time() - starttime
+
+        np.random.seed(seed=12345)
+        starttime = time.time()
+        zredc.compute_zreds(galaxies_batch)
+        batch_time = time.time() - starttime
+
+        print("Ran %d galaxies in %.3f seconds (scalar) and %.3f seconds (batch), speedup %.1fx" %
+              (galaxies.size, scalar_time, batch_time, scalar_time / batch_time))
+
+        for name in ['zred', 'zred_e', 'zred2', 'zred2_e', 'zred_uncorr',
+                     'zred_uncorr_e', 'lkhd', 'chisq', 'zred_samp']:
+            testing.assert_array_equal(getattr(galaxies_batch, name),
+                                       getattr(galaxies_scalar, name))
+
+        # And a block size that does not divide the catalog
+        galaxies_batch2 = copy.deepcopy(galaxies)
+        zredc = ZredColor(zredstr, block_size=777)
+        np.random.seed(seed=12345)
+        zredc.compute_zreds(galaxies_batch2)
+
+        testing.assert_array_equal(galaxies_batch2.zred, galaxies_batch.zred)
+        testing.assert_array_equal(galaxies_batch2.zred_samp, galaxies_batch.zred_samp)
+
     def test_zred_runcat(self):
         """
         Test redmapper.ZredRunCatalog, computing zreds for all the galaxies in
@@ -113,6 +161,17 @@ class ZredTestCase(unittest.TestCase):
         # This exercises the reading code
         gals = GalaxyCatalog.from_galfile(galfile, zredfile=outfile)
 
+        # And the shared memory mode should give the same zreds
+        outfile_shared = os.path.join(self.test_dir, 'test_zred_out_shared.fits')
+        zredRuncat = ZredRunCatalog(config)
+        zredRuncat.run(galfile, outfile_shared, use_shared_memory=True)
+
+        gals_shared = GalaxyCatalog.from_galfile(galfile, zredfile=outfile_shared)
+        testing.assert_array_equal(gals_shared.zred, gals.zred)
+        testing.assert_array_equal(gals_shared.zred_e, gals.zred_e)
+        testing.assert_array_equal(gals_shared.chisq, gals.chisq)
+        testing.assert_array_equal(gals_shared.lkhd, gals.lkhd)
+
         self.assertGreater(np.min(gals.zred), 0.0)
         self.assertGreater(np.min(gals.chisq), 0.0)
         self.assertLess(np.max(gals.lkhd), 0.0)
@@ -54,5 +54,37 @@ class RunzscanTestCase(unittest.TestCase):
         testing.assert_almost_equal(runzscan.cat.z_lambda_opt_e, [0.0091162 , 0.01912573, 0.00890607], 5)
 
 
+class RunzscanPrematchTestCase(unittest.TestCase):
+    """
+    Tests of the bulk neighbor prematch blocks in redmapper.RunZScan
+    """
+    def test_prematch_maxmatch(self):
+        """
+        Test that limiting the matches per prematch block shortens the
+        blocks without changing the results.
+        """
+        file_path = 'data_for_tests'
+        conffile = 'testconfig.yaml'
+        catfile = 'test_cluster_pos.fit'
+
+        cats = []
+        # With maxmatch = 1 every block is a single cluster
+        for maxmatch in [5000000, 1]:
+            random.seed(seed=12345)
+
+            config = Configuration(os.path.join(file_path, conffile))
+            config.catfile = os.path.join(file_path, catfile)
+            config.zredfile = os.path.join(file_path, 'zreds_test', 'dr8_test_zreds_master_table.fit')
+            config.neighbor_prematch_maxmatch = maxmatch
+
+            runzscan = RunZScan(config)
+            runzscan.run()
+
+            cats.append(runzscan.cat)
+
+        testing.assert_array_equal(cats[1].Lambda, cats[0].Lambda)
+        testing.assert_array_equal(cats[1].z_lambda, cats[0].z_lambda)
+
+
 if __name__=='__main__':
     unittest.main()